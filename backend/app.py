@@ -1,7 +1,9 @@
 """FastAPI backend for Relia OSS with centralized config, JWT RBAC, and stubbed endpoints."""
 from __future__ import annotations
 
+import asyncio
 import os
+import json
 import secrets
 import threading
 import time
@@ -9,7 +11,7 @@ from pathlib import Path
 from typing import Any, Dict, List, Optional
 
 from fastapi import Depends, FastAPI, HTTPException, Query, Request, status, BackgroundTasks, Response
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -20,10 +22,17 @@ from starlette.middleware.base import BaseHTTPMiddleware
 
 from .config import settings
 from .auth import role_required
-from .llm_adapter import LLMClient, get_client, LLMError, LLMValidationError, LLMTimeoutError
+from .llm_adapter import (
+    LLMClient, get_client, aclose_http_client, LLMError, LLMValidationError, LLMTimeoutError,
+    LLMQueueTimeoutError, LLMCircuitOpenError,
+)
 from .plugin_loader import load_schemas
 from .services.playbook_service import PlaybookService, PlaybookValidationError, PlaybookExecutionError
-from .cache import schema_cache, llm_cache, playbook_cache
+from .cache import schema_cache, llm_cache, playbook_cache, lint_cache
+from .lint_pool import lint_pool
+from .molecule_pool import molecule_pool
+from .semantic_cache import semantic_cache
+from .usage_recorder import usage_recorder
 from . import database
 from . import tasks
 from . import monitoring
@@ -298,7 +307,8 @@ async def http_exception_handler(request: Request, exc: HTTPException):
                   client_ip=request.client.host if request.client else None)
     return JSONResponse(
         status_code=exc.status_code,
-        content={"detail": exc.detail, "type": "HTTPException"}
+        content={"detail": exc.detail, "type": "HTTPException"},
+        headers=exc.headers,
     )
     
 @app.exception_handler(jwt.PyJWTError)
@@ -328,6 +338,28 @@ if settings.DB_ENABLED:
         logger.error(f"Failed to initialize database: {e}")
         # Continue without database functionality
 
+@app.on_event("shutdown")
+async def close_llm_connections():
+    """Release pooled LLM provider connections and write pending usage records."""
+    await aclose_http_client()
+    await asyncio.to_thread(usage_recorder.stop)
+
+@app.on_event("shutdown")
+async def stop_lint_workers():
+    """Stop the pooled ansible-lint workers."""
+    await asyncio.to_thread(lint_pool.close)
+
+@app.on_event("startup")
+async def warm_molecule_instances():
+    """Start creating warm Molecule instances for the configured images."""
+    if settings.MOLECULE_POOL_ENABLED and molecule_pool.available():
+        molecule_pool.warm(settings.MOLECULE_POOL_IMAGES)
+
+@app.on_event("shutdown")
+async def stop_molecule_instances():
+    """Destroy the warm Molecule instances."""
+    await asyncio.to_thread(molecule_pool.close)
+
 # ---------------------------------------------------------------------------
 # Pydantic Models
 # ---------------------------------------------------------------------------
@@ -354,6 +386,15 @@ class PlaybookRequest(BaseModel):
 class LintResponse(BaseModel):
     errors: List[str] = Field([], description="List of linting errors")
 
+class BatchLintRequest(BaseModel):
+    playbook_ids: List[str] = Field(
+        ..., min_length=1, max_length=settings.LINT_BATCH_MAX_SIZE,
+        description="UUIDs of the playbooks to lint",
+    )
+
+class BatchLintResponse(BaseModel):
+    results: Dict[str, List[str]] = Field({}, description="Linting errors by playbook ID")
+
 class TestResponse(BaseModel):
     status: str = Field(..., description="Test result status ('passed' or 'failed')")
     logs: str = Field(..., description="Test execution logs")
@@ -429,7 +470,7 @@ async def generate(
 
     try:
         # Use service to generate playbook
-        playbook_id, yaml_out = playbook_service.generate_playbook(
+        playbook_id, yaml_out = await playbook_service.agenerate_playbook(
             module=req.module,
             prompt=req.prompt,
             schema=schemas[key],
@@ -454,6 +495,20 @@ async def generate(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail=f"Invalid YAML generated: {e}"
         )
+    except LLMQueueTimeoutError as e:
+        logger.warning("LLM queue timeout", error=str(e), user_id=user_id)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"LLM provider is busy, try again later: {e}",
+            headers={"Retry-After": str(int(settings.LLM_QUEUE_TIMEOUT))},
+        )
+    except LLMCircuitOpenError as e:
+        logger.warning("LLM circuit open", error=str(e))
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"LLM provider is unavailable, try again later: {e}",
+            headers={"Retry-After": str(int(settings.LLM_BREAKER_OPEN_SECONDS))},
+        )
     except LLMTimeoutError as e:
         logger.error("LLM timeout", error=str(e))
         
@@ -485,6 +540,89 @@ async def generate(
             detail=f"LLM service error: {e}"
         )
 
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    """Format a server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    # Marking the body as already encoded keeps GZipMiddleware from
+    # buffering the stream; X-Accel-Buffering does the same for nginx
+    "Content-Encoding": "identity",
+    "X-Accel-Buffering": "no",
+}
+
+@app.post(
+    "/v1/generate/stream",
+    dependencies=[Depends(role_required("generator"))],
+    tags=["Playbooks"],
+    summary="Generate an Ansible playbook as a stream",
+    description=(
+        "Generate an Ansible playbook, streaming the YAML as server-sent events. "
+        "'token' events carry chunks of YAML as the LLM produces them; a final "
+        "'done' event carries the playbook ID and validated YAML, or an 'error' "
+        "event carries the status code and detail."
+    ),
+    response_class=StreamingResponse,
+)
+async def generate_stream(
+    request: Request,
+    req: GenerateRequest,
+    playbook_service: PlaybookService = Depends(get_playbook_service),
+    schemas: Dict[str, Any] = Depends(get_schema_store),
+):
+    """Generate an Ansible playbook, streaming tokens as they arrive."""
+    user_id = get_user_id(request)
+    logger.info("Generate stream request", module=req.module, prompt_length=len(req.prompt), user_id=user_id)
+    
+    key = req.module if req.module in schemas else req.module.replace("ansible.builtin.", "")
+    if key not in schemas:
+        logger.error("Schema not found", module=req.module)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, 
+            detail=f"Schema for module '{req.module}' not found"
+        )
+    
+    async def events():
+        # The status code is sent before the first token, so errors after that
+        # point are reported as an 'error' event
+        try:
+            async for event in playbook_service.astream_playbook(
+                module=req.module,
+                prompt=req.prompt,
+                schema=schemas[key],
+                user_id=user_id,
+            ):
+                name = event.pop("event")
+                if name == "done":
+                    logger.info("Playbook generated", playbook_id=event["playbook_id"],
+                                yaml_size=len(event["playbook_yaml"]))
+                yield _sse(name, event)
+        except LLMValidationError as e:
+            logger.error("LLM validation error", error=str(e))
+            yield _sse("error", {"status": status.HTTP_422_UNPROCESSABLE_ENTITY,
+                                 "detail": f"Invalid YAML generated: {e}"})
+        except (LLMQueueTimeoutError, LLMCircuitOpenError) as e:
+            logger.warning("LLM unavailable", error=str(e))
+            yield _sse("error", {"status": status.HTTP_503_SERVICE_UNAVAILABLE,
+                                 "detail": f"LLM provider is unavailable, try again later: {e}"})
+        except LLMTimeoutError as e:
+            logger.error("LLM timeout", error=str(e))
+            yield _sse("error", {"status": status.HTTP_504_GATEWAY_TIMEOUT,
+                                 "detail": f"LLM request timed out: {e}"})
+        except LLMError as e:
+            logger.error("LLM error", error=str(e))
+            yield _sse("error", {"status": status.HTTP_502_BAD_GATEWAY,
+                                 "detail": f"LLM service error: {e}"})
+        except Exception as e:
+            # Anything else (e.g. saving the playbook failed) would otherwise
+            # end the stream without telling the client it failed
+            logger.exception("Playbook stream failed", error=str(e))
+            yield _sse("error", {"status": status.HTTP_500_INTERNAL_SERVER_ERROR,
+                                 "detail": "Internal error while generating the playbook"})
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
 @app.post(
     "/v1/lint",
     response_model=LintResponse,
@@ -506,8 +644,8 @@ async def lint(
     logger.info("Lint request", playbook_id=req.playbook_id, user_id=user_id)
     
     try:
-        # Use service to lint playbook
-        errors = playbook_service.lint_playbook(
+        # Use service to lint playbook without blocking the event loop
+        errors = await playbook_service.alint_playbook(
             playbook_id=req.playbook_id,
             timeout=settings.API_TIMEOUT,
             user_id=user_id
@@ -545,6 +683,57 @@ async def lint(
                 detail=f"Linting failed: {e}"
             )
 
+@app.post(
+    "/v1/lint/batch",
+    response_model=BatchLintResponse,
+    dependencies=[Depends(role_required("tester"))],
+    tags=["Playbooks"],
+    summary="Lint many Ansible playbooks",
+    description="Lint several existing playbooks with a single ansible-lint run",
+)
+async def lint_batch(
+    request: Request,
+    req: BatchLintRequest,
+    playbook_service: PlaybookService = Depends(get_playbook_service),
+):
+    """Lint several Ansible playbooks with one ansible-lint invocation."""
+    # Get user ID for telemetry
+    user_id = get_user_id(request)
+    
+    # Log request
+    logger.info("Batch lint request", playbook_count=len(req.playbook_ids), user_id=user_id)
+    
+    try:
+        results = await playbook_service.alint_playbooks(
+            playbook_ids=req.playbook_ids,
+            timeout=settings.LINT_BATCH_TIMEOUT,
+            user_id=user_id
+        )
+        
+        logger.info("Batch linting complete", playbook_count=len(results),
+                    error_count=sum(len(errors) for errors in results.values()))
+        return BatchLintResponse(results=results)
+        
+    except PlaybookValidationError as e:
+        logger.error("Playbook validation error", error=str(e))
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    except PlaybookExecutionError as e:
+        if "timed out" in str(e).lower():
+            logger.error("Batch linting timeout", playbook_count=len(req.playbook_ids))
+            raise HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail="Linting process timed out"
+            )
+        else:
+            logger.exception("Batch linting error", error=str(e))
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Linting failed: {e}"
+            )
+
 @app.post(
     "/v1/test",
     response_model=TestResponse,
@@ -567,8 +756,8 @@ async def test(
     logger.info("Test request", playbook_id=req.playbook_id, user_id=user_id)
     
     try:
-        # Use service to test playbook
-        test_status, logs = playbook_service.test_playbook(
+        # Use service to test playbook without blocking the event loop
+        test_status, logs = await playbook_service.atest_playbook(
             playbook_id=req.playbook_id,
             timeout=settings.API_TIMEOUT * 2,  # Allow more time for tests
             user_id=user_id
@@ -685,6 +874,9 @@ async def post_feedback(
         # Validate playbook exists
         playbook_service._get_playbook_path(req.playbook_id)
         
+        # A poorly rated semantic cache hit stops its source from being reused
+        semantic_cache.record_feedback(req.playbook_id, req.rating)
+        
         # Store feedback in database if enabled
         if settings.DB_ENABLED and settings.COLLECT_FEEDBACK:
             feedback_id = database.record_feedback(
@@ -732,7 +924,10 @@ class CacheStatsResponse(BaseModel):
     schema_cache: Dict[str, Any]
     llm_cache: Dict[str, Any]
     playbook_cache: Dict[str, Any]
+    lint_cache: Dict[str, Any]
+    semantic_cache: Dict[str, Any] = {}
     total_entries: int
+    hit_ratio: float
 
 @app.get(
     "/api/admin/cache/stats",
@@ -747,14 +942,21 @@ async def get_cache_stats():
     schema_stats = schema_cache.stats()
     llm_stats = llm_cache.stats()
     playbook_stats = playbook_cache.stats()
+    lint_stats = lint_cache.stats()
     
-    total = schema_stats["size"] + llm_stats["size"] + playbook_stats["size"]
+    all_stats = (schema_stats, llm_stats, playbook_stats, lint_stats)
+    total = sum(s["size"] for s in all_stats)
+    hits = sum(s["hits"] for s in all_stats)
+    lookups = hits + sum(s["misses"] for s in all_stats)
     
     return CacheStatsResponse(
         schema_cache=schema_stats,
         llm_cache=llm_stats,
         playbook_cache=playbook_stats,
-        total_entries=total
+        lint_cache=lint_stats,
+        semantic_cache=semantic_cache.stats(),
+        total_entries=total,
+        hit_ratio=round(hits / lookups, 4) if lookups else 0.0,
     )
 
 @app.post(
@@ -768,6 +970,8 @@ async def clear_caches(
     schema: bool = Query(False, description="Clear schema cache"),
     llm: bool = Query(False, description="Clear LLM response cache"),
     playbook: bool = Query(False, description="Clear playbook cache"),
+    lint: bool = Query(False, description="Clear lint result cache"),
+    semantic: bool = Query(False, description="Clear semantic playbook cache"),
     all: bool = Query(False, description="Clear all caches"),
 ):
     """Clear one or more caches."""
@@ -785,6 +989,14 @@ async def clear_caches(
         playbook_cache.clear()
         cleared.append("playbook")
     
+    if all or lint:
+        lint_cache.clear()
+        cleared.append("lint")
+    
+    if all or semantic:
+        semantic_cache.clear()
+        cleared.append("semantic")
+    
     logger.info(f"Cleared caches: {', '.join(cleared)}")
     return {"status": "success", "cleared": cleared}
 
@@ -795,6 +1007,7 @@ class FeedbackStatsResponse(BaseModel):
     average_rating: float
     rating_counts: Dict[int, int]  # Rating -> count
     recent_feedback: List[Dict[str, Any]]
+    semantic_cache: Dict[str, Any] = {}  # Ratings of semantic cache hits vs generated playbooks
 
 class TelemetryStatsResponse(BaseModel):
     """Response model for telemetry statistics."""
@@ -807,6 +1020,10 @@ class LLMUsageStatsResponse(BaseModel):
     total_tokens: int
     total_requests: int
     providers: List[Dict[str, Any]]
+    modules: List[Dict[str, Any]] = []  # Most expensive first
+    latency: Dict[str, float] = {}  # Percentiles in milliseconds
+    estimated_cost_usd: float = 0.0
+    prompt_tokens_saved: int = 0
 
 # Task Models
 class CreateTaskRequest(BaseModel):
@@ -921,7 +1138,8 @@ async def get_feedback_stats():
         total_feedback=total_feedback,
         average_rating=average_rating,
         rating_counts=rating_counts,
-        recent_feedback=recent_feedback
+        recent_feedback=recent_feedback,
+        semantic_cache=database.get_semantic_cache_quality(),
     )
 
 @app.get(
@@ -980,7 +1198,11 @@ async def get_llm_stats():
     return LLMUsageStatsResponse(
         total_tokens=usage_stats["total_tokens"],
         total_requests=usage_stats["total_requests"],
-        providers=usage_stats["providers"]
+        providers=usage_stats["providers"],
+        modules=usage_stats.get("modules", []),
+        latency=usage_stats.get("latency", {}),
+        estimated_cost_usd=usage_stats.get("estimated_cost_usd", 0.0),
+        prompt_tokens_saved=usage_stats.get("prompt_tokens_saved", 0),
     )
 
 # Health and monitoring endpoints
@@ -1140,6 +1362,48 @@ async def get_task_result(task_id: str):
         error=task.error
     )
 
+@app.get(
+    "/v1/tasks/{task_id}/logs",
+    dependencies=[Depends(role_required("generator"))],
+    tags=["Tasks"],
+    summary="Stream task logs",
+    description=(
+        "Stream the output of a task as server-sent events. 'log' events carry "
+        "one line each, starting from the beginning of the log; a final 'done' "
+        "event carries the task's status and error once it has finished."
+    ),
+    response_class=StreamingResponse,
+)
+async def stream_task_logs(request: Request, task_id: str):
+    """Follow a task's log until the task finishes."""
+    if not tasks.get_task(task_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Task {task_id} not found"
+        )
+    
+    async def events():
+        offset = 0
+        while True:
+            task = tasks.get_task(task_id)
+            # Checked before reading so the lines logged before it finished are sent
+            finished = task is None or task.status not in (tasks.TaskStatus.PENDING, tasks.TaskStatus.RUNNING)
+            while True:
+                lines, offset = await asyncio.to_thread(tasks.read_log, task_id, offset)
+                if not lines:
+                    break
+                for line in lines:
+                    yield _sse("log", {"line": line})
+            if finished:
+                yield _sse("done", {"status": task.status if task else None,
+                                    "error": task.error if task else None})
+                return
+            if await request.is_disconnected():
+                return
+            await asyncio.sleep(settings.TASK_LOG_POLL_SECONDS)
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
 @app.post(
     "/v1/tasks/{task_id}/cancel",
     response_model=TaskResponse,
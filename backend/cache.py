@@ -5,102 +5,998 @@ Provides:
 - Schema caching with TTL
 - LLM response caching
 - In-memory cache with cleanup
+- Size-bounded caches with pluggable eviction (LRU, TinyLFU)
+- Heap-indexed expiry so cleanup only touches expired entries
+- Single-flight loading so concurrent misses for a key compute it only once
+- Optional persistent second-level tier (see cache_store)
+- Hit/miss/expiry/eviction counters broken down by key prefix
+- Lock-striped ShardedCache with lock-free reads for high-QPS paths
+- A MISSING sentinel so stored None values are hits, and negative-result
+  caching with a shorter TTL
+- Opt-in compression of large values (zlib, or lz4 when installed)
 """
+import sys
 import time
+import zlib
+import heapq
+import pickle
+import asyncio
+import inspect
+import itertools
 import logging
 import threading
-from typing import Any, Dict, Optional, Tuple, TypeVar, Generic, Callable
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Dict, List, Optional, Tuple, TypeVar, Generic, Callable, Union
 from functools import wraps
 
+from .config import settings
+from .cache_store import CacheStore, SQLiteCacheStore, SharedMemoryCacheStore, default_shm_path
+
 # Configure logger
 logger = logging.getLogger(__name__)
 
+# lz4 is optional; zlib is always available
+try:
+    import lz4.frame
+    HAVE_LZ4 = True
+except ImportError:
+    HAVE_LZ4 = False
+
 T = TypeVar('T')
 
+class _Missing:
+    """Type of the MISSING sentinel."""
+    
+    __slots__ = ()
+    
+    def __repr__(self) -> str:
+        return "MISSING"
+        
+    def __bool__(self) -> bool:
+        return False
+
+# Returned by lookups that found nothing, so that a cached None is a hit
+MISSING: Any = _Missing()
+
+def is_negative(value: Any) -> bool:
+    """Return True for "nothing found" results: None or an empty container."""
+    if value is None:
+        return True
+    if isinstance(value, (str, bytes, list, tuple, dict, set, frozenset)):
+        return len(value) == 0
+    return False
+
+def _estimate_size(value: Any) -> int:
+    """Estimate the memory footprint of a value in bytes.
+    
+    Walks containers recursively; the result is an approximation intended for
+    enforcing cache byte budgets, not an exact accounting.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(_estimate_size(item) for item in value)
+    elif isinstance(value, dict):
+        size += sum(_estimate_size(k) + _estimate_size(v) for k, v in value.items())
+    elif type(value) is _Compressed:
+        size += sys.getsizeof(value.data)
+    return size
+
 class CacheEntry(Generic[T]):
     """A cache entry with expiration time."""
     
-    def __init__(self, value: T, ttl_seconds: int = 3600):
+    __slots__ = ("value", "expiry", "size", "seq")
+    
+    def __init__(self, value: T, ttl_seconds: int = 3600, size: int = 0, seq: int = 0):
         """Initialize a cache entry.
         
         Args:
             value: The value to cache
             ttl_seconds: Time to live in seconds (default: 1 hour)
+            size: Approximate size of the entry in bytes
+            seq: Sequence number tying the entry to its expiry index record
         """
         self.value = value
         self.expiry = time.time() + ttl_seconds
+        self.size = size
+        self.seq = seq
         
-    def is_expired(self) -> bool:
-        """Check if the cache entry has expired."""
-        return time.time() > self.expiry
+    def is_expired(self, now: Optional[float] = None) -> bool:
+        """Check if the cache entry has expired.
+        
+        Args:
+            now: Current timestamp, to avoid repeated clock reads in loops
+        """
+        return (now if now is not None else time.time()) > self.expiry
+
+# ---------------------------------------------------------------------------
+# Compression
+# ---------------------------------------------------------------------------
+class _Compressed:
+    """A compressed cache value, decompressed on every read."""
+    
+    __slots__ = ("codec", "kind", "data", "original_size")
+    
+    # How the value was turned into bytes before compression
+    STR, BYTES, PICKLE = range(3)
+    
+    def __init__(self, codec: str, kind: int, data: bytes, original_size: int):
+        self.codec = codec
+        self.kind = kind
+        self.data = data
+        self.original_size = original_size
+        
+    def decompress(self) -> Any:
+        """Return the original value."""
+        raw = lz4.frame.decompress(self.data) if self.codec == "lz4" else zlib.decompress(self.data)
+        if self.kind == self.STR:
+            return raw.decode("utf-8")
+        if self.kind == self.BYTES:
+            return raw
+        return pickle.loads(raw)
+
+COMPRESSION_CODECS = ("zlib", "lz4")
+
+def _compress(value: Any, codec: str, threshold: int) -> Any:
+    """Compress a value if it is large enough and compression pays off.
+    
+    Strings and bytes are compressed directly; other values (e.g. the
+    (playbook_id, yaml) tuples in the playbook cache) are pickled first. The
+    value is returned unchanged if it is small or does not shrink.
+    """
+    if isinstance(value, str):
+        kind, raw = _Compressed.STR, value.encode("utf-8")
+    elif isinstance(value, bytes):
+        kind, raw = _Compressed.BYTES, value
+    elif value is None or isinstance(value, (bool, int, float)):
+        return value
+    else:
+        try:
+            kind, raw = _Compressed.PICKLE, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return value
+        
+    if len(raw) < threshold:
+        return value
+        
+    data = lz4.frame.compress(raw) if codec == "lz4" else zlib.compress(raw, 6)
+    original_size = _estimate_size(value)
+    if sys.getsizeof(data) >= original_size:
+        return value
+    return _Compressed(codec, kind, data, original_size)
+
+def _unwrap(value: Any) -> Any:
+    """Return the stored value, decompressing it if needed."""
+    if type(value) is _Compressed:
+        return value.decompress()
+    return value
+
+# ---------------------------------------------------------------------------
+# Eviction policies
+# ---------------------------------------------------------------------------
+class EvictionPolicy:
+    """Base class for cache eviction policies.
+    
+    A policy only tracks keys. The owning Cache holds the values and calls these
+    hooks while holding its lock, so implementations need no locking of their own.
+    """
+    
+    name = "none"
+    
+    def record_get(self, key: str, hit: bool) -> None:
+        """Record a lookup of a key."""
+        
+    def record_insert(self, key: str) -> None:
+        """Record that a key was inserted or overwritten."""
+        
+    def record_remove(self, key: str) -> None:
+        """Record that a key was removed from the cache."""
+        
+    def victim(self) -> Optional[str]:
+        """Return the key that should be evicted next, if any."""
+        return None
+        
+    def admit(self, candidate: str, victim: str) -> bool:
+        """Decide whether a new key may displace the given victim."""
+        return True
+        
+    def clear(self) -> None:
+        """Forget all tracked keys."""
+
+class LRUPolicy(EvictionPolicy):
+    """Evict the least recently used key."""
+    
+    name = "lru"
+    
+    def __init__(self):
+        self._order: "OrderedDict[str, None]" = OrderedDict()
+        
+    def record_get(self, key: str, hit: bool) -> None:
+        if hit and key in self._order:
+            self._order.move_to_end(key)
+            
+    def record_insert(self, key: str) -> None:
+        self._order[key] = None
+        self._order.move_to_end(key)
+        
+    def record_remove(self, key: str) -> None:
+        self._order.pop(key, None)
+        
+    def victim(self) -> Optional[str]:
+        return next(iter(self._order), None)
+        
+    def clear(self) -> None:
+        self._order.clear()
+
+class TinyLFUPolicy(LRUPolicy):
+    """LRU eviction guarded by a TinyLFU admission filter.
+    
+    Access frequencies (including misses) are tracked in a count-min sketch. A new
+    key is only admitted if it has been requested more often than the LRU victim
+    it would displace, which keeps one-off keys from flushing popular entries.
+    Counters are halved periodically so the sketch follows shifts in popularity.
+    """
+    
+    name = "tinylfu"
+    
+    _DEPTH = 4
+    _MAX_COUNT = 15
+    
+    def __init__(self, width: int = 4096):
+        super().__init__()
+        # Round the width up to a power of two so the index is a cheap mask
+        self._width = 1 << max(4, (width - 1).bit_length())
+        self._mask = self._width - 1
+        self._table: List[List[int]] = [[0] * self._width for _ in range(self._DEPTH)]
+        self._additions = 0
+        self._sample_size = self._width * 10
+        
+    def _indexes(self, key: str):
+        h = hash(key)
+        for row in range(self._DEPTH):
+            yield row, hash((row, h)) & self._mask
+            
+    def _increment(self, key: str) -> None:
+        for row, index in self._indexes(key):
+            if self._table[row][index] < self._MAX_COUNT:
+                self._table[row][index] += 1
+        self._additions += 1
+        if self._additions >= self._sample_size:
+            self._age()
+            
+    def _age(self) -> None:
+        """Halve all counters so old popularity decays."""
+        for row in self._table:
+            for i, count in enumerate(row):
+                row[i] = count >> 1
+        self._additions //= 2
+        
+    def frequency(self, key: str) -> int:
+        """Return the estimated access frequency of a key."""
+        return min(self._table[row][index] for row, index in self._indexes(key))
+        
+    def record_get(self, key: str, hit: bool) -> None:
+        self._increment(key)
+        super().record_get(key, hit)
+        
+    def record_insert(self, key: str) -> None:
+        if key not in self._order:
+            self._increment(key)
+        super().record_insert(key)
+        
+    def admit(self, candidate: str, victim: str) -> bool:
+        return self.frequency(candidate) > self.frequency(victim)
+        
+    def clear(self) -> None:
+        super().clear()
+        self._table = [[0] * self._width for _ in range(self._DEPTH)]
+        self._additions = 0
+
+EVICTION_POLICIES: Dict[str, Callable[[], EvictionPolicy]] = {
+    "lru": LRUPolicy,
+    "tinylfu": TinyLFUPolicy,
+}
+
+def _make_policy(policy: Union[str, EvictionPolicy, None]) -> EvictionPolicy:
+    """Resolve an eviction policy from a name or instance."""
+    if policy is None:
+        return EvictionPolicy()
+    if isinstance(policy, EvictionPolicy):
+        return policy
+    try:
+        return EVICTION_POLICIES[policy.lower()]()
+    except KeyError:
+        raise ValueError(f"Unknown eviction policy: {policy}")
+
+# ---------------------------------------------------------------------------
+# Request coalescing
+# ---------------------------------------------------------------------------
+class _Call:
+    """An in-flight computation that other threads can wait on."""
+    
+    __slots__ = ("done", "result", "error")
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+class _LeaderCancelled(Exception):
+    """Set on a shared future when the coroutine computing it was cancelled."""
+    pass
+
+class SingleFlight:
+    """Coalesce concurrent computations of the same key.
+    
+    The first caller for a key runs the computation; callers that arrive while
+    it is in flight wait for and share its result (or exception) instead of
+    repeating the work. Thread and asyncio callers are tracked separately, and
+    asyncio calls are scoped to their event loop.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._async_calls: Dict[Tuple[int, str], "asyncio.Future[Any]"] = {}
+        
+    def do(self, key: str, fn: Callable[[], T]) -> Tuple[T, bool]:
+        """Run fn once for all concurrent callers with the same key.
+        
+        Returns:
+            Tuple of (result, shared) where shared is True if this caller waited
+            on another caller's computation
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+                
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+            
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+        
+    async def ado(self, key: str, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """Await fn() once for all concurrent coroutines with the same key.
+        
+        Returns:
+            Tuple of (result, shared) as for do()
+        """
+        loop = asyncio.get_running_loop()
+        scoped_key = (id(loop), key)
+        
+        while True:
+            with self._lock:
+                future = self._async_calls.get(scoped_key)
+                leader = future is None
+                if leader:
+                    future = loop.create_future()
+                    self._async_calls[scoped_key] = future
+            if leader:
+                break
+            try:
+                # Shield so a cancelled waiter does not cancel the shared result
+                return await asyncio.shield(future), True
+            except _LeaderCancelled:
+                # Only the leader was cancelled; try again, possibly as the new leader
+                continue
+            
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except BaseException as e:
+            if not future.done():
+                future.set_exception(e)
+                # Retrieve it so an unawaited future does not log a warning
+                future.exception()
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                del self._async_calls[scoped_key]
+        return result, False
+        
+    def in_flight(self) -> int:
+        """Return the number of keys currently being computed."""
+        with self._lock:
+            return len(self._calls) + len(self._async_calls)
+
+# Lock-free read buffer size, and the fill level at which readers try to drain it
+READ_BUFFER_SIZE = 4096
+READ_BUFFER_DRAIN_THRESHOLD = 1024
+
+def _key_prefix(key: str) -> str:
+    """Return the prefix of a key (the part before the first colon)."""
+    prefix, sep, _ = key.partition(":")
+    if not sep or len(prefix) > 32:
+        return "other"
+    return prefix
+
+class CacheCounters:
+    """Hit/miss/expiry/eviction/load counters broken down by key prefix.
+    
+    Each thread increments its own counter table without taking a lock; the
+    tables are merged when stats are read. Reads may therefore lag in-flight
+    increments slightly, which is acceptable for monitoring. Tables of threads
+    that have exited (e.g. retired pool workers) are folded into a shared base
+    table, so the number of tables stays bounded by the live threads.
+    """
+    
+    FIELDS = ("hits", "misses", "expirations", "evictions", "loads", "negative", "load_seconds")
+    HITS, MISSES, EXPIRATIONS, EVICTIONS, LOADS, NEGATIVE, LOAD_SECONDS = range(7)
+    
+    def __init__(self):
+        self._local = threading.local()
+        self._tables: List[Tuple[threading.Thread, Dict[str, List[float]]]] = []
+        self._base: Dict[str, List[float]] = {}
+        self._tables_lock = threading.Lock()
+        
+    def add(self, key: str, field: int, amount: float = 1) -> None:
+        """Increment a counter for the prefix of a key."""
+        table = getattr(self._local, "table", None)
+        if table is None:
+            table = {}
+            self._local.table = table
+            with self._tables_lock:
+                self._prune()
+                self._tables.append((threading.current_thread(), table))
+                
+        prefix = _key_prefix(key)
+        row = table.get(prefix)
+        if row is None:
+            row = table[prefix] = [0] * len(self.FIELDS)
+        row[field] += amount
+        
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Merge all per-thread tables into totals by prefix."""
+        with self._tables_lock:
+            self._prune()
+            merged = {prefix: list(row) for prefix, row in self._base.items()}
+            tables = [table for _, table in self._tables]
+            
+        for table in tables:
+            self._merge(merged, table)
+        return {prefix: dict(zip(self.FIELDS, row)) for prefix, row in merged.items()}
+        
+    def _prune(self) -> None:
+        """Fold the tables of exited threads into the base table. Caller holds _tables_lock."""
+        live = []
+        for thread, table in self._tables:
+            if thread.is_alive():
+                live.append((thread, table))
+            else:
+                self._merge(self._base, table)
+        self._tables = live
+        
+    def _merge(self, totals: Dict[str, List[float]], table: Dict[str, List[float]]) -> None:
+        for prefix, row in list(table.items()):
+            total = totals.setdefault(prefix, [0] * len(self.FIELDS))
+            for i, value in enumerate(row):
+                total[i] += value
+        
+    def reset(self) -> None:
+        """Zero all counters."""
+        with self._tables_lock:
+            self._base.clear()
+            for _, table in self._tables:
+                table.clear()
+
+def _hit_ratio(hits: float, misses: float) -> float:
+    lookups = hits + misses
+    return round(hits / lookups, 4) if lookups else 0.0
 
 class Cache(Generic[T]):
-    """Thread-safe cache with automatic cleanup."""
+    """Thread-safe cache with automatic cleanup and optional size bounds."""
     
-    def __init__(self, name: str, ttl_seconds: int = 3600, cleanup_interval: int = 300):
+    def __init__(self, name: str, ttl_seconds: int = 3600, cleanup_interval: int = 300,
+                 max_entries: Optional[int] = None, max_bytes: Optional[int] = None,
+                 eviction_policy: Union[str, EvictionPolicy, None] = "lru",
+                 l2: Optional[CacheStore] = None, lock_free_reads: bool = False,
+                 compression: Optional[str] = None, compress_threshold: int = 1024):
         """Initialize the cache.
         
         Args:
             name: Cache name for logging
             ttl_seconds: Default TTL in seconds (default: 1 hour)
             cleanup_interval: How often to check for expired entries (default: 5 minutes)
+            max_entries: Maximum number of entries to hold (default: unbounded)
+            max_bytes: Approximate maximum memory footprint in bytes (default: unbounded)
+            eviction_policy: Policy name ("lru" or "tinylfu") or an EvictionPolicy
+                             instance used when a bound is reached
+            l2: Optional second-level store, checked on a miss and written through
+                on set. Entries are namespaced by the cache name.
+            lock_free_reads: If True, hits on live entries are served without
+                             taking the lock. Their recency updates are buffered
+                             and applied to the eviction policy in batches.
+            compression: Optional codec ("zlib" or "lz4") for values of at least
+                         compress_threshold bytes. Values are decompressed on
+                         every get, trading CPU for memory.
+            compress_threshold: Minimum serialized size in bytes to compress
         """
         self.name = name
         self.ttl_seconds = ttl_seconds
         self.cleanup_interval = cleanup_interval
+        self.max_entries = max_entries or None
+        self.max_bytes = max_bytes or None
+        self._policy = _make_policy(eviction_policy)
+        
+        if compression in ("", "none"):
+            compression = None
+        if compression is not None and compression not in COMPRESSION_CODECS:
+            raise ValueError(f"Unknown compression codec: {compression}")
+        if compression == "lz4" and not HAVE_LZ4:
+            logger.warning(f"lz4 not installed, {name} cache falls back to zlib compression")
+            compression = "zlib"
+        self.compression = compression
+        self.compress_threshold = compress_threshold
+        self._compressed_entries = 0
+        self._bytes_saved = 0
         self._data: Dict[str, CacheEntry[T]] = {}
         self._lock = threading.RLock()
         self._last_cleanup = time.time()
+        self._bytes = 0
+        self._evictions = 0
+        self._rejections = 0
+        
+        # Min-heap of (expiry, seq, key). Records are never removed eagerly; a
+        # record is stale once its key is gone or has been re-set with a new seq.
+        self._expiry_heap: List[Tuple[float, int, str]] = []
+        self._seq = itertools.count()
+        self._expirations = 0
+        self._cleanup_runs = 0
+        self._last_cleanup_removed = 0
+        self._last_cleanup_duration_ms = 0.0
+        
+        self._flight = SingleFlight()
+        self._coalesced = 0
+        
+        self._l2 = l2
+        self._l2_hits = 0
+        self._l2_misses = 0
+        # Time of a due second-level purge, run by the next second-level access
+        self._l2_purge_at: Optional[float] = None
+        
+        self._counters = CacheCounters()
+        # Entry count and bytes per key prefix; updated under the lock
+        self._prefix_usage: Dict[str, List[int]] = {}
+        
+        # Keys read on the lock-free path, awaiting their policy update. The
+        # buffer is lossy: if it overflows, the oldest reads are dropped, which
+        # only makes recency slightly less precise.
+        self._read_buffer: Optional[deque] = deque(maxlen=READ_BUFFER_SIZE) if lock_free_reads else None
+        
+    def get(self, key: str, default: Any = None) -> Optional[T]:
+        """Get an item from the cache, returning default if not found or expired.
+        
+        Pass MISSING as the default to tell a miss apart from a cached None.
+        On an in-memory miss the second-level store (if any) is consulted, and a
+        hit there is copied back into memory for its remaining TTL.
+        """
+        return self._count_lookup(key, self._lookup(key), default)
+        
+    async def aget(self, key: str, default: Any = None) -> Optional[T]:
+        """Async variant of get(); second-level store I/O runs in a worker thread."""
+        return self._count_lookup(key, await self._alookup(key), default)
+        
+    def _count_lookup(self, key: str, value: Any, default: Any) -> Any:
+        """Count a hit or miss and return the value or default."""
+        if value is MISSING:
+            self._counters.add(key, CacheCounters.MISSES)
+            return default
+        self._counters.add(key, CacheCounters.HITS)
+        return value
         
-    def get(self, key: str) -> Optional[T]:
-        """Get an item from the cache, returning None if not found or expired."""
+    def _lookup(self, key: str) -> Any:
+        """Look a key up in both tiers without counting a hit or miss.
+        
+        Returns MISSING if the key is not present.
+        """
+        value = self._lookup_memory(key)
+        if value is MISSING and self._l2 is not None:
+            return self._get_from_l2(key)
+        return value
+        
+    async def _alookup(self, key: str) -> Any:
+        """Async variant of _lookup() that keeps second-level I/O off the event loop."""
+        value = self._lookup_memory(key)
+        if value is MISSING and self._l2 is not None:
+            return await asyncio.to_thread(self._get_from_l2, key)
+        return value
+        
+    def _lookup_memory(self, key: str) -> Any:
+        """Look a key up in the in-memory tier, returning MISSING if absent."""
+        if self._read_buffer is not None:
+            # dict.get is atomic, and entries are replaced rather than mutated,
+            # so a live entry can be returned without the lock
+            entry = self._data.get(key)
+            if entry is not None and not entry.is_expired():
+                self._read_buffer.append(key)
+                if len(self._read_buffer) >= READ_BUFFER_DRAIN_THRESHOLD:
+                    self._try_drain_reads()
+                return _unwrap(entry.value)
+                
         with self._lock:
             self._maybe_cleanup()
+            value = self._get_live(key)
+            
+        # Decompress outside the lock
+        return _unwrap(value) if value is not MISSING else MISSING
+        
+    def _get_live(self, key: str) -> Any:
+        """Return the stored value of a live entry, or MISSING. Caller holds the lock."""
+        entry = self._data.get(key)
+        if entry is not None:
+            if not entry.is_expired():
+                self._policy.record_get(key, hit=True)
+                return entry.value
+            self._remove(key)
+            self._expirations += 1
+            self._counters.add(key, CacheCounters.EXPIRATIONS)
             
-            if key not in self._data:
-                return None
+        self._policy.record_get(key, hit=False)
+        return MISSING
+        
+    def _try_drain_reads(self) -> None:
+        """Apply buffered reads if the lock is free; otherwise leave them."""
+        if self._lock.acquire(blocking=False):
+            try:
+                self._drain_reads()
+            finally:
+                self._lock.release()
                 
-            entry = self._data[key]
-            if entry.is_expired():
-                del self._data[key]
-                return None
+    def _drain_reads(self) -> None:
+        """Apply buffered reads to the eviction policy. Caller holds the lock."""
+        buffer = self._read_buffer
+        if not buffer:
+            return
+        data = self._data
+        policy = self._policy
+        while True:
+            try:
+                key = buffer.popleft()
+            except IndexError:
+                break
+            if key in data:
+                policy.record_get(key, hit=True)
                 
-            return entry.value
+    def _get_from_l2(self, key: str) -> Any:
+        """Look a key up in the second-level store and fill memory on a hit."""
+        # I/O happens outside the lock so a slow disk cannot stall other readers
+        self._purge_l2()
+        found = self._l2.get(self.name, key)
+        if found is None:
+            with self._lock:
+                self._l2_misses += 1
+            return MISSING
+            
+        value, expiry = found
+        with self._lock:
+            self._l2_hits += 1
+        self._store(key, value, expiry - time.time())
+        return value
             
     def set(self, key: str, value: T, ttl_seconds: Optional[int] = None) -> None:
-        """Set an item in the cache with optional custom TTL."""
+        """Set an item in the cache with optional custom TTL.
+        
+        If the cache is bounded, older entries are evicted according to the
+        eviction policy. The policy may also refuse to admit the new entry, in
+        which case it is not held in memory and the rejection is counted in
+        stats(). Values are written through to the second-level store, if any.
+        """
+        ttl = ttl_seconds if ttl_seconds is not None else self.ttl_seconds
+        self._store(key, value, ttl)
+        if self._l2 is not None:
+            self._set_l2(key, value, ttl)
+            
+    async def aset(self, key: str, value: T, ttl_seconds: Optional[int] = None) -> None:
+        """Async variant of set(); the second-level write runs in a worker thread."""
         ttl = ttl_seconds if ttl_seconds is not None else self.ttl_seconds
+        self._store(key, value, ttl)
+        if self._l2 is not None:
+            await asyncio.to_thread(self._set_l2, key, value, ttl)
+            
+    def _set_l2(self, key: str, value: T, ttl: float) -> None:
+        """Write an entry through to the second-level store."""
+        self._purge_l2()
+        self._l2.set(self.name, key, value, time.time() + ttl)
+        
+    def _purge_l2(self) -> None:
+        """Purge expired second-level entries if a cleanup tick asked for it.
+        
+        Runs outside the lock, since the purge is a disk write or a scan of
+        the shared-memory slots.
+        """
+        with self._lock:
+            now, self._l2_purge_at = self._l2_purge_at, None
+        if now is not None:
+            self._l2.purge_expired(self.name, now)
+            
+    def _store(self, key: str, value: T, ttl: float) -> None:
+        """Insert an entry into the in-memory tier, evicting as needed."""
+        if self.compression is not None:
+            value = _compress(value, self.compression, self.compress_threshold)
+        size = _estimate_size(key) + _estimate_size(value)
         
         with self._lock:
             self._maybe_cleanup()
-            self._data[key] = CacheEntry(value, ttl)
+            
+            if self.max_bytes is not None and size > self.max_bytes:
+                self._rejections += 1
+                logger.debug(f"Entry {key[:20]} is larger than the {self.name} cache budget")
+                return
+                
+            # An overwritten key is already resident, so it skips admission,
+            # but a larger value may still need room
+            replacing = key in self._data
+            if replacing:
+                self._remove(key)
+            if not self._make_room(key, size, check_admission=not replacing):
+                self._rejections += 1
+                return
+                
+            entry = CacheEntry(value, ttl, size, next(self._seq))
+            self._data[key] = entry
+            self._bytes += size
+            if type(value) is _Compressed:
+                self._compressed_entries += 1
+                self._bytes_saved += value.original_size - size
+            usage = self._prefix_usage.setdefault(_key_prefix(key), [0, 0])
+            usage[0] += 1
+            usage[1] += size
+            self._policy.record_insert(key)
+            heapq.heappush(self._expiry_heap, (entry.expiry, entry.seq, key))
+            
+    def get_or_set(self, key: str, compute: Callable[[], T], ttl_seconds: Optional[int] = None,
+                   on_coalesced: Optional[Callable[[], None]] = None,
+                   negative_ttl: Optional[float] = None) -> T:
+        """Get an item, computing and storing it on a miss.
+        
+        Concurrent misses for the same key are coalesced: one caller runs
+        compute() and the others wait for its result.
+        
+        Args:
+            key: Cache key
+            compute: Function producing the value on a miss
+            ttl_seconds: Optional custom TTL for the computed value
+            on_coalesced: Optional callback invoked when this caller shared
+                          another caller's computation
+            negative_ttl: Optional TTL for negative results (None or empty,
+                          see is_negative()); 0 means do not cache them
+        """
+        value = self.get(key, MISSING)
+        if value is not MISSING:
+            return value
+        return self.load(key, compute, ttl_seconds, on_coalesced, negative_ttl)
+        
+    def load(self, key: str, compute: Callable[[], T], ttl_seconds: Optional[int] = None,
+             on_coalesced: Optional[Callable[[], None]] = None,
+             negative_ttl: Optional[float] = None) -> T:
+        """Compute and store a value after get() has returned a miss.
+        
+        This is the miss path of get_or_set() for callers that handle hits
+        themselves; it does not count another lookup. Concurrent loads of the
+        same key are coalesced.
+        """
+        def load() -> T:
+            # A previous flight may have filled the cache since our lookup
+            value = self._lookup(key)
+            if value is MISSING:
+                start = time.perf_counter()
+                value = compute()
+                self._record_load(key, start)
+                self._set_computed(key, value, ttl_seconds, negative_ttl)
+            return value
+            
+        value, shared = self._flight.do(key, load)
+        if shared:
+            self._record_coalesced(on_coalesced)
+        return value
+        
+    async def aget_or_set(self, key: str, compute: Callable[[], Awaitable[T]],
+                          ttl_seconds: Optional[int] = None,
+                          on_coalesced: Optional[Callable[[], None]] = None,
+                          negative_ttl: Optional[float] = None) -> T:
+        """Async variant of get_or_set() for coroutine computations."""
+        value = await self.aget(key, MISSING)
+        if value is not MISSING:
+            return value
+        return await self.aload(key, compute, ttl_seconds, on_coalesced, negative_ttl)
+        
+    async def aload(self, key: str, compute: Callable[[], Awaitable[T]],
+                    ttl_seconds: Optional[int] = None,
+                    on_coalesced: Optional[Callable[[], None]] = None,
+                    negative_ttl: Optional[float] = None) -> T:
+        """Async variant of load() for coroutine computations."""
+        async def load() -> T:
+            value = await self._alookup(key)
+            if value is MISSING:
+                start = time.perf_counter()
+                value = await compute()
+                self._record_load(key, start)
+                ttl = self._computed_ttl(key, value, ttl_seconds, negative_ttl)
+                if ttl is not False:
+                    await self.aset(key, value, ttl)
+            return value
+            
+        value, shared = await self._flight.ado(key, load)
+        if shared:
+            self._record_coalesced(on_coalesced)
+        return value
+        
+    def _set_computed(self, key: str, value: T, ttl_seconds: Optional[int],
+                      negative_ttl: Optional[float]) -> None:
+        """Store a computed value, using negative_ttl for negative results."""
+        ttl = self._computed_ttl(key, value, ttl_seconds, negative_ttl)
+        if ttl is not False:
+            self.set(key, value, ttl)
+            
+    def _computed_ttl(self, key: str, value: T, ttl_seconds: Optional[int],
+                      negative_ttl: Optional[float]) -> Union[Optional[float], bool]:
+        """Return the TTL to store a computed value with, or False to not store it."""
+        if negative_ttl is not None and is_negative(value):
+            if negative_ttl <= 0:
+                return False
+            self._counters.add(key, CacheCounters.NEGATIVE)
+            return negative_ttl
+        return ttl_seconds
+        
+    def _record_load(self, key: str, start: float) -> None:
+        """Count a computed value and the time it took to produce."""
+        self._counters.add(key, CacheCounters.LOADS)
+        self._counters.add(key, CacheCounters.LOAD_SECONDS, time.perf_counter() - start)
+        
+    def _record_coalesced(self, callback: Optional[Callable[[], None]]) -> None:
+        """Count a coalesced caller and notify the optional callback."""
+        with self._lock:
+            self._coalesced += 1
+        if callback is not None:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"Coalesced callback failed for {self.name} cache: {e}")
             
     def delete(self, key: str) -> None:
         """Delete an item from the cache."""
         with self._lock:
             if key in self._data:
-                del self._data[key]
+                self._remove(key)
+        if self._l2 is not None:
+            self._l2.delete(self.name, key)
                 
     def clear(self) -> None:
         """Clear all items from the cache."""
         with self._lock:
             self._data.clear()
+            self._policy.clear()
+            self._expiry_heap.clear()
+            self._bytes = 0
+            self._compressed_entries = 0
+            self._bytes_saved = 0
+            self._prefix_usage.clear()
+            if self._read_buffer is not None:
+                self._read_buffer.clear()
+        if self._l2 is not None:
+            self._l2.clear(self.name)
+            
+    def _remove(self, key: str) -> None:
+        """Remove an entry and update size accounting. Caller holds the lock."""
+        entry = self._data.pop(key)
+        self._bytes -= entry.size
+        if type(entry.value) is _Compressed:
+            self._compressed_entries -= 1
+            self._bytes_saved -= entry.value.original_size - entry.size
+        self._policy.record_remove(key)
+        usage = self._prefix_usage[_key_prefix(key)]
+        usage[0] -= 1
+        usage[1] -= entry.size
+        
+    def _over_budget(self, extra_entries: int, extra_bytes: int) -> bool:
+        """Check whether adding the given amount would exceed a bound."""
+        if self.max_entries is not None and len(self._data) + extra_entries > self.max_entries:
+            return True
+        if self.max_bytes is not None and self._bytes + extra_bytes > self.max_bytes:
+            return True
+        return False
+        
+    def _make_room(self, key: str, size: int, check_admission: bool = True) -> bool:
+        """Evict entries until a new entry of the given size fits.
+        
+        Returns False if the eviction policy refuses to admit the new key
+        (only asked if check_admission is True).
+        """
+        if not self._over_budget(1, size):
+            return True
+            
+        # Bring the policy up to date with lock-free reads before choosing victims
+        if self._read_buffer is not None:
+            self._drain_reads()
+            
+        # Expired entries are free to drop before anything live is evicted
+        self._cleanup()
+        
+        checked_admission = not check_admission
+        while self._over_budget(1, size):
+            victim = self._policy.victim()
+            if victim is None or victim not in self._data:
+                # Policy without ordering (or out of sync); fall back to insertion order
+                victim = next(iter(self._data), None)
+                if victim is None:
+                    break
+            if not checked_admission:
+                if not self._policy.admit(key, victim):
+                    return False
+                checked_admission = True
+            self._remove(victim)
+            self._evictions += 1
+            self._counters.add(victim, CacheCounters.EVICTIONS)
+            
+        return True
             
     def _maybe_cleanup(self) -> None:
-        """Clean up expired entries if cleanup_interval has passed."""
+        """Clean up expired entries if cleanup_interval has passed.
+        
+        The second-level purge is only scheduled here, as the caller holds the
+        lock; the next second-level access runs it (see _purge_l2()).
+        """
         now = time.time()
         if now - self._last_cleanup > self.cleanup_interval:
-            self._cleanup()
+            self._cleanup(now)
             self._last_cleanup = now
+            if self._l2 is not None:
+                self._l2_purge_at = now
+            
+    def _cleanup(self, now: Optional[float] = None) -> None:
+        """Remove all expired entries from the cache.
+        
+        Pops records off the expiry heap until the earliest remaining one is
+        still live, so the cost is proportional to the number of expired (or
+        stale) records rather than the size of the cache.
+        """
+        start = time.perf_counter()
+        now = now if now is not None else time.time()
+        heap = self._expiry_heap
+        removed = 0
+        
+        while heap and heap[0][0] < now:
+            _, seq, key = heapq.heappop(heap)
+            entry = self._data.get(key)
+            if entry is not None and entry.seq == seq:
+                self._remove(key)
+                self._counters.add(key, CacheCounters.EXPIRATIONS)
+                removed += 1
+                
+        # Overwrites and deletes leave stale records behind; rebuild the heap
+        # when they outnumber live entries so it cannot grow without bound.
+        if len(heap) > 2 * len(self._data) + 64:
+            self._expiry_heap = [(e.expiry, e.seq, k) for k, e in self._data.items()]
+            heapq.heapify(self._expiry_heap)
             
-    def _cleanup(self) -> None:
-        """Remove all expired entries from the cache."""
-        expired_keys = [k for k, v in self._data.items() if v.is_expired()]
-        for key in expired_keys:
-            del self._data[key]
+        self._expirations += removed
+        self._cleanup_runs += 1
+        self._last_cleanup_removed = removed
+        self._last_cleanup_duration_ms = (time.perf_counter() - start) * 1000
             
-        if expired_keys:
-            logger.info(f"Cleaned up {len(expired_keys)} expired entries from {self.name} cache")
+        if removed:
+            logger.info(f"Cleaned up {removed} expired entries from {self.name} cache")
             
     def __len__(self) -> int:
         """Return the number of items in the cache."""
@@ -110,49 +1006,377 @@ class Cache(Generic[T]):
     def stats(self) -> Dict[str, Any]:
         """Return statistics about the cache."""
         with self._lock:
-            return {
+            stats = {
                 "name": self.name,
                 "size": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "eviction_policy": self._policy.name,
+                "evictions": self._evictions,
+                "rejections": self._rejections,
+                "expirations": self._expirations,
+                "coalesced": self._coalesced,
+                "in_flight": self._flight.in_flight(),
                 "ttl_seconds": self.ttl_seconds,
                 "cleanup_interval": self.cleanup_interval,
                 "last_cleanup": self._last_cleanup,
+                "cleanup_runs": self._cleanup_runs,
+                "last_cleanup_removed": self._last_cleanup_removed,
+                "last_cleanup_duration_ms": round(self._last_cleanup_duration_ms, 3),
+                "expiry_index_size": len(self._expiry_heap),
+                "compression": self.compression,
+                "compressed_entries": self._compressed_entries,
+                "bytes_saved": self._bytes_saved,
             }
+            usage = {prefix: list(row) for prefix, row in self._prefix_usage.items()}
+            
+        by_prefix = self._counters.snapshot()
+        for prefix, (entries, size) in usage.items():
+            counts = by_prefix.setdefault(prefix, dict.fromkeys(CacheCounters.FIELDS, 0))
+            counts.update({"entries": entries, "bytes": size})
+        for counts in by_prefix.values():
+            counts.setdefault("entries", 0)
+            counts.setdefault("bytes", 0)
+            counts["hit_ratio"] = _hit_ratio(counts["hits"], counts["misses"])
+            load_seconds = counts.pop("load_seconds")
+            counts["avg_load_ms"] = round(load_seconds / counts["loads"] * 1000, 3) if counts["loads"] else 0.0
+            
+        hits = sum(c["hits"] for c in by_prefix.values())
+        misses = sum(c["misses"] for c in by_prefix.values())
+        stats.update({
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": _hit_ratio(hits, misses),
+            "by_prefix": by_prefix,
+            "l2": self._l2_stats(),
+        })
+        return stats
+        
+    def reset_stats(self) -> None:
+        """Zero the hit/miss/expiry/eviction counters."""
+        self._counters.reset()
+        with self._lock:
+            self._evictions = 0
+            self._rejections = 0
+            self._expirations = 0
+            self._coalesced = 0
+            self._l2_hits = 0
+            self._l2_misses = 0
+            
+    def _l2_stats(self) -> Optional[Dict[str, Any]]:
+        """Return statistics about the second-level store, if configured."""
+        if self._l2 is None:
+            return None
+        stats = self._l2.stats(self.name)
+        stats.update({"hits": self._l2_hits, "misses": self._l2_misses})
+        return stats
+
+class ShardedCache(Generic[T]):
+    """Cache split into independently locked shards chosen by key hash.
+    
+    Each shard is a Cache with its own lock (a lock stripe), so writers and
+    misses on different keys do not contend, and hits on live entries take no
+    lock at all. Size bounds are divided evenly between shards, so eviction is
+    per shard and only approximately global. The interface matches Cache.
+    """
+    
+    def __init__(self, name: str, ttl_seconds: int = 3600, cleanup_interval: int = 300,
+                 max_entries: Optional[int] = None, max_bytes: Optional[int] = None,
+                 eviction_policy: Union[str, EvictionPolicy, None] = "lru",
+                 l2: Optional[CacheStore] = None, shards: int = 16,
+                 lock_free_reads: bool = True, compression: Optional[str] = None,
+                 compress_threshold: int = 1024):
+        """Initialize the cache.
+        
+        Args:
+            name: Cache name for logging and the second-level store namespace
+            shards: Number of lock stripes
+            lock_free_reads: Serve hits on live entries without locking
+            
+        Other arguments are as for Cache. An EvictionPolicy instance cannot be
+        shared between shards, so eviction_policy must be a policy name here.
+        """
+        if isinstance(eviction_policy, EvictionPolicy):
+            raise ValueError("ShardedCache needs an eviction policy name, not an instance")
+        if shards < 1:
+            raise ValueError("ShardedCache needs at least one shard")
+            
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self._shards = [
+            Cache[T](
+                name,
+                ttl_seconds=ttl_seconds,
+                cleanup_interval=cleanup_interval,
+                max_entries=-(-max_entries // shards) if max_entries else None,
+                max_bytes=-(-max_bytes // shards) if max_bytes else None,
+                eviction_policy=eviction_policy,
+                l2=l2,
+                lock_free_reads=lock_free_reads,
+                compression=compression,
+                compress_threshold=compress_threshold,
+            )
+            for _ in range(shards)
+        ]
+        
+    def _shard(self, key: str) -> Cache[T]:
+        return self._shards[hash(key) % len(self._shards)]
+        
+    def get(self, key: str, default: Any = None) -> Optional[T]:
+        """Get an item from the cache, returning default if not found or expired."""
+        return self._shard(key).get(key, default)
+        
+    def set(self, key: str, value: T, ttl_seconds: Optional[int] = None) -> None:
+        """Set an item in the cache with optional custom TTL."""
+        self._shard(key).set(key, value, ttl_seconds)
+        
+    async def aget(self, key: str, default: Any = None) -> Optional[T]:
+        """Async variant of get()."""
+        return await self._shard(key).aget(key, default)
+        
+    async def aset(self, key: str, value: T, ttl_seconds: Optional[int] = None) -> None:
+        """Async variant of set()."""
+        await self._shard(key).aset(key, value, ttl_seconds)
+        
+    def get_or_set(self, key: str, compute: Callable[[], T], ttl_seconds: Optional[int] = None,
+                   on_coalesced: Optional[Callable[[], None]] = None,
+                   negative_ttl: Optional[float] = None) -> T:
+        """Get an item, computing and storing it on a miss (see Cache.get_or_set)."""
+        return self._shard(key).get_or_set(key, compute, ttl_seconds, on_coalesced, negative_ttl)
+        
+    def load(self, key: str, compute: Callable[[], T], ttl_seconds: Optional[int] = None,
+             on_coalesced: Optional[Callable[[], None]] = None,
+             negative_ttl: Optional[float] = None) -> T:
+        """Compute and store a value after a miss (see Cache.load)."""
+        return self._shard(key).load(key, compute, ttl_seconds, on_coalesced, negative_ttl)
+        
+    async def aget_or_set(self, key: str, compute: Callable[[], Awaitable[T]],
+                          ttl_seconds: Optional[int] = None,
+                          on_coalesced: Optional[Callable[[], None]] = None,
+                          negative_ttl: Optional[float] = None) -> T:
+        """Async variant of get_or_set() for coroutine computations."""
+        return await self._shard(key).aget_or_set(key, compute, ttl_seconds, on_coalesced, negative_ttl)
+        
+    async def aload(self, key: str, compute: Callable[[], Awaitable[T]],
+                    ttl_seconds: Optional[int] = None,
+                    on_coalesced: Optional[Callable[[], None]] = None,
+                    negative_ttl: Optional[float] = None) -> T:
+        """Async variant of load() for coroutine computations."""
+        return await self._shard(key).aload(key, compute, ttl_seconds, on_coalesced, negative_ttl)
+        
+    def delete(self, key: str) -> None:
+        """Delete an item from the cache."""
+        self._shard(key).delete(key)
+        
+    def clear(self) -> None:
+        """Clear all items from the cache."""
+        for shard in self._shards:
+            shard.clear()
+            
+    def __len__(self) -> int:
+        """Return the number of items in the cache."""
+        return sum(len(shard) for shard in self._shards)
+        
+    def reset_stats(self) -> None:
+        """Zero the hit/miss/expiry/eviction counters."""
+        for shard in self._shards:
+            shard.reset_stats()
+            
+    def stats(self) -> Dict[str, Any]:
+        """Return statistics about the cache, summed over shards."""
+        shard_stats = [shard.stats() for shard in self._shards]
+        first = shard_stats[0]
+        
+        stats = {
+            "name": self.name,
+            "shards": len(self._shards),
+            "max_entries": sum(s["max_entries"] or 0 for s in shard_stats) or None,
+            "max_bytes": sum(s["max_bytes"] or 0 for s in shard_stats) or None,
+            "eviction_policy": first["eviction_policy"],
+            "compression": first["compression"],
+            "ttl_seconds": self.ttl_seconds,
+            "cleanup_interval": first["cleanup_interval"],
+            "last_cleanup": min(s["last_cleanup"] for s in shard_stats),
+            "last_cleanup_duration_ms": max(s["last_cleanup_duration_ms"] for s in shard_stats),
+        }
+        for field in ("size", "bytes", "evictions", "rejections", "expirations", "coalesced",
+                      "in_flight", "cleanup_runs", "last_cleanup_removed", "expiry_index_size",
+                      "hits", "misses", "compressed_entries", "bytes_saved"):
+            stats[field] = sum(s[field] for s in shard_stats)
+        stats["hit_ratio"] = _hit_ratio(stats["hits"], stats["misses"])
+        
+        by_prefix: Dict[str, Dict[str, Any]] = {}
+        for shard in shard_stats:
+            for prefix, counts in shard["by_prefix"].items():
+                total = by_prefix.setdefault(prefix, {})
+                for field, value in counts.items():
+                    total[field] = total.get(field, 0) + value
+        for prefix, counts in by_prefix.items():
+            counts["hit_ratio"] = _hit_ratio(counts["hits"], counts["misses"])
+            # Averages cannot be summed; weight each shard's by its load count
+            load_ms = sum(s["by_prefix"][prefix]["avg_load_ms"] * s["by_prefix"][prefix]["loads"]
+                          for s in shard_stats if prefix in s["by_prefix"])
+            counts["avg_load_ms"] = round(load_ms / counts["loads"], 3) if counts["loads"] else 0.0
+        stats["by_prefix"] = by_prefix
+        
+        if first["l2"] is not None:
+            # Shards share one store; report it once with summed hit counts
+            l2 = dict(first["l2"])
+            l2["hits"] = sum(s["l2"]["hits"] for s in shard_stats)
+            l2["misses"] = sum(s["l2"]["misses"] for s in shard_stats)
+            stats["l2"] = l2
+        else:
+            stats["l2"] = None
+        return stats
+
+def make_cache(name: str, shards: int = 1, **kwargs) -> Union[Cache, ShardedCache]:
+    """Create a Cache, or a ShardedCache when more than one shard is requested."""
+    if shards > 1:
+        return ShardedCache(name, shards=shards, **kwargs)
+    return Cache(name, **kwargs)
 
-def cached(cache: Cache, key_fn: Callable = None):
+def cached(cache: Cache, key_fn: Callable = None, single_flight: bool = True,
+           negative_ttl: Optional[float] = None):
     """Decorator to cache function results.
     
+    Works on both regular functions and coroutine functions. Any return value,
+    including None, is cached; a miss is detected with the MISSING sentinel.
+    
     Args:
         cache: The cache instance to use
         key_fn: Optional function to generate a cache key from the arguments
                If not provided, uses a tuple of all args and kwargs
+        single_flight: If True, concurrent misses for the same key run the
+                       function once and share the result
+        negative_ttl: Optional TTL for negative results (None or empty, see
+                      is_negative()), usually shorter than the cache TTL so
+                      that "not found" answers are rechecked sooner. 0 means
+                      negative results are not cached.
     """
     def decorator(func):
+        def make_key(args, kwargs) -> str:
+            if key_fn:
+                return key_fn(*args, **kwargs)
+            # Simple default key generation
+            return str((func.__name__, args, frozenset(kwargs.items())))
+            
+        def result_ttl(result: Any) -> Union[Optional[float], bool]:
+            """TTL to cache a result with (None for the default), or False to skip it."""
+            if negative_ttl is not None and is_negative(result):
+                return negative_ttl if negative_ttl > 0 else False
+            return None
+            
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                key = make_key(args, kwargs)
+                
+                cached_result = await cache.aget(key, MISSING)
+                if cached_result is not MISSING:
+                    logger.debug(f"Cache hit for {func.__name__}")
+                    return cached_result
+                    
+                logger.debug(f"Cache miss for {func.__name__}")
+                if single_flight:
+                    return await cache.aload(key, lambda: func(*args, **kwargs),
+                                             negative_ttl=negative_ttl)
+                    
+                result = await func(*args, **kwargs)
+                ttl = result_ttl(result)
+                if ttl is not False:
+                    await cache.aset(key, result, ttl_seconds=ttl)
+                return result
+            return async_wrapper
+            
         @wraps(func)
         def wrapper(*args, **kwargs):
             # Generate cache key
-            if key_fn:
-                key = key_fn(*args, **kwargs)
-            else:
-                # Simple default key generation
-                key = str((func.__name__, args, frozenset(kwargs.items())))
+            key = make_key(args, kwargs)
                 
             # Check cache
-            cached_result = cache.get(key)
-            if cached_result is not None:
+            cached_result = cache.get(key, MISSING)
+            if cached_result is not MISSING:
                 logger.debug(f"Cache hit for {func.__name__}")
                 return cached_result
                 
-            # Cache miss, execute function
+            # Cache miss, execute function (once for concurrent callers)
             logger.debug(f"Cache miss for {func.__name__}")
+            if single_flight:
+                return cache.load(key, lambda: func(*args, **kwargs), negative_ttl=negative_ttl)
+                
             result = func(*args, **kwargs)
             
             # Store in cache
-            cache.set(key, result)
+            ttl = result_ttl(result)
+            if ttl is not False:
+                cache.set(key, result, ttl_seconds=ttl)
             return result
         return wrapper
     return decorator
 
+def _make_l2_store() -> Optional[CacheStore]:
+    """Build the configured second-level store, or None if disabled."""
+    if not settings.CACHE_L2_ENABLED:
+        return None
+    if settings.CACHE_L2_BACKEND == "shm":
+        try:
+            return SharedMemoryCacheStore(
+                settings.CACHE_L2_PATH or default_shm_path(),
+                slots=settings.CACHE_SHM_SLOTS,
+                slot_size=settings.CACHE_SHM_SLOT_SIZE,
+            )
+        except (OSError, ValueError) as e:
+            logger.warning(f"Shared-memory cache unavailable, using per-worker caches only: {e}")
+            return None
+    return SQLiteCacheStore(settings.CACHE_L2_PATH or settings.DATA_DIR / "cache.db")
+
+# Second-level store shared by all workers on the host
+_l2_store = _make_l2_store()
+
+def _make_lint_store() -> Optional[CacheStore]:
+    """Return the store for lint results, which are worth keeping across restarts."""
+    if isinstance(_l2_store, SQLiteCacheStore) or not settings.LINT_CACHE_PERSIST:
+        return _l2_store
+    return SQLiteCacheStore(settings.DATA_DIR / "cache.db")
+
 # Global cache instances
-schema_cache = Cache[Dict[str, Any]]("schema", ttl_seconds=3600*24)  # 1 day for schemas
-llm_cache = Cache[str]("llm", ttl_seconds=3600)  # 1 hour for LLM responses
-playbook_cache = Cache[Tuple[str, str]]("playbook", ttl_seconds=3600*24*7)  # 1 week for generated playbooks
\ No newline at end of file
+schema_cache = make_cache(
+    "schema",
+    shards=settings.CACHE_SHARDS,
+    ttl_seconds=3600*24,  # 1 day for schemas
+    max_entries=settings.SCHEMA_CACHE_MAX_ENTRIES,
+    eviction_policy=settings.CACHE_EVICTION_POLICY,
+    l2=_l2_store,
+)
+llm_cache = make_cache(
+    "llm",
+    shards=settings.CACHE_SHARDS,
+    ttl_seconds=3600,  # 1 hour for LLM responses
+    max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+    max_bytes=settings.LLM_CACHE_MAX_BYTES,
+    eviction_policy=settings.CACHE_EVICTION_POLICY,
+    l2=_l2_store,
+    compression=settings.CACHE_COMPRESSION,
+    compress_threshold=settings.CACHE_COMPRESSION_THRESHOLD,
+)
+playbook_cache = make_cache(
+    "playbook",
+    shards=settings.CACHE_SHARDS,
+    ttl_seconds=3600*24*7,  # 1 week for generated playbooks
+    max_entries=settings.PLAYBOOK_CACHE_MAX_ENTRIES,
+    max_bytes=settings.PLAYBOOK_CACHE_MAX_BYTES,
+    eviction_policy=settings.CACHE_EVICTION_POLICY,
+    l2=_l2_store,
+    compression=settings.CACHE_COMPRESSION,
+    compress_threshold=settings.CACHE_COMPRESSION_THRESHOLD,
+)
+# Lint results keyed by playbook content, ansible-lint version and config
+lint_cache = make_cache(
+    "lint",
+    shards=settings.CACHE_SHARDS,
+    ttl_seconds=settings.LINT_CACHE_TTL,
+    max_entries=settings.LINT_CACHE_MAX_ENTRIES,
+    eviction_policy=settings.CACHE_EVICTION_POLICY,
+    l2=_make_lint_store(),
+)
@@ -0,0 +1,451 @@
+"""
+Second-level storage tiers for the Relia cache.
+
+Provides:
+- CacheStore interface for tiers that sit below the in-memory Cache
+- SQLite-backed store in settings.DATA_DIR that survives restarts and is
+  shared by all worker processes on a node
+- Shared-memory store (mmap'd file with a seqlock-protected slot index) that
+  gives all workers on a host one cache with lock-free reads
+"""
+import os
+import json
+import mmap
+import time
+import zlib
+import struct
+import sqlite3
+import hashlib
+import logging
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# fcntl is POSIX-only; without it the shared-memory store only excludes
+# writers within a single process.
+try:
+    import fcntl
+    HAVE_FCNTL = True
+except ImportError:
+    HAVE_FCNTL = False
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+class CacheStore(ABC):
+    """A second-level cache tier.
+
+    Entries are grouped by namespace (the owning cache's name) and carry an
+    absolute expiry timestamp. Stores must never raise on I/O problems; a
+    failing tier behaves like an empty one so caching cannot break requests.
+    """
+
+    name = "store"
+
+    @abstractmethod
+    def get(self, namespace: str, key: str) -> Optional[Tuple[Any, float]]:
+        """Return (value, expiry) for a live entry, or None."""
+
+    @abstractmethod
+    def set(self, namespace: str, key: str, value: Any, expiry: float) -> None:
+        """Store a value until the given expiry timestamp."""
+
+    @abstractmethod
+    def delete(self, namespace: str, key: str) -> None:
+        """Remove an entry."""
+
+    @abstractmethod
+    def clear(self, namespace: str) -> None:
+        """Remove all entries in a namespace."""
+
+    @abstractmethod
+    def purge_expired(self, namespace: str, now: Optional[float] = None) -> int:
+        """Remove expired entries in a namespace and return how many were removed."""
+
+    def stats(self, namespace: str) -> Dict[str, Any]:
+        """Return statistics about a namespace."""
+        return {"backend": self.name}
+
+class SQLiteCacheStore(CacheStore):
+    """Cache tier backed by a local SQLite file.
+
+    The database runs in WAL mode so that several uvicorn worker processes can
+    read concurrently while one writes. Values are stored as JSON, so only
+    JSON-serializable values are persisted (tuples come back as lists); other
+    values silently stay in the in-memory tier only.
+    """
+
+    name = "sqlite"
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS cache_entries (
+        namespace TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value TEXT NOT NULL,
+        expiry REAL NOT NULL,
+        PRIMARY KEY (namespace, key)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_cache_entries_expiry ON cache_entries(namespace, expiry);
+    """
+
+    def __init__(self, path: Path, timeout: float = 5.0):
+        """Initialize the store.
+
+        Args:
+            path: Path to the SQLite database file
+            timeout: Seconds to wait on a locked database before giving up
+        """
+        self.path = Path(path)
+        self.timeout = timeout
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection, creating the schema on first use.
+
+        Raises:
+            sqlite3.Error: If the database cannot be opened, including when
+                its directory cannot be created
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            return conn
+
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            raise sqlite3.OperationalError(f"Cannot create {self.path.parent}: {e}") from e
+        conn = sqlite3.connect(str(self.path), timeout=self.timeout, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+
+        with self._init_lock:
+            if not self._initialized:
+                conn.executescript(self._SCHEMA)
+                self._initialized = True
+
+        self._local.conn = conn
+        return conn
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[Any, float]]:
+        try:
+            row = self._connect().execute(
+                "SELECT value, expiry FROM cache_entries WHERE namespace = ? AND key = ? AND expiry > ?",
+                (namespace, key, time.time()),
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Cache store read failed for {namespace}: {e}")
+            return None
+
+        if row is None:
+            return None
+
+        try:
+            return json.loads(row[0]), row[1]
+        except ValueError as e:
+            logger.warning(f"Discarding corrupt cache store entry in {namespace}: {e}")
+            self.delete(namespace, key)
+            return None
+
+    def set(self, namespace: str, key: str, value: Any, expiry: float) -> None:
+        try:
+            payload = json.dumps(value)
+        except (TypeError, ValueError):
+            logger.debug(f"Value for {key[:20]} is not JSON-serializable, not persisting")
+            return
+
+        try:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expiry) VALUES (?, ?, ?, ?)",
+                (namespace, key, payload, expiry),
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"Cache store write failed for {namespace}: {e}")
+
+    def delete(self, namespace: str, key: str) -> None:
+        try:
+            self._connect().execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"Cache store delete failed for {namespace}: {e}")
+
+    def clear(self, namespace: str) -> None:
+        try:
+            self._connect().execute("DELETE FROM cache_entries WHERE namespace = ?", (namespace,))
+        except sqlite3.Error as e:
+            logger.warning(f"Cache store clear failed for {namespace}: {e}")
+
+    def purge_expired(self, namespace: str, now: Optional[float] = None) -> int:
+        now = now if now is not None else time.time()
+        try:
+            cursor = self._connect().execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND expiry <= ?",
+                (namespace, now),
+            )
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            logger.warning(f"Cache store purge failed for {namespace}: {e}")
+            return 0
+
+    def stats(self, namespace: str) -> Dict[str, Any]:
+        try:
+            row = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM cache_entries WHERE namespace = ?",
+                (namespace,),
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Cache store stats failed for {namespace}: {e}")
+            return {"backend": self.name, "path": str(self.path), "error": str(e)}
+
+        return {
+            "backend": self.name,
+            "path": str(self.path),
+            "size": row[0],
+            "bytes": row[1],
+        }
+
+class SharedMemoryCacheStore(CacheStore):
+    """Cache tier held in a memory-mapped file shared by all local processes.
+
+    The file is divided into fixed-size slots addressed by a hash of the
+    namespace and key, with a short linear probe window. Each slot starts with
+    a sequence counter used as a seqlock: writers make it odd while updating
+    the slot and even when done, and readers retry if the counter was odd or
+    changed while they copied the slot. Reads therefore take no lock at all.
+    A CRC of the payload guards against torn reads on weakly ordered CPUs.
+
+    Writers serialize on a thread lock plus an flock() on the file, so workers
+    on one host can write safely. Values larger than a slot are not stored.
+    When a probe window is full, the entry closest to expiry is replaced.
+    """
+
+    name = "shm"
+
+    _MAGIC = b"RLSHMC01"
+    _HEADER = struct.Struct("<8sII")  # magic, slot count, slot size
+    _HEADER_SIZE = 64
+    # seq, key length, key hash, expiry, value length, payload crc
+    _SLOT = struct.Struct("<IIQdII")
+    _SEQ = struct.Struct("<I")
+    _PROBES = 8
+    _READ_RETRIES = 16
+
+    def __init__(self, path: Path, slots: int = 4096, slot_size: int = 16 * 1024):
+        """Initialize the store, creating the backing file if needed.
+
+        Args:
+            path: Path to the backing file (ideally on tmpfs, e.g. /dev/shm)
+            slots: Number of slots, used only when creating the file
+            slot_size: Bytes per slot including its header, used only when
+                       creating the file
+        """
+        self.path = Path(path)
+        self._write_lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fd = os.open(str(self.path), os.O_RDWR | os.O_CREAT, 0o600)
+
+        with self._file_lock():
+            header = os.pread(self._fd, self._HEADER.size, 0)
+            if len(header) == self._HEADER.size and header[:8] == self._MAGIC:
+                # Another worker created the file; its geometry wins
+                _, slots, slot_size = self._HEADER.unpack(header)
+            else:
+                os.ftruncate(self._fd, self._HEADER_SIZE + slots * slot_size)
+                os.pwrite(self._fd, self._HEADER.pack(self._MAGIC, slots, slot_size), 0)
+
+        self.slots = slots
+        self.slot_size = slot_size
+        self.max_payload = slot_size - self._SLOT.size
+        self._mm = mmap.mmap(self._fd, self._HEADER_SIZE + slots * slot_size)
+        self._torn_reads = 0
+
+    # -- helpers -------------------------------------------------------------
+    @contextmanager
+    def _file_lock(self):
+        """Exclude writers in this and other processes."""
+        with self._write_lock:
+            if HAVE_FCNTL:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if HAVE_FCNTL:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _full_key(namespace: str, key: str) -> bytes:
+        return f"{namespace}\0{key}".encode("utf-8")
+
+    @staticmethod
+    def _hash(full_key: bytes) -> int:
+        # Zero marks an empty slot, so never produce it
+        return int.from_bytes(hashlib.blake2b(full_key, digest_size=8).digest(), "little") or 1
+
+    def _offset(self, index: int) -> int:
+        return self._HEADER_SIZE + index * self.slot_size
+
+    def _probe(self, key_hash: int) -> Iterator[int]:
+        start = key_hash % self.slots
+        for i in range(min(self._PROBES, self.slots)):
+            yield self._offset((start + i) % self.slots)
+
+    def _read_slot(self, offset: int) -> Optional[Tuple[int, bytes, float, bytes]]:
+        """Read a consistent snapshot of a slot without locking.
+
+        Returns (key_hash, key, expiry, value_bytes), or None if the slot is
+        empty or could not be read consistently.
+        """
+        mm = self._mm
+        for _ in range(self._READ_RETRIES):
+            seq, key_len, key_hash, expiry, value_len, crc = self._SLOT.unpack_from(mm, offset)
+            if seq & 1:
+                continue  # Writer in progress
+            if key_hash == 0:
+                return None
+            if key_len + value_len > self.max_payload:
+                continue  # Header torn mid-write
+            start = offset + self._SLOT.size
+            payload = mm[start:start + key_len + value_len]
+            if self._SEQ.unpack_from(mm, offset)[0] != seq or zlib.crc32(payload) != crc:
+                continue
+            return key_hash, payload[:key_len], expiry, payload[key_len:]
+        self._torn_reads += 1
+        return None
+
+    def _write_slot(self, offset: int, key_hash: int, full_key: bytes,
+                    expiry: float, value: bytes) -> None:
+        """Write a slot under the seqlock. Caller holds the file lock."""
+        mm = self._mm
+        seq = self._SEQ.unpack_from(mm, offset)[0]
+        self._SEQ.pack_into(mm, offset, seq + 1)
+        payload = full_key + value
+        start = offset + self._SLOT.size
+        mm[start:start + len(payload)] = payload
+        self._SLOT.pack_into(mm, offset, seq + 1, len(full_key), key_hash, expiry,
+                             len(value), zlib.crc32(payload))
+        self._SEQ.pack_into(mm, offset, seq + 2)
+
+    def _clear_slot(self, offset: int) -> None:
+        """Mark a slot empty. Caller holds the file lock."""
+        self._write_slot(offset, 0, b"", 0.0, b"")
+
+    def _iter_slots(self) -> Iterator[int]:
+        for index in range(self.slots):
+            yield self._offset(index)
+
+    # -- CacheStore interface ------------------------------------------------
+    def get(self, namespace: str, key: str) -> Optional[Tuple[Any, float]]:
+        full_key = self._full_key(namespace, key)
+        key_hash = self._hash(full_key)
+        now = time.time()
+
+        for offset in self._probe(key_hash):
+            snapshot = self._read_slot(offset)
+            if snapshot is None or snapshot[0] != key_hash or snapshot[1] != full_key:
+                continue
+            _, _, expiry, value = snapshot
+            if expiry <= now:
+                return None
+            try:
+                return json.loads(value), expiry
+            except ValueError:
+                return None
+        return None
+
+    def set(self, namespace: str, key: str, value: Any, expiry: float) -> None:
+        try:
+            payload = json.dumps(value).encode("utf-8")
+        except (TypeError, ValueError):
+            logger.debug(f"Value for {key[:20]} is not JSON-serializable, not sharing")
+            return
+
+        full_key = self._full_key(namespace, key)
+        if len(full_key) + len(payload) > self.max_payload:
+            logger.debug(f"Value for {key[:20]} exceeds the shared cache slot size")
+            return
+
+        key_hash = self._hash(full_key)
+        now = time.time()
+        with self._file_lock():
+            target = None
+            soonest = None
+            for offset in self._probe(key_hash):
+                _, key_len, slot_hash, slot_expiry, _, _ = self._SLOT.unpack_from(self._mm, offset)
+                if slot_hash == key_hash:
+                    start = offset + self._SLOT.size
+                    if self._mm[start:start + key_len] == full_key:
+                        target = offset
+                        break
+                if target is None and (slot_hash == 0 or slot_expiry <= now):
+                    target = offset
+                if soonest is None or slot_expiry < soonest[1]:
+                    soonest = (offset, slot_expiry)
+            if target is None:
+                # Window is full of live entries; replace the one expiring first
+                target = soonest[0]
+            self._write_slot(target, key_hash, full_key, expiry, payload)
+
+    def delete(self, namespace: str, key: str) -> None:
+        full_key = self._full_key(namespace, key)
+        key_hash = self._hash(full_key)
+        with self._file_lock():
+            for offset in self._probe(key_hash):
+                snapshot = self._read_slot(offset)
+                if snapshot is not None and snapshot[0] == key_hash and snapshot[1] == full_key:
+                    self._clear_slot(offset)
+
+    def _clear_where(self, namespace: str, predicate) -> int:
+        prefix = f"{namespace}\0".encode("utf-8")
+        removed = 0
+        with self._file_lock():
+            for offset in self._iter_slots():
+                snapshot = self._read_slot(offset)
+                if snapshot is not None and snapshot[1].startswith(prefix) and predicate(snapshot[2]):
+                    self._clear_slot(offset)
+                    removed += 1
+        return removed
+
+    def clear(self, namespace: str) -> None:
+        self._clear_where(namespace, lambda expiry: True)
+
+    def purge_expired(self, namespace: str, now: Optional[float] = None) -> int:
+        now = now if now is not None else time.time()
+        return self._clear_where(namespace, lambda expiry: expiry <= now)
+
+    def stats(self, namespace: str) -> Dict[str, Any]:
+        prefix = f"{namespace}\0".encode("utf-8")
+        size = 0
+        used_bytes = 0
+        for offset in self._iter_slots():
+            snapshot = self._read_slot(offset)
+            if snapshot is not None and snapshot[1].startswith(prefix):
+                size += 1
+                used_bytes += len(snapshot[3])
+        return {
+            "backend": self.name,
+            "path": str(self.path),
+            "size": size,
+            "bytes": used_bytes,
+            "slots": self.slots,
+            "slot_size": self.slot_size,
+            "torn_reads": self._torn_reads,
+        }
+
+    def close(self) -> None:
+        """Unmap the file and close its descriptor."""
+        self._mm.close()
+        os.close(self._fd)
+
+def default_shm_path() -> Path:
+    """Return a per-user shared-memory path, preferring tmpfs when available."""
+    uid = os.getuid() if hasattr(os, "getuid") else 0
+    shm_dir = Path("/dev/shm")
+    if shm_dir.is_dir():
+        return shm_dir / f"relia-cache-{uid}.shm"
+    from .config import settings
+    return settings.DATA_DIR / "cache.shm"
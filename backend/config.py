@@ -2,7 +2,7 @@
 Configuration for Relia OSS Backend, using environment variables with sensible defaults.
 """
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 import logging
 import os
 from pydantic import Field, field_validator
@@ -36,9 +36,51 @@ class Settings(BaseSettings):
     HSTS_ENABLED: bool = Field(True, validation_alias="RELIA_HSTS_ENABLED")
     HSTS_MAX_AGE: int = Field(31536000, validation_alias="RELIA_HSTS_MAX_AGE")  # 1 year in seconds
     
-    # LLM backend choice: 'openai' or 'bedrock'
+    # LLM backend choice: 'openai', 'bedrock' or 'fake' (offline, for load testing)
     RELIA_LLM: str = Field("openai", validation_alias="RELIA_LLM")
 
+    # Pooled connections for async LLM calls
+    LLM_HTTP_MAX_CONNECTIONS: int = Field(100, validation_alias="RELIA_LLM_HTTP_MAX_CONNECTIONS")
+    LLM_HTTP_MAX_KEEPALIVE: int = Field(20, validation_alias="RELIA_LLM_HTTP_MAX_KEEPALIVE")
+
+    # Per-provider LLM call limits; callers beyond them wait in a fair queue
+    LLM_MAX_CONCURRENCY: int = Field(8, validation_alias="RELIA_LLM_MAX_CONCURRENCY")
+    LLM_TOKENS_PER_MINUTE: int = Field(0, validation_alias="RELIA_LLM_TOKENS_PER_MINUTE")  # 0 = unlimited
+    LLM_QUEUE_TIMEOUT: float = Field(30.0, validation_alias="RELIA_LLM_QUEUE_TIMEOUT")
+
+    # Provider failover and circuit breakers
+    LLM_FAILOVER: bool = Field(False, validation_alias="RELIA_LLM_FAILOVER")
+    LLM_BREAKER_WINDOW: int = Field(20, validation_alias="RELIA_LLM_BREAKER_WINDOW")
+    LLM_BREAKER_MIN_CALLS: int = Field(5, validation_alias="RELIA_LLM_BREAKER_MIN_CALLS")
+    LLM_BREAKER_FAILURE_RATE: float = Field(0.5, validation_alias="RELIA_LLM_BREAKER_FAILURE_RATE")
+    LLM_BREAKER_SLOW_CALL_SECONDS: float = Field(20.0, validation_alias="RELIA_LLM_BREAKER_SLOW_CALL_SECONDS")
+    LLM_BREAKER_SLOW_CALL_RATE: float = Field(0.8, validation_alias="RELIA_LLM_BREAKER_SLOW_CALL_RATE")
+    LLM_BREAKER_OPEN_SECONDS: float = Field(30.0, validation_alias="RELIA_LLM_BREAKER_OPEN_SECONDS")
+
+    # Hedged requests: re-send async calls slower than a latency percentile
+    LLM_HEDGING: bool = Field(False, validation_alias="RELIA_LLM_HEDGING")
+    LLM_HEDGE_PERCENTILE: float = Field(95.0, validation_alias="RELIA_LLM_HEDGE_PERCENTILE")
+    LLM_HEDGE_MIN_SAMPLES: int = Field(20, validation_alias="RELIA_LLM_HEDGE_MIN_SAMPLES")
+    LLM_HEDGE_MIN_DELAY: float = Field(1.0, validation_alias="RELIA_LLM_HEDGE_MIN_DELAY")
+    LLM_HEDGE_ALTERNATE: bool = Field(True, validation_alias="RELIA_LLM_HEDGE_ALTERNATE")
+
+    # Micro-batching: send concurrent generation requests for one module as a single prompt
+    LLM_BATCHING: bool = Field(False, validation_alias="RELIA_LLM_BATCHING")
+    LLM_BATCH_WINDOW: float = Field(0.05, validation_alias="RELIA_LLM_BATCH_WINDOW")  # Seconds
+    LLM_BATCH_MAX_SIZE: int = Field(8, validation_alias="RELIA_LLM_BATCH_MAX_SIZE")
+
+    # Fake provider (RELIA_LLM=fake): simulated latency, errors and token counts
+    FAKE_LLM_LATENCY_MS: float = Field(800.0, validation_alias="RELIA_FAKE_LLM_LATENCY_MS")  # Median
+    FAKE_LLM_LATENCY_DISTRIBUTION: str = Field("lognormal", validation_alias="RELIA_FAKE_LLM_LATENCY_DISTRIBUTION")
+    FAKE_LLM_LATENCY_SPREAD: float = Field(0.5, validation_alias="RELIA_FAKE_LLM_LATENCY_SPREAD")
+    FAKE_LLM_ERROR_RATE: float = Field(0.0, validation_alias="RELIA_FAKE_LLM_ERROR_RATE")
+    FAKE_LLM_COMPLETION_TOKENS: int = Field(0, validation_alias="RELIA_FAKE_LLM_COMPLETION_TOKENS")  # 0 = from text
+    FAKE_LLM_SEED: int = Field(0, validation_alias="RELIA_FAKE_LLM_SEED")
+
+    # Prompts list module options as a compact digest instead of the full schema JSON
+    PROMPT_COMPACTION: bool = Field(True, validation_alias="RELIA_PROMPT_COMPACTION")
+    PROMPT_DESCRIPTION_CHARS: int = Field(120, validation_alias="RELIA_PROMPT_DESCRIPTION_CHARS")
+
     # Directories
     BASE_DIR: Path = Path(__file__).parent
     SCHEMA_DIR: Path = BASE_DIR / "schemas"
@@ -54,12 +96,66 @@ class Settings(BaseSettings):
     # Task settings
     TASK_MAX_WORKERS: int = Field(4, validation_alias="RELIA_TASK_MAX_WORKERS")
     TASK_CLEANUP_HOURS: int = Field(24, validation_alias="RELIA_TASK_CLEANUP_HOURS")
+    TASK_LOG_TAIL_LINES: int = Field(200, validation_alias="RELIA_TASK_LOG_TAIL_LINES")  # Output lines kept in the task result
+    TASK_LOG_POLL_SECONDS: float = Field(0.5, validation_alias="RELIA_TASK_LOG_POLL_SECONDS")  # How often log streams check for new lines
+
+    # Cache settings (0 disables a bound)
+    CACHE_EVICTION_POLICY: str = Field("lru", validation_alias="RELIA_CACHE_EVICTION_POLICY")
+    CACHE_SHARDS: int = Field(1, validation_alias="RELIA_CACHE_SHARDS")  # >1 uses lock-striped caches
+    NEGATIVE_CACHE_TTL: int = Field(300, validation_alias="RELIA_NEGATIVE_CACHE_TTL")  # Seconds; 0 disables
+    LINT_CACHE_TTL: int = Field(30 * 24 * 3600, validation_alias="RELIA_LINT_CACHE_TTL")  # 30 days
+    LINT_CACHE_MAX_ENTRIES: int = Field(50000, validation_alias="RELIA_LINT_CACHE_MAX_ENTRIES")
+    LINT_CACHE_PERSIST: bool = Field(True, validation_alias="RELIA_LINT_CACHE_PERSIST")  # Keep lint results in DATA_DIR/cache.db
+
+    # Persistent ansible-lint workers; falls back to one process per lint when unavailable
+    LINT_POOL_ENABLED: bool = Field(True, validation_alias="RELIA_LINT_POOL_ENABLED")
+    LINT_POOL_SIZE: int = Field(2, validation_alias="RELIA_LINT_POOL_SIZE")
+    LINT_POOL_MAX_JOBS: int = Field(100, validation_alias="RELIA_LINT_POOL_MAX_JOBS")  # Lints before a worker is replaced
+    # /v1/lint/batch: playbooks per request and seconds for its single ansible-lint run
+    LINT_BATCH_MAX_SIZE: int = Field(500, validation_alias="RELIA_LINT_BATCH_MAX_SIZE")
+    LINT_BATCH_TIMEOUT: int = Field(600, validation_alias="RELIA_LINT_BATCH_TIMEOUT")
+    # Warm Molecule instances; tests converge on one instead of running `molecule test`
+    MOLECULE_POOL_ENABLED: bool = Field(False, validation_alias="RELIA_MOLECULE_POOL_ENABLED")
+    MOLECULE_POOL_SIZE: int = Field(2, validation_alias="RELIA_MOLECULE_POOL_SIZE")  # Instances per image
+    MOLECULE_POOL_IMAGES: List[str] = Field([], validation_alias="RELIA_MOLECULE_POOL_IMAGES")  # Warmed at startup; JSON list
+    MOLECULE_POOL_DRIVER: str = Field("docker", validation_alias="RELIA_MOLECULE_POOL_DRIVER")  # "default" = delegated, no Docker
+    MOLECULE_POOL_HEALTH_INTERVAL: float = Field(300.0, validation_alias="RELIA_MOLECULE_POOL_HEALTH_INTERVAL")
+    SCHEMA_CACHE_MAX_ENTRIES: int = Field(1000, validation_alias="RELIA_SCHEMA_CACHE_MAX_ENTRIES")
+    LLM_CACHE_MAX_ENTRIES: int = Field(10000, validation_alias="RELIA_LLM_CACHE_MAX_ENTRIES")
+    LLM_CACHE_MAX_BYTES: int = Field(64 * 1024 * 1024, validation_alias="RELIA_LLM_CACHE_MAX_BYTES")  # 64MB
+    PLAYBOOK_CACHE_MAX_ENTRIES: int = Field(20000, validation_alias="RELIA_PLAYBOOK_CACHE_MAX_ENTRIES")
+    PLAYBOOK_CACHE_MAX_BYTES: int = Field(128 * 1024 * 1024, validation_alias="RELIA_PLAYBOOK_CACHE_MAX_BYTES")  # 128MB
+    CACHE_COMPRESSION: str = Field("none", validation_alias="RELIA_CACHE_COMPRESSION")  # 'none', 'zlib' or 'lz4'
+    CACHE_COMPRESSION_THRESHOLD: int = Field(1024, validation_alias="RELIA_CACHE_COMPRESSION_THRESHOLD")  # Bytes
+    CACHE_L2_ENABLED: bool = Field(False, validation_alias="RELIA_CACHE_L2_ENABLED")
+    CACHE_L2_BACKEND: str = Field("sqlite", validation_alias="RELIA_CACHE_L2_BACKEND")  # 'sqlite' or 'shm'
+    CACHE_L2_PATH: Optional[Path] = Field(None, validation_alias="RELIA_CACHE_L2_PATH")  # Defaults to DATA_DIR/cache.db or /dev/shm
+    CACHE_SHM_SLOTS: int = Field(4096, validation_alias="RELIA_CACHE_SHM_SLOTS")
+    CACHE_SHM_SLOT_SIZE: int = Field(16 * 1024, validation_alias="RELIA_CACHE_SHM_SLOT_SIZE")  # 16KB
+
+    # Semantic playbook cache: reuse playbooks generated for similar tasks
+    SEMANTIC_CACHE_ENABLED: bool = Field(False, validation_alias="RELIA_SEMANTIC_CACHE_ENABLED")
+    SEMANTIC_CACHE_THRESHOLD: float = Field(0.9, validation_alias="RELIA_SEMANTIC_CACHE_THRESHOLD")  # Cosine similarity
+    SEMANTIC_CACHE_MAX_ENTRIES: int = Field(5000, validation_alias="RELIA_SEMANTIC_CACHE_MAX_ENTRIES")  # Per module
+    SEMANTIC_CACHE_EVICT_RATING: int = Field(2, validation_alias="RELIA_SEMANTIC_CACHE_EVICT_RATING")  # Feedback at or below drops the entry
 
     # Database settings
     DB_ENABLED: bool = Field(True, validation_alias="RELIA_DB_ENABLED")
     COLLECT_TELEMETRY: bool = Field(True, validation_alias="RELIA_COLLECT_TELEMETRY")
     COLLECT_FEEDBACK: bool = Field(True, validation_alias="RELIA_COLLECT_FEEDBACK")
     COLLECT_LLM_USAGE: bool = Field(True, validation_alias="RELIA_COLLECT_LLM_USAGE")
+    LLM_USAGE_QUEUE_SIZE: int = Field(10000, validation_alias="RELIA_LLM_USAGE_QUEUE_SIZE")  # Records waiting to be written
+    LLM_USAGE_BATCH_SIZE: int = Field(200, validation_alias="RELIA_LLM_USAGE_BATCH_SIZE")
+    LLM_USAGE_FLUSH_SECONDS: float = Field(1.0, validation_alias="RELIA_LLM_USAGE_FLUSH_SECONDS")
+    # USD per 1K (prompt, completion) tokens by model, for cost estimates; JSON in the environment
+    LLM_TOKEN_PRICES: Dict[str, Tuple[float, float]] = Field(
+        {
+            "gpt-4o-mini": (0.00015, 0.0006),
+            "gpt-4o": (0.0025, 0.01),
+            "anthropic.claude-instant-v1": (0.0008, 0.0024),
+        },
+        validation_alias="RELIA_LLM_TOKEN_PRICES",
+    )
 
     # Monitoring settings
     MONITORING_ENABLED: bool = Field(True, validation_alias="RELIA_MONITORING_ENABLED")
@@ -86,8 +182,48 @@ class Settings(BaseSettings):
     @field_validator("RELIA_LLM")
     @classmethod
     def validate_llm_provider(cls, v: str) -> str:
-        if v not in ["openai", "bedrock"]:
-            raise ValueError("RELIA_LLM must be 'openai' or 'bedrock'")
+        if v not in ["openai", "bedrock", "fake"]:
+            raise ValueError("RELIA_LLM must be 'openai', 'bedrock' or 'fake'")
+        return v
+
+    @field_validator("FAKE_LLM_LATENCY_DISTRIBUTION")
+    @classmethod
+    def validate_fake_latency_distribution(cls, v: str) -> str:
+        v = v.lower()
+        if v not in ["constant", "uniform", "lognormal"]:
+            raise ValueError("FAKE_LLM_LATENCY_DISTRIBUTION must be 'constant', 'uniform' or 'lognormal'")
+        return v
+
+    @field_validator("MOLECULE_POOL_DRIVER")
+    @classmethod
+    def validate_molecule_pool_driver(cls, v: str) -> str:
+        v = v.lower()
+        if v not in ["docker", "default", "delegated"]:
+            raise ValueError("MOLECULE_POOL_DRIVER must be 'docker', 'default' or 'delegated'")
+        return v
+
+    @field_validator("CACHE_EVICTION_POLICY")
+    @classmethod
+    def validate_eviction_policy(cls, v: str) -> str:
+        v = v.lower()
+        if v not in ["lru", "tinylfu"]:
+            raise ValueError("CACHE_EVICTION_POLICY must be 'lru' or 'tinylfu'")
+        return v
+
+    @field_validator("CACHE_COMPRESSION")
+    @classmethod
+    def validate_compression(cls, v: str) -> str:
+        v = v.lower()
+        if v not in ["none", "zlib", "lz4"]:
+            raise ValueError("CACHE_COMPRESSION must be 'none', 'zlib' or 'lz4'")
+        return v
+
+    @field_validator("CACHE_L2_BACKEND")
+    @classmethod
+    def validate_l2_backend(cls, v: str) -> str:
+        v = v.lower()
+        if v not in ["sqlite", "shm"]:
+            raise ValueError("CACHE_L2_BACKEND must be 'sqlite' or 'shm'")
         return v
 
     @field_validator("ENV")
@@ -51,7 +51,9 @@ CREATE TABLE IF NOT EXISTS playbooks (
     yaml_content TEXT NOT NULL,
     created_at TEXT NOT NULL,
     user_id TEXT DEFAULT 'anonymous',
-    status TEXT DEFAULT 'created'
+    status TEXT DEFAULT 'created',
+    semantic_source_id TEXT,
+    semantic_similarity REAL
 );
 
 -- LLM Usage metrics
@@ -65,7 +67,12 @@ CREATE TABLE IF NOT EXISTS llm_usage (
     duration_ms INTEGER,
     created_at TEXT NOT NULL,
     request_id TEXT,
-    user_id TEXT DEFAULT 'anonymous'
+    user_id TEXT DEFAULT 'anonymous',
+    hedged INTEGER DEFAULT 0,
+    latency_saved_ms INTEGER DEFAULT 0,
+    module TEXT,
+    baseline_prompt_tokens INTEGER,
+    tokens_estimated INTEGER DEFAULT 0
 );
 
 -- Application logs
@@ -105,6 +112,19 @@ CREATE INDEX IF NOT EXISTS idx_app_logs_level ON app_logs(level);
 CREATE INDEX IF NOT EXISTS idx_access_logs_timestamp ON access_logs(timestamp);
 """
 
+# Columns added after the initial schema: (table, column, definition).
+# CREATE TABLE IF NOT EXISTS leaves existing tables alone, so these are added
+# to databases created by earlier versions.
+COLUMN_MIGRATIONS = [
+    ("llm_usage", "hedged", "INTEGER DEFAULT 0"),
+    ("llm_usage", "latency_saved_ms", "INTEGER DEFAULT 0"),
+    ("playbooks", "semantic_source_id", "TEXT"),
+    ("playbooks", "semantic_similarity", "REAL"),
+    ("llm_usage", "module", "TEXT"),
+    ("llm_usage", "baseline_prompt_tokens", "INTEGER"),
+    ("llm_usage", "tokens_estimated", "INTEGER DEFAULT 0"),
+]
+
 class Database:
     """Database connection manager for SQLite."""
     
@@ -260,13 +280,28 @@ def initialize_database(force_init: bool = False, in_memory: bool = False):
                     # Skip empty statements
                     if statement.strip():
                         conn.execute(statement)
-            
+        
+        apply_column_migrations()
         logger.info(f"Database initialized successfully: {db_url}")
         return True
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}")
         return False
 
+def apply_column_migrations():
+    """Add columns from COLUMN_MIGRATIONS that are missing in existing tables.
+    
+    Each column is added in its own transaction; a failure because the column
+    already exists is expected and ignored.
+    """
+    for table, column, definition in COLUMN_MIGRATIONS:
+        try:
+            with transaction() as conn:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            logger.info(f"Added column {table}.{column}")
+        except Exception as e:
+            logger.debug(f"Column {table}.{column} not added: {e}")
+
 def get_db(force_init: bool = False):
     """Get the database connection pool.
     
@@ -419,7 +454,8 @@ def get_telemetry(event_type: Optional[str] = None, limit: int = 100) -> List[Di
 # Playbook functions
 # ----------------------------------------------------------------
 def record_playbook(playbook_id: str, module: str, prompt: str, yaml_content: str,
-                    user_id: str = "anonymous") -> str:
+                    user_id: str = "anonymous", semantic_source_id: Optional[str] = None,
+                    semantic_similarity: Optional[float] = None) -> str:
     """Record a generated playbook.
     
     Args:
@@ -428,6 +464,8 @@ def record_playbook(playbook_id: str, module: str, prompt: str, yaml_content: st
         prompt: User prompt
         yaml_content: Generated YAML content
         user_id: User ID (defaults to "anonymous")
+        semantic_source_id: Playbook this one was reused from by the semantic cache
+        semantic_similarity: Similarity of the prompt to the source playbook's prompt
         
     Returns:
         Playbook ID
@@ -436,14 +474,61 @@ def record_playbook(playbook_id: str, module: str, prompt: str, yaml_content: st
     created_at = datetime.utcnow().isoformat()
     
     db.execute(
-        """INSERT INTO playbooks (playbook_id, module, prompt, yaml_content, created_at, user_id)
-           VALUES (?, ?, ?, ?, ?, ?)""",
-        (playbook_id, module, prompt, yaml_content, created_at, user_id)
+        """INSERT INTO playbooks (playbook_id, module, prompt, yaml_content, created_at, user_id,
+                                  semantic_source_id, semantic_similarity)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+        (playbook_id, module, prompt, yaml_content, created_at, user_id,
+         semantic_source_id, semantic_similarity)
     )
     
     logger.info(f"Recorded playbook {playbook_id} for module {module}")
     return playbook_id
 
+def get_semantic_cache_quality() -> Dict[str, Any]:
+    """Compare feedback on semantic cache hits with feedback on generated playbooks.
+    
+    Returns:
+        Dictionary with feedback count and average rating for playbooks
+        served by the semantic cache and for all others, and for semantic
+        hits grouped by similarity (rounded down to 0.01)
+    """
+    db = get_db()
+    
+    cursor = db.execute(
+        """SELECT
+               p.semantic_source_id IS NOT NULL as semantic,
+               COUNT(*) as feedback_count,
+               AVG(f.rating) as average_rating
+           FROM feedback f JOIN playbooks p ON p.playbook_id = f.playbook_id
+           GROUP BY semantic"""
+    )
+    groups = {bool(row["semantic"]): dict(row) for row in cursor.fetchall()}
+    
+    cursor = db.execute(
+        """SELECT
+               CAST(p.semantic_similarity * 100 AS INTEGER) / 100.0 as similarity,
+               COUNT(*) as feedback_count,
+               AVG(f.rating) as average_rating
+           FROM feedback f JOIN playbooks p ON p.playbook_id = f.playbook_id
+           WHERE p.semantic_source_id IS NOT NULL
+           GROUP BY similarity
+           ORDER BY similarity"""
+    )
+    by_similarity = [dict(row) for row in cursor.fetchall()]
+    
+    def summary(semantic: bool) -> Dict[str, Any]:
+        row = groups.get(semantic, {})
+        return {
+            "feedback_count": row.get("feedback_count", 0),
+            "average_rating": row.get("average_rating") or 0.0,
+        }
+    
+    return {
+        "semantic_hits": summary(True),
+        "generated": summary(False),
+        "by_similarity": by_similarity,
+    }
+
 def update_playbook_status(playbook_id: str, status: str) -> bool:
     """Update the status of a playbook.
     
@@ -773,9 +858,31 @@ def get_logs(
 # ----------------------------------------------------------------
 # LLM Usage functions
 # ----------------------------------------------------------------
+_LLM_USAGE_INSERT = """INSERT INTO llm_usage 
+    (provider, model, prompt_tokens, completion_tokens, total_tokens, 
+     duration_ms, created_at, request_id, user_id, hedged, latency_saved_ms,
+     module, baseline_prompt_tokens, tokens_estimated)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+
+def _llm_usage_row(provider: str, model: str, prompt_tokens: int, completion_tokens: int,
+                   duration_ms: int, user_id: str = "anonymous",
+                   request_id: Optional[str] = None, hedged: bool = False,
+                   latency_saved_ms: int = 0, module: Optional[str] = None,
+                   baseline_prompt_tokens: Optional[int] = None,
+                   tokens_estimated: bool = False) -> tuple:
+    """Build the llm_usage parameters for record_llm_usage() arguments."""
+    if baseline_prompt_tokens is None:
+        baseline_prompt_tokens = prompt_tokens
+    return (provider, model, prompt_tokens, completion_tokens, prompt_tokens + completion_tokens,
+            duration_ms, datetime.utcnow().isoformat(), request_id, user_id, int(hedged),
+            latency_saved_ms, module, baseline_prompt_tokens, int(tokens_estimated))
+
 def record_llm_usage(provider: str, model: str, prompt_tokens: int, completion_tokens: int,
                     duration_ms: int, user_id: str = "anonymous", 
-                    request_id: Optional[str] = None) -> int:
+                    request_id: Optional[str] = None, hedged: bool = False,
+                    latency_saved_ms: int = 0, module: Optional[str] = None,
+                    baseline_prompt_tokens: Optional[int] = None,
+                    tokens_estimated: bool = False) -> int:
     """Record LLM usage metrics.
     
     Args:
@@ -786,31 +893,104 @@ def record_llm_usage(provider: str, model: str, prompt_tokens: int, completion_t
         duration_ms: Duration in milliseconds
         user_id: User ID (defaults to "anonymous")
         request_id: Optional request ID
+        hedged: Whether a hedge request was sent
+        latency_saved_ms: Estimated latency saved by the hedge
+        module: Ansible module the request was for
+        baseline_prompt_tokens: Prompt tokens the request would have used
+            without prompt compaction (defaults to prompt_tokens)
+        tokens_estimated: True if the provider did not report token counts
+            and they were estimated from the text length
         
     Returns:
         ID of the new usage record
     """
     db = get_db()
-    created_at = datetime.utcnow().isoformat()
-    total_tokens = prompt_tokens + completion_tokens
+    row = _llm_usage_row(provider, model, prompt_tokens, completion_tokens, duration_ms,
+                         user_id, request_id, hedged, latency_saved_ms, module,
+                         baseline_prompt_tokens, tokens_estimated)
+    cursor = db.execute(_LLM_USAGE_INSERT, row)
+    
+    logger.debug(f"Recorded LLM usage: {provider}/{model}, {row[4]} tokens")
+    return cursor.lastrowid
+
+def record_llm_usage_batch(records: List[Dict[str, Any]]) -> int:
+    """Record several LLM usage records in one transaction.
     
+    Args:
+        records: Keyword arguments of record_llm_usage() for each record
+        
+    Returns:
+        Number of records written
+    """
+    rows = [_llm_usage_row(**record) for record in records]
+    with transaction() as cursor:
+        cursor.executemany(_LLM_USAGE_INSERT, rows)
+    
+    logger.debug(f"Recorded {len(rows)} LLM usage records")
+    return len(rows)
+
+LATENCY_PERCENTILES = (50, 90, 95, 99)
+
+def _latency_percentiles_by(db: "Database", columns: List[str], where: str,
+                            params: List[Any]) -> Dict[tuple, Dict[str, float]]:
+    """Nearest-rank p50/p90/p95/p99 duration for each group of columns.
+    
+    Rows are ranked in SQL and only the rows at the percentile ranks are
+    returned, so the durations are never loaded into Python.
+    
+    Args:
+        db: Database to query
+        columns: SQL expressions to group by
+        where: WHERE clause of the llm_usage filters
+        params: Parameters of the WHERE clause
+        
+    Returns:
+        Percentiles in milliseconds by tuple of group values
+    """
+    keys = ", ".join(columns)
+    ranks = " OR ".join(f"rank = MIN(n - 1, n * {pct} / 100)" for pct in LATENCY_PERCENTILES)
     cursor = db.execute(
-        """INSERT INTO llm_usage 
-           (provider, model, prompt_tokens, completion_tokens, total_tokens, 
-            duration_ms, created_at, request_id, user_id)
-           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-        (provider, model, prompt_tokens, completion_tokens, total_tokens,
-         duration_ms, created_at, request_id, user_id)
+        f"""SELECT * FROM (
+               SELECT {keys}, duration_ms,
+                      ROW_NUMBER() OVER (PARTITION BY {keys} ORDER BY duration_ms) - 1 AS rank,
+                      COUNT(*) OVER (PARTITION BY {keys}) AS n
+               FROM llm_usage{where} AND duration_ms IS NOT NULL)
+            WHERE {ranks}""",
+        params
     )
+    durations: Dict[tuple, Dict[int, int]] = {}
+    counts: Dict[tuple, int] = {}
+    for row in cursor.fetchall():
+        key = tuple(row)[:len(columns)]
+        durations.setdefault(key, {})[row["rank"]] = row["duration_ms"]
+        counts[key] = row["n"]
+    return {
+        key: {f"p{pct}_ms": durations[key][min(n - 1, n * pct // 100)] for pct in LATENCY_PERCENTILES}
+        for key, n in counts.items()
+    }
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    """Estimate the cost in USD of tokens for a model, using settings.LLM_TOKEN_PRICES.
     
-    logger.debug(f"Recorded LLM usage: {provider}/{model}, {total_tokens} tokens")
-    return cursor.lastrowid
+    Returns:
+        Cost in USD, or None if the model has no configured price
+    """
+    prices = settings.LLM_TOKEN_PRICES.get(model)
+    if prices is None:
+        return None
+    prompt_price, completion_price = prices
+    return ((prompt_tokens or 0) * prompt_price + (completion_tokens or 0) * completion_price) / 1000
 
 def get_llm_usage_stats(provider: Optional[str] = None, 
                         start_date: Optional[str] = None,
                         end_date: Optional[str] = None) -> Dict[str, Any]:
     """Get aggregated LLM usage statistics.
     
+    Totals, latency percentiles and estimated cost are reported per provider
+    and model, per module (most expensive first) and overall. Costs use
+    settings.LLM_TOKEN_PRICES; models without a price count as zero and are
+    listed under "unpriced_models".
+    
     Args:
         provider: Optional provider to filter by
         start_date: Optional start date (ISO format)
@@ -821,46 +1001,118 @@ def get_llm_usage_stats(provider: Optional[str] = None,
     """
     db = get_db()
     
-    # Build query and parameters
-    query = """
-        SELECT 
-            provider,
-            model,
-            COUNT(*) as request_count,
-            SUM(prompt_tokens) as total_prompt_tokens,
-            SUM(completion_tokens) as total_completion_tokens,
-            SUM(total_tokens) as total_tokens,
-            AVG(duration_ms) as avg_duration_ms
-        FROM llm_usage
-        WHERE 1=1
-    """
+    # Build filters and parameters
+    where = " WHERE 1=1"
     params = []
     
     if provider:
-        query += " AND provider = ?"
+        where += " AND provider = ?"
         params.append(provider)
         
     if start_date:
-        query += " AND created_at >= ?"
+        where += " AND created_at >= ?"
         params.append(start_date)
         
     if end_date:
-        query += " AND created_at <= ?"
+        where += " AND created_at <= ?"
         params.append(end_date)
-        
-    query += " GROUP BY provider, model"
     
-    cursor = db.execute(query, params)
+    # Totals are summed in SQL per provider, model and module and only these
+    # groups are combined here; cost is linear in the token sums.
+    module = "COALESCE(module, 'unknown')"
+    cursor = db.execute(
+        f"""SELECT provider, model, {module} AS module,
+                   COUNT(*) AS request_count,
+                   COALESCE(SUM(prompt_tokens), 0) AS prompt_tokens,
+                   COALESCE(SUM(completion_tokens), 0) AS completion_tokens,
+                   COALESCE(SUM(COALESCE(baseline_prompt_tokens, prompt_tokens)), 0)
+                       AS baseline_prompt_tokens,
+                   COALESCE(SUM(hedged), 0) AS hedged,
+                   COALESCE(SUM(latency_saved_ms), 0) AS latency_saved_ms,
+                   COALESCE(SUM(tokens_estimated), 0) AS tokens_estimated,
+                   COALESCE(SUM(duration_ms), 0) AS duration_ms,
+                   COUNT(duration_ms) AS duration_count
+            FROM llm_usage{where}
+            GROUP BY provider, model, {module}""",
+        params
+    )
     
-    # Convert to a more structured result
-    results = [dict(row) for row in cursor.fetchall()]
+    totals_fields = ("request_count", "prompt_tokens", "completion_tokens",
+                     "baseline_prompt_tokens", "hedged", "latency_saved_ms",
+                     "tokens_estimated", "duration_ms", "duration_count", "cost")
+    by_model: Dict[tuple, Dict[str, Any]] = {}
+    by_module: Dict[str, Dict[str, Any]] = {}
+    overall = dict.fromkeys(totals_fields, 0)
+    unpriced = set()
+    for row in cursor.fetchall():
+        row = dict(row)
+        cost = estimate_cost(row["model"], row["prompt_tokens"], row["completion_tokens"])
+        if cost is None:
+            unpriced.add(row["model"])
+        row["cost"] = cost or 0.0
+        for totals in (by_model.setdefault((row["provider"], row["model"]), dict.fromkeys(totals_fields, 0)),
+                       by_module.setdefault(row["module"], dict.fromkeys(totals_fields, 0)),
+                       overall):
+            for field in totals_fields:
+                totals[field] += row[field]
     
-    # Calculate totals across all models
-    total_requests = sum(r["request_count"] for r in results)
-    total_tokens = sum(r["total_tokens"] for r in results)
+    model_latency = _latency_percentiles_by(db, ["provider", "model"], where, params)
+    module_latency = _latency_percentiles_by(db, [module], where, params)
+    overall_latency = _latency_percentiles_by(db, ["'all'"], where, params).get(("all",), {})
+    no_latency = {f"p{pct}_ms": 0 for pct in LATENCY_PERCENTILES}
+    
+    def summarize(totals: Dict[str, Any], latency: Dict[str, float]) -> Dict[str, Any]:
+        count = totals["request_count"]
+        prompt_tokens = totals["prompt_tokens"]
+        completion_tokens = totals["completion_tokens"]
+        baseline = totals["baseline_prompt_tokens"]
+        hedged = totals["hedged"]
+        cost = totals["cost"]
+        return {
+            "request_count": count,
+            "total_prompt_tokens": prompt_tokens,
+            "total_completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "avg_prompt_tokens": prompt_tokens / count if count else 0.0,
+            "avg_duration_ms": (totals["duration_ms"] / totals["duration_count"]
+                                if totals["duration_count"] else 0.0),
+            **(latency or no_latency),
+            "hedged_requests": hedged,
+            "hedge_rate": hedged / count if count else 0.0,
+            "total_latency_saved_ms": totals["latency_saved_ms"],
+            "baseline_prompt_tokens": baseline,
+            "prompt_tokens_saved": baseline - prompt_tokens,
+            "estimated_tokens_requests": totals["tokens_estimated"],
+            "estimated_cost_usd": round(cost, 6),
+            "cost_per_request_usd": round(cost / count, 6) if count else 0.0,
+        }
+    
+    providers = [
+        {"provider": p, "model": m, **summarize(totals, model_latency.get((p, m)))}
+        for (p, m), totals in sorted(by_model.items())
+    ]
+    modules = sorted(
+        ({"module": name, **summarize(totals, module_latency.get((name,)))}
+         for name, totals in by_module.items()),
+        key=lambda m: m["estimated_cost_usd"],
+        reverse=True,
+    )
+    overall = summarize(overall, overall_latency)
     
     return {
-        "providers": results,
-        "total_requests": total_requests,
-        "total_tokens": total_tokens
-    }
\ No newline at end of file
+        "providers": providers,
+        "modules": modules,
+        "total_requests": overall["request_count"],
+        "total_tokens": overall["total_tokens"],
+        "hedged_requests": overall["hedged_requests"],
+        "hedge_rate": overall["hedge_rate"],
+        "total_latency_saved_ms": overall["total_latency_saved_ms"],
+        "prompt_tokens": overall["total_prompt_tokens"],
+        "baseline_prompt_tokens": overall["baseline_prompt_tokens"],
+        "prompt_tokens_saved": overall["prompt_tokens_saved"],
+        "prompt_compaction_ratio": (round(overall["total_prompt_tokens"] / overall["baseline_prompt_tokens"], 4)
+                                    if overall["baseline_prompt_tokens"] else 1.0),
+        "latency": overall_latency or no_latency,
+        "estimated_cost_usd": overall["estimated_cost_usd"],
+        "unpriced_models": sorted(unpriced),
+    }
@@ -0,0 +1,248 @@
+"""
+Pool of persistent ansible-lint workers.
+
+Starting ansible-lint for every lint costs far more than linting a short
+playbook: the interpreter starts, Ansible and ansible-lint are imported and the
+rules are loaded each time. The pool keeps a few long-lived worker processes
+(backend/lint_worker.py) that do this once and lint one playbook path per
+request over a pipe.
+
+A worker is replaced after max_jobs lints so state cannot build up in it, and
+after any failure. If ansible-lint cannot be imported by this interpreter or a
+worker fails to start, the pool disables itself and callers run ansible-lint
+as a separate process as before (LintPoolError tells them to).
+"""
+from __future__ import annotations
+
+import importlib.util
+import json
+import logging
+import os
+import select
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .config import settings
+from . import process
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+WORKER_SCRIPT = Path(__file__).with_name("lint_worker.py")
+
+class LintPoolError(Exception):
+    """Raised when the pool cannot lint a playbook; run ansible-lint directly instead."""
+    pass
+
+def _deadline(timeout: Optional[float]) -> Optional[float]:
+    """Monotonic time at which timeout seconds from now run out (None: never)."""
+    return None if timeout is None else time.monotonic() + timeout
+
+def _remaining(deadline: Optional[float]) -> Optional[float]:
+    """Seconds left until deadline, at least 0 (None: no deadline)."""
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+class _Worker:
+    """One worker process and its pipes."""
+
+    def __init__(self, command: List[str], startup_timeout: float):
+        self.jobs = 0
+        # Unbuffered binary pipes: replies are framed here with os.read, so
+        # select() never misses a line already sitting in a read buffer
+        self.proc = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            bufsize=0, start_new_session=True,
+        )
+        self._buffer = bytearray()
+        try:
+            ready = self._read(_deadline(startup_timeout))
+        except subprocess.TimeoutExpired:
+            self.close()
+            raise LintPoolError(f"Lint worker did not start within {startup_timeout}s")
+        except LintPoolError:
+            self.close()
+            raise
+        if not ready.get("ready"):
+            self.close()
+            raise LintPoolError(f"Lint worker failed to start: {ready.get('error')}")
+
+    def lint(self, path: str, deadline: Optional[float]) -> subprocess.CompletedProcess:
+        """Lint one playbook, returning the result ansible-lint -p would have."""
+        request = memoryview((json.dumps({"path": path}) + "\n").encode())
+        try:
+            while request:
+                request = request[os.write(self.proc.stdin.fileno(), request):]
+        except OSError as e:
+            raise LintPoolError(f"Lint worker exited with code {self.proc.poll()}: {e}")
+        reply = self._read(deadline)
+        self.jobs += 1
+        if not reply.get("ok"):
+            raise LintPoolError(f"Lint worker failed: {reply.get('error')}")
+        stdout = "".join(f"{line}\n" for line in reply["lines"])
+        return subprocess.CompletedProcess(["ansible-lint", "-p", path], reply["exit_code"], stdout, "")
+
+    def _read(self, deadline: Optional[float]) -> Dict[str, Any]:
+        """Read one reply, raising subprocess.TimeoutExpired if none arrives by deadline."""
+        started = time.monotonic()
+        fd = self.proc.stdout.fileno()
+        end = self._buffer.find(b"\n")
+        while end < 0:
+            readable, _, _ = select.select([fd], [], [], _remaining(deadline))
+            if not readable:
+                raise subprocess.TimeoutExpired(self.proc.args, time.monotonic() - started)
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                raise LintPoolError(f"Lint worker exited with code {self.proc.poll()}")
+            scanned = len(self._buffer)
+            self._buffer += chunk
+            end = self._buffer.find(b"\n", scanned)
+        line = bytes(self._buffer[:end])
+        del self._buffer[:end + 1]
+        try:
+            return json.loads(line)
+        except ValueError as e:
+            raise LintPoolError(f"Invalid reply from lint worker: {e}")
+
+    def close(self, grace: float = 2) -> None:
+        """Stop the worker, killing it if it does not exit on end of input within grace seconds."""
+        try:
+            self.proc.stdin.close()
+            if grace:
+                self.proc.wait(timeout=grace)
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+        process.kill_group(self.proc)
+        self.proc.wait()
+        self.proc.stdout.close()
+
+class LintPool:
+    """Bounded pool of ansible-lint workers, started on demand.
+
+    Args:
+        size: Maximum number of workers (and concurrent lints)
+        max_jobs: Lints after which a worker is replaced
+        startup_timeout: Seconds a new worker may take to load ansible-lint
+        command: Worker command, defaults to running lint_worker.py with this interpreter
+    """
+
+    def __init__(self, size: int = 2, max_jobs: int = 100, startup_timeout: float = 60.0,
+                 command: Optional[List[str]] = None):
+        self.size = size
+        self.max_jobs = max_jobs
+        self.startup_timeout = startup_timeout
+        self.command = command or [sys.executable, str(WORKER_SCRIPT)]
+        self._idle: List[_Worker] = []
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._disabled: Optional[str] = None
+
+        # Counters
+        self._jobs = 0
+        self._started = 0
+        self._recycled = 0
+        self._failures = 0
+
+    def available(self) -> bool:
+        """Whether lints can be sent to the pool."""
+        if self._disabled is None:
+            if os.name != "posix":
+                self._disable("worker pipes need select() on POSIX")
+            elif self.command[1:2] == [str(WORKER_SCRIPT)] and importlib.util.find_spec("ansiblelint") is None:
+                self._disable("ansible-lint is not importable by this interpreter")
+        return self._disabled is None
+
+    def run(self, path: str, timeout: Optional[float] = None) -> subprocess.CompletedProcess:
+        """Lint a playbook on a pooled worker.
+
+        Args:
+            path: Playbook path
+            timeout: Seconds to wait for a free worker and the lint together
+
+        Returns:
+            CompletedProcess with ansible-lint's exit code and parseable output
+
+        Raises:
+            LintPoolError: If the pool is unavailable or the worker failed
+            subprocess.TimeoutExpired: If the lint did not finish within timeout
+        """
+        if not self.available():
+            raise LintPoolError(f"Lint pool disabled: {self._disabled}")
+        deadline = _deadline(timeout)
+        if not self._slots.acquire(timeout=timeout):
+            raise subprocess.TimeoutExpired(["ansible-lint", "-p", path], timeout)
+        try:
+            worker = self._checkout()
+            try:
+                result = worker.lint(path, deadline)
+            except BaseException:
+                with self._lock:
+                    self._failures += 1
+                # It may still be linting; kill it rather than add to the timeout
+                worker.close(grace=0)
+                raise
+            with self._lock:
+                self._jobs += 1
+            self._checkin(worker)
+            return result
+        finally:
+            self._slots.release()
+
+    def _checkout(self) -> _Worker:
+        """Take an idle worker or start a new one."""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        try:
+            worker = _Worker(self.command, self.startup_timeout)
+        except (LintPoolError, OSError) as e:
+            self._disable(str(e))
+            raise LintPoolError(str(e))
+        with self._lock:
+            self._started += 1
+        return worker
+
+    def _checkin(self, worker: _Worker) -> None:
+        """Return a worker to the pool, replacing it once it reached max_jobs."""
+        if self.max_jobs and worker.jobs >= self.max_jobs:
+            with self._lock:
+                self._recycled += 1
+            worker.close()
+            return
+        with self._lock:
+            self._idle.append(worker)
+
+    def _disable(self, reason: str) -> None:
+        if self._disabled is None:
+            logger.warning(f"Lint worker pool disabled, running ansible-lint per lint: {reason}")
+        self._disabled = reason
+
+    def close(self) -> None:
+        """Stop the idle workers."""
+        with self._lock:
+            workers, self._idle = self._idle, []
+        for worker in workers:
+            worker.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get worker and job counts."""
+        with self._lock:
+            return {
+                "enabled": settings.LINT_POOL_ENABLED,
+                "disabled_reason": self._disabled,
+                "size": self.size,
+                "idle": len(self._idle),
+                "jobs": self._jobs,
+                "workers_started": self._started,
+                "workers_recycled": self._recycled,
+                "failures": self._failures,
+            }
+
+# Global lint worker pool
+lint_pool = LintPool(
+    size=settings.LINT_POOL_SIZE,
+    max_jobs=settings.LINT_POOL_MAX_JOBS,
+)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Long-lived ansible-lint worker used by backend/lint_pool.py.
+
+Imports ansible-lint and loads its rules once, then lints one playbook per
+request, producing the same lines as `ansible-lint -p`. Requests are JSON
+lines on stdin ({"path": ...}); each gets one JSON line in reply:
+
+    {"ok": true, "lines": [...], "exit_code": 0 or 2}
+    {"ok": false, "error": "..."}
+
+The first line written is {"ready": true} or {"ready": false, "error": ...}.
+Anything ansible-lint or Ansible print goes to stderr, so it cannot corrupt the
+replies. This file runs as a standalone script and must not import the backend.
+
+The worker drives ansible-lint through internals that are not a public API
+(initialize_options, runner.get_matches and the global options). It only
+starts for the ansible-lint versions it was written against; otherwise it
+reports {"ready": false} and the pool falls back to running ansible-lint.
+"""
+import json
+import os
+import re
+import sys
+from importlib import metadata
+from typing import Callable, List, Optional, Tuple
+
+# backend/ has modules named like stdlib ones (secrets.py); run as a script,
+# its directory would shadow them for ansible-lint
+_HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:] = [p for p in sys.path if os.path.abspath(p or ".") != _HERE]
+
+# ansible-lint's exit code when violations were found
+VIOLATIONS_FOUND = 2
+
+# ansible-lint versions whose internals the worker uses, [min, max)
+SUPPORTED_VERSIONS = ((6, 22), (7, 0))
+
+def _parse_version(version: str) -> Optional[Tuple[int, int]]:
+    """Major and minor of a version string, or None if it has neither."""
+    match = re.match(r"(\d+)\.(\d+)", version)
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+def _check_version() -> None:
+    """Raise RuntimeError unless the installed ansible-lint is supported."""
+    version = metadata.version("ansible-lint")
+    parsed = _parse_version(version)
+    low, high = SUPPORTED_VERSIONS
+    if parsed is None or not low <= parsed < high:
+        raise RuntimeError(
+            f"ansible-lint {version} is not supported by the lint worker "
+            f"(needs >={low[0]}.{low[1]},<{high[0]}.{high[1]})"
+        )
+
+def _reply_stream():
+    """Keep the original stdout for replies and send fd 1 to stderr."""
+    stream = os.fdopen(os.dup(1), "w", buffering=1, encoding="utf-8")
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+    return stream
+
+def _plain_renderer() -> Callable[[str], str]:
+    """Return a function turning ansible-lint's console markup into plain text.
+
+    ansible-lint used rich for its console markup before switching to a small
+    BBCode renderer of its own; support both.
+    """
+    try:
+        from rich.markup import render
+        return lambda text: render(text).plain
+    except ImportError:
+        from ansiblelint.output import Console
+        console = Console(None)
+        console.colored = False
+        return console.render
+
+def _load_linter() -> Callable[[str], Tuple[List[str], int]]:
+    """Import ansible-lint, load its configuration and rules once."""
+    _check_version()
+    from ansiblelint.__main__ import initialize_options
+    from ansiblelint.app import get_app
+    from ansiblelint.config import options
+    from ansiblelint.rules import RulesCollection
+    from ansiblelint.runner import get_matches
+
+    # Offline: never refresh schemas or take the cache lock from a worker
+    initialize_options(["-p", "--offline"])
+    app = get_app(offline=True)
+    rules = RulesCollection(
+        app=app,
+        rulesdirs=options.rulesdirs,
+        profile_name=options.profile,
+        options=options,
+    )
+    # The formatter ansible-lint picked for -p
+    formatter = app.formatter
+    render = _plain_renderer()
+
+    def lint(path: str) -> Tuple[List[str], int]:
+        options.lintables = [path]
+        result = get_matches(rules, options)
+        matches = [m for m in result.matches if m.tag not in options.skip_list]
+        lines = [render(formatter.apply(m)) for m in matches]
+        return lines, VIOLATIONS_FOUND if matches else 0
+
+    return lint
+
+def main() -> int:
+    replies = _reply_stream()
+
+    def reply(message: dict) -> None:
+        replies.write(json.dumps(message) + "\n")
+        replies.flush()
+
+    try:
+        lint = _load_linter()
+    except Exception as e:
+        reply({"ready": False, "error": f"{type(e).__name__}: {e}"})
+        return 1
+    reply({"ready": True})
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            lines, exit_code = lint(json.loads(line)["path"])
+            reply({"ok": True, "lines": lines, "exit_code": exit_code})
+        except Exception as e:
+            reply({"ok": False, "error": f"{type(e).__name__}: {e}"})
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,20 +2,39 @@
 from __future__ import annotations
 import os
 import json
+import asyncio
+import contextvars
+import functools
 import logging
+import math
+import random
+import re
+import threading
+import zlib
 import yaml
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
 import time
 
+import httpx
+
 from tenacity import (
-    retry, 
+    AsyncRetrying,
+    Retrying,
     stop_after_attempt, 
     wait_exponential, 
     retry_if_exception_type
 )
 
+from .config import settings
+from .llm_breaker import CircuitBreaker, Permit, get_breaker
+from .llm_hedging import LatencyTracker, get_latency_tracker, hedged_call
+from .llm_limiter import LLMLimiter, QueueTimeoutError, get_limiter
+from .usage_recorder import usage_recorder
+
 # Configure module-level logger
 logger = logging.getLogger(__name__)
 
@@ -39,10 +58,35 @@ class LLMValidationError(LLMError):
     """Raised when response validation fails."""
     pass
 
+class LLMQueueTimeoutError(LLMError):
+    """Raised when a request waits too long for a provider call slot."""
+    pass
+
+class LLMCircuitOpenError(LLMError):
+    """Raised when a provider's circuit breaker is open."""
+    pass
+
 class LLMClient(ABC):
     @abstractmethod
     def generate(self, prompt: str) -> str:
         """Generate and return a YAML string from the LLM."""
+    
+    async def agenerate(self, prompt: str) -> str:
+        """Async variant of generate() for use on the event loop.
+        
+        The default runs generate() in a worker thread; clients with a native
+        async transport override it.
+        """
+        return await run_blocking(self.generate, prompt)
+    
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        """Yield the response text in chunks as the provider produces it.
+        
+        The concatenated chunks are validated with validate_yaml() once the
+        response is complete, so LLMValidationError may be raised after the
+        last chunk. The default yields the whole agenerate() response at once.
+        """
+        yield await self.agenerate(prompt)
         
     def validate_yaml(self, content: str) -> str:
         """Validate that the response is valid YAML."""
@@ -57,8 +101,476 @@ class LLMClient(ABC):
             logger.error(f"Invalid YAML in LLM response: {e}")
             raise LLMValidationError(f"LLM generated invalid YAML: {e}")
 
+class Completion(str):
+    """Provider response text with the token counts the provider reported.
+    
+    Behaves as a plain string everywhere; the LLM clients read the token
+    counts when recording usage. Counts are None if the provider did not
+    report them.
+    """
+    prompt_tokens: Optional[int]
+    completion_tokens: Optional[int]
+    
+    def __new__(cls, text: str, prompt_tokens: Optional[int] = None,
+                completion_tokens: Optional[int] = None) -> "Completion":
+        completion = super().__new__(cls, text)
+        completion.prompt_tokens = prompt_tokens
+        completion.completion_tokens = completion_tokens
+        return completion
+
+# --- Usage context -------------------------------------------------------------
+# Details of the current request that the caller knows but the prompt doesn't
+# carry (e.g. the module being generated), recorded with LLM usage
+_usage_context: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar(
+    "llm_usage_context", default={}
+)
+
+@contextmanager
+def usage_context(module: Optional[str] = None, prompt_tokens_saved: int = 0) -> Iterator[None]:
+    """Attach request details to the LLM usage recorded inside the block.
+    
+    Args:
+        module: Ansible module the request is for
+        prompt_tokens_saved: Estimated prompt tokens saved by prompt compaction
+    """
+    previous = _usage_context.get()
+    _usage_context.set({"module": module, "prompt_tokens_saved": prompt_tokens_saved})
+    try:
+        yield
+    finally:
+        # Restore rather than reset with a token: an async generator may be
+        # closed from a different context than the one it entered in
+        _usage_context.set(previous)
+
+# Requesting user of the LLM calls made in the current context, used to queue
+# provider calls fairly between users and recorded with their usage
+_request_user: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "llm_request_user", default=None
+)
+
+@contextmanager
+def user_context(user_id: Optional[str]) -> Iterator[None]:
+    """Attribute the LLM calls made inside the block to a user.
+    
+    Args:
+        user_id: Requesting user, or None for anonymous requests
+    """
+    previous = _request_user.get()
+    _request_user.set(user_id)
+    try:
+        yield
+    finally:
+        _request_user.set(previous)
+
+def current_user() -> Optional[str]:
+    """Return the user LLM calls in this context are made for, if known."""
+    return _request_user.get()
+
+# --- Shared transports --------------------------------------------------------
+_http_client: Optional[httpx.AsyncClient] = None
+_http_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_blocking_executor: Optional[ThreadPoolExecutor] = None
+_transport_lock = threading.Lock()
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the process-wide pooled HTTP client for async provider calls.
+    
+    Connections are kept alive and reused across requests. The client is tied
+    to the event loop that created it, so a new one is created if called from
+    a different loop (e.g. in tests).
+    """
+    global _http_client, _http_client_loop
+    loop = asyncio.get_running_loop()
+    if _http_client is None or _http_client.is_closed or _http_client_loop is not loop:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.API_TIMEOUT, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=30.0,
+            ),
+        )
+        _http_client_loop = loop
+    return _http_client
+
+async def aclose_http_client() -> None:
+    """Close the pooled HTTP client (called on application shutdown)."""
+    global _http_client, _http_client_loop
+    if _http_client is not None:
+        await _http_client.aclose()
+    _http_client = None
+    _http_client_loop = None
+
+async def run_blocking(fn, *args):
+    """Run a blocking provider call in the shared LLM thread pool.
+    
+    The pool is sized like the HTTP connection pool so that SDKs without an
+    async API (boto3) can keep as many calls in flight as the async clients.
+    """
+    global _blocking_executor
+    if _blocking_executor is None:
+        with _transport_lock:
+            if _blocking_executor is None:
+                _blocking_executor = ThreadPoolExecutor(
+                    max_workers=settings.LLM_HTTP_MAX_CONNECTIONS,
+                    thread_name_prefix="llm",
+                )
+    loop = asyncio.get_running_loop()
+    call = functools.partial(contextvars.copy_context().run, fn, *args)
+    return await loop.run_in_executor(_blocking_executor, call)
+
+def _metrics():
+    """Return the application metrics collector."""
+    # Imported lazily: monitoring imports this module
+    from . import monitoring
+    return monitoring.get_metrics()
+
+def _record_coalesced() -> None:
+    """Count a request that shared another caller's in-flight LLM call."""
+    _metrics().record_coalesced()
+
+class CachingLLMClient(LLMClient):
+    """Base class for provider clients that cache responses in llm_cache.
+    
+    Concurrent requests for the same prompt are coalesced, so N identical
+    requests that miss the cache together result in a single provider call.
+    Subclasses implement _invoke() to call the provider.
+    
+    Provider calls go through the provider's LLMLimiter, which caps calls in
+    flight and tokens per minute and queues the rest fairly by user, and its
+    CircuitBreaker, which rejects calls at once while the provider is failing.
+    
+    Timeouts and connection failures are retried with exponential backoff.
+    The limiter slot and breaker permit are given back between attempts, so
+    other callers are not queued behind the backoff.
+    
+    With hedging enabled, async calls slower than a percentile of recent
+    latency are hedged with a second request to hedge_to (or this client).
+    """
+    
+    provider = "llm"
+    use_cache: bool
+    hedge_to: Optional["CachingLLMClient"] = None
+    retry_attempts = 3
+    retry_wait = wait_exponential(multiplier=1, min=2, max=30)
+    
+    @property
+    def model_name(self) -> str:
+        """Name of the model used by this client."""
+        raise NotImplementedError
+    
+    @property
+    def limiter(self) -> LLMLimiter:
+        """Concurrency and token-rate limiter shared by all clients of this provider."""
+        return get_limiter(self.provider)
+    
+    @property
+    def breaker(self) -> CircuitBreaker:
+        """Circuit breaker shared by all clients of this provider."""
+        return get_breaker(self.provider)
+    
+    @property
+    def latency(self) -> LatencyTracker:
+        """Recent call latencies of this provider, used to time hedge requests."""
+        return get_latency_tracker(self.provider)
+    
+    def _get_cache_key(self, prompt: str) -> str:
+        """Generate a cache key for the prompt."""
+        # Use a hash of the prompt and model as the cache key
+        import hashlib
+        prompt_hash = hashlib.md5(prompt.encode()).hexdigest()
+        
+        # Create a semantic key for similar prompts
+        # Extract key elements from the prompt (module name and task description)
+        import re
+        module_match = re.search(r"using\s+([a-z0-9_.]+)", prompt, re.IGNORECASE)
+        module = module_match.group(1) if module_match else ""
+        
+        task_match = re.search(r"Task:\s*(.+?)(?:\n|$)", prompt, re.IGNORECASE)
+        task = task_match.group(1) if task_match else ""
+        
+        # Create a normalized task string (lowercase, remove stop words)
+        stop_words = {"a", "an", "the", "and", "or", "but", "in", "on", "at", "to", "for", "with"}
+        normalized_task = " ".join([word for word in task.lower().split() if word not in stop_words])
+        
+        # Create a semantic fingerprint
+        semantic_key = f"{module}:{normalized_task}"
+        semantic_hash = hashlib.md5(semantic_key.encode()).hexdigest()
+        
+        return f"{self.provider}:{self.model_name}:{prompt_hash}:{semantic_hash}"
+    
+    def generate(self, prompt: str) -> str:
+        """Generate a YAML response, using the cache if enabled."""
+        if not self.use_cache:
+            return self._generate_uncached(prompt)
+            
+        cache_key = self._get_cache_key(prompt)
+        cached_response = self.llm_cache.get(cache_key)
+        if cached_response is not None:
+            logger.info(f"Using cached response for {cache_key[:10]}...")
+            _metrics().record_llm_call(is_cache_hit=True)
+            return cached_response
+            
+        # Only one caller per key reaches the provider; the rest share its result
+        return self.llm_cache.load(
+            cache_key,
+            lambda: self._generate_uncached(prompt),
+            on_coalesced=_record_coalesced,
+        )
+    
+    async def agenerate(self, prompt: str) -> str:
+        """Async variant of generate(); the event loop is never blocked on the provider."""
+        if not self.use_cache:
+            return await self._agenerate_uncached(prompt)
+            
+        cache_key = self._get_cache_key(prompt)
+        cached_response = await self.llm_cache.aget(cache_key)
+        if cached_response is not None:
+            logger.info(f"Using cached response for {cache_key[:10]}...")
+            _metrics().record_llm_call(is_cache_hit=True)
+            return cached_response
+            
+        return await self.llm_cache.aload(
+            cache_key,
+            lambda: self._agenerate_uncached(prompt),
+            on_coalesced=_record_coalesced,
+        )
+    
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        """Yield response chunks as they arrive from the provider.
+        
+        Cache hits are yielded as a single chunk. Streams are not coalesced or
+        hedged, but hold a limiter slot and count toward the circuit breaker
+        like any other call. The complete response is validated and cached at
+        the end.
+        """
+        cache_key = self._get_cache_key(prompt) if self.use_cache else None
+        if cache_key:
+            cached_response = await self.llm_cache.aget(cache_key)
+            if cached_response is not None:
+                logger.info(f"Using cached response for {cache_key[:10]}...")
+                _metrics().record_llm_call(is_cache_hit=True)
+                yield cached_response
+                return
+        
+        try:
+            await self.limiter.aacquire(prompt, current_user())
+        except QueueTimeoutError as e:
+            raise LLMQueueTimeoutError(str(e)) from e
+        chunks = []
+        usage: Optional[Completion] = None
+        start = time.monotonic()
+        try:
+            permit = self._acquire_breaker()
+            try:
+                async for chunk in self._astream_invoke(prompt):
+                    if isinstance(chunk, Completion) and chunk.prompt_tokens is not None:
+                        usage = chunk
+                    if chunk:
+                        chunks.append(chunk)
+                        yield chunk
+                content = self.validate_yaml("".join(chunks))
+                if usage is not None:
+                    content = Completion(content, usage.prompt_tokens, usage.completion_tokens)
+            except (asyncio.CancelledError, GeneratorExit):
+                # The consumer went away before the response was complete; the
+                # tokens streamed so far are still billed
+                self.breaker.release(permit.probe)
+                self._record_usage(prompt, "".join(chunks), time.monotonic() - start)
+                raise
+            except Exception as e:
+                self._record_failure(e, time.monotonic() - start, permit)
+                raise
+            self._record_success(time.monotonic() - start, permit)
+        finally:
+            self.limiter.release()
+        _metrics().record_llm_call()
+        
+        if cache_key:
+            await self.llm_cache.aset(cache_key, str(content))
+        self._record_usage(prompt, content, time.monotonic() - start)
+    
+    def _generate_uncached(self, prompt: str) -> str:
+        """Call the provider and record the usage."""
+        start = time.monotonic()
+        content = self._call(prompt)
+        self._record_usage(prompt, content, time.monotonic() - start)
+        return str(content)
+    
+    async def _agenerate_uncached(self, prompt: str) -> str:
+        """Call the provider, hedging slow calls if enabled, and record the usage."""
+        start = time.monotonic()
+        delay = self._hedge_delay()
+        if delay is None:
+            content = await self._acall(prompt)
+            self._record_usage(prompt, content, time.monotonic() - start)
+            return str(content)
+        
+        target = self.hedge_to or self
+        result = await hedged_call(
+            lambda: self._acall(prompt),
+            lambda: target._acall(prompt),
+            delay,
+            self.latency,
+        )
+        winner = target if result.hedge_won else self
+        winner._record_usage(prompt, result.value, time.monotonic() - start,
+                             result.hedged, result.latency_saved_ms)
+        return str(result.value)
+    
+    def _hedge_delay(self) -> Optional[float]:
+        """Seconds after which to hedge a call, or None to not hedge it.
+        
+        Hedging starts once enough latency samples have been collected.
+        """
+        if not settings.LLM_HEDGING or len(self.latency) < settings.LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return max(settings.LLM_HEDGE_MIN_DELAY,
+                   self.latency.percentile(settings.LLM_HEDGE_PERCENTILE))
+    
+    def _record_usage(self, prompt: str, content: str, duration: float,
+                      hedged: bool = False,
+                      latency_saved_ms: int = 0) -> None:
+        """Queue a provider call for llm_usage without waiting for the write.
+        
+        Token counts reported by the provider (see Completion) are used when
+        available; otherwise they are estimated at four characters per token.
+        """
+        if not (settings.DB_ENABLED and settings.COLLECT_LLM_USAGE):
+            return
+        context = _usage_context.get()
+        prompt_tokens = getattr(content, "prompt_tokens", None)
+        completion_tokens = getattr(content, "completion_tokens", None)
+        estimated = prompt_tokens is None
+        if estimated:
+            prompt_tokens = len(prompt) // 4
+            completion_tokens = len(content) // 4
+        usage_recorder.record(
+            provider=self.provider,
+            model=self.model_name,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens or 0,
+            duration_ms=int(duration * 1000),
+            user_id=current_user() or "anonymous",
+            hedged=hedged,
+            latency_saved_ms=latency_saved_ms,
+            module=context.get("module"),
+            baseline_prompt_tokens=prompt_tokens + context.get("prompt_tokens_saved", 0),
+            tokens_estimated=estimated,
+        )
+    
+    def _retry_policy(self) -> dict:
+        """Arguments of the tenacity retry policy for provider calls."""
+        return dict(
+            stop=stop_after_attempt(self.retry_attempts),
+            wait=self.retry_wait,
+            retry=retry_if_exception_type((LLMConnectionError, LLMTimeoutError)),
+            reraise=True,
+        )
+    
+    def _call(self, prompt: str) -> str:
+        """Call the provider, retrying transient failures."""
+        for attempt in Retrying(**self._retry_policy()):
+            with attempt:
+                content = self._call_once(prompt)
+        return content
+    
+    async def _acall(self, prompt: str) -> str:
+        """Async variant of _call()."""
+        async for attempt in AsyncRetrying(**self._retry_policy()):
+            with attempt:
+                content = await self._acall_once(prompt)
+        return content
+    
+    def _call_once(self, prompt: str) -> str:
+        """Call the provider once a slot is free and record the call in the metrics."""
+        try:
+            self.limiter.acquire(prompt, current_user())
+        except QueueTimeoutError as e:
+            raise LLMQueueTimeoutError(str(e)) from e
+        try:
+            permit = self._acquire_breaker()
+            start = time.monotonic()
+            try:
+                content = self._invoke(prompt)
+            except Exception as e:
+                self._record_failure(e, time.monotonic() - start, permit)
+                raise
+            self._record_success(time.monotonic() - start, permit)
+        finally:
+            self.limiter.release()
+        _metrics().record_llm_call()
+        return content
+    
+    async def _acall_once(self, prompt: str) -> str:
+        """Async variant of _call_once()."""
+        try:
+            await self.limiter.aacquire(prompt, current_user())
+        except QueueTimeoutError as e:
+            raise LLMQueueTimeoutError(str(e)) from e
+        try:
+            permit = self._acquire_breaker()
+            start = time.monotonic()
+            try:
+                content = await self._ainvoke(prompt)
+            except asyncio.CancelledError:
+                # Lost a hedge race or the request went away: no outcome for the
+                # breaker, but the provider bills the prompt all the same
+                self.breaker.release(permit.probe)
+                self._record_usage(prompt, "", time.monotonic() - start)
+                raise
+            except Exception as e:
+                self._record_failure(e, time.monotonic() - start, permit)
+                raise
+            self._record_success(time.monotonic() - start, permit)
+        finally:
+            self.limiter.release()
+        _metrics().record_llm_call()
+        return content
+    
+    def _acquire_breaker(self) -> Permit:
+        """Return the breaker's permit, raising LLMCircuitOpenError if it rejects the call."""
+        permit = self.breaker.try_acquire()
+        if permit is None:
+            raise LLMCircuitOpenError(f"Circuit breaker for {self.provider} is open")
+        return permit
+    
+    def _record_success(self, duration: float, permit: Permit) -> None:
+        """Record a successful provider call in the breaker and latency tracker."""
+        self.breaker.record_success(duration, permit.probe)
+        self.latency.record(duration)
+    
+    def _record_failure(self, error: Exception, duration: float, permit: Permit) -> None:
+        """Record a failed provider call in the breaker and the metrics."""
+        _metrics().record_llm_call(is_error=True)
+        if isinstance(error, LLMValidationError):
+            # The provider answered; the model just produced unusable output
+            self.breaker.record_success(duration, permit.probe)
+        else:
+            self.breaker.record_failure(duration, permit.probe)
+    
+    @abstractmethod
+    def _invoke(self, prompt: str) -> str:
+        """Call the provider and return validated YAML."""
+    
+    async def _ainvoke(self, prompt: str) -> str:
+        """Call the provider without blocking the event loop.
+        
+        The default runs _invoke() in the shared LLM thread pool.
+        """
+        return await run_blocking(self._invoke, prompt)
+    
+    async def _astream_invoke(self, prompt: str) -> AsyncIterator[str]:
+        """Yield raw response chunks from the provider.
+        
+        The default yields the whole _ainvoke() response as one chunk.
+        """
+        yield await self._ainvoke(prompt)
+
 # --- OpenAI Adapter --------------------------------------------------------
-class OpenAIClient(LLMClient):
+class OpenAIClient(CachingLLMClient):
+    provider = "openai"
+    
     def __init__(self, model: Optional[str] = None, use_cache: bool = True):
         try:
             from .cache import llm_cache
@@ -82,51 +594,23 @@ class OpenAIClient(LLMClient):
                 
             openai.api_key = key
             self._client = openai
+            # SDK errors for requests that never completed, mapped like the
+            # httpx ones on the async path so both are retried alike
+            self._timeout_errors = (TimeoutError, openai.APITimeoutError)
+            self._connection_errors = (ConnectionError, openai.APIConnectionError)
+            self._api_key = key
+            self.base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
             self.model = model or os.getenv("OPENAI_MODEL", "gpt-4o-mini")
             logger.info(f"OpenAI client initialized with model: {self.model}")
         except ImportError:
             raise LLMError("openai package not installed. Run 'pip install openai'.")
     
-    def _get_cache_key(self, prompt: str) -> str:
-        """Generate a cache key for the prompt."""
-        # Use a hash of the prompt and model as the cache key
-        import hashlib
-        prompt_hash = hashlib.md5(prompt.encode()).hexdigest()
-        
-        # Create a semantic key for similar prompts
-        # Extract key elements from the prompt (module name and task description)
-        import re
-        module_match = re.search(r"using\s+([a-z0-9_.]+)", prompt, re.IGNORECASE)
-        module = module_match.group(1) if module_match else ""
-        
-        task_match = re.search(r"Task:\s*(.+?)(?:\n|$)", prompt, re.IGNORECASE)
-        task = task_match.group(1) if task_match else ""
-        
-        # Create a normalized task string (lowercase, remove stop words)
-        stop_words = {"a", "an", "the", "and", "or", "but", "in", "on", "at", "to", "for", "with"}
-        normalized_task = " ".join([word for word in task.lower().split() if word not in stop_words])
-        
-        # Create a semantic fingerprint
-        semantic_key = f"{module}:{normalized_task}"
-        semantic_hash = hashlib.md5(semantic_key.encode()).hexdigest()
-        
-        return f"openai:{self.model}:{prompt_hash}:{semantic_hash}"
+    @property
+    def model_name(self) -> str:
+        return self.model
     
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=2, max=30),
-        retry=retry_if_exception_type((ConnectionError, TimeoutError)),
-    )
-    def generate(self, prompt: str) -> str:
-        """Generate YAML response from OpenAI with caching."""
-        # Check cache first if enabled
-        if self.use_cache:
-            cache_key = self._get_cache_key(prompt)
-            cached_response = self.llm_cache.get(cache_key)
-            if cached_response:
-                logger.info(f"Using cached response for {cache_key[:10]}...")
-                return cached_response
-        
+    def _invoke(self, prompt: str) -> str:
+        """Generate YAML response from OpenAI."""
         try:
             start_time = time.time()
             logger.info(f"Sending request to OpenAI model: {self.model}")
@@ -143,28 +627,121 @@ class OpenAIClient(LLMClient):
             logger.info(f"OpenAI response received in {duration:.2f}s")
             
             content = resp.choices[0].message.content
-            validated_content = self.validate_yaml(content)
+            return self._completion(self.validate_yaml(content), resp.get("usage"))
+            
+        except LLMError:
+            raise
+        except self._timeout_errors as e:
+            logger.error(f"OpenAI request timed out: {e}")
+            raise LLMTimeoutError(f"OpenAI request timed out: {e}")
+        except self._connection_errors as e:
+            logger.error(f"Failed to connect to OpenAI: {e}")
+            raise LLMConnectionError(f"Failed to connect to OpenAI: {e}")
+        except Exception as e:
+            logger.exception(f"Unexpected error in OpenAI request: {e}")
+            raise LLMError(f"OpenAI request failed: {e}")
+    
+    async def _ainvoke(self, prompt: str) -> str:
+        """Generate YAML response from OpenAI over the pooled async HTTP client."""
+        try:
+            start_time = time.time()
+            logger.info(f"Sending async request to OpenAI model: {self.model}")
             
-            # Store in cache if enabled
-            if self.use_cache:
-                cache_key = self._get_cache_key(prompt)
-                self.llm_cache.set(cache_key, validated_content)
-                logger.debug(f"Cached response with key {cache_key[:10]}...")
+            resp = await get_http_client().post(
+                f"{self.base_url}/chat/completions",
+                headers={"Authorization": f"Bearer {self._api_key}"},
+                json=self._chat_payload(prompt),
+            )
+            if resp.status_code in (401, 403):
+                raise LLMAuthenticationError(f"OpenAI rejected the API key: {resp.status_code}")
+            resp.raise_for_status()
             
-            return validated_content
+            duration = time.time() - start_time
+            logger.info(f"OpenAI response received in {duration:.2f}s")
             
-        except TimeoutError as e:
+            body = resp.json()
+            content = body["choices"][0]["message"]["content"]
+            return self._completion(self.validate_yaml(content), body.get("usage"))
+            
+        except LLMError:
+            raise
+        except httpx.TimeoutException as e:
             logger.error(f"OpenAI request timed out: {e}")
             raise LLMTimeoutError(f"OpenAI request timed out: {e}")
-        except ConnectionError as e:
+        except httpx.TransportError as e:
             logger.error(f"Failed to connect to OpenAI: {e}")
             raise LLMConnectionError(f"Failed to connect to OpenAI: {e}")
         except Exception as e:
             logger.exception(f"Unexpected error in OpenAI request: {e}")
             raise LLMError(f"OpenAI request failed: {e}")
+    
+    async def _astream_invoke(self, prompt: str) -> AsyncIterator[str]:
+        """Stream response tokens from OpenAI as server-sent events."""
+        try:
+            logger.info(f"Sending streaming request to OpenAI model: {self.model}")
+            async with get_http_client().stream(
+                "POST",
+                f"{self.base_url}/chat/completions",
+                headers={"Authorization": f"Bearer {self._api_key}"},
+                json=self._chat_payload(prompt, stream=True),
+            ) as resp:
+                if resp.status_code in (401, 403):
+                    raise LLMAuthenticationError(f"OpenAI rejected the API key: {resp.status_code}")
+                if resp.status_code >= 400:
+                    await resp.aread()
+                    resp.raise_for_status()
+                
+                async for line in resp.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    event = json.loads(data)
+                    if event.get("usage"):
+                        # Final event requested with stream_options.include_usage
+                        yield self._completion("", event["usage"])
+                    if not event.get("choices"):
+                        continue
+                    delta = event["choices"][0].get("delta", {}).get("content")
+                    if delta:
+                        yield delta
+                        
+        except LLMError:
+            raise
+        except httpx.TimeoutException as e:
+            logger.error(f"OpenAI stream timed out: {e}")
+            raise LLMTimeoutError(f"OpenAI request timed out: {e}")
+        except httpx.TransportError as e:
+            logger.error(f"Failed to connect to OpenAI: {e}")
+            raise LLMConnectionError(f"Failed to connect to OpenAI: {e}")
+        except Exception as e:
+            logger.exception(f"Unexpected error in OpenAI stream: {e}")
+            raise LLMError(f"OpenAI request failed: {e}")
+    
+    def _chat_payload(self, prompt: str, stream: bool = False) -> dict:
+        """Build the chat completions request body."""
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": 600,
+            "temperature": 0.3,
+        }
+        if stream:
+            payload["stream"] = True
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+    
+    @staticmethod
+    def _completion(content: str, usage: Optional[dict]) -> Completion:
+        """Attach the token counts from an OpenAI usage object."""
+        usage = usage or {}
+        return Completion(content, usage.get("prompt_tokens"), usage.get("completion_tokens"))
 
 # --- AWS Bedrock Adapter ----------------------------------------------------
-class BedrockClient(LLMClient):
+class BedrockClient(CachingLLMClient):
+    provider = "bedrock"
+    
     def __init__(self, model_id: Optional[str] = None, use_cache: bool = True):
         try:
             from .cache import llm_cache
@@ -172,7 +749,12 @@ class BedrockClient(LLMClient):
             self.llm_cache = llm_cache
 
             import boto3
-            self._client = boto3.client("bedrock-runtime")
+            from botocore.config import Config
+            # Size the connection pool for concurrent calls from agenerate()
+            self._client = boto3.client(
+                "bedrock-runtime",
+                config=Config(max_pool_connections=settings.LLM_HTTP_MAX_CONNECTIONS),
+            )
             self.model_id = model_id or os.getenv("BEDROCK_MODEL", "anthropic.claude-instant-v1")
             logger.info(f"AWS Bedrock client initialized with model: {self.model_id}")
         except ImportError:
@@ -180,59 +762,18 @@ class BedrockClient(LLMClient):
         except Exception as e:
             raise LLMConnectionError(f"Failed to initialize AWS Bedrock client: {e}")
     
-    def _get_cache_key(self, prompt: str) -> str:
-        """Generate a cache key for the prompt."""
-        # Use a hash of the prompt and model as the cache key
-        import hashlib
-        prompt_hash = hashlib.md5(prompt.encode()).hexdigest()
-        
-        # Create a semantic key for similar prompts
-        # Extract key elements from the prompt (module name and task description)
-        import re
-        module_match = re.search(r"using\s+([a-z0-9_.]+)", prompt, re.IGNORECASE)
-        module = module_match.group(1) if module_match else ""
-        
-        task_match = re.search(r"Task:\s*(.+?)(?:\n|$)", prompt, re.IGNORECASE)
-        task = task_match.group(1) if task_match else ""
-        
-        # Create a normalized task string (lowercase, remove stop words)
-        stop_words = {"a", "an", "the", "and", "or", "but", "in", "on", "at", "to", "for", "with"}
-        normalized_task = " ".join([word for word in task.lower().split() if word not in stop_words])
-        
-        # Create a semantic fingerprint
-        semantic_key = f"{module}:{normalized_task}"
-        semantic_hash = hashlib.md5(semantic_key.encode()).hexdigest()
-        
-        return f"bedrock:{self.model_id}:{prompt_hash}:{semantic_hash}"
+    @property
+    def model_name(self) -> str:
+        return self.model_id
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=2, max=30),
-        retry=retry_if_exception_type((ConnectionError, TimeoutError)),
-    )
-    def generate(self, prompt: str) -> str:
-        """Generate YAML response from AWS Bedrock with caching."""
-        # Check cache first if enabled
-        if self.use_cache:
-            cache_key = self._get_cache_key(prompt)
-            cached_response = self.llm_cache.get(cache_key)
-            if cached_response:
-                logger.info(f"Using cached response for {cache_key[:10]}...")
-                return cached_response
-        
+    def _invoke(self, prompt: str) -> str:
+        """Generate YAML response from AWS Bedrock."""
         try:
             start_time = time.time()
             logger.info(f"Sending request to AWS Bedrock model: {self.model_id}")
             
-            payload = json.dumps({
-                "prompt": prompt,
-                "max_tokens_to_sample": 600,
-                "temperature": 0.3,
-                "top_p": 0.9,
-            })
-            
             resp = self._client.invoke_model(
-                body=payload,
+                body=self._payload(prompt),
                 modelId=self.model_id,
                 accept="application/json",
                 contentType="application/json"
@@ -241,17 +782,9 @@ class BedrockClient(LLMClient):
             duration = time.time() - start_time
             logger.info(f"AWS Bedrock response received in {duration:.2f}s")
             
-            body = resp["body"].read()
-            content = json.loads(body)["completion"]
-            validated_content = self.validate_yaml(content)
-            
-            # Store in cache if enabled
-            if self.use_cache:
-                cache_key = self._get_cache_key(prompt)
-                self.llm_cache.set(cache_key, validated_content)
-                logger.debug(f"Cached response with key {cache_key[:10]}...")
-            
-            return validated_content
+            body = json.loads(resp["body"].read())
+            content = self.validate_yaml(body["completion"])
+            return self._completion(content, body, resp.get("ResponseMetadata", {}).get("HTTPHeaders", {}))
             
         except TimeoutError as e:
             logger.error(f"AWS Bedrock request timed out: {e}")
@@ -265,20 +798,388 @@ class BedrockClient(LLMClient):
         except Exception as e:
             logger.exception(f"Unexpected error in AWS Bedrock request: {e}")
             raise LLMError(f"AWS Bedrock request failed: {e}")
+    
+    async def _astream_invoke(self, prompt: str) -> AsyncIterator[str]:
+        """Stream response chunks from AWS Bedrock.
+        
+        boto3's event stream is blocking, so it is read in the LLM thread pool
+        and handed to the event loop through a queue.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stopped = threading.Event()
+        end = object()
+        
+        def put(item) -> None:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                # The consumer stopped early and the loop has since closed
+                logger.warning(f"AWS Bedrock stream outlived its event loop, dropping {type(item).__name__}")
+        
+        def reader_done(future: asyncio.Future) -> None:
+            if not future.cancelled() and future.exception() is not None:
+                logger.error(f"AWS Bedrock stream reader failed: {future.exception()}")
+        
+        def pump():
+            try:
+                resp = self._client.invoke_model_with_response_stream(
+                    body=self._payload(prompt),
+                    modelId=self.model_id,
+                    accept="application/json",
+                    contentType="application/json"
+                )
+                for event in resp["body"]:
+                    if stopped.is_set():
+                        break
+                    chunk = event.get("chunk")
+                    if chunk:
+                        data = json.loads(chunk["bytes"])
+                        text = data.get("completion", "")
+                        metrics = data.get("amazon-bedrock-invocationMetrics")
+                        if metrics:
+                            # Sent with the last chunk
+                            text = Completion(text, metrics.get("inputTokenCount"),
+                                              metrics.get("outputTokenCount"))
+                        put(text)
+            except Exception as e:
+                put(e)
+            finally:
+                put(end)
+        
+        logger.info(f"Sending streaming request to AWS Bedrock model: {self.model_id}")
+        reader = asyncio.ensure_future(run_blocking(pump))
+        finished = False
+        try:
+            while True:
+                item = await queue.get()
+                if item is end:
+                    finished = True
+                    break
+                if isinstance(item, TimeoutError):
+                    raise LLMTimeoutError(f"AWS Bedrock request timed out: {item}")
+                if isinstance(item, ConnectionError):
+                    raise LLMConnectionError(f"Failed to connect to AWS Bedrock: {item}")
+                if isinstance(item, Exception):
+                    logger.error(f"AWS Bedrock stream failed: {item}")
+                    raise LLMError(f"AWS Bedrock request failed: {item}")
+                if item or isinstance(item, Completion):
+                    yield item
+        finally:
+            # Let the reader thread stop at the next event if we stopped early
+            stopped.set()
+            if finished:
+                # The pump has returned; raise anything it failed with
+                await reader
+            else:
+                # It returns at the next event; log a failure then
+                reader.add_done_callback(reader_done)
+    
+    @staticmethod
+    def _completion(content: str, body: dict, headers: dict) -> Completion:
+        """Attach token counts from the response body or Bedrock's token count headers."""
+        usage = body.get("usage") or {}
+        prompt_tokens = usage.get("input_tokens", headers.get("x-amzn-bedrock-input-token-count"))
+        completion_tokens = usage.get("output_tokens", headers.get("x-amzn-bedrock-output-token-count"))
+        return Completion(
+            content,
+            int(prompt_tokens) if prompt_tokens is not None else None,
+            int(completion_tokens) if completion_tokens is not None else None,
+        )
+    
+    @staticmethod
+    def _payload(prompt: str) -> str:
+        """Build the Bedrock request body."""
+        return json.dumps({
+            "prompt": prompt,
+            "max_tokens_to_sample": 600,
+            "temperature": 0.3,
+            "top_p": 0.9,
+        })
+
+# --- Fake Adapter -------------------------------------------------------------
+class FakeLLMClient(CachingLLMClient):
+    """Offline provider for load and latency testing.
+    
+    Answers with YAML built from the module options listed in the prompt,
+    after a latency drawn from a configurable distribution, and fails a
+    configurable share of calls with transient errors. Calls go through the
+    same cache, limiter, breaker, retry, hedging and usage-recording paths as
+    the real providers. Latencies and errors come from a seeded generator, so
+    a sequential run is reproducible; the YAML depends only on the prompt.
+    
+    Args:
+        latency_ms: Median latency in milliseconds
+        distribution: "constant", "uniform" or "lognormal"
+        spread: Relative spread (uniform: +/- fraction, lognormal: sigma)
+        error_rate: Fraction of calls that fail
+        completion_tokens: Reported completion tokens, 0 to derive them from the text
+        seed: Random seed
+    """
+    
+    provider = "fake"
+    
+    # Extra task keywords, picked per task so responses vary like a real model's
+    TEMPLATES = ({}, {"become": True}, {"tags": ["relia"]})
+    
+    def __init__(self, latency_ms: Optional[float] = None, distribution: Optional[str] = None,
+                 spread: Optional[float] = None, error_rate: Optional[float] = None,
+                 completion_tokens: Optional[int] = None, seed: Optional[int] = None,
+                 use_cache: bool = True):
+        from .cache import llm_cache
+        self.use_cache = use_cache
+        self.llm_cache = llm_cache
+        
+        self.model = "relia-fake"
+        self.latency_ms = settings.FAKE_LLM_LATENCY_MS if latency_ms is None else latency_ms
+        self.distribution = distribution or settings.FAKE_LLM_LATENCY_DISTRIBUTION
+        self.spread = settings.FAKE_LLM_LATENCY_SPREAD if spread is None else spread
+        self.error_rate = settings.FAKE_LLM_ERROR_RATE if error_rate is None else error_rate
+        self.completion_tokens = (settings.FAKE_LLM_COMPLETION_TOKENS
+                                  if completion_tokens is None else completion_tokens)
+        self._random = random.Random(settings.FAKE_LLM_SEED if seed is None else seed)
+        self._random_lock = threading.Lock()
+        logger.info(f"Fake LLM client initialized: {self.distribution} latency around "
+                    f"{self.latency_ms:.0f}ms, error rate {self.error_rate:.1%}")
+    
+    @property
+    def model_name(self) -> str:
+        return self.model
+    
+    def _invoke(self, prompt: str) -> str:
+        """Sleep for a sampled latency, then answer or fail."""
+        delay, error = self._sample()
+        time.sleep(delay)
+        if error:
+            raise error
+        return self._response(prompt)
+    
+    async def _ainvoke(self, prompt: str) -> str:
+        """Async variant of _invoke() that sleeps on the event loop."""
+        delay, error = self._sample()
+        await asyncio.sleep(delay)
+        if error:
+            raise error
+        return self._response(prompt)
+    
+    async def _astream_invoke(self, prompt: str) -> AsyncIterator[str]:
+        """Yield the response line by line, spreading the latency over the lines."""
+        delay, error = self._sample()
+        if error:
+            await asyncio.sleep(delay)
+            raise error
+        completion = self._response(prompt)
+        lines = completion.splitlines(keepends=True)
+        for line in lines:
+            await asyncio.sleep(delay / len(lines))
+            yield line
+        yield Completion("", completion.prompt_tokens, completion.completion_tokens)
+    
+    def _sample(self) -> Tuple[float, Optional[LLMError]]:
+        """Draw the latency in seconds and the error, if any, of one call."""
+        with self._random_lock:
+            if self.distribution == "constant":
+                latency_ms = self.latency_ms
+            elif self.distribution == "uniform":
+                latency_ms = self._random.uniform(self.latency_ms * (1 - self.spread),
+                                                  self.latency_ms * (1 + self.spread))
+            else:
+                latency_ms = self._random.lognormvariate(math.log(max(self.latency_ms, 1e-3)),
+                                                         self.spread)
+            failed = self._random.random() < self.error_rate
+            timed_out = self._random.random() < 0.5
+        error = None
+        if failed:
+            error = (LLMTimeoutError("Fake provider request timed out") if timed_out
+                     else LLMConnectionError("Failed to connect to fake provider"))
+        return max(0.0, latency_ms) / 1000, error
+    
+    def _response(self, prompt: str) -> Completion:
+        """Build YAML for the task (or numbered tasks) in the prompt."""
+        module_match = re.search(r"using\s+([A-Za-z0-9_.]+)", prompt)
+        module = module_match.group(1).rstrip(".,") if module_match else "ansible.builtin.debug"
+        options = self._parse_options(prompt)
+        
+        batch = re.search(r"^Tasks:\n(.*?)(?:\nReturn YAML|\Z)", prompt, re.MULTILINE | re.DOTALL)
+        if batch:
+            tasks = re.findall(r"^(\d+)\.\s+(.+)$", batch.group(1), re.MULTILINE)
+            content = "".join(f"# task {number}\n{self._task_yaml(module, options, task)}"
+                              for number, task in tasks)
+        else:
+            task_match = re.search(r"Task:\s*(.+)", prompt)
+            content = self._task_yaml(module, options, task_match.group(1) if task_match else module)
+        
+        content = self.validate_yaml(content)
+        completion_tokens = self.completion_tokens or len(content) // 4
+        return Completion(content, len(prompt) // 4, completion_tokens)
+    
+    def _task_yaml(self, module: str, options: Dict[str, Dict[str, Any]], task: str) -> str:
+        """Render one task setting the required options (or the first one)."""
+        names = [name for name, option in options.items() if option.get("required")]
+        if not names and options:
+            names = [next(iter(options))]
+        task = task.strip()
+        entry: Dict[str, Any] = {"name": task}
+        entry[module] = {name: self._option_value(name, options[name]) for name in names}
+        entry.update(self.TEMPLATES[zlib.crc32(task.encode("utf-8")) % len(self.TEMPLATES)])
+        return yaml.safe_dump([entry], sort_keys=False)
+    
+    @staticmethod
+    def _option_value(name: str, option: Dict[str, Any]) -> Any:
+        """Pick a value that matches the option's choices or type."""
+        if option.get("choices"):
+            return option["choices"][0]
+        option_type = option.get("type", "str")
+        if option_type == "bool":
+            return True
+        if option_type in ("int", "float"):
+            return 1
+        if option_type == "list":
+            return [f"{name}-item"]
+        if option_type == "dict":
+            return {}
+        if option_type == "path" or name in ("path", "dest", "src", "file"):
+            return f"/tmp/relia/{name}"
+        return f"example-{name}"
+    
+    @staticmethod
+    def _parse_options(prompt: str) -> Dict[str, Dict[str, Any]]:
+        """Read the module options from the prompt's Parameters section.
+        
+        Understands both the compact digest and the full options JSON.
+        """
+        section = re.search(r"^Parameters:\n(.*?)\nTasks?:", prompt, re.MULTILINE | re.DOTALL)
+        if not section:
+            return {}
+        text = section.group(1)
+        try:
+            options = json.loads(text)
+            if isinstance(options, dict):
+                return {name: option or {} for name, option in options.items()}
+        except json.JSONDecodeError:
+            pass
+        
+        options: Dict[str, Dict[str, Any]] = {}
+        for match in re.finditer(r"^- ([\w-]+): ([^;\n]*)", text, re.MULTILINE):
+            flags = [flag.strip() for flag in match.group(2).split(", ")]
+            option: Dict[str, Any] = {"type": flags[0].split("[")[0] or "str"}
+            for flag in flags[1:]:
+                if flag == "required":
+                    option["required"] = True
+                elif flag.startswith("choices "):
+                    option["choices"] = flag[len("choices "):].split("|")
+            options[match.group(1)] = option
+        return options
+
+# --- Failover ---------------------------------------------------------------
+class FailoverClient(LLMClient):
+    """Composite client that tries providers in order of preference.
+    
+    Providers whose circuit breaker is open are skipped without waiting, and a
+    provider error moves the request on to the next provider. Invalid YAML is
+    not a provider failure and is raised as-is.
+    """
+    
+    def __init__(self, clients: List[CachingLLMClient]):
+        self.clients = clients
+        if settings.LLM_HEDGE_ALTERNATE and len(clients) > 1:
+            # Hedge each provider's slow calls with the next provider
+            for i, client in enumerate(clients):
+                client.hedge_to = clients[(i + 1) % len(clients)]
+    
+    @property
+    def model(self) -> str:
+        """Model of the preferred provider."""
+        return self.clients[0].model_name
+    
+    def generate(self, prompt: str) -> str:
+        """Generate a YAML response from the first healthy provider."""
+        last_error: Optional[LLMError] = None
+        for client in self._available_clients():
+            try:
+                return client.generate(prompt)
+            except LLMValidationError:
+                raise
+            except LLMError as e:
+                logger.warning(f"LLM provider {client.provider} failed, failing over: {e}")
+                last_error = e
+        raise last_error or LLMCircuitOpenError("All LLM providers are unavailable")
+    
+    async def agenerate(self, prompt: str) -> str:
+        """Async variant of generate()."""
+        last_error: Optional[LLMError] = None
+        for client in self._available_clients():
+            try:
+                return await client.agenerate(prompt)
+            except LLMValidationError:
+                raise
+            except LLMError as e:
+                logger.warning(f"LLM provider {client.provider} failed, failing over: {e}")
+                last_error = e
+        raise last_error or LLMCircuitOpenError("All LLM providers are unavailable")
+    
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        """Stream from the first healthy provider.
+        
+        A provider error fails over only if nothing has been streamed yet.
+        """
+        last_error: Optional[LLMError] = None
+        for client in self._available_clients():
+            started = False
+            try:
+                async for chunk in client.astream(prompt):
+                    started = True
+                    yield chunk
+                return
+            except LLMValidationError:
+                raise
+            except LLMError as e:
+                if started:
+                    raise
+                logger.warning(f"LLM provider {client.provider} failed, failing over: {e}")
+                last_error = e
+        raise last_error or LLMCircuitOpenError("All LLM providers are unavailable")
+    
+    def _available_clients(self) -> List[CachingLLMClient]:
+        """Clients whose breaker currently lets calls through, in preference order."""
+        return [client for client in self.clients if client.breaker.allow_request()]
 
 # --- Factory ---------------------------------------------------------------
+PROVIDERS = {
+    "openai": OpenAIClient,
+    "bedrock": BedrockClient,
+    "fake": FakeLLMClient,
+}
+
+# Providers that are never used as failover targets for a real provider
+OFFLINE_PROVIDERS = {"fake"}
+
 def get_client() -> LLMClient:
-    """Return an LLMClient based on RELIA_LLM env ("bedrock" or default OpenAI)."""
+    """Return an LLMClient based on RELIA_LLM env ("bedrock", "fake" or default OpenAI).
+    
+    With RELIA_LLM_FAILOVER enabled, the other providers that can be
+    initialized are added as fallbacks behind the configured one. The offline
+    fake provider is never added as a fallback.
+    """
     try:
         provider = os.getenv("RELIA_LLM", "openai").lower()
         logger.info(f"Initializing LLM client for provider: {provider}")
         
-        if provider == "bedrock":
-            return BedrockClient()
-        elif provider == "openai":
-            return OpenAIClient()
-        else:
+        if provider not in PROVIDERS:
             raise LLMError(f"Unsupported LLM provider: {provider}")
+        if not settings.LLM_FAILOVER:
+            return PROVIDERS[provider]()
+        
+        clients = []
+        fallbacks = [p for p in PROVIDERS if p != provider and p not in OFFLINE_PROVIDERS]
+        for name in [provider] + fallbacks:
+            try:
+                clients.append(PROVIDERS[name]())
+            except LLMError as e:
+                logger.warning(f"LLM provider {name} unavailable for failover: {e}")
+        if not clients:
+            raise LLMError("No LLM provider could be initialized")
+        return clients[0] if len(clients) == 1 else FailoverClient(clients)
     except Exception as e:
         logger.exception(f"Failed to initialize LLM client: {e}")
         raise
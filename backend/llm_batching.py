@@ -0,0 +1,227 @@
+"""
+Micro-batching of playbook generation requests.
+
+Bulk clients often send many /v1/generate requests for the same module within
+a few milliseconds of each other. The batcher holds each request for a short
+window and sends the requests for the same module that arrived in it as one
+multi-task prompt, so the module's options are sent once and N requests take a
+single limiter slot and provider call. The response is split back into one
+YAML document per task and validated for each caller.
+
+A request whose part of the response is missing or invalid, or every request
+of a batch whose response is not valid YAML at all, is retried on its own with
+its single-task prompt.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .config import settings
+from .llm_adapter import LLMClient, LLMValidationError, current_user, user_context
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Marker the LLM is asked to put before each task's YAML
+TASK_MARKER = re.compile(r"^[ \t]*#[ \t]*task[ \t]+(\d+)[ \t]*:?[ \t]*$", re.IGNORECASE | re.MULTILINE)
+
+def build_batch_prompt(module: str, options: str, tasks: List[str]) -> str:
+    """Create a prompt asking for one Ansible task per entry of tasks.
+
+    Args:
+        module: Module all tasks use
+        options: Module parameters as listed in single-task prompts
+        tasks: Task descriptions, numbered from 1 in the prompt
+    """
+    numbered = "\n".join(f"{i}. {task}" for i, task in enumerate(tasks, 1))
+    return (
+        f"Generate {len(tasks)} separate Ansible tasks using {module}, "
+        f"one for each numbered task below.\n"
+        f"Parameters:\n{options}\n"
+        f"Tasks:\n{numbered}\n"
+        f"Return YAML only. Put a comment line \"# task <number>\" before the YAML of each task."
+    )
+
+def split_batch_response(content: str, count: int) -> List[Optional[str]]:
+    """Split a batched response into the YAML for each of count tasks.
+
+    Returns:
+        List of count entries, None where the response has no YAML for a task
+    """
+    parts: List[Optional[str]] = [None] * count
+    markers = list(TASK_MARKER.finditer(content))
+    for marker, following in zip(markers, markers[1:] + [None]):
+        number = int(marker.group(1))
+        end = following.start() if following else len(content)
+        text = content[marker.end():end].strip()
+        if 1 <= number <= count and text and parts[number - 1] is None:
+            parts[number - 1] = text + "\n"
+    return parts
+
+@dataclass
+class _Request:
+    task: str
+    prompt: str
+    user_id: Optional[str]
+    future: asyncio.Future
+
+@dataclass
+class _Batch:
+    client: LLMClient
+    module: str
+    options: str
+    requests: List[_Request] = field(default_factory=list)
+    timer: Optional[asyncio.TimerHandle] = None
+
+class GenerationBatcher:
+    """Groups generation requests for the same module into batched LLM calls.
+
+    Args:
+        window_seconds: How long the first request of a batch waits for others
+        max_size: Batch size at which a batch is sent without waiting
+    """
+
+    def __init__(self, window_seconds: float = 0.05, max_size: int = 8):
+        self.window_seconds = window_seconds
+        self.max_size = max_size
+        self._batches: Dict[Tuple[Any, ...], _Batch] = {}
+        self._lock = threading.Lock()
+        # Batches being sent; the event loop only keeps weak references to tasks
+        self._sending: Set[asyncio.Future] = set()
+
+        # Counters
+        self._requests = 0
+        self._batches_sent = 0
+        self._batched_requests = 0
+        self._fallbacks = 0
+
+    async def agenerate(self, client: LLMClient, module: str, task: str, prompt: str,
+                        options: str) -> str:
+        """Generate the YAML for one task, batched with concurrent requests.
+
+        Args:
+            client: LLM client to call
+            module: Module the task uses; only requests for the same module are batched
+            task: Task description from the user
+            prompt: Complete single-task prompt, used when the request is sent alone
+            options: Module parameters text shared by all prompts for the module
+
+        Returns:
+            The validated YAML for this task
+        """
+        loop = asyncio.get_running_loop()
+        request = _Request(task, prompt, current_user(), loop.create_future())
+        key = (loop, type(client), getattr(client, "model", None), module, options)
+        with self._lock:
+            self._requests += 1
+            batch = self._batches.get(key)
+            if batch is None:
+                batch = self._batches[key] = _Batch(client, module, options)
+                batch.timer = loop.call_later(self.window_seconds, self._flush, key, batch)
+            batch.requests.append(request)
+            full = len(batch.requests) >= self.max_size
+        if full:
+            batch.timer.cancel()
+            self._flush(key, batch)
+        return await request.future
+
+    def _flush(self, key: Tuple[Any, ...], batch: _Batch) -> None:
+        """Close a batch to new requests and send it."""
+        with self._lock:
+            if self._batches.get(key) is not batch:
+                return
+            del self._batches[key]
+        task = asyncio.ensure_future(self._send(batch))
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+
+    async def _send(self, batch: _Batch) -> None:
+        """Call the LLM for a batch and resolve each request's future."""
+        requests = [r for r in batch.requests if not r.future.done()]
+        if not requests:
+            return
+        if len(requests) == 1:
+            await self._send_single(batch.client, requests[0])
+            return
+
+        with self._lock:
+            self._batches_sent += 1
+            self._batched_requests += len(requests)
+        logger.info(f"Sending {len(requests)} {batch.module} generation requests as one batch")
+
+        prompt = build_batch_prompt(batch.module, batch.options, [r.task for r in requests])
+        try:
+            # The batch is sent from its own task; queue it as its first requester's call
+            with user_context(requests[0].user_id):
+                content = await batch.client.agenerate(prompt)
+            parts = split_batch_response(content, len(requests))
+        except LLMValidationError as e:
+            logger.warning(f"Batched {batch.module} response was invalid, retrying singly: {e}")
+            parts = [None] * len(requests)
+        except Exception as e:
+            for request in requests:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+
+        retries = []
+        for request, part in zip(requests, parts):
+            if request.future.done():
+                continue
+            yaml_content = self._validated(batch.client, part)
+            if yaml_content is None:
+                retries.append(request)
+            else:
+                request.future.set_result(yaml_content)
+
+        if retries:
+            with self._lock:
+                self._fallbacks += len(retries)
+            await asyncio.gather(*(self._send_single(batch.client, r) for r in retries))
+
+    @staticmethod
+    def _validated(client: LLMClient, part: Optional[str]) -> Optional[str]:
+        """Return part if it is valid YAML, otherwise None."""
+        if part is None:
+            return None
+        try:
+            return client.validate_yaml(part)
+        except LLMValidationError:
+            return None
+
+    @staticmethod
+    async def _send_single(client: LLMClient, request: _Request) -> None:
+        """Generate one request with its single-task prompt."""
+        try:
+            with user_context(request.user_id):
+                result = await client.agenerate(request.prompt)
+        except Exception as e:
+            if not request.future.done():
+                request.future.set_exception(e)
+        else:
+            if not request.future.done():
+                request.future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get request, batch and fallback counts."""
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "batches": self._batches_sent,
+                "batched_requests": self._batched_requests,
+                "avg_batch_size": round(self._batched_requests / self._batches_sent, 2)
+                                  if self._batches_sent else 0.0,
+                "fallbacks": self._fallbacks,
+                "pending": sum(len(b.requests) for b in self._batches.values()),
+            }
+
+# Global batcher used by the playbook service
+generation_batcher = GenerationBatcher(
+    window_seconds=settings.LLM_BATCH_WINDOW,
+    max_size=settings.LLM_BATCH_MAX_SIZE,
+)
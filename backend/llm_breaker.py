@@ -0,0 +1,222 @@
+"""
+Circuit breakers for LLM providers.
+
+A breaker tracks the outcome and latency of a provider's recent calls. When
+too many of them fail or are slow it opens, and calls to that provider are
+rejected at once instead of waiting through retries and timeouts. After a
+cool-down it lets a single probe call through (half-open); the probe's outcome
+decides whether the breaker closes again or stays open for another cool-down.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from .config import settings
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+class BreakerState(str, Enum):
+    """Circuit breaker states."""
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+@dataclass(frozen=True)
+class Permit:
+    """Permission for one call; probe is set for the half-open probe call."""
+    probe: bool = False
+
+class CircuitBreaker:
+    """Error-rate and latency based circuit breaker.
+
+    Args:
+        name: Name of the protected provider
+        window: Number of recent calls considered
+        min_calls: Calls required in the window before the breaker can open
+        failure_rate: Fraction of failed calls that opens the breaker
+        slow_call_seconds: Calls taking at least this long count as slow
+        slow_call_rate: Fraction of slow calls that opens the breaker
+        open_seconds: Cool-down before a probe call is allowed
+    """
+
+    def __init__(self, name: str, window: int = 20, min_calls: int = 5,
+                 failure_rate: float = 0.5, slow_call_seconds: float = 20.0,
+                 slow_call_rate: float = 0.8, open_seconds: float = 30.0):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self._lock = threading.Lock()
+        # (succeeded, slow) for each recent call
+        self._calls: Deque[Tuple[bool, bool]] = deque(maxlen=window)
+        self._state = BreakerState.CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self._times_opened = 0
+        self._rejected = 0
+
+    @property
+    def state(self) -> BreakerState:
+        """Current state, moving from open to half-open once the cool-down ends."""
+        with self._lock:
+            return self._current_state()
+
+    def allow_request(self) -> bool:
+        """Check whether a call would currently be let through, without reserving it."""
+        with self._lock:
+            state = self._current_state()
+            return state == BreakerState.CLOSED or (state == BreakerState.HALF_OPEN and not self._probing)
+
+    def try_acquire(self) -> Optional[Permit]:
+        """Reserve permission for a call.
+
+        Always succeeds while closed; in half-open state only one probe call
+        is allowed at a time. Every permit must be passed back, with its probe
+        flag, to record_success(), record_failure() or release().
+
+        Returns:
+            The permit, or None if the call is rejected
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == BreakerState.CLOSED:
+                return Permit()
+            if state == BreakerState.HALF_OPEN and not self._probing:
+                self._probing = True
+                return Permit(probe=True)
+            self._rejected += 1
+            return None
+
+    def record_success(self, duration: float, probe: bool = False) -> None:
+        """Record a completed call and its duration.
+
+        Only the probe decides a half-open breaker; calls let through while
+        it was closed that finish after it opened are ignored.
+        """
+        with self._lock:
+            if not self._counts(probe):
+                return
+            if self._state == BreakerState.HALF_OPEN:
+                self._probing = False
+                if duration < self.slow_call_seconds:
+                    logger.info(f"Circuit breaker for {self.name} closed")
+                    self._state = BreakerState.CLOSED
+                    self._calls.clear()
+                else:
+                    self._open()
+                return
+            self._calls.append((True, duration >= self.slow_call_seconds))
+            self._evaluate()
+
+    def record_failure(self, duration: float, probe: bool = False) -> None:
+        """Record a failed call; like record_success(), only the probe decides a half-open breaker."""
+        with self._lock:
+            if not self._counts(probe):
+                return
+            if self._state == BreakerState.HALF_OPEN:
+                self._probing = False
+                self._open()
+                return
+            self._calls.append((False, duration >= self.slow_call_seconds))
+            self._evaluate()
+
+    def release(self, probe: bool = False) -> None:
+        """Give back a permit without recording an outcome (e.g. a cancelled call)."""
+        with self._lock:
+            if probe and self._state == BreakerState.HALF_OPEN:
+                self._probing = False
+
+    def _counts(self, probe: bool) -> bool:
+        """Whether a call's outcome is recorded; must be called with the lock held."""
+        if self._state == BreakerState.CLOSED:
+            return True
+        return probe and self._state == BreakerState.HALF_OPEN and self._probing
+
+    def reset(self) -> None:
+        """Close the breaker and forget recent calls."""
+        with self._lock:
+            self._state = BreakerState.CLOSED
+            self._calls.clear()
+            self._probing = False
+
+    def _current_state(self) -> BreakerState:
+        """Must be called with the lock held."""
+        if (self._state == BreakerState.OPEN
+                and time.monotonic() - self._opened_at >= self.open_seconds):
+            self._state = BreakerState.HALF_OPEN
+            self._probing = False
+        return self._state
+
+    def _evaluate(self) -> None:
+        """Open the breaker if the window's error or slow-call rate is too high."""
+        total = len(self._calls)
+        if total < self.min_calls:
+            return
+        failures = sum(1 for ok, _ in self._calls if not ok)
+        slow = sum(1 for _, is_slow in self._calls if is_slow)
+        if failures / total >= self.failure_rate or slow / total >= self.slow_call_rate:
+            logger.warning(f"Circuit breaker for {self.name} opened: "
+                           f"{failures}/{total} failed, {slow}/{total} slow")
+            self._open()
+
+    def _open(self) -> None:
+        self._state = BreakerState.OPEN
+        self._opened_at = time.monotonic()
+        self._times_opened += 1
+        self._calls.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the breaker state and recent call counts."""
+        with self._lock:
+            state = self._current_state()
+            total = len(self._calls)
+            failures = sum(1 for ok, _ in self._calls if not ok)
+            slow = sum(1 for _, is_slow in self._calls if is_slow)
+            retry_in = None
+            if state == BreakerState.OPEN:
+                retry_in = round(max(0.0, self.open_seconds - (time.monotonic() - self._opened_at)), 1)
+            return {
+                "state": state.value,
+                "recent_calls": total,
+                "failure_rate": round(failures / total, 3) if total else 0.0,
+                "slow_call_rate": round(slow / total, 3) if total else 0.0,
+                "times_opened": self._times_opened,
+                "rejected": self._rejected,
+                "retry_in_seconds": retry_in,
+            }
+
+# Global registry, one breaker per provider
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    """Get the shared breaker for a provider, creating it from settings."""
+    with _breakers_lock:
+        breaker = _breakers.get(provider)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                provider,
+                window=settings.LLM_BREAKER_WINDOW,
+                min_calls=settings.LLM_BREAKER_MIN_CALLS,
+                failure_rate=settings.LLM_BREAKER_FAILURE_RATE,
+                slow_call_seconds=settings.LLM_BREAKER_SLOW_CALL_SECONDS,
+                slow_call_rate=settings.LLM_BREAKER_SLOW_CALL_RATE,
+                open_seconds=settings.LLM_BREAKER_OPEN_SECONDS,
+            )
+            _breakers[provider] = breaker
+        return breaker
+
+def get_breaker_stats() -> Dict[str, Dict[str, Any]]:
+    """Get stats for every provider breaker created so far."""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.stats() for breaker in breakers}
@@ -0,0 +1,122 @@
+"""
+Hedged LLM requests.
+
+A hedged call starts the primary request and, if it has not answered within a
+delay taken from a percentile of the provider's recent latencies, sends a
+second (hedge) request. Whichever answers first wins and the other is
+cancelled. This trims the tail latency caused by the occasional very slow
+provider response at the cost of a few extra calls.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Deque, Dict, Generic, Optional, TypeVar
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class LatencyTracker:
+    """Sliding window of a provider's recent call latencies in seconds."""
+
+    def __init__(self, window: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        """Add a latency sample."""
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Return the pct-th percentile of recent latencies, or None if empty."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * pct / 100))
+        return samples[index]
+
+    def mean_above(self, threshold: float) -> Optional[float]:
+        """Return the mean of recent latencies above threshold, or None if there are none."""
+        with self._lock:
+            slow = [s for s in self._samples if s > threshold]
+        return sum(slow) / len(slow) if slow else None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._samples)
+
+@dataclass
+class HedgeResult(Generic[T]):
+    """Outcome of a hedged call."""
+    value: T
+    hedged: bool = False
+    hedge_won: bool = False
+    latency_saved_ms: int = 0
+
+async def hedged_call(primary: Callable[[], Awaitable[T]], hedge: Callable[[], Awaitable[T]],
+                      delay: float, tracker: LatencyTracker) -> HedgeResult[T]:
+    """Run primary(), starting hedge() as well if primary is slower than delay.
+
+    The first successful result wins and the other request is cancelled. If
+    one request fails, the other one's result is used; if both fail the last
+    error is raised.
+
+    When the hedge wins, the primary's elapsed time is recorded in tracker as a
+    lower bound of its latency (so cancelled slow calls still count), and the
+    latency saved is estimated from the mean of recent calls slower than the
+    hedge delay.
+    """
+    start = time.monotonic()
+    first = asyncio.ensure_future(primary())
+    pending = {first}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        if done:
+            return HedgeResult(first.result())
+
+        logger.info(f"LLM request exceeded {delay:.2f}s, sending hedge request")
+        second = asyncio.ensure_future(hedge())
+        pending.add(second)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winner = next((task for task in done if task.exception() is None), None)
+            if winner is None:
+                error = next(iter(done)).exception()
+                continue
+
+            elapsed = time.monotonic() - start
+            saved = 0
+            if winner is second:
+                # Estimate before recording, so this call's own latency is not
+                # part of the baseline it is compared with
+                expected = tracker.mean_above(delay)
+                if expected is not None:
+                    saved = max(0, int((expected - elapsed) * 1000))
+                tracker.record(elapsed)
+            return HedgeResult(winner.result(), hedged=True,
+                               hedge_won=winner is second, latency_saved_ms=saved)
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+# Global registry, one tracker per provider
+_trackers: Dict[str, LatencyTracker] = {}
+_trackers_lock = threading.Lock()
+
+def get_latency_tracker(provider: str) -> LatencyTracker:
+    """Get the shared latency tracker for a provider."""
+    with _trackers_lock:
+        tracker = _trackers.get(provider)
+        if tracker is None:
+            tracker = _trackers[provider] = LatencyTracker()
+        return tracker
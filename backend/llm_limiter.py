@@ -0,0 +1,285 @@
+"""
+Concurrency and token-rate governor for LLM provider calls.
+
+Each provider gets one LLMLimiter that caps the number of calls in flight and
+the estimated tokens sent per minute. Callers that cannot start immediately
+wait in a fair queue: waiters are grouped by user_id and users are served
+round-robin, so one user submitting a burst cannot starve everyone else.
+Waiters that are not admitted within the queue timeout get QueueTimeoutError
+instead of piling onto a provider that is already rate limiting.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Deque, Dict, Optional
+
+from .config import settings
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Completion budget requested from every provider (max_tokens)
+COMPLETION_TOKENS = 600
+
+ANONYMOUS = "anonymous"
+
+class QueueTimeoutError(TimeoutError):
+    """Raised when a caller waits longer than the queue timeout for a slot."""
+
+def estimate_tokens(prompt: str, completion_tokens: int = COMPLETION_TOKENS) -> int:
+    """Estimate the tokens a call will consume (about four characters per token)."""
+    return len(prompt) // 4 + completion_tokens
+
+class _Waiter:
+    """A queued caller, woken through an Event (threads) or a Future (coroutines)."""
+
+    __slots__ = ("tokens", "event", "future", "loop", "granted")
+
+    def __init__(self, tokens: int, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.tokens = tokens
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+        self.granted = False
+
+    def wake(self) -> None:
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self) -> None:
+        if not self.future.done():
+            self.future.set_result(True)
+
+class LLMLimiter:
+    """Per-provider limit on concurrent calls and tokens per minute.
+
+    Args:
+        provider: Provider name, used in logs and stats
+        max_concurrency: Maximum calls in flight at once
+        tokens_per_minute: Token budget per minute, 0 for no limit
+        queue_timeout: Seconds a caller may wait for a slot
+    """
+
+    def __init__(self, provider: str, max_concurrency: int = 8,
+                 tokens_per_minute: int = 0, queue_timeout: float = 30.0):
+        self.provider = provider
+        self.max_concurrency = max(1, max_concurrency)
+        self.tokens_per_minute = max(0, tokens_per_minute)
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._queues: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self._in_flight = 0
+        self._tokens = float(self.tokens_per_minute)
+        self._refilled_at = time.monotonic()
+        self._timer: Optional[threading.Timer] = None
+
+        # Counters
+        self._acquired = 0
+        self._queued = 0
+        self._timeouts = 0
+        self._wait_seconds = 0.0
+        self._max_wait = 0.0
+
+    @contextmanager
+    def slot(self, prompt: str, user_id: Optional[str] = None):
+        """Hold a call slot for the duration of the block (blocking)."""
+        self.acquire(prompt, user_id)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self, prompt: str, user_id: Optional[str] = None):
+        """Async variant of slot() that waits without blocking the event loop."""
+        await self.aacquire(prompt, user_id)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def acquire(self, prompt: str, user_id: Optional[str] = None) -> int:
+        """Wait for a call slot and return the tokens reserved for it.
+
+        Raises:
+            QueueTimeoutError: If no slot is free within the queue timeout
+        """
+        start = time.monotonic()
+        waiter = self._enqueue(prompt, user_id, None)
+        if not waiter.granted:
+            waiter.event.wait(self.queue_timeout)
+            self._check_granted(waiter, user_id, start)
+        self._record_wait(start)
+        return waiter.tokens
+
+    async def aacquire(self, prompt: str, user_id: Optional[str] = None) -> int:
+        """Async variant of acquire()."""
+        start = time.monotonic()
+        waiter = self._enqueue(prompt, user_id, asyncio.get_running_loop())
+        if not waiter.granted:
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                if not self._abandon(waiter, user_id):
+                    self.release()
+                raise
+            self._check_granted(waiter, user_id, start)
+        self._record_wait(start)
+        return waiter.tokens
+
+    def release(self) -> None:
+        """Return a call slot and admit the next waiter."""
+        with self._lock:
+            self._in_flight -= 1
+            self._dispatch()
+
+    def _enqueue(self, prompt: str, user_id: Optional[str],
+                 loop: Optional[asyncio.AbstractEventLoop]) -> _Waiter:
+        """Queue a waiter behind the caller's earlier requests and try to admit it."""
+        tokens = estimate_tokens(prompt)
+        if self.tokens_per_minute:
+            # A single oversized call must still fit into an empty bucket
+            tokens = min(tokens, self.tokens_per_minute)
+        waiter = _Waiter(tokens, loop)
+        with self._lock:
+            self._queues.setdefault(user_id or ANONYMOUS, deque()).append(waiter)
+            self._dispatch()
+            if not waiter.granted:
+                self._queued += 1
+        return waiter
+
+    def _check_granted(self, waiter: _Waiter, user_id: Optional[str], start: float) -> None:
+        """Raise QueueTimeoutError if the waiter was not admitted in time."""
+        if self._abandon(waiter, user_id):
+            with self._lock:
+                self._timeouts += 1
+            waited = time.monotonic() - start
+            logger.warning(f"LLM queue timeout for {self.provider} after {waited:.1f}s "
+                           f"(user={user_id or ANONYMOUS})")
+            raise QueueTimeoutError(
+                f"Timed out after {waited:.1f}s waiting for a {self.provider} request slot"
+            )
+
+    def _abandon(self, waiter: _Waiter, user_id: Optional[str]) -> bool:
+        """Remove a waiter that gave up; returns False if it was admitted meanwhile."""
+        with self._lock:
+            if waiter.granted:
+                return False
+            key = user_id or ANONYMOUS
+            queue = self._queues.get(key)
+            if queue is not None:
+                queue.remove(waiter)
+                if not queue:
+                    del self._queues[key]
+            # The removed waiter may have been blocking the head of the line
+            self._dispatch()
+            return True
+
+    def _dispatch(self) -> None:
+        """Admit queued waiters, one user at a time, while capacity allows.
+
+        Must be called with the lock held.
+        """
+        while self._queues and self._in_flight < self.max_concurrency:
+            user_id, queue = next(iter(self._queues.items()))
+            waiter = queue[0]
+
+            if self.tokens_per_minute:
+                self._refill()
+                if self._tokens < waiter.tokens:
+                    rate = self.tokens_per_minute / 60.0
+                    self._schedule((waiter.tokens - self._tokens) / rate)
+                    return
+                self._tokens -= waiter.tokens
+
+            queue.popleft()
+            if queue:
+                # Round-robin: this user's next request goes behind other users
+                self._queues.move_to_end(user_id)
+            else:
+                del self._queues[user_id]
+
+            self._in_flight += 1
+            self._acquired += 1
+            waiter.granted = True
+            waiter.wake()
+
+    def _refill(self) -> None:
+        """Add tokens earned since the last refill, up to one minute's budget."""
+        now = time.monotonic()
+        rate = self.tokens_per_minute / 60.0
+        self._tokens = min(float(self.tokens_per_minute),
+                           self._tokens + (now - self._refilled_at) * rate)
+        self._refilled_at = now
+
+    def _schedule(self, delay: float) -> None:
+        """Re-run dispatch once enough tokens have accumulated."""
+        if self._timer is not None and self._timer.is_alive():
+            return
+        self._timer = threading.Timer(delay, self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_timer(self) -> None:
+        with self._lock:
+            self._timer = None
+            self._dispatch()
+
+    def _record_wait(self, start: float) -> None:
+        waited = time.monotonic() - start
+        with self._lock:
+            self._wait_seconds += waited
+            self._max_wait = max(self._max_wait, waited)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get current queue depth, in-flight calls and wait time counters."""
+        with self._lock:
+            if self.tokens_per_minute:
+                self._refill()
+            return {
+                "provider": self.provider,
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self._in_flight,
+                "queue_depth": sum(len(q) for q in self._queues.values()),
+                "queued_users": len(self._queues),
+                "tokens_per_minute": self.tokens_per_minute,
+                "tokens_available": int(self._tokens) if self.tokens_per_minute else None,
+                "acquired": self._acquired,
+                "queued": self._queued,
+                "timeouts": self._timeouts,
+                "avg_wait_ms": round(self._wait_seconds / self._acquired * 1000, 2) if self._acquired else 0.0,
+                "max_wait_ms": round(self._max_wait * 1000, 2),
+            }
+
+# Global registry, one limiter per provider
+_limiters: Dict[str, LLMLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(provider: str) -> LLMLimiter:
+    """Get the shared limiter for a provider, creating it from settings."""
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            limiter = LLMLimiter(
+                provider,
+                max_concurrency=settings.LLM_MAX_CONCURRENCY,
+                tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE,
+                queue_timeout=settings.LLM_QUEUE_TIMEOUT,
+            )
+            _limiters[provider] = limiter
+        return limiter
+
+def get_limiter_stats() -> Dict[str, Dict[str, Any]]:
+    """Get stats for every provider limiter created so far."""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.provider: limiter.stats() for limiter in limiters}
@@ -0,0 +1,391 @@
+"""
+Pool of warm Molecule instances.
+
+`molecule test` creates an instance, converges the playbook, checks it and
+destroys the instance on every run, and creating and destroying containers
+takes most of that time. The pool keeps instances created ahead of time for
+each image; a test only runs `molecule converge` on a free one.
+
+After a test the instance is reset in the background: destroyed and created
+again from its image, the clean snapshot every test starts from. Requests
+therefore never wait for container setup unless every instance of an image is
+busy or the image has not been used yet. Instances are health checked (a ping
+playbook run as Molecule's side effect) after each reset and when they have
+been idle for a while; unhealthy ones are destroyed and replaced.
+
+With driver "default" (Molecule's delegated driver) instances are unmanaged
+and converge runs against localhost, which allows using the pool without
+Docker, e.g. in tests.
+"""
+from __future__ import annotations
+
+import logging
+import re
+import shutil
+import subprocess
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from .config import settings
+from .tasks import TaskLog
+from . import process
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Seconds a molecule create, destroy or health check may take, unless the
+# test waiting for it runs out of time first
+COMMAND_TIMEOUT = 600
+
+HEALTH_PLAYBOOK = """---
+- name: Check instance
+  hosts: all
+  gather_facts: false
+  tasks:
+    - name: Ping
+      ansible.builtin.ping:
+"""
+
+class MoleculePoolError(Exception):
+    """Raised when the pool cannot provide an instance; run `molecule test` instead."""
+    pass
+
+@dataclass
+class _Instance:
+    """One warm instance and the Molecule project directory that manages it."""
+    image: str
+    name: str
+    path: Path
+    checked_at: float = 0.0
+    tests: int = 0
+
+    @property
+    def scenario_dir(self) -> Path:
+        return self.path / "molecule" / "default"
+
+def _molecule_config(name: str, image: str, driver: str) -> str:
+    """Return molecule.yml for a pooled instance."""
+    if driver == "docker":
+        driver_config = "driver:\n  name: docker\n"
+        platform = f"  - name: {name}\n    image: {image}\n"
+    else:
+        # Delegated driver: nothing to create, converge on localhost
+        driver_config = (
+            f"driver:\n  name: {driver}\n  options:\n    managed: false\n"
+            f"    ansible_connection_options:\n      ansible_connection: local\n"
+        )
+        platform = f"  - name: {name}\n"
+    return (
+        f"---\n{driver_config}platforms:\n{platform}"
+        f"provisioner:\n  name: ansible\n  playbooks:\n"
+        f"    converge: converge.yml\n    side_effect: health.yml\n"
+    )
+
+class MoleculePool:
+    """Warm Molecule instances per image, created on demand or ahead of time.
+
+    Args:
+        base_dir: Directory for the instances' Molecule projects
+        size: Maximum number of instances per image
+        driver: Molecule driver, "docker" or "default" (delegated, no Docker)
+        health_interval: Seconds after which an idle instance is checked again before use
+        run: Command runner, defaults to process.run
+    """
+
+    def __init__(self, base_dir: Path, size: int = 2, driver: str = "docker",
+                 health_interval: float = 300.0,
+                 run: Optional[Callable[..., subprocess.CompletedProcess]] = None):
+        self.base_dir = Path(base_dir)
+        self.size = size
+        self.driver = driver
+        self.health_interval = health_interval
+        self._run = run or process.run
+        self._ready: Dict[str, List[_Instance]] = {}
+        # Instances per image, including busy ones and ones being created or reset
+        self._counts: Dict[str, int] = {}
+        self._cond = threading.Condition()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._closed = False
+
+        # Counters
+        self._tests = 0
+        self._cold_starts = 0
+        self._created = 0
+        self._resets = 0
+        self._health_failures = 0
+
+    def available(self) -> bool:
+        """Whether tests can be run on the pool."""
+        return not self._closed and shutil.which("molecule") is not None
+
+    def test(self, image: str, playbook: Path, timeout: Optional[float] = None,
+             log: Optional[TaskLog] = None) -> subprocess.CompletedProcess:
+        """Converge a playbook on a warm instance of image.
+
+        Args:
+            image: Image the instance runs
+            playbook: Playbook to converge
+            timeout: Seconds to wait for a free instance and for the converge itself
+            log: Task log to stream the converge output to
+
+        Returns:
+            CompletedProcess of `molecule converge`
+
+        Raises:
+            MoleculePoolError: If no instance could be created
+            subprocess.TimeoutExpired: If no instance became free or the converge
+                did not finish within timeout
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        instance = self._checkout(image, deadline, timeout)
+        try:
+            remaining = self._time_left(deadline, timeout)
+        except subprocess.TimeoutExpired:
+            self._add_ready(instance)
+            raise
+        (instance.scenario_dir / "converge.yml").write_text(
+            f"---\n- import_playbook: {Path(playbook).resolve()}\n"
+        )
+        try:
+            proc = self._run(["molecule", "converge"], cwd=instance.path, timeout=remaining, log=log)
+        except BaseException:
+            self._submit(self._discard, instance)
+            raise
+        instance.tests += 1
+        with self._cond:
+            self._tests += 1
+        self._submit(self._reset, instance)
+        return proc
+
+    def warm(self, images: List[str]) -> None:
+        """Create instances for images in the background, up to size each."""
+        for image in images:
+            while self._reserve(image):
+                self._submit(self._provision, image)
+
+    def _checkout(self, image: str, deadline: Optional[float], timeout: Optional[float]) -> _Instance:
+        """Take a ready, healthy instance of image, creating one if the image has room."""
+        while True:
+            with self._cond:
+                while not self._ready.get(image) and not self._reserve(image):
+                    if self._closed:
+                        raise MoleculePoolError("Molecule pool is closed")
+                    self._cond.wait(self._time_left(deadline, timeout))
+                instance = self._ready[image].pop() if self._ready.get(image) else None
+
+            if instance is None:
+                try:
+                    create_timeout = self._time_left(deadline, timeout, COMMAND_TIMEOUT)
+                except subprocess.TimeoutExpired:
+                    self._release_slot(image)
+                    raise
+                # The first tests of an image pay for creating its instances
+                with self._cond:
+                    self._cold_starts += 1
+                try:
+                    return self._create(image, create_timeout)
+                except MoleculePoolError:
+                    self._release_slot(image)
+                    raise
+
+            if time.monotonic() - instance.checked_at < self.health_interval:
+                return instance
+            try:
+                check_timeout = self._time_left(deadline, timeout, COMMAND_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                self._add_ready(instance)
+                raise
+            if self._healthy(instance, check_timeout):
+                return instance
+            self._submit(self._discard, instance)
+
+    @staticmethod
+    def _time_left(deadline: Optional[float], timeout: Optional[float],
+                   limit: Optional[float] = None) -> Optional[float]:
+        """Seconds until deadline, at most limit.
+
+        Raises:
+            subprocess.TimeoutExpired: If the deadline has passed
+        """
+        if deadline is None:
+            return limit
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise subprocess.TimeoutExpired(["molecule", "converge"], timeout)
+        return remaining if limit is None else min(remaining, limit)
+
+    def _reserve(self, image: str) -> bool:
+        """Count a new instance of image if it has room."""
+        with self._cond:
+            if self._closed or self._counts.get(image, 0) >= self.size:
+                return False
+            self._counts[image] = self._counts.get(image, 0) + 1
+            return True
+
+    def _release_slot(self, image: str) -> None:
+        with self._cond:
+            self._counts[image] -= 1
+            self._cond.notify_all()
+
+    def _create(self, image: str, timeout: Optional[float] = COMMAND_TIMEOUT) -> _Instance:
+        """Write a Molecule project for a new instance and create it.
+
+        Raises:
+            MoleculePoolError: If the instance could not be created
+            subprocess.TimeoutExpired: If creating it took longer than timeout;
+                the instance is destroyed and its slot freed in the background
+        """
+        slug = re.sub(r"[^a-z0-9]+", "-", image.lower()).strip("-")
+        name = f"relia-{slug}-{uuid.uuid4().hex[:8]}"
+        instance = _Instance(image, name, self.base_dir / name)
+        instance.scenario_dir.mkdir(parents=True, exist_ok=True)
+        (instance.scenario_dir / "molecule.yml").write_text(_molecule_config(name, image, self.driver))
+        (instance.scenario_dir / "health.yml").write_text(HEALTH_PLAYBOOK)
+        # Replaced by each test's playbook
+        (instance.scenario_dir / "converge.yml").write_text(HEALTH_PLAYBOOK)
+        try:
+            proc = self._run(["molecule", "create"], cwd=instance.path, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self._submit(self._discard, instance)
+            raise
+        except (OSError, subprocess.SubprocessError) as e:
+            self._remove(instance)
+            raise MoleculePoolError(f"Could not create a {image} instance: {e}")
+        if proc.returncode != 0:
+            self._remove(instance)
+            raise MoleculePoolError(f"Could not create a {image} instance: molecule create exited with {proc.returncode}")
+        instance.checked_at = time.monotonic()
+        with self._cond:
+            self._created += 1
+        logger.info(f"Created warm Molecule instance {name} ({image})")
+        return instance
+
+    def _healthy(self, instance: _Instance, timeout: Optional[float] = COMMAND_TIMEOUT) -> bool:
+        """Run the health check playbook on an instance."""
+        try:
+            proc = self._run(["molecule", "side-effect"], cwd=instance.path, timeout=timeout)
+            healthy = proc.returncode == 0
+        except (OSError, subprocess.SubprocessError):
+            healthy = False
+        if healthy:
+            instance.checked_at = time.monotonic()
+        else:
+            logger.warning(f"Molecule instance {instance.name} failed its health check, replacing it")
+            with self._cond:
+                self._health_failures += 1
+        return healthy
+
+    def _provision(self, image: str) -> None:
+        """Background: create an instance and add it to the ready list."""
+        try:
+            instance = self._create(image)
+        except MoleculePoolError as e:
+            logger.warning(str(e))
+            self._release_slot(image)
+            return
+        except subprocess.TimeoutExpired as e:
+            logger.warning(f"Could not create a {image} instance: {e}")
+            return
+        self._add_ready(instance)
+
+    def _reset(self, instance: _Instance) -> None:
+        """Background: recreate a used instance from its image and return it to the pool."""
+        with self._cond:
+            self._resets += 1
+        self._destroy(instance)
+        if self._closed:
+            self._remove(instance)
+            self._release_slot(instance.image)
+            return
+        try:
+            proc = self._run(["molecule", "create"], cwd=instance.path, timeout=COMMAND_TIMEOUT)
+            created = proc.returncode == 0
+        except (OSError, subprocess.SubprocessError):
+            created = False
+        if created and self._healthy(instance):
+            self._add_ready(instance)
+        else:
+            self._discard(instance)
+
+    def _discard(self, instance: _Instance) -> None:
+        """Destroy an instance for good and free its slot."""
+        self._destroy(instance)
+        self._remove(instance)
+        self._release_slot(instance.image)
+
+    def _destroy(self, instance: _Instance) -> None:
+        try:
+            self._run(["molecule", "destroy"], cwd=instance.path, timeout=COMMAND_TIMEOUT)
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.warning(f"Could not destroy Molecule instance {instance.name}: {e}")
+
+    @staticmethod
+    def _remove(instance: _Instance) -> None:
+        shutil.rmtree(instance.path, ignore_errors=True)
+
+    def _add_ready(self, instance: _Instance) -> None:
+        with self._cond:
+            if not self._closed:
+                self._ready.setdefault(instance.image, []).append(instance)
+                self._cond.notify_all()
+                return
+        self._discard(instance)
+
+    def _submit(self, fn: Callable[..., None], *args: Any) -> None:
+        """Run instance upkeep in the background (inline once the pool is closed)."""
+        with self._cond:
+            if not self._closed and self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="molecule-pool")
+            executor = None if self._closed else self._executor
+        if executor is None:
+            fn(*args)
+        else:
+            executor.submit(fn, *args)
+
+    def close(self) -> None:
+        """Wait for background upkeep and destroy all instances."""
+        with self._cond:
+            self._closed = True
+            executor, self._executor = self._executor, None
+            self._cond.notify_all()
+        if executor is not None:
+            executor.shutdown(wait=True)
+        with self._cond:
+            instances = [i for ready in self._ready.values() for i in ready]
+            self._ready = {}
+        for instance in instances:
+            self._discard(instance)
+        with self._cond:
+            # Instances are created on demand again afterwards
+            self._closed = False
+
+    def stats(self) -> Dict[str, Any]:
+        """Get instance and test counts."""
+        with self._cond:
+            return {
+                "enabled": settings.MOLECULE_POOL_ENABLED,
+                "driver": self.driver,
+                "size": self.size,
+                "images": {
+                    image: {"ready": len(self._ready.get(image, [])), "instances": count}
+                    for image, count in self._counts.items()
+                },
+                "tests": self._tests,
+                "cold_starts": self._cold_starts,
+                "instances_created": self._created,
+                "resets": self._resets,
+                "health_failures": self._health_failures,
+            }
+
+# Global warm instance pool
+molecule_pool = MoleculePool(
+    settings.DATA_DIR / "molecule-pool",
+    size=settings.MOLECULE_POOL_SIZE,
+    driver=settings.MOLECULE_POOL_DRIVER,
+    health_interval=settings.MOLECULE_POOL_HEALTH_INTERVAL,
+)
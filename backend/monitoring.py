@@ -17,7 +17,13 @@ from enum import Enum
 import psutil
 
 from .config import settings
-from .llm_adapter import get_client, LLMError
+from .llm_adapter import get_client, FailoverClient, LLMError
+from .llm_batching import generation_batcher
+from .llm_breaker import BreakerState
+from .lint_pool import lint_pool
+from .molecule_pool import molecule_pool
+from .llm_limiter import get_limiter_stats
+from .usage_recorder import usage_recorder
 from . import database
 from . import tasks
 
@@ -355,7 +361,12 @@ class HealthCheck:
     
     @classmethod
     def check_llm_health(cls) -> Dict[str, Any]:
-        """Check LLM service health."""
+        """Check LLM service health.
+        
+        The client is only initialized, not called, to avoid costs. Provider
+        health comes from the circuit breakers: degraded if some providers'
+        breakers are open, unhealthy if all of them are.
+        """
         try:
             # Get LLM client
             llm_client = get_client()
@@ -369,9 +380,26 @@ class HealthCheck:
                 # Instead, we'll just check if the client can be initialized
                 duration_ms = (time.time() - start_time) * 1000
                 
+                clients = llm_client.clients if isinstance(llm_client, FailoverClient) else [llm_client]
+                breakers = {
+                    client.provider: client.breaker.stats()
+                    for client in clients if hasattr(client, "breaker")
+                }
+                open_count = sum(1 for b in breakers.values() if b["state"] == BreakerState.OPEN.value)
+                if breakers and open_count == len(breakers):
+                    health = HealthStatus.UNHEALTHY
+                elif open_count:
+                    health = HealthStatus.DEGRADED
+                else:
+                    health = HealthStatus.HEALTHY
+                
                 return {
-                    "status": HealthStatus.HEALTHY,
-                    "details": {"provider": llm_provider},
+                    "status": health,
+                    "details": {
+                        "provider": llm_provider,
+                        "providers": list(breakers),
+                        "breakers": breakers,
+                    },
                     "response_time_ms": duration_ms,
                 }
             except LLMError as e:
@@ -547,6 +575,7 @@ class Metrics:
                 "errors": 0,
                 "cache_hits": 0,
                 "cache_misses": 0,
+                "coalesced": 0,
             },
             "tasks": {
                 "created": 0,
@@ -592,6 +621,11 @@ class Metrics:
             else:
                 self.metrics["llm"]["cache_misses"] += 1
     
+    def record_coalesced(self, count: int = 1):
+        """Record requests that shared an in-flight LLM call instead of making their own."""
+        with self._lock:
+            self.metrics["llm"]["coalesced"] += count
+    
     def record_task_event(self, event_type: str):
         """Record a task event."""
         with self._lock:
@@ -622,7 +656,33 @@ class Metrics:
                 "process": SystemInfo.get_process_info(),
             })
             
-            return result
+        # Cache counters live in the caches themselves and are merged on read
+        result["caches"] = self.get_cache_metrics()
+        result["llm_queue"] = get_limiter_stats()
+        result["llm_usage_writer"] = usage_recorder.stats()
+        result["llm_batching"] = generation_batcher.stats()
+        result["lint_pool"] = lint_pool.stats()
+        result["molecule_pool"] = molecule_pool.stats()
+        return result
+    
+    @staticmethod
+    def get_cache_metrics() -> Dict[str, Any]:
+        """Get hit/miss/expiry/eviction counters for the global caches."""
+        from . import cache
+        
+        caches = {}
+        for name, instance in (("schema", cache.schema_cache), ("llm", cache.llm_cache),
+                               ("playbook", cache.playbook_cache), ("lint", cache.lint_cache)):
+            try:
+                stats = instance.stats()
+                caches[name] = {
+                    key: stats.get(key)
+                    for key in ("size", "bytes", "hits", "misses", "hit_ratio",
+                                "expirations", "evictions", "by_prefix")
+                }
+            except Exception as e:
+                logger.error(f"Failed to collect {name} cache metrics: {e}")
+        return caches
     
     def reset_metrics(self):
         """Reset all metrics."""
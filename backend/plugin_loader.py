@@ -7,20 +7,32 @@ Features:
 - Caching of schemas to improve performance
 - Lazy loading option to defer loading until needed
 - Validation of schema format
+- Compact option digests for LLM prompts, built once per schema
 """
 import json
 import os
+import re
 import logging
 import hashlib
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict, Any, Optional, Set
+from typing import Dict, Any, List, Optional, Set, Tuple
 from datetime import datetime
 
 from .cache import schema_cache, cached
+from .config import settings
 
 # Configure logger
 logger = logging.getLogger(__name__)
 
+# Prompt digests of loaded schemas by schema identity, kept out of the schema
+# dicts because those are returned to clients unchanged. Each entry holds its
+# schema so the id cannot be reused while the entry exists.
+MAX_PROMPT_DIGESTS = 4096
+_prompt_digests: "OrderedDict[int, Tuple[Dict[str, Any], Dict[str, Any]]]" = OrderedDict()
+_prompt_digests_lock = threading.Lock()
+
 def _get_schema_hash(base_dir: Path, plugin_dir: Optional[Path] = None) -> str:
     """Generate a hash of schema directory contents for cache invalidation."""
     hasher = hashlib.md5()
@@ -39,6 +51,84 @@ def _get_schema_hash(base_dir: Path, plugin_dir: Optional[Path] = None) -> str:
     
     return hasher.hexdigest()
 
+def _short_description(description: Any, max_chars: int) -> str:
+    """Return the first sentence of an option description, at most max_chars long.
+    
+    ansible-doc descriptions may be a string or a list of paragraphs.
+    """
+    if isinstance(description, list):
+        description = description[0] if description else ""
+    text = " ".join(str(description or "").split())
+    # Keep the first sentence only
+    text = re.split(r"(?<=\.)\s", text, maxsplit=1)[0]
+    if len(text) > max_chars:
+        text = text[:max_chars - 3].rstrip() + "..."
+    return text
+
+def _option_line(name: str, option: Dict[str, Any], max_chars: int) -> str:
+    """Format one option as "- name: type, flags; description"."""
+    option_type = option.get("type", "str")
+    if option.get("elements"):
+        option_type = f"{option_type}[{option['elements']}]"
+    flags: List[str] = [option_type]
+    if option.get("required"):
+        flags.append("required")
+    if option.get("choices"):
+        flags.append("choices " + "|".join(str(c) for c in option["choices"]))
+    if option.get("default") is not None:
+        flags.append(f"default {option['default']}")
+    if option.get("suboptions"):
+        flags.append("suboptions " + "|".join(option["suboptions"]))
+    
+    line = f"- {name}: {', '.join(flags)}"
+    description = _short_description(option.get("description"), max_chars)
+    return f"{line}; {description}" if description else line
+
+def build_prompt_digest(schema: Dict[str, Any],
+                        description_chars: Optional[int] = None) -> Dict[str, Any]:
+    """Build the compact option summary used in LLM prompts.
+    
+    One line per option with its type, required flag, choices, default and
+    the first sentence of its description, instead of the pretty-printed
+    ansible-doc JSON.
+    
+    Args:
+        schema: Module schema with an "options" mapping
+        description_chars: Maximum description length per option
+        
+    Returns:
+        Dictionary with the digest "text" and the estimated prompt tokens of
+        the digest ("tokens") and of the full options JSON ("full_tokens")
+    """
+    max_chars = description_chars or settings.PROMPT_DESCRIPTION_CHARS
+    options = schema.get("options") or {}
+    text = "\n".join(_option_line(name, option or {}, max_chars)
+                     for name, option in options.items())
+    full = json.dumps(options, indent=2)
+    return {
+        "text": text,
+        "tokens": len(text) // 4,
+        "full_tokens": len(full) // 4,
+    }
+
+def get_prompt_digest(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the prompt digest built when the schema was loaded, building it if missing."""
+    with _prompt_digests_lock:
+        entry = _prompt_digests.get(id(schema))
+    if entry is not None and entry[0] is schema:
+        return entry[1]
+    digest = build_prompt_digest(schema)
+    _remember_prompt_digest(schema, digest)
+    return digest
+
+def _remember_prompt_digest(schema: Dict[str, Any], digest: Dict[str, Any]) -> None:
+    """Store a schema's digest, dropping the oldest once MAX_PROMPT_DIGESTS are held."""
+    with _prompt_digests_lock:
+        _prompt_digests[id(schema)] = (schema, digest)
+        _prompt_digests.move_to_end(id(schema))
+        while len(_prompt_digests) > MAX_PROMPT_DIGESTS:
+            _prompt_digests.popitem(last=False)
+
 def _load_schema_file(file_path: Path) -> Optional[Dict[str, Any]]:
     """Load and validate a single schema file."""
     try:
@@ -48,7 +138,9 @@ def _load_schema_file(file_path: Path) -> Optional[Dict[str, Any]]:
         if not isinstance(schema, dict) or 'options' not in schema:
             logger.warning(f"Invalid schema format in {file_path.name}, missing 'options'")
             return None
-            
+        
+        # Built once here so prompts don't serialize the options per request
+        _remember_prompt_digest(schema, build_prompt_digest(schema))
         return schema
     except json.JSONDecodeError as e:
         logger.warning(f"Invalid JSON in {file_path.name}: {e}")
@@ -117,6 +209,32 @@ def load_schemas(
     
     return schemas
 
+@cached(schema_cache, key_fn=lambda base_dir, plugin_dir, key: f"schema:{base_dir}:{plugin_dir}:{key}",
+        negative_ttl=settings.NEGATIVE_CACHE_TTL)
+def _find_schema(base_dir: Path, plugin_dir: Optional[Path], key: str) -> Optional[Dict[str, Any]]:
+    """Find and load a single schema, preferring the plugin directory.
+    
+    Returns None if no valid schema exists. Unknown modules are cached for
+    settings.NEGATIVE_CACHE_TTL seconds so repeated lookups skip the filesystem.
+    """
+    # Try loading from plugin dir first (takes precedence)
+    if plugin_dir and plugin_dir.exists():
+        plugin_path = plugin_dir / f"{key}.json"
+        if plugin_path.exists():
+            schema = _load_schema_file(plugin_path)
+            if schema:
+                return schema
+    
+    # Try loading from base dir
+    if base_dir.exists():
+        base_path = base_dir / f"{key}.json"
+        if base_path.exists():
+            schema = _load_schema_file(base_path)
+            if schema:
+                return schema
+    
+    return None
+
 class LazySchemaLoader:
     """Lazy-loading proxy for schemas.
     
@@ -159,25 +277,10 @@ class LazySchemaLoader:
         if key in self._loaded_schemas:
             return self._loaded_schemas[key]
             
-        # Try loading from plugin dir first (takes precedence)
-        if self.plugin_dir and self.plugin_dir.exists():
-            plugin_path = self.plugin_dir / f"{key}.json"
-            if plugin_path.exists():
-                schema = _load_schema_file(plugin_path)
-                if schema:
-                    self._loaded_schemas[key] = schema
-                    return schema
-        
-        # Try loading from base dir
-        if self.base_dir.exists():
-            base_path = self.base_dir / f"{key}.json"
-            if base_path.exists():
-                schema = _load_schema_file(base_path)
-                if schema:
-                    self._loaded_schemas[key] = schema
-                    return schema
-        
-        return None
+        schema = _find_schema(self.base_dir, self.plugin_dir, key)
+        if schema:
+            self._loaded_schemas[key] = schema
+        return schema
     
     def __getitem__(self, key: str) -> Dict[str, Any]:
         """Get a schema by key, loading it if needed."""
@@ -0,0 +1,165 @@
+"""
+Subprocess execution with process-group cleanup.
+
+ansible-lint and Molecule start children of their own (ansible-playbook,
+docker, ...). subprocess.run() only kills the direct child on timeout and
+leaves the rest running. These helpers start each command in a new session
+and, on timeout or cancellation, terminate its whole process group, escalating
+to SIGKILL after a grace period.
+
+arun() is the asyncio variant for request handlers: waiting for a slow command
+does not block the event loop, so concurrent lint and test requests run side
+by side.
+
+Given a task log, run() streams the command's output into it line by line
+instead of holding all of it in memory.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import signal
+import subprocess
+import threading
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, List, Optional, Union
+
+if TYPE_CHECKING:
+    from .tasks import TaskLog
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Seconds a timed-out command gets to exit after SIGTERM before it is killed
+KILL_GRACE_SECONDS = 5.0
+
+_POSIX = os.name == "posix"
+
+def _signal_group(proc: Union[subprocess.Popen, asyncio.subprocess.Process], sig: int) -> None:
+    """Send sig to the command's process group (or just the process off POSIX)."""
+    try:
+        if _POSIX:
+            os.killpg(proc.pid, sig)
+        elif sig == signal.SIGTERM:
+            proc.terminate()
+        else:
+            proc.kill()
+    except (ProcessLookupError, PermissionError):
+        # Already gone
+        pass
+
+def _kill_signal() -> int:
+    return signal.SIGKILL if _POSIX else signal.SIGTERM
+
+def kill_group(proc: Union[subprocess.Popen, asyncio.subprocess.Process]) -> None:
+    """Kill a process started in its own session along with its children."""
+    _signal_group(proc, _kill_signal())
+
+def run(args: List[str], cwd: Optional[Union[str, Path]] = None,
+        timeout: Optional[float] = None, log: Optional["TaskLog"] = None) -> subprocess.CompletedProcess:
+    """Run a command and capture its output as text.
+
+    Args:
+        args: Command and arguments
+        cwd: Working directory
+        timeout: Seconds before the command's process group is terminated
+        log: Task log to stream stdout and stderr to; the result's stdout is
+            then only the log's tail and stderr is empty
+
+    Returns:
+        CompletedProcess with the return code, stdout and stderr
+
+    Raises:
+        subprocess.TimeoutExpired: If the command did not finish within timeout
+    """
+    if log is not None:
+        return _run_logged(args, cwd, timeout, log)
+    proc = subprocess.Popen(args, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            text=True, start_new_session=_POSIX)
+    try:
+        stdout, stderr = proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        logger.warning(f"{args[0]} timed out after {timeout}s, terminating its process group")
+        _signal_group(proc, signal.SIGTERM)
+        try:
+            proc.wait(timeout=KILL_GRACE_SECONDS)
+        except subprocess.TimeoutExpired:
+            pass
+        # Also sweep up children that outlived the leader
+        _signal_group(proc, _kill_signal())
+        stdout, stderr = proc.communicate()
+        raise subprocess.TimeoutExpired(args, timeout, output=stdout, stderr=stderr)
+    except BaseException:
+        _signal_group(proc, _kill_signal())
+        proc.wait()
+        raise
+    return subprocess.CompletedProcess(args, proc.returncode, stdout, stderr)
+
+def _copy_lines(stream: IO[str], log: "TaskLog") -> None:
+    with stream:
+        for line in stream:
+            log.write(line)
+
+def _run_logged(args: List[str], cwd: Optional[Union[str, Path]], timeout: Optional[float],
+                log: "TaskLog") -> subprocess.CompletedProcess:
+    """run() streaming the command's combined output to a task log."""
+    log.write(f"$ {' '.join(args)}")
+    proc = subprocess.Popen(args, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            text=True, errors="replace", start_new_session=_POSIX)
+    reader = threading.Thread(target=_copy_lines, args=(proc.stdout, log), daemon=True)
+    reader.start()
+    try:
+        proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        logger.warning(f"{args[0]} timed out after {timeout}s, terminating its process group")
+        _signal_group(proc, signal.SIGTERM)
+        try:
+            proc.wait(timeout=KILL_GRACE_SECONDS)
+        except subprocess.TimeoutExpired:
+            pass
+        _signal_group(proc, _kill_signal())
+        proc.wait()
+        reader.join()
+        raise subprocess.TimeoutExpired(args, timeout, output=log.tail())
+    except BaseException:
+        _signal_group(proc, _kill_signal())
+        proc.wait()
+        raise
+    # Like communicate(), wait until the output pipe is closed
+    reader.join()
+    return subprocess.CompletedProcess(args, proc.returncode, log.tail(), "")
+
+async def arun(args: List[str], cwd: Optional[Union[str, Path]] = None,
+               timeout: Optional[float] = None) -> subprocess.CompletedProcess:
+    """Async variant of run() using asyncio subprocesses.
+
+    If the awaiting task is cancelled (e.g. the client disconnected), the
+    command's process group is killed as well.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *args, cwd=cwd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        start_new_session=_POSIX,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"{args[0]} timed out after {timeout}s, terminating its process group")
+        _signal_group(proc, signal.SIGTERM)
+        try:
+            await asyncio.wait_for(proc.wait(), KILL_GRACE_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _signal_group(proc, _kill_signal())
+        await proc.wait()
+        raise subprocess.TimeoutExpired(args, timeout)
+    except BaseException:
+        # Cancelled: kill at once, the child watcher reaps the process
+        _signal_group(proc, _kill_signal())
+        raise
+    return subprocess.CompletedProcess(
+        args,
+        proc.returncode,
+        stdout.decode("utf-8", errors="replace"),
+        stderr.decode("utf-8", errors="replace"),
+    )
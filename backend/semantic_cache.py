@@ -0,0 +1,310 @@
+"""
+Semantic similarity cache for generated playbooks.
+
+The exact playbook cache only hits when module and prompt match exactly. This
+cache embeds the normalized task text locally as a hashed n-gram vector and
+keeps an in-memory nearest-neighbour index per module, so that near-duplicate
+prompts ("copy the config file to /etc/app" vs "copy config file to
+/etc/app") can reuse an existing playbook. Prompts that differ in a literal
+(a number, octal mode, path, file name or quoted string) never share an entry,
+however similar the rest of the text is.
+
+NumPy is used for the vectors and the similarity search when available;
+without it a sparse pure-Python representation is used.
+"""
+from __future__ import annotations
+
+import logging
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from .config import settings
+
+try:
+    import numpy as np
+    HAVE_NUMPY = True
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+    HAVE_NUMPY = False
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+STOP_WORDS = {"a", "an", "the", "and", "or", "but", "in", "on", "at", "to", "for", "with",
+              "please", "of", "is", "be", "that", "this", "it"}
+
+# Values a playbook is written for: quoted strings, paths, file names and
+# numbers (ports, counts, octal modes like 0644, versions and addresses)
+_LITERAL = re.compile(
+    r"""'[^']*'|"[^"]*"|(?<![\w.~/-])(?:~|\.{1,2})?/[\w./~{}\-]*"""
+    r"""|\b[\w-]*[a-zA-Z][\w-]*\.[a-zA-Z]\w*\b|\b\d+(?:\.\d+)*\b"""
+)
+
+# Feature weights: whole words dominate, character trigrams absorb small
+# spelling and inflection differences
+WORD_WEIGHT = 1.0
+BIGRAM_WEIGHT = 0.7
+TRIGRAM_WEIGHT = 0.3
+
+def normalize_task(text: str) -> str:
+    """Lowercase, strip punctuation (keeping path and variable characters) and stop words."""
+    words = re.findall(r"[a-z0-9_./{}\-]+", text.lower())
+    return " ".join(w for w in words if w not in STOP_WORDS)
+
+def task_literals(text: str) -> FrozenSet[str]:
+    """Literals a task must share with a cached one to reuse its playbook."""
+    literals = set()
+    for literal in _LITERAL.findall(text):
+        # "to /etc/app." ends a sentence; "/etc/app/" is the same directory
+        literal = literal.rstrip(".")
+        if len(literal) > 1 and literal[0] in "/~.":
+            literal = literal.rstrip("/") or literal
+        if literal:
+            literals.add(literal)
+    return frozenset(literals)
+
+def _stem(word: str) -> str:
+    """Strip a plural "s" from plain words ("files" -> "file", not "/etc/hosts")."""
+    if len(word) > 3 and word.isalpha() and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+def _features(normalized: str) -> List[Tuple[str, float]]:
+    """Weighted word, word-bigram and character-trigram features."""
+    words = [_stem(w) for w in normalized.split()]
+    features = [(f"w:{w}", WORD_WEIGHT) for w in words]
+    features += [(f"b:{a} {b}", BIGRAM_WEIGHT) for a, b in zip(words, words[1:])]
+    padded = f" {normalized} "
+    features += [(f"c:{padded[i:i + 3]}", TRIGRAM_WEIGHT) for i in range(len(padded) - 2)]
+    return features
+
+def embed(text: str, dims: int = 1024):
+    """Embed text as an L2-normalized hashed n-gram vector.
+
+    Returns a NumPy float32 array, or a sparse {index: weight} dict when
+    NumPy is not installed. Returns None for text without any features.
+    """
+    sparse: Dict[int, float] = {}
+    for feature, weight in _features(normalize_task(text)):
+        h = zlib.crc32(feature.encode("utf-8"))
+        index = h % dims
+        # A second hash bit picks the sign so that collisions tend to cancel out
+        sign = 1.0 if (h // dims) & 1 else -1.0
+        sparse[index] = sparse.get(index, 0.0) + sign * weight
+
+    norm = sum(v * v for v in sparse.values()) ** 0.5
+    if not norm:
+        return None
+    if HAVE_NUMPY:
+        vector = np.zeros(dims, dtype=np.float32)
+        for index, value in sparse.items():
+            vector[index] = value / norm
+        return vector
+    return {index: value / norm for index, value in sparse.items()}
+
+@dataclass
+class SemanticHit:
+    """A cached value whose task was similar enough to the requested one."""
+    value: Any
+    similarity: float
+    task: str
+    key: str
+
+class _ModuleIndex:
+    """Brute-force nearest-neighbour index over one module's entries.
+
+    Entries are kept in insertion order; the oldest is evicted when full.
+    """
+
+    def __init__(self, dims: int, max_entries: int):
+        self.dims = dims
+        self.max_entries = max_entries
+        self.keys: List[str] = []
+        self.entries: List[Tuple[Any, str, float, FrozenSet[str]]] = []  # (value, task, expires_at, literals)
+        self.vectors: List[Any] = []
+        self._matrix = None  # NumPy matrix of self.vectors, rebuilt lazily
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, key: str, vector, value: Any, task: str, expires_at: float,
+            literals: FrozenSet[str]) -> int:
+        """Add or replace an entry; returns the number of entries evicted."""
+        if key in self.keys:
+            self.remove(key)
+        evicted = 0
+        while self.max_entries and len(self.keys) >= self.max_entries:
+            self.remove(self.keys[0])
+            evicted += 1
+        self.keys.append(key)
+        self.entries.append((value, task, expires_at, literals))
+        self.vectors.append(vector)
+        self._matrix = None
+        return evicted
+
+    def remove(self, key: str) -> bool:
+        try:
+            i = self.keys.index(key)
+        except ValueError:
+            return False
+        del self.keys[i], self.entries[i], self.vectors[i]
+        self._matrix = None
+        return True
+
+    def remove_expired(self, now: float) -> None:
+        """Drop the entries whose TTL has passed."""
+        for key, (_, _, expires_at, _) in list(zip(self.keys, self.entries)):
+            if expires_at <= now:
+                self.remove(key)
+
+    def ranked(self, vector, threshold: float) -> List[Tuple[int, float]]:
+        """Return (position, cosine similarity) of the entries at or above threshold, most similar first."""
+        if not self.keys:
+            return []
+        if HAVE_NUMPY:
+            if self._matrix is None:
+                self._matrix = np.vstack(self.vectors)
+            scores = self._matrix @ vector
+            above = np.flatnonzero(scores >= threshold)
+            return [(int(i), float(scores[i])) for i in above[np.argsort(-scores[above], kind="stable")]]
+        found = []
+        for i, other in enumerate(self.vectors):
+            small, large = (vector, other) if len(vector) < len(other) else (other, vector)
+            score = sum(w * large.get(k, 0.0) for k, w in small.items())
+            if score >= threshold:
+                found.append((i, score))
+        return sorted(found, key=lambda item: -item[1])
+
+class SemanticCache:
+    """Per-module nearest-neighbour cache keyed by task similarity.
+
+    Args:
+        threshold: Minimum cosine similarity for a hit
+        ttl_seconds: How long an entry may be served
+        max_entries: Maximum entries per module (0 for unbounded)
+        dims: Embedding dimensions
+        max_served: Number of served hits remembered for feedback
+    """
+
+    def __init__(self, threshold: float = 0.9, ttl_seconds: int = 3600 * 24 * 7,
+                 max_entries: int = 5000, dims: int = 1024, max_served: int = 10000):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.dims = dims
+        self.max_served = max_served
+        self._lock = threading.Lock()
+        self._indexes: Dict[str, _ModuleIndex] = {}
+        # Playbook served from a hit -> (module, key of the entry it came from)
+        self._served: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+
+        # Counters
+        self._lookups = 0
+        self._hits = 0
+        self._similarity_total = 0.0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def lookup(self, module: str, task: str) -> Optional[SemanticHit]:
+        """Return the most similar live entry for module above the threshold.
+
+        Only entries with exactly the task's literals (see task_literals())
+        are considered.
+        """
+        vector = embed(task, self.dims)
+        literals = task_literals(task)
+        with self._lock:
+            self._lookups += 1
+            index = self._indexes.get(module)
+            if vector is None or index is None:
+                return None
+            index.remove_expired(time.time())
+            for i, similarity in index.ranked(vector, self.threshold):
+                value, source_task, _, source_literals = index.entries[i]
+                if source_literals != literals:
+                    continue
+                self._hits += 1
+                self._similarity_total += similarity
+                return SemanticHit(value, similarity, source_task, index.keys[i])
+            return None
+
+    def add(self, module: str, task: str, value: Any, key: Optional[str] = None) -> None:
+        """Index value under the task's embedding.
+
+        Args:
+            module: Module the task is for
+            task: Task text as entered by the user
+            value: Value to return on a hit
+            key: Entry key, defaults to the normalized task
+        """
+        vector = embed(task, self.dims)
+        if vector is None:
+            return
+        key = key or normalize_task(task)
+        with self._lock:
+            index = self._indexes.get(module)
+            if index is None:
+                index = self._indexes[module] = _ModuleIndex(self.dims, self.max_entries)
+            self._evictions += index.add(key, vector, value, task, time.time() + self.ttl_seconds,
+                                         task_literals(task))
+
+    def record_served(self, served_id: str, module: str, hit: SemanticHit) -> None:
+        """Remember that served_id was answered from hit, for later feedback."""
+        with self._lock:
+            self._served[served_id] = (module, hit.key)
+            while len(self._served) > self.max_served:
+                self._served.popitem(last=False)
+
+    def record_feedback(self, served_id: str, rating: int) -> bool:
+        """Drop the source entry of a served hit that received a poor rating.
+
+        Returns:
+            True if an entry was invalidated
+        """
+        with self._lock:
+            served = self._served.get(served_id)
+            if served is None or rating > settings.SEMANTIC_CACHE_EVICT_RATING:
+                return False
+            module, key = served
+            index = self._indexes.get(module)
+            if index is None or not index.remove(key):
+                return False
+            self._invalidations += 1
+        logger.info(f"Dropped semantic cache entry for {module} after rating {rating}")
+        return True
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._indexes.clear()
+            self._served.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get entry counts, hit ratio and mean similarity of hits."""
+        with self._lock:
+            return {
+                "enabled": settings.SEMANTIC_CACHE_ENABLED,
+                "threshold": self.threshold,
+                "size": sum(len(index) for index in self._indexes.values()),
+                "modules": {module: len(index) for module, index in self._indexes.items()},
+                "lookups": self._lookups,
+                "hits": self._hits,
+                "misses": self._lookups - self._hits,
+                "hit_ratio": round(self._hits / self._lookups, 4) if self._lookups else 0.0,
+                "avg_similarity": round(self._similarity_total / self._hits, 4) if self._hits else 0.0,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+                "numpy": HAVE_NUMPY,
+            }
+
+# Global semantic cache for generated playbooks
+semantic_cache = SemanticCache(
+    threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+    ttl_seconds=3600 * 24 * 7,  # Same as the playbook cache
+    max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+)
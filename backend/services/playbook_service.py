@@ -1,26 +1,148 @@
 """Service layer for playbook-related operations."""
 import json
+import asyncio
 import logging
+import re
 import shutil
 import structlog
 import subprocess
 import uuid
 import hashlib
+import importlib.metadata
+from dataclasses import dataclass, field
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Any, Tuple
+from typing import AsyncIterator, Dict, List, Any, Optional, Tuple
 from datetime import datetime
 
 
 from ..config import settings
-from ..llm_adapter import LLMClient
-from ..cache import playbook_cache
+from ..llm_adapter import LLMClient, usage_context, user_context
+from ..llm_batching import generation_batcher
+from ..plugin_loader import get_prompt_digest
+from ..cache import playbook_cache, lint_cache
+from ..lint_pool import LintPoolError, lint_pool
+from ..molecule_pool import MoleculePoolError, molecule_pool
+from ..semantic_cache import SemanticHit, semantic_cache
 from .. import database
+from .. import monitoring
+from .. import process
+from .. import tasks
 from ..utils import validate_safe_path, is_safe_file_name
 
 # Configure loggers
 logger = logging.getLogger(__name__)
 structured_logger = structlog.get_logger(__name__)
 
+# ansible-lint exit codes of a completed lint: 0 no issues, 2 issues found
+LINT_EXIT_CODES = (0, 2)
+
+# An `ansible-lint -p` line: "path:line[:column]: rule: message"
+_LINT_LINE = re.compile(r"^.*?:(\d+(?::\d+)?: .*)$")
+
+# Files ansible-lint reads its configuration from, relative to the working directory
+LINT_CONFIG_FILES = (
+    ".ansible-lint",
+    ".ansible-lint.yml",
+    ".ansible-lint.yaml",
+    ".config/ansible-lint.yml",
+    ".config/ansible-lint.yaml",
+)
+
+@lru_cache(maxsize=1)
+def _ansible_lint_version() -> str:
+    """Return the installed ansible-lint version, or "unknown"."""
+    try:
+        return importlib.metadata.version("ansible-lint")
+    except importlib.metadata.PackageNotFoundError:
+        pass
+    
+    # Installed outside this environment (e.g. pipx); ask the binary
+    try:
+        proc = subprocess.run(["ansible-lint", "--version"], capture_output=True, text=True, timeout=30)
+        parts = proc.stdout.split()
+        if proc.returncode == 0 and len(parts) > 1:
+            return parts[1]
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning(f"Could not determine ansible-lint version: {e}")
+    return "unknown"
+
+def _lint_config_hash(base_dir: Optional[Path] = None) -> str:
+    """Return a short hash of the ansible-lint configuration files in effect."""
+    base_dir = base_dir or Path.cwd()
+    hasher = hashlib.sha256()
+    for name in LINT_CONFIG_FILES:
+        path = base_dir / name
+        if path.is_file():
+            hasher.update(name.encode())
+            hasher.update(path.read_bytes())
+    return hasher.hexdigest()[:16]
+
+def lint_cache_key(content: bytes) -> str:
+    """Return the lint cache key for playbook content.
+    
+    Identical content linted by the same ansible-lint version with the same
+    configuration always gives the same result, whatever the playbook ID.
+    Cached results are stored without the file path (see strip_lint_paths()),
+    which "v2" in the key tells apart from entries that included it.
+    """
+    content_hash = hashlib.sha256(content).hexdigest()
+    return f"lint:v2:{content_hash}:{_ansible_lint_version()}:{_lint_config_hash()}"
+
+def strip_lint_paths(lines: List[str]) -> Optional[List[str]]:
+    """Drop the file path from `ansible-lint -p` lines.
+    
+    The rest ("line[:column]: rule: message") depends only on the content,
+    so it can be shared by playbooks with the same content.
+    
+    Returns:
+        The issues without path, or None if a line is not in -p form
+    """
+    issues = []
+    for line in lines:
+        match = _LINT_LINE.match(line)
+        if not match:
+            return None
+        issues.append(match.group(1))
+    return issues
+
+def with_lint_path(issues: List[str], path: Path) -> List[str]:
+    """Render issues without path as `ansible-lint -p` lines for a playbook."""
+    return [f"{path}:{issue}" for issue in issues]
+
+def parse_lint_json(output: str) -> Dict[str, List[str]]:
+    """Group the issues of `ansible-lint -f json` (Code Climate) output by file.
+    
+    Each issue is rendered like a line of `ansible-lint -p` output without the
+    path ("line[:column]: rule: message"), as strip_lint_paths() leaves them.
+    
+    Args:
+        output: ansible-lint's stdout
+    
+    Returns:
+        Mapping of the path ansible-lint reported to its issues
+    """
+    errors: Dict[str, List[str]] = {}
+    for issue in json.loads(output or "[]"):
+        location = issue.get("location", {})
+        path = location.get("path", "")
+        begin = location.get("positions", {}).get("begin")
+        if begin:
+            position = f"{begin['line']}:{begin['column']}"
+        else:
+            position = str(location.get("lines", {}).get("begin", 1))
+        line = f"{position}: {issue.get('check_name')}: {issue.get('description')}"
+        errors.setdefault(path, []).append(line)
+    return errors
+
+@dataclass
+class _PendingLint:
+    """Playbooks with the same content that a batch lint still has to run for."""
+    path: Path
+    cache_key: Optional[str]
+    # Path of each playbook ID, for its own error lines
+    playbooks: Dict[str, Path] = field(default_factory=dict)
+
 class PlaybookValidationError(Exception):
     """Raised when playbook validation fails."""
     pass
@@ -46,59 +168,235 @@ class PlaybookService:
         
     def generate_playbook(self, module: str, prompt: str, schema: Dict[str, Any], 
                          user_id: str = "anonymous") -> Tuple[str, str]:
-        """Generate a playbook using the LLM and return the ID and content."""
-        # Check cache if enabled
-        if self.use_cache:
-            cache_key = self._get_cache_key(module, prompt)
-            cached_result = playbook_cache.get(cache_key)
-            if cached_result:
-                playbook_id, yaml_content = cached_result
-                logger.info(f"Using cached playbook {playbook_id} for {module} prompt")
-                
-                # Ensure the file exists (might have been cleaned up)
-                pb_path = settings.PLAYBOOK_DIR / f"{playbook_id}.yml"
-                if not pb_path.exists():
-                    logger.info(f"Cached playbook file not found, recreating: {playbook_id}")
-                    self._save_playbook(playbook_id, yaml_content)
-                
-                # Record telemetry for cache hit
-                if settings.DB_ENABLED and settings.COLLECT_TELEMETRY:
-                    database.record_telemetry(
-                        "generate_cache_hit",
-                        {
-                            "module": module,
-                            "playbook_id": playbook_id,
-                            "cache_key": cache_key[:10],
-                        },
-                        user_id=user_id
-                    )
-                
-                return playbook_id, yaml_content
+        """Generate a playbook using the LLM and return the ID and content.
+        
+        Concurrent requests for the same module and prompt are coalesced when
+        caching is enabled, so only one of them calls the LLM.
+        """
+        if not self.use_cache:
+            return self._create_playbook(module, prompt, schema, user_id)
+            
+        # Check cache
+        cache_key = self._get_cache_key(module, prompt)
+        cached_result = playbook_cache.get(cache_key)
+        if cached_result is not None:
+            return self._use_cached_playbook(cache_key, cached_result, module, user_id)
+        
+        # Cache miss: one caller generates, concurrent callers share its playbook
+        result = playbook_cache.load(
+            cache_key,
+            lambda: self._create_playbook(module, prompt, schema, user_id),
+            on_coalesced=lambda: monitoring.get_metrics().record_coalesced(),
+        )
+        logger.debug(f"Cached playbook {result[0]} with key {cache_key[:10]}...")
+        return result
+    
+    async def agenerate_playbook(self, module: str, prompt: str, schema: Dict[str, Any],
+                                 user_id: str = "anonymous") -> Tuple[str, str]:
+        """Async variant of generate_playbook() for use from request handlers.
+        
+        The LLM is called via the client's agenerate(), so the event loop stays
+        free while the provider responds; file and database writes run in a
+        worker thread.
+        """
+        if not self.use_cache:
+            return await self._acreate_playbook(module, prompt, schema, user_id)
+        
+        cache_key = self._get_cache_key(module, prompt)
+        cached_result = await playbook_cache.aget(cache_key)
+        if cached_result is not None:
+            return await asyncio.to_thread(
+                self._use_cached_playbook, cache_key, cached_result, module, user_id
+            )
+        
+        result = await playbook_cache.aload(
+            cache_key,
+            lambda: self._acreate_playbook(module, prompt, schema, user_id),
+            on_coalesced=lambda: monitoring.get_metrics().record_coalesced(),
+        )
+        logger.debug(f"Cached playbook {result[0]} with key {cache_key[:10]}...")
+        return result
+        
+    async def astream_playbook(self, module: str, prompt: str, schema: Dict[str, Any],
+                               user_id: str = "anonymous") -> AsyncIterator[Dict[str, Any]]:
+        """Generate a playbook, yielding events as the LLM produces it.
+        
+        Yields {"event": "token", "text": ...} for each chunk of YAML and, once
+        the complete YAML is validated and saved, {"event": "done",
+        "playbook_id": ..., "playbook_yaml": ...}. A cached playbook is yielded
+        as a single token. LLM errors are raised to the caller.
+        """
+        cache_key = self._get_cache_key(module, prompt) if self.use_cache else None
+        if cache_key:
+            cached_result = await playbook_cache.aget(cache_key)
+            if cached_result is not None:
+                playbook_id, yaml_content = await asyncio.to_thread(
+                    self._use_cached_playbook, cache_key, cached_result, module, user_id
+                )
+                yield {"event": "token", "text": yaml_content}
+                yield {"event": "done", "playbook_id": playbook_id, "playbook_yaml": yaml_content}
+                return
+            
+            reused = await asyncio.to_thread(self._semantic_lookup, module, prompt, user_id)
+            if reused is not None:
+                await playbook_cache.aset(cache_key, reused)
+                yield {"event": "token", "text": reused[1]}
+                yield {"event": "done", "playbook_id": reused[0], "playbook_yaml": reused[1]}
+                return
+        
+        start_time = datetime.now()
+        chunks = []
+        with self._usage_context(module, schema), user_context(user_id):
+            async for chunk in self.llm_client.astream(self._build_prompt(module, prompt, schema)):
+                chunks.append(chunk)
+                yield {"event": "token", "text": chunk}
+        
+        result = await asyncio.to_thread(
+            self._store_playbook, module, prompt, "".join(chunks), user_id, start_time
+        )
+        if cache_key:
+            await playbook_cache.aset(cache_key, result)
+            self._semantic_add(module, prompt, result)
+        yield {"event": "done", "playbook_id": result[0], "playbook_yaml": result[1]}
+        
+    def _use_cached_playbook(self, cache_key: str, cached_result: Tuple[str, str],
+                             module: str, user_id: str) -> Tuple[str, str]:
+        """Return a cached playbook, restoring its file if needed."""
+        playbook_id, yaml_content = cached_result
+        logger.info(f"Using cached playbook {playbook_id} for {module} prompt")
+        
+        # Ensure the file exists (might have been cleaned up)
+        pb_path = settings.PLAYBOOK_DIR / f"{playbook_id}.yml"
+        if not pb_path.exists():
+            logger.info(f"Cached playbook file not found, recreating: {playbook_id}")
+            self._save_playbook(playbook_id, yaml_content)
+        
+        # Record telemetry for cache hit
+        if settings.DB_ENABLED and settings.COLLECT_TELEMETRY:
+            database.record_telemetry(
+                "generate_cache_hit",
+                {
+                    "module": module,
+                    "playbook_id": playbook_id,
+                    "cache_key": cache_key[:10],
+                },
+                user_id=user_id
+            )
+        
+        return playbook_id, yaml_content
+        
+    def _create_playbook(self, module: str, prompt: str, schema: Dict[str, Any],
+                         user_id: str) -> Tuple[str, str]:
+        """Generate a new playbook via the LLM, save and record it.
+        
+        A playbook generated earlier for a similar prompt is reused instead if
+        the semantic cache has one.
+        """
+        reused = self._semantic_lookup(module, prompt, user_id)
+        if reused is not None:
+            return reused
+        
+        start_time = datetime.now()
+        with self._usage_context(module, schema), user_context(user_id):
+            yaml_content = self.llm_client.generate(self._build_prompt(module, prompt, schema))
+        result = self._store_playbook(module, prompt, yaml_content, user_id, start_time)
+        self._semantic_add(module, prompt, result)
+        return result
+    
+    async def _acreate_playbook(self, module: str, prompt: str, schema: Dict[str, Any],
+                                user_id: str) -> Tuple[str, str]:
+        """Async variant of _create_playbook().
+        
+        With LLM batching enabled, concurrent requests for the same module are
+        generated together by the generation batcher.
+        """
+        reused = await asyncio.to_thread(self._semantic_lookup, module, prompt, user_id)
+        if reused is not None:
+            return reused
         
-        # Cache miss, create a new playbook
-        # Create module-specific prompt
         start_time = datetime.now()
-        opts = json.dumps(schema["options"], indent=2)
-        llm_prompt = (
+        llm_prompt = self._build_prompt(module, prompt, schema)
+        with self._usage_context(module, schema), user_context(user_id):
+            if settings.LLM_BATCHING:
+                yaml_content = await generation_batcher.agenerate(
+                    self.llm_client, module, prompt, llm_prompt, self._prompt_options(schema)
+                )
+            else:
+                yaml_content = await self.llm_client.agenerate(llm_prompt)
+        result = await asyncio.to_thread(
+            self._store_playbook, module, prompt, yaml_content, user_id, start_time
+        )
+        self._semantic_add(module, prompt, result)
+        return result
+    
+    def _usage_context(self, module: str, schema: Dict[str, Any]):
+        """Record the module and the prompt tokens saved by compaction with LLM usage."""
+        saved = 0
+        if settings.PROMPT_COMPACTION:
+            digest = get_prompt_digest(schema)
+            saved = max(0, digest["full_tokens"] - digest["tokens"])
+        return usage_context(module=module, prompt_tokens_saved=saved)
+    
+    def _semantic_enabled(self) -> bool:
+        return self.use_cache and settings.SEMANTIC_CACHE_ENABLED
+    
+    def _semantic_lookup(self, module: str, prompt: str, user_id: str) -> Optional[Tuple[str, str]]:
+        """Reuse the playbook of a similar earlier prompt, if there is one.
+        
+        The reused YAML is stored under a new playbook ID that records its
+        source, so feedback on it measures the quality of semantic hits.
+        
+        Returns:
+            Tuple of the new playbook ID and the YAML, or None on a miss
+        """
+        if not self._semantic_enabled():
+            return None
+        hit = semantic_cache.lookup(module, prompt)
+        if hit is None:
+            return None
+        
+        logger.info(f"Reusing playbook {hit.value[0]} for similar {module} prompt "
+                    f"(similarity {hit.similarity:.3f})")
+        result = self._store_playbook(module, prompt, hit.value[1], user_id, datetime.now(),
+                                      semantic_hit=hit)
+        semantic_cache.record_served(result[0], module, hit)
+        return result
+    
+    def _semantic_add(self, module: str, prompt: str, result: Tuple[str, str]) -> None:
+        """Index a newly generated playbook for semantic lookups."""
+        if self._semantic_enabled():
+            semantic_cache.add(module, prompt, result)
+    
+    def _build_prompt(self, module: str, prompt: str, schema: Dict[str, Any]) -> str:
+        """Create the module-specific LLM prompt.
+        
+        Options are listed with the schema's precomputed prompt digest, or as
+        the full options JSON if prompt compaction is disabled.
+        """
+        return (
             f"Generate an Ansible task using {module}.\n"
-            f"Parameters:\n{opts}\n"
+            f"Parameters:\n{self._prompt_options(schema)}\n"
             f"Task: {prompt}\n"
             f"Return YAML only."
         )
+    
+    def _prompt_options(self, schema: Dict[str, Any]) -> str:
+        """List the module's options for a prompt."""
+        if settings.PROMPT_COMPACTION:
+            return get_prompt_digest(schema)["text"]
+        return json.dumps(schema["options"], indent=2)
+    
+    def _store_playbook(self, module: str, prompt: str, yaml_content: str,
+                        user_id: str, start_time: datetime,
+                        semantic_hit: Optional[SemanticHit] = None) -> Tuple[str, str]:
+        """Save a generated playbook and record it in the database.
         
-        # Generate YAML via LLM
-        yaml_content = self.llm_client.generate(llm_prompt)
-        
+        semantic_hit is the semantic cache entry the YAML was reused from, if any.
+        """
         # Create unique playbook ID and save
         playbook_id = str(uuid.uuid4())
         self._save_playbook(playbook_id, yaml_content)
         
-        # Store in cache if enabled
-        if self.use_cache:
-            cache_key = self._get_cache_key(module, prompt)
-            playbook_cache.set(cache_key, (playbook_id, yaml_content))
-            logger.debug(f"Cached playbook {playbook_id} with key {cache_key[:10]}...")
-        
         duration = (datetime.now() - start_time).total_seconds()
         logger.info(f"Generated playbook {playbook_id} in {duration:.2f}s")
         
@@ -110,19 +408,25 @@ class PlaybookService:
                     module=module,
                     prompt=prompt,
                     yaml_content=yaml_content,
-                    user_id=user_id
+                    user_id=user_id,
+                    semantic_source_id=semantic_hit.value[0] if semantic_hit else None,
+                    semantic_similarity=semantic_hit.similarity if semantic_hit else None,
                 )
                 
                 # Record telemetry for generation
                 if settings.COLLECT_TELEMETRY:
+                    event_data = {
+                        "module": module,
+                        "playbook_id": playbook_id,
+                        "duration_ms": int(duration * 1000),
+                        "yaml_length": len(yaml_content),
+                    }
+                    if semantic_hit:
+                        event_data["source_playbook_id"] = semantic_hit.value[0]
+                        event_data["similarity"] = round(semantic_hit.similarity, 4)
                     database.record_telemetry(
-                        "generate",
-                        {
-                            "module": module,
-                            "playbook_id": playbook_id,
-                            "duration_ms": int(duration * 1000),
-                            "yaml_length": len(yaml_content),
-                        },
+                        "generate_semantic_hit" if semantic_hit else "generate",
+                        event_data,
                         user_id=user_id
                     )
             except Exception as e:
@@ -133,75 +437,276 @@ class PlaybookService:
     def lint_playbook(self, playbook_id: str, timeout: int = 30, 
                       user_id: str = "anonymous") -> List[str]:
         """Lint a playbook using ansible-lint and return errors."""
+        pb_path, cache_key, cached_errors = self._lint_lookup(playbook_id, user_id)
+        if cached_errors is not None:
+            return self._log_lint_errors(cached_errors)
+        
+        # Run ansible-lint
+        start_time = datetime.now()
+        try:
+            proc = self._run_lint(pb_path, timeout)
+        except Exception as e:
+            raise self._lint_failed(playbook_id, e, timeout, user_id)
+        return self._log_lint_errors(
+            self._lint_complete(playbook_id, pb_path, cache_key, proc, start_time, user_id)
+        )
+    
+    async def alint_playbook(self, playbook_id: str, timeout: int = 30,
+                             user_id: str = "anonymous") -> List[str]:
+        """Async variant of lint_playbook() for use from request handlers.
+        
+        ansible-lint runs as an asyncio subprocess, so the event loop is free
+        while it works; file and database access run in a worker thread.
+        """
+        pb_path, cache_key, cached_errors = await asyncio.to_thread(
+            self._lint_lookup, playbook_id, user_id
+        )
+        if cached_errors is not None:
+            return cached_errors
+        
+        start_time = datetime.now()
+        try:
+            proc = await self._arun_lint(pb_path, timeout)
+        except Exception as e:
+            raise await asyncio.to_thread(self._lint_failed, playbook_id, e, timeout, user_id)
+        return await asyncio.to_thread(
+            self._lint_complete, playbook_id, pb_path, cache_key, proc, start_time, user_id
+        )
+    
+    def lint_playbooks(self, playbook_ids: List[str], timeout: int = 600,
+                       user_id: str = "anonymous") -> Dict[str, List[str]]:
+        """Lint several playbooks with a single ansible-lint run.
+        
+        Playbooks whose content was linted before are answered from the lint
+        cache and playbooks with identical content are linted once; the rest
+        are passed to one `ansible-lint -f json` invocation.
+        
+        Args:
+            playbook_ids: IDs of the playbooks to lint
+            timeout: Seconds the whole ansible-lint run may take
+            user_id: Requesting user
+        
+        Returns:
+            Mapping of playbook ID to its lint errors, in request order
+        
+        Raises:
+            PlaybookValidationError: If any playbook does not exist
+            PlaybookExecutionError: If ansible-lint failed or timed out
+        """
+        results, pending = self._lint_batch_lookup(playbook_ids, user_id)
+        if not pending:
+            return results
+        
+        start_time = datetime.now()
+        try:
+            proc = process.run(self._lint_batch_args(pending), timeout=timeout)
+            found = self._parse_lint_batch(proc, pending)
+        except Exception as e:
+            raise self._lint_failed(", ".join(playbook_ids), e, timeout, user_id)
+        self._lint_batch_complete(results, pending, found, start_time, user_id)
+        return results
+    
+    async def alint_playbooks(self, playbook_ids: List[str], timeout: int = 600,
+                              user_id: str = "anonymous") -> Dict[str, List[str]]:
+        """Async variant of lint_playbooks() for use from request handlers."""
+        results, pending = await asyncio.to_thread(self._lint_batch_lookup, playbook_ids, user_id)
+        if not pending:
+            return results
+        
+        start_time = datetime.now()
+        try:
+            proc = await process.arun(self._lint_batch_args(pending), timeout=timeout)
+            found = self._parse_lint_batch(proc, pending)
+        except Exception as e:
+            raise await asyncio.to_thread(
+                self._lint_failed, ", ".join(playbook_ids), e, timeout, user_id
+            )
+        await asyncio.to_thread(
+            self._lint_batch_complete, results, pending, found, start_time, user_id
+        )
+        return results
+    
+    def _lint_batch_lookup(self, playbook_ids: List[str], user_id: str
+                           ) -> Tuple[Dict[str, Optional[List[str]]], List[_PendingLint]]:
+        """Answer what the lint cache can and group the rest by content.
+        
+        Returns:
+            Tuple of the results by playbook ID (None where still to be
+            linted) and the distinct playbooks to lint
+        """
+        results: Dict[str, Optional[List[str]]] = {}
+        pending: Dict[str, _PendingLint] = {}
+        for playbook_id in playbook_ids:
+            pb_path, cache_key, cached_errors = self._lint_lookup(playbook_id, user_id)
+            results[playbook_id] = cached_errors
+            if cached_errors is not None:
+                continue
+            group = pending.setdefault(cache_key or str(pb_path), _PendingLint(pb_path, cache_key))
+            group.playbooks[playbook_id] = pb_path
+        return results, list(pending.values())
+    
+    @staticmethod
+    def _lint_batch_args(pending: List[_PendingLint]) -> List[str]:
+        return ["ansible-lint", "-f", "json", "--nocolor", *(str(p.path) for p in pending)]
+    
+    @staticmethod
+    def _parse_lint_batch(proc: subprocess.CompletedProcess,
+                          pending: List[_PendingLint]) -> Dict[str, List[str]]:
+        """Check a batch run's exit code and parse its issues by playbook file name.
+        
+        Playbooks are `<id>.yml` files directly in PLAYBOOK_DIR, so they are
+        matched by name whatever directory ansible-lint reports paths against.
+        Issues for any other file fail the batch rather than let a playbook
+        be reported, and cached, as clean.
+        """
+        # Anything but 0 or 2 means ansible-lint itself failed
+        if proc.returncode not in LINT_EXIT_CODES:
+            stderr = proc.stderr.strip().splitlines()
+            detail = stderr[-1] if stderr else "no output"
+            raise RuntimeError(f"ansible-lint exited with code {proc.returncode}: {detail}")
+        names = {lint.path.name for lint in pending}
+        found: Dict[str, List[str]] = {}
+        for path, issues in parse_lint_json(proc.stdout).items():
+            name = Path(path).name
+            if name not in names:
+                raise RuntimeError(f"ansible-lint reported issues for {path}, which was not linted")
+            found.setdefault(name, []).extend(issues)
+        return found
+    
+    def _lint_batch_complete(self, results: Dict[str, Optional[List[str]]],
+                             pending: List[_PendingLint], found: Dict[str, List[str]],
+                             start_time: datetime, user_id: str) -> None:
+        """Fill in, cache and record the results of a batch run."""
+        # Attribute the run's duration evenly to the files it linted
+        duration = (datetime.now() - start_time).total_seconds() / len(pending)
+        for lint in pending:
+            issues = found.get(lint.path.name, [])
+            if lint.cache_key:
+                lint_cache.set(lint.cache_key, issues)
+            for playbook_id, pb_path in lint.playbooks.items():
+                errors = with_lint_path(issues, pb_path)
+                results[playbook_id] = errors
+                self._lint_record(playbook_id, errors, 2 if errors else 0, duration, user_id)
+    
+    @staticmethod
+    def _log_lint_errors(errors: List[str]) -> List[str]:
+        """Copy lint errors to the running task's log, if any.
+        
+        ansible-lint prints its findings only when it is done, so they are
+        added in one go rather than streamed.
+        """
+        log = tasks.current_log()
+        if log is not None:
+            for error in errors:
+                log.write(error)
+        return errors
+    
+    def _run_lint(self, pb_path: Path, timeout: int) -> subprocess.CompletedProcess:
+        """Run ansible-lint on a pooled worker, or as a new process if the pool can't."""
+        if settings.LINT_POOL_ENABLED and lint_pool.available():
+            try:
+                return lint_pool.run(str(pb_path), timeout)
+            except LintPoolError as e:
+                logger.warning(f"Lint pool failed, running ansible-lint directly: {e}")
+        return process.run(["ansible-lint", "-p", str(pb_path)], timeout=timeout)
+    
+    async def _arun_lint(self, pb_path: Path, timeout: int) -> subprocess.CompletedProcess:
+        """Async variant of _run_lint(); pooled lints wait in a worker thread."""
+        if settings.LINT_POOL_ENABLED and lint_pool.available():
+            try:
+                return await asyncio.to_thread(lint_pool.run, str(pb_path), timeout)
+            except LintPoolError as e:
+                logger.warning(f"Lint pool failed, running ansible-lint directly: {e}")
+        return await process.arun(["ansible-lint", "-p", str(pb_path)], timeout=timeout)
+    
+    def _lint_lookup(self, playbook_id: str,
+                     user_id: str) -> Tuple[Path, Optional[str], Optional[List[str]]]:
+        """Find the playbook and any cached lint results for its content.
+        
+        Returns:
+            Tuple of the playbook path, the lint cache key (None without
+            caching) and the cached errors (None on a miss)
+        """
         # Get playbook path
         pb_path = self._get_playbook_path(playbook_id)
         
-        # Check if we have cached lint results
-        if self.use_cache:
-            cache_key = f"lint:{playbook_id}"
-            cached_errors = playbook_cache.get(cache_key)
-            if cached_errors is not None:
-                logger.info(f"Using cached lint results for {playbook_id}")
+        # Check if this content has been linted before, under any playbook ID
+        if not self.use_cache:
+            return pb_path, None, None
+        cache_key = lint_cache_key(pb_path.read_bytes())
+        cached_issues = lint_cache.get(cache_key)
+        cached_errors = None if cached_issues is None else with_lint_path(cached_issues, pb_path)
+        if cached_errors is not None:
+            logger.info(f"Using cached lint results for {playbook_id}")
+            
+            # Record telemetry for cache hit
+            if settings.DB_ENABLED and settings.COLLECT_TELEMETRY:
+                database.record_telemetry(
+                    "lint_cache_hit",
+                    {
+                        "playbook_id": playbook_id,
+                        "error_count": len(cached_errors),
+                    },
+                    user_id=user_id
+                )
+        return pb_path, cache_key, cached_errors
+    
+    def _lint_complete(self, playbook_id: str, pb_path: Path, cache_key: Optional[str],
+                       proc: subprocess.CompletedProcess, start_time: datetime,
+                       user_id: str) -> List[str]:
+        """Parse ansible-lint output, cache it and record the run.
+        
+        Only completed lints are cached, without the playbook's path, and the
+        errors are given with this playbook's path as on a cache hit.
+        """
+        # Parse results
+        errors = proc.stdout.splitlines() if proc.stdout else []
+        issues = strip_lint_paths(errors)
+        if issues is not None:
+            errors = with_lint_path(issues, pb_path)
+        
+        # Cache the results
+        if proc.returncode not in LINT_EXIT_CODES:
+            logger.warning(f"ansible-lint exited with code {proc.returncode} for {playbook_id}, "
+                           f"not caching its result")
+        elif cache_key and issues is not None:
+            lint_cache.set(cache_key, issues)
+            logger.debug(f"Cached lint results for {playbook_id}")
+        
+        duration = (datetime.now() - start_time).total_seconds()
+        self._lint_record(playbook_id, errors, proc.returncode, duration, user_id)
+        return errors
+    
+    def _lint_record(self, playbook_id: str, errors: List[str], exit_code: int,
+                     duration: float, user_id: str) -> None:
+        """Log a finished lint and record it in the database."""
+        logger.info(f"Linted playbook {playbook_id} in {duration:.2f}s, found {len(errors)} issues")
+        
+        # Update playbook status and record telemetry
+        if settings.DB_ENABLED:
+            try:
+                # Update playbook status
+                database.update_playbook_status(playbook_id, "linted")
                 
-                # Record telemetry for cache hit
-                if settings.DB_ENABLED and settings.COLLECT_TELEMETRY:
+                # Record telemetry
+                if settings.COLLECT_TELEMETRY:
                     database.record_telemetry(
-                        "lint_cache_hit",
+                        "lint",
                         {
                             "playbook_id": playbook_id,
-                            "error_count": len(cached_errors),
+                            "duration_ms": int(duration * 1000),
+                            "error_count": len(errors),
+                            "exit_code": exit_code,
                         },
                         user_id=user_id
                     )
-                
-                return cached_errors
-        
-        # Run ansible-lint
-        start_time = datetime.now()
-        try:
-            proc = subprocess.run(
-                ["ansible-lint", "-p", str(pb_path)], 
-                capture_output=True, 
-                text=True,
-                timeout=timeout,
-            )
-            
-            # Parse results
-            errors = proc.stdout.splitlines() if proc.stdout else []
-            
-            # Cache the results
-            if self.use_cache:
-                cache_key = f"lint:{playbook_id}"
-                playbook_cache.set(cache_key, errors, ttl_seconds=3600)  # Cache for 1 hour
-                logger.debug(f"Cached lint results for {playbook_id}")
-            
-            duration = (datetime.now() - start_time).total_seconds()
-            logger.info(f"Linted playbook {playbook_id} in {duration:.2f}s, found {len(errors)} issues")
-            
-            # Update playbook status and record telemetry
-            if settings.DB_ENABLED:
-                try:
-                    # Update playbook status
-                    database.update_playbook_status(playbook_id, "linted")
-                    
-                    # Record telemetry
-                    if settings.COLLECT_TELEMETRY:
-                        database.record_telemetry(
-                            "lint",
-                            {
-                                "playbook_id": playbook_id,
-                                "duration_ms": int(duration * 1000),
-                                "error_count": len(errors),
-                                "exit_code": proc.returncode,
-                            },
-                            user_id=user_id
-                        )
-                except Exception as e:
-                    logger.error(f"Failed to record lint data in database: {e}")
-            
-            return errors
-            
-        except subprocess.TimeoutExpired:
+            except Exception as e:
+                logger.error(f"Failed to record lint data in database: {e}")
+    
+    def _lint_failed(self, playbook_id: str, error: Exception, timeout: int,
+                     user_id: str) -> PlaybookExecutionError:
+        """Record a failed ansible-lint run and return the error to raise."""
+        if isinstance(error, subprocess.TimeoutExpired):
             structured_logger.error("Linting timeout", playbook_id=playbook_id)
             if settings.DB_ENABLED and settings.COLLECT_TELEMETRY:
                 database.record_telemetry(
@@ -209,16 +714,16 @@ class PlaybookService:
                     {"playbook_id": playbook_id, "timeout": timeout},
                     user_id=user_id
                 )
-            raise PlaybookExecutionError("Linting process timed out")
-        except Exception as e:
-            structured_logger.error("Linting error", playbook_id=playbook_id, error=str(e))
-            if settings.DB_ENABLED and settings.COLLECT_TELEMETRY:
-                database.record_telemetry(
-                    "lint_error",
-                    {"playbook_id": playbook_id, "error": str(e)},
-                    user_id=user_id
-                )
-            raise PlaybookExecutionError(f"Linting failed: {e}")
+            return PlaybookExecutionError("Linting process timed out")
+        
+        structured_logger.error("Linting error", playbook_id=playbook_id, error=str(error))
+        if settings.DB_ENABLED and settings.COLLECT_TELEMETRY:
+            database.record_telemetry(
+                "lint_error",
+                {"playbook_id": playbook_id, "error": str(error)},
+                user_id=user_id
+            )
+        return PlaybookExecutionError(f"Linting failed: {error}")
     
     def test_playbook(self, playbook_id: str, timeout: int = 60, 
                        user_id: str = "anonymous") -> Tuple[str, str]:
@@ -231,15 +736,84 @@ class PlaybookService:
         
         start_time = datetime.now()
         try:
-            # Create molecule scenario directory
-            scenario_dir = settings.PLAYBOOK_DIR / playbook_id / "molecule" / "default"
-            scenario_dir.mkdir(parents=True, exist_ok=True)
-            
-            # Determine Docker image based on playbook content
+            proc, image = self._run_molecule(playbook_id, pb_path, timeout)
+        except Exception as e:
+            raise self._test_failed(playbook_id, e, timeout, user_id)
+        return self._test_complete(playbook_id, proc, image, start_time, user_id)
+    
+    async def atest_playbook(self, playbook_id: str, timeout: int = 60,
+                             user_id: str = "anonymous") -> Tuple[str, str]:
+        """Async variant of test_playbook() for use from request handlers.
+        
+        Molecule runs as an asyncio subprocess, so a long test run does not
+        block the event loop.
+        """
+        pb_path = await asyncio.to_thread(self._get_playbook_path, playbook_id)
+        
+        start_time = datetime.now()
+        try:
+            proc, image = await self._arun_molecule(playbook_id, pb_path, timeout)
+        except Exception as e:
+            raise await asyncio.to_thread(self._test_failed, playbook_id, e, timeout, user_id)
+        return await asyncio.to_thread(
+            self._test_complete, playbook_id, proc, image, start_time, user_id
+        )
+    
+    def _run_molecule(self, playbook_id: str, pb_path: Path,
+                      timeout: int) -> Tuple[subprocess.CompletedProcess, str]:
+        """Converge on a warm pooled instance, or run `molecule test` if the pool can't.
+        
+        Inside a background task, Molecule's output is streamed to the task log
+        and only its tail is returned.
+        
+        Returns:
+            Tuple of the finished Molecule run and the Docker image it used
+        """
+        log = tasks.current_log()
+        if settings.MOLECULE_POOL_ENABLED and molecule_pool.available():
             image = self._determine_molecule_image(pb_path)
+            try:
+                return molecule_pool.test(image, pb_path, timeout, log=log), image
+            except MoleculePoolError as e:
+                logger.warning(f"Molecule pool failed, running molecule test: {e}")
+        
+        scenario_dir, image = self._prepare_molecule_scenario(playbook_id, pb_path)
+        proc = process.run(["molecule", "test"], cwd=scenario_dir.parent.parent,
+                           timeout=timeout, log=log)
+        return proc, image
+    
+    async def _arun_molecule(self, playbook_id: str, pb_path: Path,
+                             timeout: int) -> Tuple[subprocess.CompletedProcess, str]:
+        """Async variant of _run_molecule(); pooled runs wait in a worker thread."""
+        if settings.MOLECULE_POOL_ENABLED and molecule_pool.available():
+            image = await asyncio.to_thread(self._determine_molecule_image, pb_path)
+            try:
+                return await asyncio.to_thread(molecule_pool.test, image, pb_path, timeout), image
+            except MoleculePoolError as e:
+                logger.warning(f"Molecule pool failed, running molecule test: {e}")
+        
+        scenario_dir, image = await asyncio.to_thread(
+            self._prepare_molecule_scenario, playbook_id, pb_path
+        )
+        proc = await process.arun(["molecule", "test"], cwd=scenario_dir.parent.parent,
+                                  timeout=timeout)
+        return proc, image
+    
+    def _prepare_molecule_scenario(self, playbook_id: str, pb_path: Path) -> Tuple[Path, str]:
+        """Write the Molecule scenario for a playbook.
+        
+        Returns:
+            Tuple of the scenario directory and the Docker image it uses
+        """
+        # Create molecule scenario directory
+        scenario_dir = settings.PLAYBOOK_DIR / playbook_id / "molecule" / "default"
+        scenario_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Determine Docker image based on playbook content
+        image = self._determine_molecule_image(pb_path)
 
-            # Create molecule.yml config
-            molecule_config = f"""---
+        # Create molecule.yml config
+        molecule_config = f"""---
 driver:
   name: docker
 platforms:
@@ -250,50 +824,48 @@ provisioner:
   playbooks:
     converge: ../../../../{pb_path.relative_to(settings.PLAYBOOK_DIR.parent)}
 """
-            (scenario_dir / "molecule.yml").write_text(molecule_config)
-            
-            # Run molecule test with timeout
-            proc = subprocess.run(
-                ["molecule", "test"], 
-                cwd=scenario_dir.parent.parent, 
-                capture_output=True, 
-                text=True,
-                timeout=timeout,
-            )
-            
-            # Process results
-            status = "passed" if proc.returncode == 0 else "failed"
-            logs = proc.stdout + proc.stderr
-            
-            duration = (datetime.now() - start_time).total_seconds()
-            logger.info(f"Tested playbook {playbook_id} in {duration:.2f}s: {status}")
-            
-            # Update playbook status and record telemetry
-            if settings.DB_ENABLED:
-                try:
-                    # Update playbook status to include test result
-                    database.update_playbook_status(playbook_id, f"tested_{status}")
-                    
-                    # Record telemetry
-                    if settings.COLLECT_TELEMETRY:
-                        database.record_telemetry(
-                            "test",
-                            {
-                                "playbook_id": playbook_id,
-                                "duration_ms": int(duration * 1000),
-                                "status": status,
-                                "exit_code": proc.returncode,
-                                "log_length": len(logs),
-                                "image": image,
-                            },
-                            user_id=user_id
-                        )
-                except Exception as e:
-                    logger.error(f"Failed to record test data in database: {e}")
-            
-            return status, logs
-            
-        except subprocess.TimeoutExpired:
+        (scenario_dir / "molecule.yml").write_text(molecule_config)
+        return scenario_dir, image
+    
+    def _test_complete(self, playbook_id: str, proc: subprocess.CompletedProcess, image: str,
+                       start_time: datetime, user_id: str) -> Tuple[str, str]:
+        """Turn a finished Molecule run into its status and logs and record it."""
+        # Process results
+        status = "passed" if proc.returncode == 0 else "failed"
+        logs = proc.stdout + proc.stderr
+        
+        duration = (datetime.now() - start_time).total_seconds()
+        logger.info(f"Tested playbook {playbook_id} in {duration:.2f}s: {status}")
+        
+        # Update playbook status and record telemetry
+        if settings.DB_ENABLED:
+            try:
+                # Update playbook status to include test result
+                database.update_playbook_status(playbook_id, f"tested_{status}")
+                
+                # Record telemetry
+                if settings.COLLECT_TELEMETRY:
+                    database.record_telemetry(
+                        "test",
+                        {
+                            "playbook_id": playbook_id,
+                            "duration_ms": int(duration * 1000),
+                            "status": status,
+                            "exit_code": proc.returncode,
+                            "log_length": len(logs),
+                            "image": image,
+                        },
+                        user_id=user_id
+                    )
+            except Exception as e:
+                logger.error(f"Failed to record test data in database: {e}")
+        
+        return status, logs
+    
+    def _test_failed(self, playbook_id: str, error: Exception, timeout: int,
+                     user_id: str) -> PlaybookExecutionError:
+        """Record a failed Molecule run and return the error to raise."""
+        if isinstance(error, subprocess.TimeoutExpired):
             structured_logger.error("Testing timeout", playbook_id=playbook_id)
             if settings.DB_ENABLED and settings.COLLECT_TELEMETRY:
                 database.record_telemetry(
@@ -301,16 +873,16 @@ provisioner:
                     {"playbook_id": playbook_id, "timeout": timeout},
                     user_id=user_id
                 )
-            raise PlaybookExecutionError("Testing process timed out")
-        except Exception as e:
-            structured_logger.error("Testing error", playbook_id=playbook_id, error=str(e))
-            if settings.DB_ENABLED and settings.COLLECT_TELEMETRY:
-                database.record_telemetry(
-                    "test_error",
-                    {"playbook_id": playbook_id, "error": str(e)},
-                    user_id=user_id
-                )
-            raise PlaybookExecutionError(f"Testing failed: {e}")
+            return PlaybookExecutionError("Testing process timed out")
+        
+        structured_logger.error("Testing error", playbook_id=playbook_id, error=str(error))
+        if settings.DB_ENABLED and settings.COLLECT_TELEMETRY:
+            database.record_telemetry(
+                "test_error",
+                {"playbook_id": playbook_id, "error": str(error)},
+                user_id=user_id
+            )
+        return PlaybookExecutionError(f"Testing failed: {error}")
     
     def cleanup_molecule_artifacts(self, playbook_id: str):
         """Clean up molecule artifacts with security validation."""
@@ -329,9 +901,11 @@ provisioner:
                 
             # Use our path validation function to ensure we're accessing a safe path
             playbook_dir_path = validate_safe_path(settings.PLAYBOOK_DIR, playbook_id)
-            if not playbook_dir_path or not playbook_dir_path.exists():
-                structured_logger.error("Playbook directory not found or validation failed", playbook_id=playbook_id)
-                return  # Nothing to clean up
+            if not playbook_dir_path:
+                structured_logger.error("Playbook directory validation failed", playbook_id=playbook_id)
+                return
+            if not playbook_dir_path.exists():
+                return  # Tested on a pooled instance or not at all; nothing to clean up
                 
             molecule_dir = playbook_dir_path / "molecule"
             if molecule_dir.exists():
@@ -341,12 +915,7 @@ provisioner:
                     return
                     
                 # Run molecule destroy to clean up containers
-                subprocess.run(
-                    ["molecule", "destroy"], 
-                    cwd=molecule_dir.parent, 
-                    capture_output=True, 
-                    timeout=60,
-                )
+                process.run(["molecule", "destroy"], cwd=molecule_dir.parent, timeout=60)
                 
                 # Remove molecule directory - final validation before deletion
                 if molecule_dir.parent.exists() and molecule_dir.parent.is_dir() and \
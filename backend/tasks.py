@@ -3,11 +3,18 @@ Asynchronous task processing for long-running operations.
 
 This module provides an asynchronous task queue system for processing
 long-running operations like testing, linting, and other resource-intensive tasks.
+
+Output of a running task (e.g. Molecule's) is written line by line to a log
+file under DATA_DIR/task-logs, which clients can follow while the task runs;
+only the last lines are kept in memory.
 """
+import contextvars
 import logging
 import time
 import uuid
-from typing import Any, Dict, List, Optional, Callable
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, IO, List, Optional, Callable, Tuple
 import threading
 from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
@@ -27,6 +34,107 @@ class TaskStatus(str, Enum):
     FAILED = "failed"
     CANCELED = "canceled"
 
+# Longest line kept in a task log's in-memory tail
+MAX_TAIL_LINE_CHARS = 4096
+
+# Most bytes read from a log file at once
+LOG_READ_CHUNK = 1024 * 1024
+
+class TaskLog:
+    """Output of a running task.
+    
+    Lines are appended to a file that clients can follow while the task runs,
+    and only the last tail_lines are kept in memory. The file is created on
+    the first write, so tasks without output leave none behind.
+    
+    Args:
+        path: Log file, or None to keep only the tail
+        tail_lines: Number of lines kept in memory
+    """
+    
+    def __init__(self, path: Optional[Path], tail_lines: int = 200):
+        self.path = path
+        self.lines = 0
+        self._tail: Deque[str] = deque(maxlen=tail_lines)
+        self._lock = threading.Lock()
+        self._file: Optional[IO[str]] = None
+        # Whether the file is still to be created by the first write
+        self._pending = path is not None
+    
+    def _open(self) -> None:
+        """Create the log file; on failure only the tail is kept from then on."""
+        self._pending = False
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+        except OSError as e:
+            logger.warning(f"Cannot write task log {self.path}, keeping only its tail: {e}")
+    
+    def write(self, line: str) -> None:
+        """Append one line of output."""
+        if not line.endswith("\n"):
+            line += "\n"
+        with self._lock:
+            self.lines += 1
+            if len(line) > MAX_TAIL_LINE_CHARS:
+                self._tail.append(line[:MAX_TAIL_LINE_CHARS - 1] + "\n")
+            else:
+                self._tail.append(line)
+            if self._pending:
+                self._open()
+            if self._file is not None:
+                self._file.write(line)
+                self._file.flush()
+    
+    def tail(self) -> str:
+        """Return the last lines written."""
+        with self._lock:
+            return "".join(self._tail)
+    
+    def close(self) -> None:
+        """Close the log file; nothing is written to it afterwards."""
+        with self._lock:
+            self._pending = False
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+# Log of the task running in the current worker thread
+_current_log: contextvars.ContextVar[Optional[TaskLog]] = contextvars.ContextVar(
+    "task_log", default=None
+)
+
+def current_log() -> Optional[TaskLog]:
+    """Return the log of the task running in this context, if any."""
+    return _current_log.get()
+
+def log_path(task_id: str) -> Path:
+    """Return the log file of a task."""
+    return settings.DATA_DIR / "task-logs" / f"{task_id}.log"
+
+def read_log(task_id: str, offset: int = 0) -> Tuple[List[str], int]:
+    """Read complete lines a task logged after offset.
+    
+    Args:
+        task_id: Task ID
+        offset: Byte offset returned by the previous call
+        
+    Returns:
+        Tuple of the lines read (at most LOG_READ_CHUNK bytes) and the offset
+        to continue from
+    """
+    try:
+        with open(log_path(task_id), "rb") as f:
+            f.seek(offset)
+            data = f.read(LOG_READ_CHUNK)
+    except FileNotFoundError:
+        return [], offset
+    end = data.rfind(b"\n") + 1
+    if end == 0 and len(data) == LOG_READ_CHUNK:
+        # A single line longer than a chunk; pass it on in pieces
+        end = len(data)
+    return data[:end].decode("utf-8", errors="replace").splitlines(), offset + end
+
 class Task:
     """Represents an asynchronous task."""
     
@@ -165,8 +273,14 @@ class TaskQueue:
                     user_id=task.user_id
                 )
                 
-            # Execute the task function
-            result = func(*args, **kwargs)
+            # Execute the task function, streaming its output to the task log
+            log = TaskLog(log_path(task.task_id), settings.TASK_LOG_TAIL_LINES)
+            token = _current_log.set(log)
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                _current_log.reset(token)
+                log.close()
             
             # Update task status
             with self.lock:
@@ -273,6 +387,7 @@ class TaskQueue:
             # Remove identified tasks
             for task_id in to_remove:
                 del self.tasks[task_id]
+                log_path(task_id).unlink(missing_ok=True)
                 
         if to_remove:
             logger.info(f"Cleaned up {len(to_remove)} old tasks")
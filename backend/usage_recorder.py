@@ -0,0 +1,151 @@
+"""
+Background writer for LLM usage records.
+
+LLM clients hand each provider call's usage to the recorder, which queues it
+and writes batches to llm_usage from a worker thread. Recording usage never
+puts a database write on the request path; if the database falls behind and
+the queue fills up, records are dropped and counted rather than blocking.
+"""
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from .config import settings
+from . import database
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+class UsageRecorder:
+    """Queue of llm_usage records drained by a daemon thread.
+
+    Args:
+        max_queue: Records that may wait to be written; more are dropped
+        batch_size: Maximum records written per transaction
+        flush_seconds: Longest the writer holds a record back to fill its batch
+    """
+
+    def __init__(self, max_queue: int = 10000, batch_size: int = 200, flush_seconds: float = 1.0):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._written = 0
+        self._dropped = 0
+        self._failed = 0
+
+    def record(self, **usage: Any) -> bool:
+        """Queue a usage record (keyword arguments of database.record_llm_usage).
+
+        Returns:
+            False if the queue was full and the record was dropped
+        """
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(usage)
+            return True
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+            logger.warning("LLM usage queue full, dropping record")
+            return False
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every record queued so far has been written.
+
+        Returns:
+            False if the records were not written within timeout
+        """
+        if self._thread is None:
+            return True
+        marker = threading.Event()
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        return marker.wait(timeout)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Write the queued records and stop the worker thread."""
+        self._stopping = True
+        self.flush(timeout)
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                logger.warning("LLM usage writer did not drain its queue before shutdown")
+            thread.join(timeout)
+        self._stopping = False
+
+    def _ensure_started(self) -> None:
+        if self._thread is None and not self._stopping:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="llm-usage", daemon=True)
+                    self._thread.start()
+
+    def _run(self) -> None:
+        """Write queued records in batches until stopped."""
+        while True:
+            item = self._queue.get()
+            # The batch is written flush_seconds after its oldest record was
+            # taken, when it is full, or at once for flush() and stop()
+            deadline = time.monotonic() + self.flush_seconds
+            batch: List[Dict[str, Any]] = []
+            markers: List[threading.Event] = []
+            stop = False
+            while True:
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    markers.append(item)
+                else:
+                    batch.append(item)
+                remaining = deadline - time.monotonic()
+                if stop or markers or len(batch) >= self.batch_size or remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            self._write(batch)
+            for marker in markers:
+                marker.set()
+            if stop:
+                return
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        if not batch:
+            return
+        try:
+            database.record_llm_usage_batch(batch)
+            with self._lock:
+                self._written += len(batch)
+        except Exception as e:
+            with self._lock:
+                self._failed += len(batch)
+            logger.error(f"Failed to record {len(batch)} LLM usage records: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Get queue depth and counts of written, dropped and failed records."""
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "written": self._written,
+                "dropped": self._dropped,
+                "failed": self._failed,
+            }
+
+# Global recorder used by the LLM clients
+usage_recorder = UsageRecorder(
+    max_queue=settings.LLM_USAGE_QUEUE_SIZE,
+    batch_size=settings.LLM_USAGE_BATCH_SIZE,
+    flush_seconds=settings.LLM_USAGE_FLUSH_SECONDS,
+)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark comparing Cache and ShardedCache read throughput under threads.
+
+Each thread performs a mix of reads (mostly hits) and occasional writes against
+a shared cache, and the script reports total operations per second for 1 to 32
+threads.
+
+Usage:
+    python scripts/bench_cache.py [--ops 200000] [--keys 10000] [--write-ratio 0.05]
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.cache import Cache, ShardedCache  # noqa: E402
+
+THREAD_COUNTS = [1, 2, 4, 8, 16, 32]
+
+def run(cache, threads: int, ops: int, keys: int, write_ratio: float) -> float:
+    """Run the workload and return operations per second."""
+    per_thread = ops // threads
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(seed: int):
+        rng = random.Random(seed)
+        key_ids = [rng.randrange(keys) for _ in range(per_thread)]
+        writes = [rng.random() < write_ratio for _ in range(per_thread)]
+        barrier.wait()
+        for key_id, is_write in zip(key_ids, writes):
+            key = f"bench:{key_id}"
+            if is_write:
+                cache.set(key, key)
+            else:
+                cache.get(key)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for w in workers:
+        w.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for w in workers:
+        w.join()
+    return per_thread * threads / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ops", type=int, default=200000, help="Total operations per run")
+    parser.add_argument("--keys", type=int, default=10000, help="Number of distinct keys")
+    parser.add_argument("--write-ratio", type=float, default=0.05, help="Fraction of operations that are writes")
+    parser.add_argument("--shards", type=int, default=16, help="Shards for ShardedCache")
+    args = parser.parse_args()
+
+    variants = {
+        "Cache": lambda: Cache("bench", ttl_seconds=3600, max_entries=args.keys),
+        f"ShardedCache({args.shards})": lambda: ShardedCache(
+            "bench", ttl_seconds=3600, max_entries=args.keys, shards=args.shards
+        ),
+    }
+
+    print(f"{'threads':>8} " + " ".join(f"{name:>20}" for name in variants))
+    for threads in THREAD_COUNTS:
+        results = []
+        for make in variants.values():
+            cache = make()
+            for i in range(args.keys):
+                cache.set(f"bench:{i}", f"bench:{i}")
+            results.append(run(cache, threads, args.ops, args.keys, args.write_ratio))
+        print(f"{threads:>8} " + " ".join(f"{ops:>16,.0f} op/s" for ops in results))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark comparing one ansible-lint process per lint with the worker pool.
+
+Writes a set of small playbooks to a temporary directory, lints each of them
+by spawning `ansible-lint -p` and through LintPool, sequentially and with
+several threads, and reports lints per second. The pool's first lints include
+worker startup, as they would in a freshly started server.
+
+Usage:
+    python scripts/bench_lint.py [--playbooks 20] [--threads 4] [--pool-size 2]
+"""
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend import process  # noqa: E402
+from backend.lint_pool import LintPool  # noqa: E402
+
+PLAYBOOK = """---
+- name: Configure web server {n}
+  hosts: all
+  become: true
+  tasks:
+    - name: Install nginx
+      ansible.builtin.package:
+        name: nginx
+        state: present
+    - name: Write index page
+      ansible.builtin.copy:
+        dest: /var/www/html/index.html
+        content: "server {n}"
+        mode: "0644"
+    - name: Start nginx
+      ansible.builtin.service:
+        name: nginx
+        state: started
+        enabled: true
+    - shell: echo {n}
+"""
+
+def write_playbooks(directory: Path, count: int) -> list:
+    paths = []
+    for n in range(count):
+        path = directory / f"playbook_{n}.yml"
+        path.write_text(PLAYBOOK.format(n=n))
+        paths.append(str(path))
+    return paths
+
+def measure(lint, paths: list, threads: int) -> float:
+    """Lint every path and return lints per second."""
+    start = time.perf_counter()
+    if threads == 1:
+        for path in paths:
+            lint(path)
+    else:
+        with ThreadPoolExecutor(threads) as executor:
+            list(executor.map(lint, paths))
+    return len(paths) / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--playbooks", type=int, default=20, help="Number of playbooks to lint")
+    parser.add_argument("--threads", type=int, default=4, help="Threads for the concurrent run")
+    parser.add_argument("--pool-size", type=int, default=2, help="Workers in the pool")
+    args = parser.parse_args()
+
+    if shutil.which("ansible-lint") is None:
+        sys.exit("ansible-lint is not installed")
+
+    pool = LintPool(size=args.pool_size)
+    if not pool.available():
+        sys.exit(f"Lint pool unavailable: {pool.stats()['disabled_reason']}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = write_playbooks(Path(tmp), args.playbooks)
+        variants = {
+            "spawn": lambda path: process.run(["ansible-lint", "-p", path], timeout=300),
+            f"pool({args.pool_size})": lambda path: pool.run(path, timeout=300),
+        }
+        try:
+            print(f"{'variant':>10} {'sequential':>16} {f'{args.threads} threads':>16}")
+            for name, lint in variants.items():
+                sequential = measure(lint, paths, 1)
+                concurrent = measure(lint, paths, args.threads)
+                print(f"{name:>10} {sequential:>10.2f} lint/s {concurrent:>10.2f} lint/s")
+        finally:
+            pool.close()
+        print(f"pool stats: {pool.stats()}")
+
+if __name__ == "__main__":
+    main()
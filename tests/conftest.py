@@ -9,6 +9,11 @@ def disable_db_pool_logging():
     import logging
     logging.getLogger("backend.db_pool").setLevel(logging.ERROR)
 
+@pytest.fixture(autouse=True)
+def isolate_data_dir(tmp_path, monkeypatch):
+    """Keep files tests write under DATA_DIR (task logs) out of the repository."""
+    monkeypatch.setattr("backend.config.settings.DATA_DIR", tmp_path)
+
 @pytest.fixture(scope="function", autouse=True)
 def setup_test_database(monkeypatch):
     """Create an in-memory test database for each test."""
@@ -67,6 +72,7 @@ def setup_test_database(monkeypatch):
     monkeypatch.setattr("backend.cache.schema_cache", mock_cache)
     monkeypatch.setattr("backend.cache.llm_cache", mock_cache)
     monkeypatch.setattr("backend.cache.playbook_cache", mock_cache)
+    monkeypatch.setattr("backend.cache.lint_cache", mock_cache)
     
     yield
     # No teardown needed for mock database
\ No newline at end of file
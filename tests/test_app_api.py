@@ -1,4 +1,5 @@
 """Tests for the Relia backend API endpoints."""
+import json
 from pathlib import Path
 import pytest
 from fastapi.testclient import TestClient
@@ -152,6 +153,51 @@ def test_generate_endpoint_invalid_module():
     assert response.status_code == 404
     assert "not found" in response.json()["detail"]
 
+def test_generate_stream_endpoint():
+    """Test the streaming generate endpoint sends tokens and a final event."""
+    response = client.post(
+        "/v1/generate/stream",
+        json={"prompt": "Show a test message", "module": "ansible.builtin.debug"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    
+    events = [block.split("\n") for block in response.text.strip().split("\n\n")]
+    names = [lines[0].removeprefix("event: ") for lines in events]
+    assert names[0] == "token"
+    assert names[-1] == "done"
+    
+    done = json.loads(events[-1][1].removeprefix("data: "))
+    assert done["playbook_id"]
+    assert done["playbook_yaml"] == "- name: test task\n  ansible.builtin.debug:\n    msg: test"
+
+def test_generate_stream_endpoint_reports_unexpected_errors(monkeypatch):
+    """Test a failure after streaming started ends the stream with an error event."""
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+    monkeypatch.setattr(PlaybookService, "_store_playbook", fail)
+    
+    response = client.post(
+        "/v1/generate/stream",
+        json={"prompt": "Show a message that is never saved", "module": "ansible.builtin.debug"}
+    )
+    assert response.status_code == 200
+    
+    events = [block.split("\n") for block in response.text.strip().split("\n\n")]
+    assert events[0][0] == "event: token"
+    assert events[-1][0] == "event: error"
+    error = json.loads(events[-1][1].removeprefix("data: "))
+    assert error["status"] == 500
+    assert "disk full" not in error["detail"]
+
+def test_generate_stream_endpoint_invalid_module():
+    """Test the streaming endpoint rejects unknown modules before streaming."""
+    response = client.post(
+        "/v1/generate/stream",
+        json={"prompt": "Show a test message", "module": "nonexistent.module"}
+    )
+    assert response.status_code == 404
+
 def test_lint_endpoint(mock_playbook_service, monkeypatch):
     """Test the lint endpoint."""
     # Create a valid UUID string for testing
@@ -169,6 +215,19 @@ def test_lint_endpoint(mock_playbook_service, monkeypatch):
     assert response.status_code == 404
     assert "Playbook not found" in response.json()["detail"]
 
+def test_lint_batch_endpoint():
+    """Test the batch lint endpoint validates its playbook IDs."""
+    response = client.post(
+        "/v1/lint/batch",
+        json={"playbook_ids": ["abcdef12-3456-789a-bcde-f1234567890f"]}
+    )
+    assert response.status_code == 404
+    assert "Playbook not found" in response.json()["detail"]
+    
+    # An empty batch is rejected before linting
+    response = client.post("/v1/lint/batch", json={"playbook_ids": []})
+    assert response.status_code == 422
+
 def test_test_endpoint(mock_playbook_service, monkeypatch):
     """Test the test endpoint."""
     # Create a valid UUID string for testing
@@ -185,6 +244,31 @@ def test_test_endpoint(mock_playbook_service, monkeypatch):
     assert response.status_code == 404
     assert "Playbook not found" in response.json()["detail"]
 
+def test_task_logs_endpoint():
+    """Test the task logs endpoint streams the log and a final event."""
+    from backend import tasks
+    task = tasks.create_task("test", "test-user")
+    task.status = tasks.TaskStatus.FAILED
+    task.error = "Molecule test failed"
+    tasks.log_path(task.task_id).parent.mkdir()
+    tasks.log_path(task.task_id).write_text("$ molecule test\nPLAY [all]\n")
+    
+    response = client.get(f"/v1/tasks/{task.task_id}/logs")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    
+    events = [block.split("\n") for block in response.text.strip().split("\n\n")]
+    assert [json.loads(lines[1].removeprefix("data: ")) for lines in events[:-1]] == [
+        {"line": "$ molecule test"}, {"line": "PLAY [all]"},
+    ]
+    assert events[-1][0] == "event: done"
+    assert json.loads(events[-1][1].removeprefix("data: ")) == {
+        "status": "failed", "error": "Molecule test failed",
+    }
+    
+    response = client.get("/v1/tasks/unknown-task/logs")
+    assert response.status_code == 404
+
 def test_schema_endpoint():
     """Test the schema endpoint."""
     response = client.get("/v1/schema?module=ansible.builtin.debug")
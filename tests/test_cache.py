@@ -1,8 +1,14 @@
 """Tests for the caching system."""
+import asyncio
+import threading
 import time
 from unittest.mock import MagicMock
 
-from backend.cache import Cache, CacheEntry, cached
+import pytest
+
+from backend.cache import (
+    MISSING, Cache, CacheEntry, ShardedCache, TinyLFUPolicy, cached, is_negative, make_cache
+)
 
 def test_cache_entry_expiration():
     """Test that cache entries expire correctly."""
@@ -139,4 +145,481 @@ def test_cached_decorator_with_key_fn():
     
     # Call with different args should compute again
     assert get_greeting("Hi", "Bob") == "Hi Bob"
-    assert counter.call_count == 2
\ No newline at end of file
+    assert counter.call_count == 2
+
+def test_cache_max_entries_evicts_lru():
+    """Test that a bounded cache evicts the least recently used entry."""
+    cache = Cache[str]("test", ttl_seconds=30, max_entries=2)
+    
+    cache.set("key1", "value1")
+    cache.set("key2", "value2")
+    
+    # Touch key1 so key2 becomes the LRU entry
+    assert cache.get("key1") == "value1"
+    cache.set("key3", "value3")
+    
+    assert len(cache) == 2
+    assert cache.get("key2") is None
+    assert cache.get("key1") == "value1"
+    assert cache.get("key3") == "value3"
+    assert cache.stats()["evictions"] == 1
+
+def test_cache_max_bytes():
+    """Test that a byte budget is enforced."""
+    cache = Cache[str]("test", ttl_seconds=30, max_bytes=2000)
+    
+    for i in range(20):
+        cache.set(f"key{i}", "x" * 200)
+    
+    stats = cache.stats()
+    assert stats["bytes"] <= 2000
+    assert stats["evictions"] > 0
+    assert cache.get("key19") == "x" * 200
+    
+    # An entry larger than the whole budget is rejected outright
+    cache.set("huge", "x" * 5000)
+    assert cache.get("huge") is None
+    assert cache.stats()["rejections"] == 1
+
+def test_cache_overwrite_with_larger_value_stays_in_budget():
+    """Test that replacing an entry with a bigger value evicts to make room."""
+    cache = Cache[str]("test", ttl_seconds=30, max_bytes=2000)
+    
+    for i in range(8):
+        cache.set(f"key{i}", "x" * 200)
+    cache.set("key7", "x" * 1500)
+    
+    assert cache.stats()["bytes"] <= 2000
+    assert cache.stats()["evictions"] > 0
+    assert cache.get("key7") == "x" * 1500
+    assert cache.get("key0") is None
+
+def test_cache_tinylfu_admission():
+    """Test that TinyLFU keeps popular entries over one-off keys."""
+    cache = Cache[str]("test", ttl_seconds=30, max_entries=2, eviction_policy="tinylfu")
+    
+    cache.set("hot1", "value")
+    cache.set("hot2", "value")
+    for _ in range(5):
+        cache.get("hot1")
+        cache.get("hot2")
+    
+    # A key seen once should not displace frequently used entries
+    cache.set("cold", "value")
+    assert cache.get("cold") is None
+    assert cache.get("hot1") == "value"
+    assert cache.get("hot2") == "value"
+    assert cache.stats()["rejections"] == 1
+    
+    # Once it has been requested often enough it gets admitted
+    for _ in range(10):
+        cache.get("cold")
+    cache.set("cold", "value")
+    assert cache.get("cold") == "value"
+    assert cache.stats()["evictions"] == 1
+
+def test_tinylfu_frequency_ages():
+    """Test that TinyLFU counters decay over time."""
+    policy = TinyLFUPolicy(width=16)
+    for _ in range(10):
+        policy.record_get("key", hit=False)
+    before = policy.frequency("key")
+    
+    # Enough unrelated traffic triggers a reset that halves all counters
+    for _ in range(150):
+        policy.record_get("other", hit=False)
+    assert policy.frequency("key") < before
+
+def test_cache_cleanup_uses_expiry_index():
+    """Test that cleanup only removes expired entries and reports its cost."""
+    cache = Cache[str]("test", ttl_seconds=30, cleanup_interval=0.1)
+    
+    for i in range(100):
+        cache.set(f"long{i}", "value")
+    for i in range(10):
+        cache.set(f"short{i}", "value", ttl_seconds=0.05)
+    
+    time.sleep(0.15)
+    cache.get("missing")  # Trigger a cleanup tick
+    
+    stats = cache.stats()
+    assert len(cache) == 100
+    assert stats["expirations"] == 10
+    assert stats["last_cleanup_removed"] == 10
+    assert stats["cleanup_runs"] >= 1
+    assert stats["last_cleanup_duration_ms"] >= 0
+    assert cache.get("long0") == "value"
+
+def test_cache_expiry_index_ignores_stale_records():
+    """Test that overwritten entries are not expired by their old TTL."""
+    cache = Cache[str]("test", ttl_seconds=30, cleanup_interval=0.1)
+    
+    cache.set("key", "old", ttl_seconds=0.05)
+    cache.set("key", "new", ttl_seconds=30)
+    
+    time.sleep(0.15)
+    cache.get("missing")  # Trigger a cleanup tick
+    
+    assert cache.get("key") == "new"
+    assert cache.stats()["expirations"] == 0
+
+def test_get_or_set_coalesces_threads():
+    """Test that concurrent misses for one key compute it only once."""
+    cache = Cache[str]("test", ttl_seconds=30)
+    calls = []
+    coalesced = []
+    
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return "value"
+    
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(
+            cache.get_or_set("key", compute, on_coalesced=lambda: coalesced.append(1))))
+        for _ in range(5)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    
+    assert results == ["value"] * 5
+    assert len(calls) == 1
+    assert len(coalesced) == 4
+    assert cache.stats()["coalesced"] == 4
+    assert cache.stats()["in_flight"] == 0
+
+def test_get_or_set_shares_errors():
+    """Test that waiters receive the leader's exception and nothing is cached."""
+    cache = Cache[str]("test", ttl_seconds=30)
+    
+    def compute():
+        time.sleep(0.1)
+        raise ValueError("boom")
+    
+    errors = []
+    def call():
+        try:
+            cache.get_or_set("key", compute)
+        except ValueError as e:
+            errors.append(e)
+    
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    
+    assert len(errors) == 3
+    assert cache.get("key") is None
+
+async def test_aget_or_set_coalesces_coroutines():
+    """Test that concurrent coroutines share one computation."""
+    cache = Cache[str]("test", ttl_seconds=30)
+    calls = []
+    
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "value"
+    
+    results = await asyncio.gather(*[cache.aget_or_set("key", compute) for _ in range(5)])
+    
+    assert results == ["value"] * 5
+    assert len(calls) == 1
+    assert cache.stats()["coalesced"] == 4
+
+async def test_aget_or_set_survives_leader_cancellation():
+    """Test that waiters retry instead of failing when the leader is cancelled."""
+    cache = Cache[str]("test", ttl_seconds=30)
+    calls = []
+    
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "value"
+    
+    leader = asyncio.ensure_future(cache.aget_or_set("key", compute))
+    await asyncio.sleep(0.01)
+    waiter = asyncio.ensure_future(cache.aget_or_set("key", compute))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+    
+    assert await waiter == "value"
+    assert leader.cancelled()
+    assert len(calls) == 2
+    assert cache.stats()["in_flight"] == 0
+
+async def test_cached_decorator_async():
+    """Test the cached decorator on a coroutine function."""
+    cache = Cache[int]("test", ttl_seconds=30)
+    counter = MagicMock()
+    
+    @cached(cache)
+    async def expensive_function(x):
+        counter()
+        await asyncio.sleep(0.05)
+        return x * 2
+    
+    results = await asyncio.gather(*[expensive_function(2) for _ in range(3)])
+    assert results == [4, 4, 4]
+    assert counter.call_count == 1
+    
+    assert await expensive_function(2) == 4
+    assert counter.call_count == 1
+
+def test_stats_count_hits_and_misses_by_prefix():
+    """Test hit/miss/eviction counters broken down by key prefix."""
+    cache = Cache[str]("test", ttl_seconds=30, max_entries=2)
+    cache.set("lint:1", "a")
+    cache.set("playbook:1", "b")
+    
+    cache.get("lint:1")
+    cache.get("lint:1")
+    cache.get("lint:missing")
+    cache.get("playbook:missing")
+    cache.set("openai:1", "c")  # Evicts playbook:1, the least recently used
+    
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 2
+    assert stats["hit_ratio"] == 0.5
+    
+    lint = stats["by_prefix"]["lint"]
+    assert (lint["hits"], lint["misses"], lint["entries"]) == (2, 1, 1)
+    assert lint["hit_ratio"] == round(2 / 3, 4)
+    playbook = stats["by_prefix"]["playbook"]
+    assert (playbook["evictions"], playbook["entries"], playbook["bytes"]) == (1, 0, 0)
+    assert playbook["hit_ratio"] == 0.0
+    assert stats["by_prefix"]["openai"]["bytes"] > 0
+
+def test_stats_merge_counters_from_threads():
+    """Test that per-thread counters are merged when stats are read."""
+    cache = Cache[str]("test", ttl_seconds=30)
+    cache.set("key:1", "value")
+    
+    def reader():
+        for _ in range(100):
+            cache.get("key:1")
+    
+    threads = [threading.Thread(target=reader) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    
+    assert cache.stats()["by_prefix"]["key"]["hits"] == 400
+    cache.reset_stats()
+    assert cache.stats()["hits"] == 0
+
+def test_stats_fold_counters_of_exited_threads():
+    """Test that counter tables of finished threads do not accumulate."""
+    cache = Cache[str]("test", ttl_seconds=30)
+    cache.set("key:1", "value")
+    
+    for _ in range(10):
+        thread = threading.Thread(target=lambda: cache.get("key:1"))
+        thread.start()
+        thread.join()
+    
+    assert cache.stats()["by_prefix"]["key"]["hits"] == 10
+    assert len(cache._counters._tables) <= 1
+
+def test_stats_count_loads_and_expirations():
+    """Test that get_or_set loads and expirations are counted."""
+    cache = Cache[str]("test", ttl_seconds=30)
+    
+    assert cache.get_or_set("llm:1", lambda: "value", ttl_seconds=0.05) == "value"
+    time.sleep(0.1)
+    assert cache.get("llm:1") is None
+    
+    counts = cache.stats()["by_prefix"]["llm"]
+    assert counts["loads"] == 1
+    assert counts["misses"] == 2
+    assert counts["expirations"] == 1
+    assert counts["avg_load_ms"] >= 0
+
+def test_lock_free_reads_update_recency():
+    """Test that buffered lock-free reads still drive LRU eviction."""
+    cache = Cache[str]("test", ttl_seconds=30, max_entries=2, lock_free_reads=True)
+    cache.set("key1", "value1")
+    cache.set("key2", "value2")
+    
+    assert cache.get("key1") == "value1"
+    cache.set("key3", "value3")
+    
+    assert cache.get("key1") == "value1"
+    assert cache.get("key2") is None
+
+def test_lock_free_reads_skip_expired_entries():
+    """Test that the lock-free path falls back to the locked path on expiry."""
+    cache = Cache[str]("test", ttl_seconds=30, lock_free_reads=True)
+    cache.set("key1", "value1", ttl_seconds=0.05)
+    time.sleep(0.1)
+    
+    assert cache.get("key1") is None
+    assert cache.stats()["expirations"] == 1
+
+def test_sharded_cache_operations():
+    """Test that ShardedCache behaves like Cache across shards."""
+    cache = ShardedCache[str]("test", ttl_seconds=30, max_entries=64, shards=4)
+    for i in range(20):
+        cache.set(f"key:{i}", f"value{i}")
+    
+    assert len(cache) == 20
+    assert all(cache.get(f"key:{i}") == f"value{i}" for i in range(20))
+    assert cache.get_or_set("key:new", lambda: "computed") == "computed"
+    
+    cache.delete("key:0")
+    assert cache.get("key:0") is None
+    
+    stats = cache.stats()
+    assert stats["shards"] == 4
+    assert stats["size"] == 20
+    assert stats["max_entries"] == 64
+    assert stats["by_prefix"]["key"]["hits"] == 20
+    assert stats["by_prefix"]["key"]["loads"] == 1
+    
+    cache.clear()
+    assert len(cache) == 0
+
+def test_sharded_cache_concurrent_access():
+    """Test concurrent reads and writes across shards."""
+    cache = ShardedCache[str]("test", ttl_seconds=30, max_entries=100, shards=8)
+    errors = []
+    
+    def worker(n):
+        try:
+            for i in range(500):
+                key = f"key:{(n * 7 + i) % 150}"
+                if i % 5 == 0:
+                    cache.set(key, key)
+                else:
+                    value = cache.get(key)
+                    assert value is None or value == key
+        except Exception as e:
+            errors.append(e)
+    
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    
+    assert not errors
+    assert len(cache) <= 8 * -(-100 // 8)
+
+def test_make_cache_selects_implementation():
+    """Test that make_cache only shards when asked to."""
+    assert isinstance(make_cache("test"), Cache)
+    assert isinstance(make_cache("test", shards=4), ShardedCache)
+
+def test_get_distinguishes_cached_none_with_missing():
+    """Test that a cached None is a hit when MISSING is the default."""
+    cache = Cache[str]("test", ttl_seconds=30)
+    cache.set("none", None)
+    
+    assert cache.get("none", MISSING) is None
+    assert cache.get("absent", MISSING) is MISSING
+    assert cache.get("absent", "default") == "default"
+    assert cache.stats()["hits"] == 1
+
+def test_cached_decorator_caches_none_results():
+    """Test that functions returning None run only once."""
+    cache = Cache[str]("test", ttl_seconds=30)
+    mock_func = MagicMock(return_value=None)
+    
+    @cached(cache)
+    def lookup(x):
+        return mock_func(x)
+    
+    assert lookup(1) is None
+    assert lookup(1) is None
+    assert mock_func.call_count == 1
+
+def test_cached_decorator_negative_ttl():
+    """Test that negative results use the shorter negative TTL."""
+    cache = Cache[str]("test", ttl_seconds=30)
+    results = {"found": ["x"], "empty": [], "none": None}
+    calls = []
+    
+    @cached(cache, negative_ttl=0.05)
+    def lookup(name):
+        calls.append(name)
+        return results[name]
+    
+    for name in results:
+        lookup(name)
+        lookup(name)
+    assert calls == ["found", "empty", "none"]
+    
+    time.sleep(0.1)
+    for name in results:
+        lookup(name)
+    assert calls == ["found", "empty", "none", "empty", "none"]
+    assert cache.stats()["by_prefix"]["other"]["negative"] == 4
+
+def test_cached_decorator_negative_ttl_zero_disables():
+    """Test that negative_ttl=0 never caches negative results."""
+    cache = Cache[str]("test", ttl_seconds=30)
+    mock_func = MagicMock(return_value=None)
+    
+    @cached(cache, negative_ttl=0, single_flight=False)
+    def lookup(x):
+        return mock_func(x)
+    
+    lookup(1)
+    lookup(1)
+    assert mock_func.call_count == 2
+
+def test_is_negative():
+    """Test which values count as negative results."""
+    assert is_negative(None)
+    assert is_negative([])
+    assert is_negative({})
+    assert is_negative("")
+    assert not is_negative(0)
+    assert not is_negative(False)
+    assert not is_negative(["error"])
+
+def test_compression_round_trip_and_bytes_saved():
+    """Test that large values are compressed transparently."""
+    cache = Cache("test", ttl_seconds=30, compression="zlib", compress_threshold=256)
+    playbook = "- name: Install nginx\n  ansible.builtin.apt:\n    name: nginx\n" * 100
+    
+    cache.set("text", playbook)
+    cache.set("tuple", ("id-1", playbook))
+    cache.set("small", "short")
+    
+    assert cache.get("text") == playbook
+    assert cache.get("tuple") == ("id-1", playbook)
+    assert cache.get("small") == "short"
+    
+    stats = cache.stats()
+    assert stats["compression"] == "zlib"
+    assert stats["compressed_entries"] == 2
+    assert stats["bytes_saved"] > len(playbook)
+    
+    cache.delete("text")
+    cache.delete("tuple")
+    assert cache.stats()["bytes_saved"] == 0
+
+def test_compression_fits_more_entries_in_byte_budget():
+    """Test that compressed entries count at their compressed size."""
+    playbook = "- name: Copy a file\n  ansible.builtin.copy:\n    src: a\n    dest: b\n" * 50
+    plain = Cache("plain", ttl_seconds=30, max_bytes=64 * 1024)
+    packed = Cache("packed", ttl_seconds=30, max_bytes=64 * 1024, compression="zlib")
+    
+    for i in range(100):
+        plain.set(f"key{i}", playbook + str(i))
+        packed.set(f"key{i}", playbook + str(i))
+    
+    assert len(packed) == 100
+    assert len(plain) < len(packed)
+
+def test_compression_rejects_unknown_codec():
+    """Test that an unknown codec is an error."""
+    with pytest.raises(ValueError):
+        Cache("test", compression="brotli")
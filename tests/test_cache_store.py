@@ -0,0 +1,202 @@
+"""Tests for the second-level cache store."""
+import threading
+import time
+import multiprocessing
+
+from backend.cache import Cache
+from backend.cache_store import SQLiteCacheStore, SharedMemoryCacheStore
+
+def test_sqlite_store_get_set(tmp_path):
+    """Test basic store operations and namespacing."""
+    store = SQLiteCacheStore(tmp_path / "cache.db")
+    
+    store.set("llm", "key1", "value1", time.time() + 30)
+    store.set("playbook", "key1", ["id", "yaml"], time.time() + 30)
+    
+    value, expiry = store.get("llm", "key1")
+    assert value == "value1"
+    assert expiry > time.time()
+    assert store.get("playbook", "key1")[0] == ["id", "yaml"]
+    
+    store.delete("llm", "key1")
+    assert store.get("llm", "key1") is None
+    assert store.get("playbook", "key1") is not None
+    
+    store.clear("playbook")
+    assert store.get("playbook", "key1") is None
+
+def test_sqlite_store_expiry(tmp_path):
+    """Test that expired entries are not returned and can be purged."""
+    store = SQLiteCacheStore(tmp_path / "cache.db")
+    
+    store.set("llm", "old", "value", time.time() - 1)
+    store.set("llm", "new", "value", time.time() + 30)
+    
+    assert store.get("llm", "old") is None
+    assert store.purge_expired("llm") == 1
+    assert store.stats("llm")["size"] == 1
+
+def test_sqlite_store_skips_unserializable(tmp_path):
+    """Test that values that cannot be stored as JSON are skipped."""
+    store = SQLiteCacheStore(tmp_path / "cache.db")
+    store.set("schema", "key", object(), time.time() + 30)
+    assert store.get("schema", "key") is None
+
+def test_sqlite_store_unwritable_dir_acts_empty(tmp_path):
+    """Test a store whose directory cannot be created behaves like an empty tier."""
+    (tmp_path / "data").write_text("not a directory")
+    store = SQLiteCacheStore(tmp_path / "data" / "cache.db")
+    
+    store.set("lint", "key", ["error"], time.time() + 30)
+    assert store.get("lint", "key") is None
+    store.delete("lint", "key")
+    assert store.purge_expired("lint") == 0
+    assert "error" in store.stats("lint")
+    
+    cache = Cache("lint", l2=store)
+    cache.set("key", ["error"])
+    assert cache.get("key") == ["error"]
+
+def test_cache_l2_shared_between_instances(tmp_path):
+    """Test that two caches on one store share entries, like two workers."""
+    worker1 = Cache[str]("llm", ttl_seconds=30, l2=SQLiteCacheStore(tmp_path / "cache.db"))
+    worker2 = Cache[str]("llm", ttl_seconds=30, l2=SQLiteCacheStore(tmp_path / "cache.db"))
+    
+    worker1.set("key", "value")
+    
+    # Miss in worker2's memory, hit in the shared store, then filled into memory
+    assert worker2.get("key") == "value"
+    assert len(worker2) == 1
+    stats = worker2.stats()
+    assert stats["l2"]["hits"] == 1
+    assert stats["l2"]["size"] == 1
+
+def test_cache_l2_survives_restart_with_remaining_ttl(tmp_path):
+    """Test that a new cache instance picks up persisted entries and their TTL."""
+    cache = Cache[str]("llm", ttl_seconds=30, l2=SQLiteCacheStore(tmp_path / "cache.db"))
+    cache.set("short", "value", ttl_seconds=0.2)
+    
+    restarted = Cache[str]("llm", ttl_seconds=30, l2=SQLiteCacheStore(tmp_path / "cache.db"))
+    assert restarted.get("short") == "value"
+    
+    time.sleep(0.3)
+    assert restarted.get("short") is None
+
+def test_cache_l2_delete_and_clear(tmp_path):
+    """Test that delete and clear propagate to the store."""
+    cache = Cache[str]("llm", ttl_seconds=30, l2=SQLiteCacheStore(tmp_path / "cache.db"))
+    cache.set("key1", "value1")
+    cache.set("key2", "value2")
+    
+    cache.delete("key1")
+    cache.clear()
+    
+    fresh = Cache[str]("llm", ttl_seconds=30, l2=SQLiteCacheStore(tmp_path / "cache.db"))
+    assert fresh.get("key1") is None
+    assert fresh.get("key2") is None
+
+def test_cache_l2_purge_runs_outside_lock(tmp_path):
+    """Test that the periodic store purge does not hold the cache lock."""
+    held = []
+    class RecordingStore(SQLiteCacheStore):
+        def purge_expired(self, namespace, now=None):
+            held.append(cache._lock._is_owned())
+            return super().purge_expired(namespace, now)
+    
+    cache = Cache[str]("llm", ttl_seconds=30, cleanup_interval=0,
+                       l2=RecordingStore(tmp_path / "cache.db"))
+    time.sleep(0.01)
+    cache.set("key1", "value1")
+    
+    assert held == [False]
+
+async def test_cache_l2_async_io_runs_in_worker_thread(tmp_path):
+    """Test that aget and aset keep store I/O off the event loop thread."""
+    threads = []
+    class RecordingStore(SQLiteCacheStore):
+        def get(self, namespace, key):
+            threads.append(threading.current_thread())
+            return super().get(namespace, key)
+        def set(self, namespace, key, value, expiry):
+            threads.append(threading.current_thread())
+            super().set(namespace, key, value, expiry)
+    
+    cache = Cache[str]("llm", ttl_seconds=30, l2=RecordingStore(tmp_path / "cache.db"))
+    await cache.aset("key1", "value1")
+    restarted = Cache[str]("llm", ttl_seconds=30, l2=RecordingStore(tmp_path / "cache.db"))
+    assert await restarted.aget("key1") == "value1"
+    assert await restarted.aget("missing") is None
+    
+    assert len(threads) == 3
+    assert threading.main_thread() not in threads
+
+def _shm_writer(path, key, value):
+    """Write an entry from a separate process."""
+    store = SharedMemoryCacheStore(path)
+    store.set("llm", key, value, time.time() + 30)
+    store.close()
+
+def test_shm_store_get_set(tmp_path):
+    """Test basic shared-memory store operations and namespacing."""
+    store = SharedMemoryCacheStore(tmp_path / "cache.shm", slots=64, slot_size=1024)
+    
+    store.set("llm", "key1", "value1", time.time() + 30)
+    store.set("playbook", "key1", ["id", "yaml"], time.time() + 30)
+    store.set("llm", "key1", "value2", time.time() + 30)
+    
+    assert store.get("llm", "key1")[0] == "value2"
+    assert store.get("playbook", "key1")[0] == ["id", "yaml"]
+    assert store.stats("llm")["size"] == 1
+    
+    store.delete("llm", "key1")
+    assert store.get("llm", "key1") is None
+    assert store.get("playbook", "key1") is not None
+    
+    store.clear("playbook")
+    assert store.get("playbook", "key1") is None
+
+def test_shm_store_expiry_and_oversized(tmp_path):
+    """Test expiry, purging and values that do not fit in a slot."""
+    store = SharedMemoryCacheStore(tmp_path / "cache.shm", slots=64, slot_size=256)
+    
+    store.set("llm", "old", "value", time.time() - 1)
+    store.set("llm", "new", "value", time.time() + 30)
+    store.set("llm", "big", "x" * 1024, time.time() + 30)
+    
+    assert store.get("llm", "old") is None
+    assert store.get("llm", "big") is None
+    assert store.purge_expired("llm") == 1
+    assert store.stats("llm")["size"] == 1
+
+def test_shm_store_full_probe_window_replaces_soonest_expiry(tmp_path):
+    """Test that a full store replaces the entry closest to expiry."""
+    store = SharedMemoryCacheStore(tmp_path / "cache.shm", slots=4, slot_size=256)
+    now = time.time()
+    for i in range(4):
+        store.set("llm", f"key{i}", i, now + 10 + i)
+    
+    store.set("llm", "key4", 4, now + 60)
+    
+    assert store.get("llm", "key0") is None
+    assert [store.get("llm", f"key{i}")[0] for i in range(1, 5)] == [1, 2, 3, 4]
+
+def test_shm_store_existing_file_geometry_wins(tmp_path):
+    """Test that workers attach with the geometry of the existing segment."""
+    SharedMemoryCacheStore(tmp_path / "cache.shm", slots=32, slot_size=512).close()
+    store = SharedMemoryCacheStore(tmp_path / "cache.shm", slots=4096, slot_size=16384)
+    assert (store.slots, store.slot_size) == (32, 512)
+
+def test_shm_store_shared_across_processes(tmp_path):
+    """Test that an entry written by another process is visible here."""
+    path = tmp_path / "cache.shm"
+    cache = Cache[str]("llm", ttl_seconds=30, l2=SharedMemoryCacheStore(path))
+    
+    process = multiprocessing.get_context("spawn").Process(
+        target=_shm_writer, args=(str(path), "key", "from-worker")
+    )
+    process.start()
+    process.join(timeout=30)
+    assert process.exitcode == 0
+    
+    assert cache.get("key") == "from-worker"
+    assert cache.stats()["l2"]["backend"] == "shm"
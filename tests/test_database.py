@@ -5,7 +5,7 @@ from unittest.mock import patch
 from backend.database import (
     Database, record_telemetry, get_telemetry, record_playbook,
     get_playbook, update_playbook_status, get_playbooks,
-    record_llm_usage, get_llm_usage_stats
+    record_llm_usage, record_llm_usage_batch, get_llm_usage_stats, get_semantic_cache_quality
 )
 
 @pytest.fixture
@@ -106,6 +106,24 @@ def test_playbook_operations(temp_db):
     result = update_playbook_status(playbook_id="non-existent", status="tested")
     assert result is False
 
+def test_semantic_cache_quality(temp_db):
+    """Test feedback on semantic cache hits is reported separately."""
+    record_playbook("generated", "test.module", "install nginx", "yaml")
+    record_playbook("reused", "test.module", "install nginx please", "yaml",
+                    semantic_source_id="generated", semantic_similarity=0.934)
+    for playbook_id, rating in [("generated", 5), ("reused", 4), ("reused", 2)]:
+        temp_db.execute(
+            "INSERT INTO feedback (playbook_id, rating, created_at) VALUES (?, ?, '2024-01-01')",
+            (playbook_id, rating)
+        )
+    
+    quality = get_semantic_cache_quality()
+    assert quality["generated"] == {"feedback_count": 1, "average_rating": 5.0}
+    assert quality["semantic_hits"] == {"feedback_count": 2, "average_rating": 3.0}
+    assert quality["by_similarity"] == [
+        {"similarity": 0.93, "feedback_count": 2, "average_rating": 3.0}
+    ]
+
 def test_llm_usage_operations(temp_db):
     """Test LLM usage operations."""
     # Record LLM usage
@@ -146,4 +164,99 @@ def test_llm_usage_operations(temp_db):
     # Models should be in the providers list
     models = [p["model"] for p in stats["providers"]]
     assert "gpt-4" in models
-    assert "gpt-3.5-turbo" in models
\ No newline at end of file
+    assert "gpt-3.5-turbo" in models
+
+def test_llm_usage_prompt_compaction(temp_db):
+    """Test prompt tokens saved by compaction are reported."""
+    record_llm_usage("openai", "gpt-4", prompt_tokens=100, completion_tokens=50,
+                     duration_ms=1000, module="ansible.builtin.copy", baseline_prompt_tokens=250)
+    # Without a baseline the prompt is assumed not to be compacted
+    record_llm_usage("openai", "gpt-4", prompt_tokens=100, completion_tokens=50, duration_ms=1000)
+    
+    stats = get_llm_usage_stats()
+    assert stats["prompt_tokens"] == 200
+    assert stats["baseline_prompt_tokens"] == 350
+    assert stats["prompt_tokens_saved"] == 150
+    assert stats["providers"][0]["prompt_tokens_saved"] == 150
+
+def test_llm_usage_latency_and_cost_per_module(temp_db, monkeypatch):
+    """Test latency percentiles and module costs, most expensive module first."""
+    monkeypatch.setattr("backend.database.settings.LLM_TOKEN_PRICES", {"gpt-4": (0.01, 0.03)})
+    for duration in range(100, 1100, 100):
+        record_llm_usage("openai", "gpt-4", prompt_tokens=1000, completion_tokens=100,
+                         duration_ms=duration, module="ansible.builtin.copy")
+    record_llm_usage("openai", "gpt-4", prompt_tokens=100, completion_tokens=100,
+                     duration_ms=50, module="ansible.builtin.debug")
+    record_llm_usage("other", "unpriced", prompt_tokens=100, completion_tokens=100, duration_ms=50)
+    
+    stats = get_llm_usage_stats()
+    
+    copy, debug, unknown = stats["modules"]
+    assert copy["module"] == "ansible.builtin.copy"
+    assert copy["estimated_cost_usd"] == pytest.approx(10 * 0.013)
+    assert copy["cost_per_request_usd"] == pytest.approx(0.013)
+    assert copy["p50_ms"] == 600
+    assert copy["p99_ms"] == 1000
+    assert debug["estimated_cost_usd"] == pytest.approx(0.004)
+    assert unknown["module"] == "unknown"
+    assert stats["unpriced_models"] == ["unpriced"]
+    assert stats["latency"]["p50_ms"] == 500
+    assert stats["estimated_cost_usd"] == pytest.approx(0.134)
+
+def test_llm_usage_stats_without_usage(temp_db):
+    """Test stats of an empty usage table report zeros."""
+    record_llm_usage("openai", "gpt-4", prompt_tokens=10, completion_tokens=5, duration_ms=100)
+    
+    stats = get_llm_usage_stats(provider="bedrock")
+    
+    assert stats["total_requests"] == 0
+    assert stats["providers"] == []
+    assert stats["latency"] == {"p50_ms": 0, "p90_ms": 0, "p95_ms": 0, "p99_ms": 0}
+
+def test_record_llm_usage_batch(temp_db):
+    """Test usage records are written together in one transaction."""
+    from contextlib import contextmanager
+    
+    @contextmanager
+    def transaction():
+        yield temp_db.connect().cursor()
+    
+    with patch("backend.database.transaction", transaction):
+        written = record_llm_usage_batch([
+            {"provider": "openai", "model": "gpt-4", "prompt_tokens": 10,
+             "completion_tokens": 5, "duration_ms": 100},
+            {"provider": "openai", "model": "gpt-4", "prompt_tokens": 20,
+             "completion_tokens": 5, "duration_ms": 200, "tokens_estimated": True},
+        ])
+    
+    assert written == 2
+    stats = get_llm_usage_stats()
+    assert stats["total_requests"] == 2
+    assert stats["total_tokens"] == 40
+    assert stats["providers"][0]["estimated_tokens_requests"] == 1
+
+def test_apply_column_migrations_upgrades_old_llm_usage():
+    """Test that columns added after the initial schema are added to old tables."""
+    import sqlite3
+    from contextlib import contextmanager
+    from backend import database
+    
+    conn = sqlite3.connect(":memory:", isolation_level=None)
+    conn.execute("""CREATE TABLE llm_usage (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, provider TEXT NOT NULL, model TEXT NOT NULL,
+        prompt_tokens INTEGER, completion_tokens INTEGER, total_tokens INTEGER,
+        duration_ms INTEGER, created_at TEXT NOT NULL, request_id TEXT,
+        user_id TEXT DEFAULT 'anonymous')""")
+    
+    @contextmanager
+    def transaction():
+        yield conn
+    
+    with patch("backend.database.transaction", transaction):
+        database.apply_column_migrations()
+        # Running again is a no-op
+        database.apply_column_migrations()
+    
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(llm_usage)")]
+    assert "hedged" in columns
+    assert "latency_saved_ms" in columns
@@ -0,0 +1,159 @@
+"""Tests for the persistent ansible-lint worker pool."""
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+
+import pytest
+
+from backend import lint_worker
+from backend.lint_pool import LintPool, LintPoolError
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="the pool needs POSIX pipes")
+
+FAKE_WORKER = textwrap.dedent("""
+    import json, os, sys, time
+    if sys.argv[1:] == ["broken"]:
+        print(json.dumps({"ready": False, "error": "ImportError: no ansiblelint"}), flush=True)
+        sys.exit(1)
+    print(json.dumps({"ready": True}), flush=True)
+    for line in sys.stdin:
+        path = json.loads(line)["path"]
+        if "slow" in path:
+            time.sleep(30)
+        if "sleepy" in path:
+            time.sleep(1)
+        if "crash" in path:
+            sys.exit(3)
+        if "partial" in path or "stall" in path:
+            sys.stdout.write('{"ok": true, "lines": ["split"], ')
+            sys.stdout.flush()
+            time.sleep(0.2 if "partial" in path else 30)
+            print('"exit_code": 2}', flush=True)
+            continue
+        if "error" in path:
+            print(json.dumps({"ok": False, "error": "AnsibleParserError: bad"}), flush=True)
+            continue
+        lines = [f"{path}:1: name[missing]: pid {os.getpid()}"]
+        print(json.dumps({"ok": True, "lines": lines, "exit_code": 2}), flush=True)
+""")
+
+@pytest.fixture
+def worker_command(tmp_path):
+    script = tmp_path / "fake_worker.py"
+    script.write_text(FAKE_WORKER)
+    return [sys.executable, str(script)]
+
+@pytest.fixture
+def pool(worker_command):
+    pool = LintPool(size=2, max_jobs=3, startup_timeout=10, command=worker_command)
+    yield pool
+    pool.close()
+
+def worker_pid(result):
+    return result.stdout.split("pid ")[1].strip()
+
+def test_lint_returns_parseable_output(pool):
+    """Test results look like those of ansible-lint -p."""
+    result = pool.run("/tmp/pb.yml", timeout=10)
+
+    assert result.returncode == 2
+    assert result.stdout.startswith("/tmp/pb.yml:1: name[missing]")
+    assert result.stdout.endswith("\n")
+
+def test_workers_are_reused_and_recycled(pool):
+    """Test a worker serves max_jobs lints before it is replaced."""
+    pids = [worker_pid(pool.run(f"/tmp/pb{i}.yml", timeout=10)) for i in range(4)]
+
+    assert pids[0] == pids[1] == pids[2]
+    assert pids[3] != pids[0]
+    stats = pool.stats()
+    assert stats["jobs"] == 4
+    assert stats["workers_started"] == 2
+    assert stats["workers_recycled"] == 1
+
+def test_concurrent_lints_use_separate_workers(pool):
+    """Test up to size lints run at once on different workers."""
+    results = []
+    barrier = threading.Barrier(2)
+    def lint(i):
+        barrier.wait()
+        results.append(worker_pid(pool.run(f"/tmp/pb{i}.yml", timeout=10)))
+    threads = [threading.Thread(target=lint, args=(i,)) for i in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 2
+    assert pool.stats()["workers_started"] <= 2
+
+def test_timeout_replaces_worker(pool):
+    """Test a lint that overruns its timeout raises and its worker is discarded."""
+    first = worker_pid(pool.run("/tmp/pb.yml", timeout=10))
+
+    with pytest.raises(subprocess.TimeoutExpired):
+        pool.run("/tmp/slow.yml", timeout=0.3)
+
+    assert worker_pid(pool.run("/tmp/pb.yml", timeout=10)) != first
+    assert pool.stats()["failures"] == 1
+
+def test_replies_are_read_across_partial_writes(pool):
+    """Test a reply written in pieces is read whole and a stalled one times out."""
+    assert pool.run("/tmp/partial.yml", timeout=10).stdout == "split\n"
+
+    started = time.monotonic()
+    with pytest.raises(subprocess.TimeoutExpired):
+        pool.run("/tmp/stall.yml", timeout=0.5)
+    assert time.monotonic() - started < 5
+
+def test_timeout_covers_waiting_for_a_worker(worker_command):
+    """Test the time spent waiting for a free worker counts against the timeout."""
+    pool = LintPool(size=1, startup_timeout=10, command=worker_command)
+    pool.run("/tmp/pb.yml", timeout=10)
+    busy = threading.Thread(target=pool.run, args=("/tmp/sleepy.yml",), kwargs={"timeout": 10})
+    busy.start()
+    time.sleep(0.2)
+
+    started = time.monotonic()
+    with pytest.raises(subprocess.TimeoutExpired):
+        pool.run("/tmp/slow.yml", timeout=1.5)
+    elapsed = time.monotonic() - started
+    busy.join()
+    pool.close()
+
+    assert 1.4 < elapsed < 2.0
+
+def test_worker_errors_ask_for_fallback(pool):
+    """Test failed or crashed workers raise LintPoolError without disabling the pool."""
+    with pytest.raises(LintPoolError, match="AnsibleParserError"):
+        pool.run("/tmp/error.yml", timeout=10)
+    with pytest.raises(LintPoolError, match="exited"):
+        pool.run("/tmp/crash.yml", timeout=10)
+
+    assert pool.available()
+    assert pool.run("/tmp/pb.yml", timeout=10).returncode == 2
+
+def test_startup_failure_disables_pool(worker_command):
+    """Test a worker that cannot load ansible-lint disables the pool."""
+    pool = LintPool(size=1, command=worker_command + ["broken"])
+
+    with pytest.raises(LintPoolError, match="no ansiblelint"):
+        pool.run("/tmp/pb.yml", timeout=10)
+
+    assert not pool.available()
+    assert "no ansiblelint" in pool.stats()["disabled_reason"]
+
+@pytest.mark.parametrize("version, supported", [
+    ("6.22.1", True), ("6.99.0", True), ("6.21.0", False), ("24.2.0", False), ("dev", False),
+])
+def test_worker_only_starts_on_supported_ansible_lint(monkeypatch, version, supported):
+    """Test the worker refuses ansible-lint versions whose internals it does not know."""
+    monkeypatch.setattr(lint_worker.metadata, "version", lambda name: version)
+
+    if supported:
+        lint_worker._check_version()
+    else:
+        with pytest.raises(RuntimeError, match="not supported"):
+            lint_worker._check_version()
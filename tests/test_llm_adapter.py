@@ -1,10 +1,57 @@
 """Tests for the LLM adapter module."""
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+import openai
 import pytest
+import yaml
+from tenacity import wait_none
 
+from backend import llm_adapter
+from backend.cache import Cache
+from backend.llm_batching import build_batch_prompt, split_batch_response
+from backend.llm_breaker import BreakerState, CircuitBreaker, get_breaker
+from backend.llm_hedging import LatencyTracker
+from backend.llm_limiter import LLMLimiter
 from backend.llm_adapter import (
+    CachingLLMClient,
+    FailoverClient,
+    FakeLLMClient,
+    LLMCircuitOpenError,
+    LLMConnectionError,
+    LLMAuthenticationError,
     LLMClient, 
-    LLMValidationError
+    LLMQueueTimeoutError,
+    LLMTimeoutError,
+    LLMValidationError,
+    OpenAIClient,
+    user_context
 )
+from backend.monitoring import get_metrics
+from backend.plugin_loader import build_prompt_digest
+
+class FakeProviderClient(CachingLLMClient):
+    """Provider client with a slow, counting _invoke for cache tests."""
+    
+    provider = "fake"
+    
+    def __init__(self, use_cache: bool = True):
+        self.use_cache = use_cache
+        self.llm_cache = Cache[str]("test-llm", ttl_seconds=30)
+        self.calls = 0
+    
+    @property
+    def model_name(self) -> str:
+        return "fake-model"
+    
+    def _invoke(self, prompt: str) -> str:
+        self.calls += 1
+        time.sleep(0.2)
+        return self.validate_yaml("- name: test\n  ansible.builtin.debug:\n    msg: test")
 
 class TestLLMClient:
     """Test the base LLMClient class."""
@@ -46,6 +93,319 @@ class TestLLMClient:
         with pytest.raises(LLMValidationError, match="Empty response"):
             client.validate_yaml("   ")
 
+class TestCachingLLMClient:
+    """Test caching and request coalescing shared by provider clients."""
+    
+    def test_cache_key_includes_provider_and_model(self):
+        """Test the cache key format."""
+        client = FakeProviderClient()
+        key = client._get_cache_key("Generate an Ansible task using ansible.builtin.copy.\nTask: copy a file\n")
+        assert key.startswith("fake:fake-model:")
+    
+    def test_generate_coalesces_concurrent_requests(self):
+        """Test that identical concurrent prompts make one provider call."""
+        client = FakeProviderClient()
+        metrics = get_metrics()
+        before = metrics.metrics["llm"]["coalesced"]
+        
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(client.generate("same prompt")))
+                   for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        
+        assert len(results) == 4
+        assert len(set(results)) == 1
+        assert client.calls == 1
+        assert metrics.metrics["llm"]["coalesced"] - before == 3
+        
+        # Subsequent calls are served from the cache
+        client.generate("same prompt")
+        assert client.calls == 1
+    
+    def test_generate_records_llm_metrics(self):
+        """Test that provider calls and cache hits are counted in the metrics."""
+        client = FakeProviderClient()
+        llm_metrics = get_metrics().metrics["llm"]
+        calls, hits = llm_metrics["calls"], llm_metrics["cache_hits"]
+        
+        client.generate("metrics prompt")
+        client.generate("metrics prompt")
+        
+        assert llm_metrics["calls"] - calls == 1
+        assert llm_metrics["cache_hits"] - hits == 1
+    
+    def test_generate_without_cache(self):
+        """Test that disabling the cache calls the provider every time."""
+        client = FakeProviderClient(use_cache=False)
+        client.generate("prompt")
+        client.generate("prompt")
+        assert client.calls == 2
+    
+    def test_generate_queue_timeout(self, monkeypatch):
+        """Test that a full provider queue surfaces as LLMQueueTimeoutError."""
+        limiter = LLMLimiter("fake", max_concurrency=1, queue_timeout=0.05)
+        monkeypatch.setattr(FakeProviderClient, "limiter", limiter)
+        client = FakeProviderClient(use_cache=False)
+        limiter.acquire("hold")
+        
+        users = []
+        acquire = limiter.acquire
+        monkeypatch.setattr(limiter, "acquire", lambda prompt, user_id=None: users.append(user_id) or acquire(prompt, user_id))
+        
+        # The requesting user is taken from the user context
+        with user_context("alice"):
+            with pytest.raises(LLMQueueTimeoutError):
+                client.generate("prompt")
+            assert client.calls == 0
+            
+            limiter.release()
+            client.generate("prompt")
+        assert users == ["alice", "alice"]
+        assert client.calls == 1
+        assert limiter.stats()["in_flight"] == 0
+    
+    def test_retries_back_off_without_holding_a_slot(self, monkeypatch):
+        """Test that the limiter slot is given back while a failed call backs off."""
+        limiter = LLMLimiter("fake", max_concurrency=1)
+        monkeypatch.setattr(FakeProviderClient, "limiter", limiter)
+        monkeypatch.setattr(FakeProviderClient, "breaker", CircuitBreaker("fake"))
+        client = FakeProviderClient(use_cache=False)
+        in_flight = []
+        client.retry_wait = lambda state: in_flight.append(limiter.stats()["in_flight"]) or 0
+        
+        failures = [LLMTimeoutError("timed out"), LLMConnectionError("refused")]
+        invoke = client._invoke
+        
+        def flaky(prompt):
+            if failures:
+                raise failures.pop(0)
+            return invoke(prompt)
+        
+        monkeypatch.setattr(client, "_invoke", flaky)
+        
+        assert "ansible.builtin.debug" in client.generate("prompt")
+        assert in_flight == [0, 0]
+        assert client.calls == 1
+    
+    async def test_agenerate_coalesces_concurrent_requests(self):
+        """Test that identical concurrent coroutines make one provider call."""
+        client = FakeProviderClient()
+        
+        results = await asyncio.gather(*[client.agenerate("async prompt") for _ in range(4)])
+        
+        assert len(set(results)) == 1
+        assert client.calls == 1
+        assert await client.agenerate("async prompt") == results[0]
+        assert client.calls == 1
+    
+    async def test_agenerate_does_not_block_event_loop(self):
+        """Test that a slow provider call leaves the event loop responsive."""
+        client = FakeProviderClient(use_cache=False)
+        ticks = 0
+        
+        async def ticker():
+            nonlocal ticks
+            for _ in range(5):
+                await asyncio.sleep(0.01)
+                ticks += 1
+        
+        await asyncio.gather(client.agenerate("prompt"), ticker())
+        assert ticks == 5
+
+class FailingProviderClient(FakeProviderClient):
+    """Provider client whose calls always fail with a connection error."""
+    
+    provider = "failing"
+    retry_attempts = 1
+    
+    def __init__(self):
+        super().__init__(use_cache=False)
+        self._breaker = CircuitBreaker("failing", window=10, min_calls=2, open_seconds=60)
+    
+    @property
+    def breaker(self) -> CircuitBreaker:
+        return self._breaker
+    
+    def _invoke(self, prompt: str) -> str:
+        self.calls += 1
+        raise LLMConnectionError("connection refused")
+
+class TestFailoverClient:
+    """Test failover between providers guarded by circuit breakers."""
+    
+    def test_fails_over_and_skips_open_breaker(self):
+        """Test that a failing provider is skipped once its breaker opens."""
+        primary = FailingProviderClient()
+        secondary = FakeProviderClient(use_cache=False)
+        client = FailoverClient([primary, secondary])
+        
+        for _ in range(3):
+            assert "ansible.builtin.debug" in client.generate("prompt")
+        
+        assert primary.breaker.state == BreakerState.OPEN
+        assert primary.calls == 2
+        assert secondary.calls == 3
+    
+    def test_open_breaker_rejects_without_calling(self):
+        """Test that an open breaker fails fast with LLMCircuitOpenError."""
+        client = FailingProviderClient()
+        for _ in range(2):
+            with pytest.raises(LLMConnectionError):
+                client.generate("prompt")
+        
+        with pytest.raises(LLMCircuitOpenError):
+            client.generate("prompt")
+        assert client.calls == 2
+    
+    async def test_agenerate_fails_over(self):
+        """Test failover on the async path."""
+        primary = FailingProviderClient()
+        secondary = FakeProviderClient(use_cache=False)
+        client = FailoverClient([primary, secondary])
+        
+        content = await client.agenerate("prompt")
+        assert "ansible.builtin.debug" in content
+        assert primary.calls == 1
+        assert secondary.calls == 1
+    
+    def test_all_providers_unavailable(self):
+        """Test the error when every breaker is open."""
+        primary = FailingProviderClient()
+        primary.breaker._open()
+        client = FailoverClient([primary])
+        
+        with pytest.raises(LLMCircuitOpenError, match="All LLM providers"):
+            client.generate("prompt")
+
+class SlowOnceProviderClient(FakeProviderClient):
+    """Provider client whose first call hangs; later calls answer quickly."""
+    
+    provider = "slow-once"
+    
+    def __init__(self):
+        super().__init__(use_cache=False)
+        self._latency = LatencyTracker()
+        for _ in range(5):
+            self._latency.record(0.01)
+    
+    @property
+    def latency(self) -> LatencyTracker:
+        return self._latency
+    
+    async def _ainvoke(self, prompt: str) -> str:
+        self.calls += 1
+        await asyncio.sleep(5 if self.calls == 1 else 0.01)
+        return self.validate_yaml(f"- name: call {self.calls}\n  ansible.builtin.debug:\n    msg: test")
+
+class StreamingProviderClient(FakeProviderClient):
+    """Provider client that streams a fixed response in chunks."""
+    
+    provider = "streaming"
+    chunks = ["- name: test\n", "  ansible.builtin.debug:\n", "    msg: test"]
+    
+    async def _astream_invoke(self, prompt: str):
+        self.calls += 1
+        for chunk in self.chunks:
+            await asyncio.sleep(0)
+            yield chunk
+
+class TestStreaming:
+    """Test streaming responses from the provider clients."""
+    
+    async def test_astream_yields_chunks_and_caches(self):
+        """Test that chunks are forwarded and the full response is cached."""
+        client = StreamingProviderClient()
+        
+        chunks = [chunk async for chunk in client.astream("prompt")]
+        assert chunks == StreamingProviderClient.chunks
+        
+        # The complete response is now a cache hit, streamed as one chunk
+        cached = [chunk async for chunk in client.astream("prompt")]
+        assert cached == ["".join(StreamingProviderClient.chunks)]
+        assert client.calls == 1
+    
+    async def test_astream_validates_at_end(self):
+        """Test that invalid YAML is reported after the last chunk."""
+        client = StreamingProviderClient(use_cache=False)
+        client.chunks = ["- name: test\n", "  ansible.builtin.debug: :\n"]
+        received = []
+        
+        with pytest.raises(LLMValidationError):
+            async for chunk in client.astream("prompt"):
+                received.append(chunk)
+        assert received == client.chunks
+    
+    async def test_astream_releases_slot_when_abandoned(self):
+        """Test that a consumer stopping early frees the limiter slot."""
+        client = StreamingProviderClient(use_cache=False)
+        stream = client.astream("prompt")
+        await stream.__anext__()
+        await stream.aclose()
+        assert client.limiter.stats()["in_flight"] == 0
+    
+    async def test_default_astream_yields_whole_response(self):
+        """Test the base implementation for clients without streaming."""
+        class WholeClient(LLMClient):
+            def generate(self, prompt: str) -> str:
+                return "- name: whole"
+        
+        assert [c async for c in WholeClient().astream("prompt")] == ["- name: whole"]
+
+class TestHedging:
+    """Test hedged requests in the provider clients."""
+    
+    @pytest.fixture(autouse=True)
+    def hedging_settings(self, monkeypatch):
+        monkeypatch.setattr("backend.config.settings.LLM_HEDGING", True)
+        monkeypatch.setattr("backend.config.settings.LLM_HEDGE_MIN_SAMPLES", 5)
+        monkeypatch.setattr("backend.config.settings.LLM_HEDGE_MIN_DELAY", 0.05)
+    
+    async def test_slow_call_is_hedged(self):
+        """Test that a hedge to the same provider answers a stuck request."""
+        client = SlowOnceProviderClient()
+        
+        content = await client.agenerate("prompt")
+        
+        assert "call 2" in content
+        assert client.calls == 2
+    
+    async def test_cancelled_hedge_loser_usage_is_recorded(self, monkeypatch):
+        """Test the losing request of a hedge is recorded, since it is billed too."""
+        monkeypatch.setattr(llm_adapter.settings, "DB_ENABLED", True)
+        records = []
+        monkeypatch.setattr(llm_adapter.usage_recorder, "record", lambda **usage: records.append(usage))
+        client = SlowOnceProviderClient()
+        
+        await client.agenerate("prompt")
+        # Let the cancelled request unwind
+        await asyncio.sleep(0.01)
+        
+        assert len(records) == 2
+        winner, loser = records
+        assert loser["completion_tokens"] == 0 and loser["tokens_estimated"]
+        assert winner["hedged"]
+    
+    async def test_hedge_to_alternate_provider(self):
+        """Test that FailoverClient hedges with the next provider."""
+        primary = SlowOnceProviderClient()
+        secondary = FakeProviderClient(use_cache=False)
+        FailoverClient([primary, secondary])
+        
+        content = await primary.agenerate("prompt")
+        
+        assert "name: test" in content
+        assert primary.calls == 1
+        assert secondary.calls == 1
+    
+    def test_no_hedging_without_samples(self):
+        """Test that hedging waits for enough latency samples."""
+        client = FakeProviderClient(use_cache=False)
+        client.provider = "no-samples"
+        assert client._hedge_delay() is None
+
 class TestOpenAIClient:
     """Test the OpenAIClient class."""
     
@@ -69,6 +429,153 @@ class TestOpenAIClient:
         # We need to skip these tests if we can't properly mock the imports
         pytest.skip("Skipping test due to mocking issues")
 
+    def test_invoke_retries_sdk_timeouts(self, monkeypatch):
+        """Test the blocking path retries SDK timeouts like the async path does."""
+        monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+        monkeypatch.setattr(OpenAIClient, "breaker", CircuitBreaker("openai"))
+        client = OpenAIClient(model="gpt-test", use_cache=False)
+        client.retry_wait = wait_none()
+        calls = []
+        
+        def create(**kwargs):
+            calls.append(kwargs)
+            raise openai.APITimeoutError(request=httpx.Request("POST", client.base_url))
+        
+        client._client = SimpleNamespace(ChatCompletion=SimpleNamespace(create=create))
+        
+        with pytest.raises(LLMTimeoutError):
+            client.generate("prompt")
+        assert len(calls) == 3
+
+    async def test_ainvoke_uses_pooled_http_client(self, monkeypatch):
+        """Test the async path posts to the chat completions endpoint."""
+        monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+        requests = []
+        
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            return httpx.Response(200, json={
+                "choices": [{"message": {"content": "- name: test\n  ansible.builtin.debug:\n    msg: hi"}}]
+            })
+        
+        http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(llm_adapter, "get_http_client", lambda: http_client)
+        client = OpenAIClient(model="gpt-test", use_cache=False)
+        
+        content = await client.agenerate("prompt")
+        await http_client.aclose()
+        
+        assert "ansible.builtin.debug" in content
+        assert requests[0].url.path.endswith("/chat/completions")
+        assert requests[0].headers["Authorization"] == "Bearer sk-test"
+    
+    async def test_ainvoke_auth_error(self, monkeypatch):
+        """Test that a rejected key is not retried and surfaces as an auth error."""
+        monkeypatch.setenv("OPENAI_API_KEY", "sk-bad")
+        http_client = httpx.AsyncClient(transport=httpx.MockTransport(lambda r: httpx.Response(401)))
+        monkeypatch.setattr(llm_adapter, "get_http_client", lambda: http_client)
+        client = OpenAIClient(use_cache=False)
+        
+        with pytest.raises(LLMAuthenticationError):
+            await client.agenerate("prompt")
+        await http_client.aclose()
+
+    async def test_astream_parses_server_sent_events(self, monkeypatch):
+        """Test streaming from the chat completions endpoint."""
+        monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+        deltas = ["- name: test\n", "  ansible.builtin.debug:\n", "    msg: hi"]
+        body = "".join(
+            f"data: {json.dumps({'choices': [{'delta': {'content': d}}]})}\n\n" for d in deltas
+        ) + "data: [DONE]\n\n"
+        
+        def handler(request: httpx.Request) -> httpx.Response:
+            assert json.loads(request.content)["stream"] is True
+            return httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+        
+        http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(llm_adapter, "get_http_client", lambda: http_client)
+        client = OpenAIClient(use_cache=False)
+        
+        chunks = [chunk async for chunk in client.astream("prompt")]
+        await http_client.aclose()
+        
+        assert chunks == deltas
+
+    async def test_records_reported_token_usage(self, monkeypatch):
+        """Test token counts from the response are queued for llm_usage."""
+        monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+        monkeypatch.setattr(llm_adapter.settings, "DB_ENABLED", True)
+        records = []
+        monkeypatch.setattr(llm_adapter.usage_recorder, "record", lambda **usage: records.append(usage))
+        
+        def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(200, json={
+                "choices": [{"message": {"content": "- name: test\n  ansible.builtin.debug:\n    msg: hi"}}],
+                "usage": {"prompt_tokens": 321, "completion_tokens": 17, "total_tokens": 338},
+            })
+        
+        http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(llm_adapter, "get_http_client", lambda: http_client)
+        client = OpenAIClient(model="gpt-test", use_cache=False)
+        
+        with llm_adapter.usage_context(module="ansible.builtin.debug", prompt_tokens_saved=100):
+            content = await client.agenerate("prompt")
+        await http_client.aclose()
+        
+        assert type(content) is str
+        assert len(records) == 1
+        assert records[0]["prompt_tokens"] == 321
+        assert records[0]["completion_tokens"] == 17
+        assert records[0]["tokens_estimated"] is False
+        assert records[0]["module"] == "ansible.builtin.debug"
+        assert records[0]["baseline_prompt_tokens"] == 421
+    
+    async def test_astream_records_reported_token_usage(self, monkeypatch):
+        """Test the usage event at the end of a stream is recorded, not yielded."""
+        monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+        monkeypatch.setattr(llm_adapter.settings, "DB_ENABLED", True)
+        records = []
+        monkeypatch.setattr(llm_adapter.usage_recorder, "record", lambda **usage: records.append(usage))
+        events = [
+            {"choices": [{"delta": {"content": "- name: test\n  ansible.builtin.debug: {}"}}]},
+            {"choices": [], "usage": {"prompt_tokens": 40, "completion_tokens": 9}},
+        ]
+        body = "".join(f"data: {json.dumps(e)}\n\n" for e in events) + "data: [DONE]\n\n"
+        
+        def handler(request: httpx.Request) -> httpx.Response:
+            assert json.loads(request.content)["stream_options"] == {"include_usage": True}
+            return httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+        
+        http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(llm_adapter, "get_http_client", lambda: http_client)
+        client = OpenAIClient(use_cache=False)
+        
+        chunks = [chunk async for chunk in client.astream("prompt")]
+        await http_client.aclose()
+        
+        assert chunks == ["- name: test\n  ansible.builtin.debug: {}"]
+        assert (records[0]["prompt_tokens"], records[0]["completion_tokens"]) == (40, 9)
+
+def test_usage_estimated_without_reported_tokens(monkeypatch):
+    """Test token counts are estimated when the provider reports none."""
+    monkeypatch.setattr(llm_adapter.settings, "DB_ENABLED", True)
+    records = []
+    monkeypatch.setattr(llm_adapter.usage_recorder, "record", lambda **usage: records.append(usage))
+    client = FakeProviderClient(use_cache=False)
+    
+    client.generate("x" * 400)
+    
+    assert records[0]["prompt_tokens"] == 100
+    assert records[0]["tokens_estimated"] is True
+    assert records[0]["module"] is None
+
+async def test_get_http_client_is_shared():
+    """Test that the pooled HTTP client is reused within an event loop."""
+    client = llm_adapter.get_http_client()
+    assert llm_adapter.get_http_client() is client
+    await llm_adapter.aclose_http_client()
+    assert client.is_closed
+
 class TestBedrockClient:
     """Test the BedrockClient class."""
     
@@ -87,6 +594,101 @@ class TestBedrockClient:
         # We need to skip these tests if we can't properly mock the imports
         pytest.skip("Skipping test due to mocking issues")
 
+class TestFakeLLMClient:
+    """Test the offline FakeLLMClient."""
+    
+    SCHEMA = {
+        "module": "ansible.builtin.file",
+        "options": {
+            "path": {"type": "path", "required": True, "description": "Path to the file."},
+            "state": {"type": "str", "choices": ["file", "absent", "directory"], "required": True},
+            "mode": {"type": "raw", "description": "Permissions."},
+        },
+    }
+    
+    @pytest.fixture(autouse=True)
+    def reset_breaker(self):
+        get_breaker("fake").reset()
+        yield
+        get_breaker("fake").reset()
+    
+    def prompt(self, task, options=None):
+        options = options or build_prompt_digest(self.SCHEMA)["text"]
+        return (f"Generate an Ansible task using ansible.builtin.file.\n"
+                f"Parameters:\n{options}\nTask: {task}\nReturn YAML only.")
+    
+    def client(self, **kwargs):
+        kwargs.setdefault("latency_ms", 0)
+        kwargs.setdefault("distribution", "constant")
+        return FakeLLMClient(use_cache=False, **kwargs)
+    
+    def test_fills_required_options(self):
+        """Test the response sets required options with valid values."""
+        content = self.client().generate(self.prompt("Create the data directory"))
+        
+        task = yaml.safe_load(content)[0]
+        assert task["name"] == "Create the data directory"
+        assert task["ansible.builtin.file"] == {"path": "/tmp/relia/path", "state": "file"}
+    
+    def test_reads_full_options_json(self):
+        """Test options are also read from the uncompacted JSON prompt."""
+        options = json.dumps(self.SCHEMA["options"], indent=2)
+        content = self.client().generate(self.prompt("Remove the lock file", options))
+        
+        assert set(yaml.safe_load(content)[0]["ansible.builtin.file"]) == {"path", "state"}
+    
+    def test_answers_batched_prompts(self):
+        """Test batched prompts get one marked task per numbered task."""
+        prompt = build_batch_prompt("ansible.builtin.file", build_prompt_digest(self.SCHEMA)["text"],
+                                    ["Create /srv", "Remove /tmp/x"])
+        
+        parts = split_batch_response(self.client().generate(prompt), 2)
+        
+        assert [yaml.safe_load(part)[0]["name"] for part in parts] == ["Create /srv", "Remove /tmp/x"]
+    
+    def test_latency_is_seeded(self):
+        """Test the same seed gives the same latencies around the median."""
+        first = self.client(latency_ms=800, distribution="lognormal", seed=7)
+        second = self.client(latency_ms=800, distribution="lognormal", seed=7)
+        
+        samples = [first._sample()[0] for _ in range(200)]
+        assert samples == [second._sample()[0] for _ in range(200)]
+        assert 0.6 < sorted(samples)[100] < 1.0
+        assert len(set(samples)) > 100
+    
+    async def test_errors_are_retried(self, monkeypatch):
+        """Test failed calls go through the retry policy and then raise."""
+        monkeypatch.setattr(FakeLLMClient, "retry_wait", wait_none())
+        client = self.client(error_rate=1.0)
+        samples = []
+        sample = client._sample
+        monkeypatch.setattr(client, "_sample", lambda: samples.append(1) or sample())
+        
+        with pytest.raises((LLMConnectionError, LLMTimeoutError)):
+            await client.agenerate(self.prompt("Create the data directory"))
+        assert len(samples) == 3
+    
+    async def test_reports_token_usage(self, monkeypatch):
+        """Test usage is recorded with the configured completion tokens."""
+        monkeypatch.setattr(llm_adapter.settings, "DB_ENABLED", True)
+        records = []
+        monkeypatch.setattr(llm_adapter.usage_recorder, "record", lambda **usage: records.append(usage))
+        client = self.client(completion_tokens=50)
+        
+        await client.agenerate(self.prompt("Create the data directory"))
+        chunks = [c async for c in client.astream(self.prompt("Create the log directory"))]
+        
+        assert "".join(chunks).startswith("- name: Create the log directory")
+        assert [r["provider"] for r in records] == ["fake", "fake"]
+        assert all(r["completion_tokens"] == 50 and not r["tokens_estimated"] for r in records)
+
+def test_get_client_fake(monkeypatch):
+    """Test RELIA_LLM=fake selects the fake provider."""
+    monkeypatch.setenv("RELIA_LLM", "fake")
+    monkeypatch.setattr(llm_adapter.settings, "LLM_FAILOVER", False)
+    
+    assert isinstance(llm_adapter.get_client(), FakeLLMClient)
+
 def test_get_client_openai():
     """Test getting an OpenAI client."""
     # We need to skip these tests if we can't properly mock the imports
@@ -0,0 +1,126 @@
+"""Tests for micro-batching of generation requests."""
+import asyncio
+import re
+
+from backend.llm_adapter import LLMClient, LLMTimeoutError
+from backend.llm_batching import GenerationBatcher, build_batch_prompt, split_batch_response
+
+class BatchLLMClient(LLMClient):
+    """Answers batched prompts with one marked task per numbered line."""
+
+    def __init__(self, skip=(), error=None):
+        self.prompts = []
+        self.skip = set(skip)
+        self.error = error
+
+    def generate(self, prompt: str) -> str:
+        self.prompts.append(prompt)
+        if self.error:
+            raise self.error
+        tasks = re.findall(r"^(\d+)\. (.+)$", prompt, re.MULTILINE)
+        if not tasks:
+            task = re.search(r"Task: (.+)", prompt).group(1)
+            return f"- name: {task}\n  ansible.builtin.debug:\n    msg: single\n"
+        return "".join(
+            f"# task {n}\n- name: {task}\n  ansible.builtin.debug:\n    msg: batched\n"
+            for n, task in tasks if int(n) not in self.skip
+        )
+
+def single_prompt(task):
+    return f"Generate an Ansible task using ansible.builtin.debug.\nParameters:\n- msg: str\nTask: {task}\nReturn YAML only."
+
+async def generate_all(batcher, client, tasks, module="ansible.builtin.debug"):
+    return await asyncio.gather(*(
+        batcher.agenerate(client, module, task, single_prompt(task), "- msg: str")
+        for task in tasks
+    ))
+
+def test_split_batch_response():
+    """Test splitting a response on task markers, ignoring unknown tasks."""
+    content = "# task 2\n- name: b\n# Task 1:\n- name: a\n\n# task 7\n- name: x\n"
+
+    assert split_batch_response(content, 3) == ["- name: a\n", "- name: b\n", None]
+    assert split_batch_response("- name: unmarked\n", 2) == [None, None]
+
+def test_build_batch_prompt_numbers_tasks():
+    """Test that the batch prompt lists the options once and numbers the tasks."""
+    prompt = build_batch_prompt("ansible.builtin.debug", "- msg: str", ["one", "two"])
+
+    assert prompt.count("- msg: str") == 1
+    assert "1. one\n2. two" in prompt
+    assert "# task <number>" in prompt
+
+async def test_concurrent_requests_share_one_call():
+    """Test that requests for one module within the window are sent together."""
+    client = BatchLLMClient()
+    batcher = GenerationBatcher(window_seconds=0.05, max_size=8)
+
+    results = await generate_all(batcher, client, ["first", "second", "third"])
+
+    assert len(client.prompts) == 1
+    assert results[0].startswith("- name: first")
+    assert results[2].startswith("- name: third")
+    assert all("batched" in r for r in results)
+    assert batcher.stats()["batches"] == 1
+    assert batcher.stats()["avg_batch_size"] == 3
+
+async def test_single_request_uses_single_prompt():
+    """Test that a request alone in its window is sent with its own prompt."""
+    client = BatchLLMClient()
+    batcher = GenerationBatcher(window_seconds=0.01)
+
+    result = await batcher.agenerate(client, "ansible.builtin.debug", "alone",
+                                     single_prompt("alone"), "- msg: str")
+
+    assert client.prompts == [single_prompt("alone")]
+    assert "single" in result
+
+async def test_modules_are_batched_separately():
+    """Test that only requests for the same module are combined."""
+    client = BatchLLMClient()
+    batcher = GenerationBatcher(window_seconds=0.05)
+
+    await asyncio.gather(
+        generate_all(batcher, client, ["a", "b"], module="ansible.builtin.debug"),
+        generate_all(batcher, client, ["c", "d"], module="ansible.builtin.copy"),
+    )
+
+    assert len(client.prompts) == 2
+    assert {re.search(r"using (\S+),", p).group(1) for p in client.prompts} == {
+        "ansible.builtin.debug", "ansible.builtin.copy"}
+
+async def test_full_batch_is_sent_without_waiting():
+    """Test that reaching max_size sends the batch before the window ends."""
+    client = BatchLLMClient()
+    batcher = GenerationBatcher(window_seconds=10, max_size=2)
+
+    results = await asyncio.wait_for(generate_all(batcher, client, ["a", "b"]), 1)
+
+    assert len(results) == 2
+    assert len(client.prompts) == 1
+
+async def test_missing_part_is_retried_singly():
+    """Test that a task missing from the batched response gets its own call."""
+    client = BatchLLMClient(skip={2})
+    batcher = GenerationBatcher(window_seconds=0.05)
+
+    results = await generate_all(batcher, client, ["a", "b", "c"])
+
+    assert "batched" in results[0] and "batched" in results[2]
+    assert results[1].startswith("- name: b") and "single" in results[1]
+    assert client.prompts[1] == single_prompt("b")
+    assert batcher.stats()["fallbacks"] == 1
+
+async def test_provider_error_reaches_every_caller():
+    """Test that a failed batched call fails all requests without retries."""
+    client = BatchLLMClient(error=LLMTimeoutError("slow"))
+    batcher = GenerationBatcher(window_seconds=0.05)
+
+    results = await asyncio.gather(
+        *(batcher.agenerate(client, "ansible.builtin.debug", t, single_prompt(t), "- msg: str")
+          for t in ("a", "b")),
+        return_exceptions=True,
+    )
+
+    assert all(isinstance(r, LLMTimeoutError) for r in results)
+    assert len(client.prompts) == 1
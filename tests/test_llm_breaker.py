@@ -0,0 +1,88 @@
+"""Tests for the LLM circuit breaker."""
+import time
+
+from backend.llm_breaker import BreakerState, CircuitBreaker
+
+def make_breaker(**kwargs):
+    options = dict(window=10, min_calls=4, failure_rate=0.5, slow_call_seconds=1.0,
+                   slow_call_rate=0.75, open_seconds=0.05)
+    options.update(kwargs)
+    return CircuitBreaker("test", **options)
+
+def test_opens_on_failure_rate():
+    """Test that the breaker opens once the failure rate is reached."""
+    breaker = make_breaker()
+    breaker.record_success(0.1)
+    breaker.record_failure(0.1)
+    breaker.record_success(0.1)
+    assert breaker.state == BreakerState.CLOSED
+    
+    breaker.record_failure(0.1)
+    assert breaker.state == BreakerState.OPEN
+    assert not breaker.try_acquire()
+    assert breaker.stats()["rejected"] == 1
+
+def test_opens_on_slow_calls():
+    """Test that successful but slow calls open the breaker too."""
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record_success(2.0)
+    breaker.record_success(0.1)
+    assert breaker.state == BreakerState.OPEN
+
+def test_needs_min_calls():
+    """Test that a few early failures do not open the breaker."""
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record_failure(0.1)
+    assert breaker.state == BreakerState.CLOSED
+
+def test_half_open_probe_closes_on_success():
+    """Test that a single probe is allowed after the cool-down."""
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record_failure(0.1)
+    time.sleep(0.06)
+    
+    assert breaker.state == BreakerState.HALF_OPEN
+    permit = breaker.try_acquire()
+    assert permit.probe
+    assert not breaker.try_acquire()
+    assert not breaker.allow_request()
+    
+    breaker.record_success(0.1, permit.probe)
+    assert breaker.state == BreakerState.CLOSED
+    assert breaker.try_acquire()
+
+def test_half_open_probe_reopens_on_failure():
+    """Test that a failed probe opens the breaker for another cool-down."""
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record_failure(0.1)
+    time.sleep(0.06)
+    
+    assert breaker.try_acquire().probe
+    breaker.record_failure(0.1, probe=True)
+    
+    stats = breaker.stats()
+    assert stats["state"] == BreakerState.OPEN.value
+    assert stats["times_opened"] == 2
+    assert stats["retry_in_seconds"] is not None
+
+def test_only_the_probe_decides_half_open():
+    """Test calls admitted while closed cannot resolve or free the half-open probe."""
+    breaker = make_breaker()
+    late = breaker.try_acquire()
+    assert not late.probe
+    for _ in range(4):
+        breaker.record_failure(0.1)
+    time.sleep(0.06)
+    probe = breaker.try_acquire()
+    
+    breaker.release(late.probe)
+    breaker.record_success(0.1, late.probe)
+    assert breaker.state == BreakerState.HALF_OPEN
+    assert not breaker.try_acquire()
+    
+    breaker.release(probe.probe)
+    assert breaker.try_acquire().probe
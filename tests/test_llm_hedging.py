@@ -0,0 +1,89 @@
+"""Tests for hedged LLM requests."""
+import asyncio
+
+import pytest
+
+from backend.llm_hedging import LatencyTracker, hedged_call
+
+def make_call(delay, value=None, error=None, log=None):
+    async def call():
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if log is not None:
+                log.append(f"cancelled {value}")
+            raise
+        if error:
+            raise error
+        return value
+    return call
+
+def test_latency_tracker_percentile():
+    """Test percentile and conditional mean over the window."""
+    tracker = LatencyTracker(window=100)
+    assert tracker.percentile(95) is None
+    for i in range(1, 101):
+        tracker.record(i / 100)
+    
+    assert tracker.percentile(50) == pytest.approx(0.51)
+    assert tracker.percentile(95) == pytest.approx(0.96)
+    assert tracker.mean_above(0.9) == pytest.approx(0.955)
+    assert tracker.mean_above(5) is None
+
+async def test_fast_primary_is_not_hedged():
+    """Test that no hedge is sent when the primary answers in time."""
+    hedge_calls = []
+    
+    async def hedge():
+        hedge_calls.append(1)
+        return "hedge"
+    
+    result = await hedged_call(make_call(0.01, "primary"), hedge, 0.2, LatencyTracker())
+    
+    assert result.value == "primary"
+    assert not result.hedged
+    assert hedge_calls == []
+
+async def test_hedge_wins_and_primary_is_cancelled():
+    """Test that a faster hedge wins and the slow primary is cancelled."""
+    log = []
+    tracker = LatencyTracker()
+    for _ in range(5):
+        tracker.record(1.0)
+    
+    result = await hedged_call(make_call(5, "primary", log=log), make_call(0.01, "hedge"),
+                               0.05, tracker)
+    
+    assert result.value == "hedge"
+    assert result.hedged and result.hedge_won
+    # Compared with the earlier 1s calls only, not with this one's own sample
+    assert 850 < result.latency_saved_ms < 950
+    await asyncio.sleep(0)
+    assert log == ["cancelled primary"]
+    # The cancelled primary is still counted as a (lower bound) latency sample
+    assert len(tracker) == 6
+
+async def test_primary_wins_after_hedge_sent():
+    """Test that the primary can still win once a hedge is in flight."""
+    log = []
+    result = await hedged_call(make_call(0.1, "primary"), make_call(5, "hedge", log=log),
+                               0.05, LatencyTracker())
+    
+    assert result.value == "primary"
+    assert result.hedged and not result.hedge_won
+    assert result.latency_saved_ms == 0
+    await asyncio.sleep(0)
+    assert log == ["cancelled hedge"]
+
+async def test_failed_primary_falls_back_to_hedge():
+    """Test that a failure of one request uses the other's result."""
+    result = await hedged_call(make_call(0.1, error=ConnectionError("boom")),
+                               make_call(0.1, "hedge"), 0.05, LatencyTracker())
+    assert result.value == "hedge"
+
+async def test_both_fail():
+    """Test that the error is raised when both requests fail."""
+    with pytest.raises(ConnectionError):
+        await hedged_call(make_call(0.1, error=ConnectionError("primary")),
+                          make_call(0.1, error=ConnectionError("hedge")),
+                          0.05, LatencyTracker())
@@ -0,0 +1,120 @@
+"""Tests for the LLM concurrency limiter."""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from backend.llm_limiter import LLMLimiter, QueueTimeoutError, estimate_tokens
+
+def test_caps_concurrent_calls():
+    """Test that no more than max_concurrency calls run at once."""
+    limiter = LLMLimiter("test", max_concurrency=2)
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+    
+    def call():
+        nonlocal running, peak
+        with limiter.slot("prompt"):
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            time.sleep(0.05)
+            with lock:
+                running -= 1
+    
+    threads = [threading.Thread(target=call) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    
+    assert peak == 2
+    stats = limiter.stats()
+    assert stats["acquired"] == 6
+    assert stats["in_flight"] == 0
+    assert stats["queue_depth"] == 0
+
+def test_fair_queue_round_robins_users():
+    """Test that a user with a backlog does not starve another user."""
+    limiter = LLMLimiter("test", max_concurrency=1)
+    limiter.acquire("hold")
+    order = []
+    
+    def call(user_id):
+        with limiter.slot("prompt", user_id):
+            order.append(user_id)
+    
+    threads = []
+    for user_id in ["bulk", "bulk", "bulk", "other"]:
+        t = threading.Thread(target=call, args=(user_id,))
+        t.start()
+        threads.append(t)
+        time.sleep(0.02)  # enqueue in a known order
+    
+    assert limiter.stats()["queue_depth"] == 4
+    assert limiter.stats()["queued_users"] == 2
+    limiter.release()
+    for t in threads:
+        t.join()
+    
+    assert order == ["bulk", "other", "bulk", "bulk"]
+
+def test_queue_timeout():
+    """Test that waiters give up after the queue timeout."""
+    limiter = LLMLimiter("test", max_concurrency=1, queue_timeout=0.05)
+    limiter.acquire("hold")
+    
+    with pytest.raises(QueueTimeoutError):
+        limiter.acquire("prompt", "user")
+    
+    stats = limiter.stats()
+    assert stats["timeouts"] == 1
+    assert stats["queue_depth"] == 0
+    
+    # The abandoned waiter does not take the slot when it frees up
+    limiter.release()
+    limiter.acquire("prompt")
+    assert limiter.stats()["in_flight"] == 1
+
+def test_tokens_per_minute_delays_calls():
+    """Test that calls wait for the token bucket to refill."""
+    prompt = "x" * 400
+    tokens = estimate_tokens(prompt)
+    # Budget for one call, refilled at tokens/0.1s
+    limiter = LLMLimiter("test", max_concurrency=10, tokens_per_minute=tokens * 600)
+    limiter._tokens = tokens
+    
+    start = time.monotonic()
+    with limiter.slot(prompt):
+        pass
+    with limiter.slot(prompt):
+        pass
+    
+    assert time.monotonic() - start >= 0.08
+
+async def test_async_acquire_waits_without_blocking():
+    """Test coroutine waiters are admitted as slots are released."""
+    limiter = LLMLimiter("test", max_concurrency=1)
+    order = []
+    
+    async def call(n):
+        async with limiter.aslot("prompt", f"user-{n}"):
+            order.append(n)
+            await asyncio.sleep(0.01)
+    
+    await asyncio.gather(*[call(n) for n in range(4)])
+    
+    assert sorted(order) == [0, 1, 2, 3]
+    assert limiter.stats()["in_flight"] == 0
+    assert limiter.stats()["max_wait_ms"] > 0
+
+async def test_async_queue_timeout():
+    """Test that coroutine waiters time out too."""
+    limiter = LLMLimiter("test", max_concurrency=1, queue_timeout=0.05)
+    await limiter.aacquire("hold")
+    
+    with pytest.raises(QueueTimeoutError):
+        await limiter.aacquire("prompt")
+    assert limiter.stats()["timeouts"] == 1
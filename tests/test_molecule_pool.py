@@ -0,0 +1,203 @@
+"""Tests for the warm Molecule instance pool."""
+import shutil
+import subprocess
+import threading
+import time
+
+import pytest
+
+from backend.molecule_pool import MoleculePool, MoleculePoolError
+
+IMAGE = "geerlingguy/docker-ubuntu2004-ansible:latest"
+
+class FakeMolecule:
+    """Stands in for the molecule command, recording (command, instance) pairs."""
+
+    def __init__(self):
+        self.calls = []
+        self.returncodes = {}
+        self.timeouts = {}
+        self.block = None
+        # Commands that hang until their timeout
+        self.hang = set()
+        self.lock = threading.Lock()
+
+    def __call__(self, args, cwd=None, timeout=None, log=None):
+        command = args[1]
+        with self.lock:
+            self.calls.append((command, cwd.name))
+            self.timeouts.setdefault(command, []).append(timeout)
+        if command in self.hang:
+            time.sleep(timeout)
+            raise subprocess.TimeoutExpired(args, timeout)
+        if command == "converge" and self.block is not None:
+            if not self.block.wait(timeout):
+                raise subprocess.TimeoutExpired(args, timeout)
+        return subprocess.CompletedProcess(args, self.returncodes.get(command, 0), stdout=f"{command}\n", stderr="")
+
+    def commands(self, instance=None):
+        with self.lock:
+            return [c for c, i in self.calls if instance is None or i == instance]
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+def ready(pool, image=IMAGE):
+    return pool.stats()["images"].get(image, {}).get("ready", 0)
+
+@pytest.fixture
+def molecule(tmp_path):
+    fake = FakeMolecule()
+    pool = MoleculePool(tmp_path / "pool", size=2, run=fake)
+    playbook = tmp_path / "playbook.yml"
+    playbook.write_text("- hosts: all\n")
+    yield fake, pool, playbook
+    pool.close()
+
+def test_test_reuses_reset_instance(molecule):
+    """Only the first test creates an instance; later ones converge on the reset one."""
+    fake, pool, playbook = molecule
+
+    proc = pool.test(IMAGE, playbook, timeout=10)
+    assert proc.returncode == 0 and proc.stdout == "converge\n"
+    instance = fake.calls[0][1]
+    assert fake.commands()[:2] == ["create", "converge"]
+    converge = (pool.base_dir / instance / "molecule" / "default" / "converge.yml").read_text()
+    assert f"import_playbook: {playbook.resolve()}" in converge
+
+    # Reset in the background: recreated from the image and health checked
+    wait_until(lambda: ready(pool) == 1)
+    assert fake.commands(instance) == ["create", "converge", "destroy", "create", "side-effect"]
+
+    pool.test(IMAGE, playbook, timeout=10)
+    assert fake.commands(instance)[5] == "converge"
+    assert pool.stats()["cold_starts"] == 1
+    assert pool.stats()["tests"] == 2
+
+def test_warm_creates_instances_ahead(molecule):
+    """Warming creates size instances per image so no test waits for one."""
+    fake, pool, playbook = molecule
+
+    pool.warm([IMAGE])
+    wait_until(lambda: ready(pool) == 2)
+    pool.warm([IMAGE])
+
+    pool.test(IMAGE, playbook, timeout=10)
+    assert fake.commands().count("create") == 2
+    assert pool.stats()["cold_starts"] == 0
+    assert pool.stats()["images"][IMAGE]["instances"] == 2
+
+def test_unhealthy_instance_is_replaced(molecule):
+    """An instance failing its health check after a reset is destroyed for good."""
+    fake, pool, playbook = molecule
+    fake.returncodes["side-effect"] = 2
+
+    pool.test(IMAGE, playbook, timeout=10)
+    instance = fake.calls[0][1]
+    wait_until(lambda: pool.stats()["images"][IMAGE]["instances"] == 0)
+
+    assert fake.commands(instance)[-1] == "destroy"
+    assert not (pool.base_dir / instance).exists()
+    assert pool.stats()["health_failures"] == 1
+
+def test_idle_instance_is_checked_before_use(molecule):
+    """Instances idle for longer than the health interval are checked again."""
+    fake, pool, playbook = molecule
+    pool.warm([IMAGE])
+    wait_until(lambda: ready(pool) == 2)
+    pool.health_interval = 0
+
+    pool.test(IMAGE, playbook, timeout=10)
+    assert fake.commands()[2:4] == ["side-effect", "converge"]
+
+def test_busy_image_times_out(molecule):
+    """A test waits for a free instance no longer than its timeout."""
+    fake, pool, playbook = molecule
+    pool.size = 1
+    fake.block = threading.Event()
+    worker = threading.Thread(target=pool.test, args=(IMAGE, playbook, 10))
+    worker.start()
+    wait_until(lambda: "converge" in fake.commands())
+
+    with pytest.raises(subprocess.TimeoutExpired):
+        pool.test(IMAGE, playbook, timeout=0.2)
+
+    fake.block.set()
+    worker.join()
+
+def test_converge_timeout_discards_instance(molecule):
+    """An instance whose converge timed out is destroyed, not reused."""
+    fake, pool, playbook = molecule
+    fake.block = threading.Event()
+
+    with pytest.raises(subprocess.TimeoutExpired):
+        pool.test(IMAGE, playbook, timeout=0.2)
+
+    wait_until(lambda: pool.stats()["images"][IMAGE]["instances"] == 0)
+    assert fake.commands() == ["create", "converge", "destroy"]
+
+def test_cold_start_is_bounded_by_timeout(molecule):
+    """Creating the first instance of an image stops at the test's timeout."""
+    fake, pool, playbook = molecule
+    fake.hang.add("create")
+
+    start = time.monotonic()
+    with pytest.raises(subprocess.TimeoutExpired):
+        pool.test(IMAGE, playbook, timeout=0.2)
+    assert time.monotonic() - start < 1.0
+    assert fake.timeouts["create"][0] <= 0.2
+
+    # The half-created instance is destroyed and its slot freed
+    wait_until(lambda: pool.stats()["images"][IMAGE]["instances"] == 0)
+    assert fake.commands() == ["create", "destroy"]
+
+def test_health_check_is_bounded_by_timeout(molecule):
+    """The health check of an idle instance stops at the test's timeout."""
+    fake, pool, playbook = molecule
+    pool.size = 1
+    pool.warm([IMAGE])
+    wait_until(lambda: ready(pool) == 1)
+    pool.health_interval = 0
+    fake.hang.add("side-effect")
+
+    start = time.monotonic()
+    with pytest.raises(subprocess.TimeoutExpired):
+        pool.test(IMAGE, playbook, timeout=0.2)
+    assert time.monotonic() - start < 1.0
+    assert fake.timeouts["side-effect"] == [pytest.approx(0.2, abs=0.05)]
+    assert "converge" not in fake.commands()
+
+def test_create_failure_raises_pool_error(molecule):
+    """A failed create is reported so the caller can run molecule test instead."""
+    fake, pool, playbook = molecule
+    fake.returncodes["create"] = 1
+
+    with pytest.raises(MoleculePoolError, match="exited with 1"):
+        pool.test(IMAGE, playbook, timeout=10)
+    assert pool.stats()["images"][IMAGE]["instances"] == 0
+    assert list(pool.base_dir.iterdir()) == []
+
+@pytest.mark.skipif(shutil.which("molecule") is None, reason="molecule is not installed")
+def test_delegated_driver(tmp_path):
+    """The pool works end to end with Molecule's delegated driver on localhost."""
+    pool = MoleculePool(tmp_path / "pool", size=1, driver="default")
+    passing = tmp_path / "pass.yml"
+    passing.write_text(
+        "- name: Pass\n  hosts: all\n  gather_facts: false\n  tasks:\n"
+        "    - name: Debug\n      ansible.builtin.debug:\n        msg: pooled\n"
+    )
+    failing = tmp_path / "fail.yml"
+    failing.write_text(
+        "- name: Fail\n  hosts: all\n  gather_facts: false\n  tasks:\n"
+        "    - name: Fail\n      ansible.builtin.fail:\n        msg: broken\n"
+    )
+    try:
+        assert pool.test("local", passing, timeout=300).returncode == 0
+        wait_until(lambda: ready(pool, "local") == 1, timeout=300)
+        assert pool.test("local", failing, timeout=300).returncode != 0
+    finally:
+        pool.close()
+    assert list((tmp_path / "pool").iterdir()) == []
@@ -1,6 +1,58 @@
+import json
 
 import pytest
 
+from backend import plugin_loader
+from backend.plugin_loader import LazySchemaLoader, build_prompt_digest, get_prompt_digest
+
 def test_load_base_and_plugin(tmp_path):
     # Skip the test for now
-    pytest.skip("Skipping test_load_base_and_plugin due to issues with plugin loading")
\ No newline at end of file
+    pytest.skip("Skipping test_load_base_and_plugin due to issues with plugin loading")
+
+def test_lazy_loader_caches_unknown_modules(tmp_path, monkeypatch):
+    """Unknown modules are looked up on disk once, then served from the cache."""
+    (tmp_path / "copy.json").write_text(json.dumps({"title": "copy", "options": {}}))
+    loader = LazySchemaLoader(tmp_path)
+    
+    assert loader.get("copy")["title"] == "copy"
+    assert loader.get("no_such_module") is None
+    
+    checks = []
+    original_exists = type(tmp_path).exists
+    monkeypatch.setattr(type(tmp_path), "exists", lambda self: checks.append(self) or original_exists(self))
+    
+    assert LazySchemaLoader(tmp_path).get("no_such_module") is None
+    assert checks == []
+
+def test_prompt_digest():
+    """The digest lists each option on one line with its key attributes."""
+    schema = {"options": {
+        "path": {"type": "path", "required": True,
+                 "description": ["The file to modify. Before Ansible 2.3 this was dest.", "More text."]},
+        "state": {"type": "str", "choices": ["present", "absent"], "default": "present",
+                  "description": "Whether the line should be there. " + "x" * 200},
+        "lines": {"type": "list", "elements": "str", "description": "x" * 200},
+    }}
+    
+    digest = build_prompt_digest(schema, description_chars=40)
+    
+    assert digest["text"].splitlines() == [
+        "- path: path, required; The file to modify.",
+        "- state: str, choices present|absent, default present; Whether the line should be there.",
+        "- lines: list[str]; " + "x" * 37 + "...",
+    ]
+    assert digest["tokens"] < digest["full_tokens"]
+
+def test_loaded_schemas_have_prompt_digest(tmp_path, monkeypatch):
+    """Schemas get their prompt digest once, when loaded, without changing the schema."""
+    (tmp_path / "debug.json").write_text(json.dumps(
+        {"options": {"msg": {"type": "str", "description": "The message."}}}
+    ))
+    
+    schema = LazySchemaLoader(tmp_path).get("debug")
+    builds = []
+    monkeypatch.setattr(plugin_loader, "build_prompt_digest", lambda s: builds.append(s))
+    
+    assert get_prompt_digest(schema)["text"] == "- msg: str; The message."
+    assert builds == []
+    assert set(schema) == {"options"}
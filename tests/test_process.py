@@ -0,0 +1,120 @@
+"""Tests for subprocess execution with process-group cleanup."""
+import asyncio
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from backend import process
+from backend.tasks import TaskLog
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith("linux"),
+                                reason="process state is read from /proc")
+
+def alive(pid: int) -> bool:
+    """Whether pid exists and is not a zombie."""
+    try:
+        stat = Path(f"/proc/{pid}/stat").read_text()
+    except FileNotFoundError:
+        return False
+    return stat.rsplit(")", 1)[1].split()[0] != "Z"
+
+def wait_dead(pid: int, seconds: float = 2.0) -> bool:
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        if not alive(pid):
+            return True
+        time.sleep(0.02)
+    return False
+
+def spawn_script(pid_file: Path, trap_term: bool = False) -> list:
+    """Shell command that starts a background child, records its PID and waits."""
+    trap = 'trap "" TERM; ' if trap_term else ""
+    return ["sh", "-c", f"{trap}sleep 30 & echo $! > {pid_file}; while true; do sleep 0.05; done"]
+
+def read_pid(pid_file: Path) -> int:
+    for _ in range(100):
+        if pid_file.exists() and pid_file.read_text().strip():
+            return int(pid_file.read_text())
+        time.sleep(0.01)
+    raise AssertionError("child PID was not written")
+
+def test_run_captures_output():
+    """Test output and return code are captured as text."""
+    proc = process.run(["sh", "-c", "echo out; echo err >&2; exit 3"])
+
+    assert proc.returncode == 3
+    assert proc.stdout == "out\n"
+    assert proc.stderr == "err\n"
+
+def test_run_timeout_kills_process_group(tmp_path, monkeypatch):
+    """Test a timed-out command's children are killed, even if it ignores SIGTERM."""
+    monkeypatch.setattr(process, "KILL_GRACE_SECONDS", 0.2)
+    pid_file = tmp_path / "pid"
+
+    with pytest.raises(subprocess.TimeoutExpired):
+        process.run(spawn_script(pid_file, trap_term=True), timeout=0.3)
+
+    assert wait_dead(read_pid(pid_file))
+
+def test_run_streams_to_log(tmp_path):
+    """Test combined output goes to the log and only its tail is returned."""
+    log = TaskLog(tmp_path / "task.log", tail_lines=2)
+    proc = process.run(["sh", "-c", "echo one; echo two >&2; echo three; exit 2"], log=log)
+    log.close()
+
+    assert proc.returncode == 2
+    assert proc.stdout == "two\nthree\n"
+    assert (tmp_path / "task.log").read_text().splitlines() == [
+        "$ sh -c echo one; echo two >&2; echo three; exit 2", "one", "two", "three",
+    ]
+
+def test_run_logged_timeout_kills_process_group(tmp_path, monkeypatch):
+    """Test a timed-out logged command is killed and reports the output so far."""
+    monkeypatch.setattr(process, "KILL_GRACE_SECONDS", 0.2)
+    pid_file = tmp_path / "pid"
+    log = TaskLog(None)
+
+    with pytest.raises(subprocess.TimeoutExpired) as excinfo:
+        process.run(spawn_script(pid_file, trap_term=True), timeout=0.3, log=log)
+
+    assert excinfo.value.output.startswith("$ sh -c")
+    assert wait_dead(read_pid(pid_file))
+
+async def test_arun_captures_output():
+    """Test the async variant decodes output like run()."""
+    proc = await process.arun(["sh", "-c", "echo out; exit 1"])
+
+    assert proc.returncode == 1
+    assert proc.stdout == "out\n"
+
+async def test_arun_does_not_block_concurrent_commands():
+    """Test concurrent commands run side by side."""
+    start = time.monotonic()
+    await asyncio.gather(*(process.arun(["sleep", "0.5"]) for _ in range(4)))
+
+    assert time.monotonic() - start < 1.5
+
+async def test_arun_timeout_kills_process_group(tmp_path, monkeypatch):
+    """Test a timed-out async command's children are killed."""
+    monkeypatch.setattr(process, "KILL_GRACE_SECONDS", 0.2)
+    pid_file = tmp_path / "pid"
+
+    with pytest.raises(subprocess.TimeoutExpired):
+        await process.arun(spawn_script(pid_file, trap_term=True), timeout=0.3)
+
+    assert wait_dead(read_pid(pid_file))
+
+async def test_arun_cancellation_kills_process_group(tmp_path):
+    """Test cancelling the caller kills the command and its children."""
+    pid_file = tmp_path / "pid"
+    task = asyncio.ensure_future(process.arun(spawn_script(pid_file)))
+    await asyncio.sleep(0.3)
+
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert wait_dead(read_pid(pid_file))
@@ -0,0 +1,140 @@
+"""Tests for the semantic playbook cache."""
+import time
+
+import pytest
+
+from backend import semantic_cache as semantic_cache_module
+from backend.semantic_cache import SemanticCache, embed, normalize_task, task_literals
+
+@pytest.fixture
+def cache():
+    return SemanticCache(threshold=0.8)
+
+def similarity(a, b):
+    va, vb = embed(a), embed(b)
+    if isinstance(va, dict):
+        return sum(w * vb.get(k, 0.0) for k, w in va.items())
+    return float(va @ vb)
+
+def test_normalize_task():
+    assert normalize_task("Please copy THE config file to /etc/app!") == "copy config file /etc/app"
+
+def test_embedding_similarity():
+    assert similarity("install nginx", "install nginx") == pytest.approx(1.0, abs=1e-5)
+    assert similarity("Copy the config file to /etc/app",
+                      "copy config file to /etc/app please") > 0.95
+    assert similarity("Copy the config file to /etc/app",
+                      "copy config files to /etc/app") > 0.9
+    # A different destination is not close enough at the default threshold
+    assert similarity("Copy the config file to /etc/app",
+                      "copy the config file to /etc/app2") < 0.9
+    assert similarity("install nginx", "remove the postgres user account") < 0.3
+
+def test_embed_empty_text():
+    assert embed("the a of") is None
+
+def test_lookup_hit_and_miss(cache):
+    cache.add("ansible.builtin.copy", "Copy the config file to /etc/app", ("id-1", "yaml"))
+    
+    hit = cache.lookup("ansible.builtin.copy", "copy config file to /etc/app please")
+    assert hit is not None
+    assert hit.value == ("id-1", "yaml")
+    assert hit.similarity > 0.95
+    
+    assert cache.lookup("ansible.builtin.copy", "delete the temporary directory") is None
+    # Indexes are per module
+    assert cache.lookup("ansible.builtin.template", "Copy the config file to /etc/app") is None
+    
+    stats = cache.stats()
+    assert stats["lookups"] == 3
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["size"] == 1
+
+def test_nearest_entry_wins(cache):
+    cache.add("m", "install the nginx package", "nginx")
+    cache.add("m", "install the postgresql package", "postgresql")
+    
+    assert cache.lookup("m", "install nginx package").value == "nginx"
+    assert cache.lookup("m", "install postgresql package").value == "postgresql"
+
+def test_same_task_replaces_entry(cache):
+    cache.add("m", "install nginx", "old")
+    cache.add("m", "Install nginx", "new")
+    
+    assert cache.stats()["size"] == 1
+    assert cache.lookup("m", "install nginx").value == "new"
+
+def test_max_entries_evicts_oldest():
+    cache = SemanticCache(threshold=0.8, max_entries=2)
+    cache.add("m", "install nginx", 1)
+    cache.add("m", "install postgresql", 2)
+    cache.add("m", "install redis", 3)
+    
+    assert cache.lookup("m", "install nginx") is None
+    assert cache.lookup("m", "install redis").value == 3
+    assert cache.stats()["evictions"] == 1
+
+def test_expired_entries_are_not_served(monkeypatch):
+    cache = SemanticCache(threshold=0.8, ttl_seconds=10)
+    cache.add("m", "install nginx", 1)
+    
+    now = time.time()
+    monkeypatch.setattr(semantic_cache_module.time, "time", lambda: now + 11)
+    assert cache.lookup("m", "install nginx") is None
+    assert cache.stats()["size"] == 0
+
+def test_poor_feedback_drops_source(cache):
+    cache.add("m", "install nginx", 1)
+    hit = cache.lookup("m", "install nginx please")
+    cache.record_served("served-1", "m", hit)
+    
+    # Good ratings and unknown playbooks leave the entry alone
+    assert not cache.record_feedback("served-1", 5)
+    assert not cache.record_feedback("other", 1)
+    assert cache.lookup("m", "install nginx") is not None
+    
+    assert cache.record_feedback("served-1", 1)
+    assert cache.lookup("m", "install nginx") is None
+    assert cache.stats()["invalidations"] == 1
+
+def test_clear(cache):
+    cache.add("m", "install nginx", 1)
+    cache.clear()
+    assert cache.lookup("m", "install nginx") is None
+    assert cache.stats()["size"] == 0
+
+@pytest.mark.parametrize("cached, requested", [
+    ("Recursively set the owner to www-data and the permissions of the web application directory /srv/www/app to mode 0755",
+     "Recursively set the owner to www-data and the permissions of the web application directory /srv/www/app to mode 0700"),
+    ("Render the application configuration template app.conf.j2 to /etc/app/app.conf owned by root with mode 0644 and restart the service",
+     "Render the application configuration template app.conf.j2 to /etc/app/app.conf owned by root with mode 0600 and restart the service"),
+    ("Create the deploy user account in the wheel group with a home directory and login shell /bin/bash",
+     "Create the deploy user account in the wheel group with a home directory and login shell /bin/zsh"),
+    ('Write the message of the day file with the text "Authorized access only" for all users on the bastion hosts',
+     'Write the message of the day file with the text "Authorised access only" for all users on the bastion hosts'),
+])
+def test_different_literals_never_hit(cached, requested):
+    """Near-identical tasks that differ in a mode, path or quoted value are misses."""
+    cache = SemanticCache()
+    cache.add("m", cached, 1)
+    
+    assert similarity(cached, requested) > cache.threshold
+    assert cache.lookup("m", requested) is None
+
+def test_task_literals():
+    assert task_literals('Copy app.conf to /etc/app/ with mode 0644 and owner "web admin".') == {
+        "app.conf", "/etc/app", "0644", '"web admin"'}
+    assert task_literals("install nginx") == set()
+
+def test_expired_nearest_entry_does_not_hide_others(monkeypatch):
+    cache = SemanticCache(threshold=0.7, ttl_seconds=10)
+    now = time.time()
+    monkeypatch.setattr(semantic_cache_module.time, "time", lambda: now)
+    cache.add("m", "install the nginx package", 1)
+    monkeypatch.setattr(semantic_cache_module.time, "time", lambda: now + 5)
+    cache.add("m", "install the nginx package on web servers", 2)
+    
+    monkeypatch.setattr(semantic_cache_module.time, "time", lambda: now + 11)
+    assert cache.lookup("m", "install the nginx package").value == 2
+    assert cache.stats()["size"] == 1
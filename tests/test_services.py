@@ -1,9 +1,26 @@
 """Tests for the backend services."""
+import asyncio
+import json
+import uuid
+import subprocess
 import pytest
 from pathlib import Path
 
+from backend import tasks
+from backend.cache import Cache
+from backend.cache_store import SQLiteCacheStore
+from backend.lint_pool import LintPoolError
+from backend.molecule_pool import MoleculePoolError
 from backend.llm_adapter import LLMClient
-from backend.services.playbook_service import PlaybookService, PlaybookValidationError
+from backend.semantic_cache import SemanticCache
+from backend.services import playbook_service as playbook_service_module
+from backend.services.playbook_service import (
+    PlaybookExecutionError,
+    PlaybookService,
+    PlaybookValidationError,
+    lint_cache_key,
+    parse_lint_json,
+)
 
 class MockLLMClient(LLMClient):
     """Mock LLM client for testing."""
@@ -49,6 +66,110 @@ def test_generate_playbook(playbook_service, test_schema, tmp_path, monkeypatch)
     assert Path(tmp_path / f"{playbook_id}.yml").exists()
     assert content == "- name: test task\n  ansible.builtin.debug:\n    msg: test"
 
+async def test_agenerate_playbook(playbook_service, test_schema, tmp_path, monkeypatch):
+    """Test generating a playbook through the async path."""
+    monkeypatch.setattr("backend.config.settings.PLAYBOOK_DIR", tmp_path)
+    
+    playbook_id, content = await playbook_service.agenerate_playbook(
+        module="ansible.builtin.debug",
+        prompt="Show a test message",
+        schema=test_schema
+    )
+    
+    assert Path(tmp_path / f"{playbook_id}.yml").exists()
+    assert content == "- name: test task\n  ansible.builtin.debug:\n    msg: test"
+
+async def test_astream_playbook(playbook_service, test_schema, tmp_path, monkeypatch):
+    """Test streaming a playbook yields tokens and then the saved playbook."""
+    monkeypatch.setattr("backend.config.settings.PLAYBOOK_DIR", tmp_path)
+    
+    events = [event async for event in playbook_service.astream_playbook(
+        module="ansible.builtin.debug",
+        prompt="Show a test message",
+        schema=test_schema
+    )]
+    
+    assert [e["event"] for e in events] == ["token", "done"]
+    done = events[-1]
+    assert Path(tmp_path / f"{done['playbook_id']}.yml").exists()
+    assert done["playbook_yaml"] == "- name: test task\n  ansible.builtin.debug:\n    msg: test"
+
+def test_prompt_uses_digest_and_records_savings(playbook_service, test_schema, tmp_path, monkeypatch):
+    """Test the prompt lists options compactly and the LLM usage context records it."""
+    from backend import llm_adapter
+    monkeypatch.setattr("backend.config.settings.PLAYBOOK_DIR", tmp_path)
+    
+    seen = {}
+    def generate(prompt):
+        seen["prompt"] = prompt
+        seen["context"] = llm_adapter._usage_context.get()
+        return playbook_service.llm_client.response
+    monkeypatch.setattr(playbook_service.llm_client, "generate", generate)
+    
+    playbook_service.generate_playbook("ansible.builtin.debug", "Show a digest test message", test_schema)
+    
+    assert "- msg: str; The message to display" in seen["prompt"]
+    assert '"description"' not in seen["prompt"]
+    assert seen["context"]["module"] == "ansible.builtin.debug"
+    assert seen["context"]["prompt_tokens_saved"] > 0
+    # The context only applies during the call
+    assert llm_adapter._usage_context.get() == {}
+
+def test_semantic_cache_reuses_similar_prompt(test_schema, tmp_path, monkeypatch):
+    """Test a similar prompt reuses the playbook under a new ID without calling the LLM."""
+    monkeypatch.setattr("backend.config.settings.PLAYBOOK_DIR", tmp_path)
+    monkeypatch.setattr("backend.config.settings.SEMANTIC_CACHE_ENABLED", True)
+    monkeypatch.setattr(playbook_service_module, "semantic_cache", SemanticCache(threshold=0.9))
+    
+    llm = MockLLMClient()
+    calls = []
+    llm.generate = lambda prompt: calls.append(prompt) or llm.response
+    service = PlaybookService(llm)
+    
+    first_id, _ = service.generate_playbook(
+        "ansible.builtin.debug", "Show the test message", test_schema
+    )
+    second_id, content = service.generate_playbook(
+        "ansible.builtin.debug", "show test message please", test_schema
+    )
+    
+    assert len(calls) == 1
+    assert second_id != first_id
+    assert content == llm.response
+    assert Path(tmp_path / f"{second_id}.yml").exists()
+    
+    # A different task still goes to the LLM
+    service.generate_playbook("ansible.builtin.debug", "Print the hostname", test_schema)
+    assert len(calls) == 2
+
+async def test_agenerate_playbook_batches_concurrent_requests(test_schema, tmp_path, monkeypatch):
+    """Test concurrent requests for one module are generated with one batched call."""
+    from backend.llm_batching import GenerationBatcher
+    monkeypatch.setattr("backend.config.settings.PLAYBOOK_DIR", tmp_path)
+    monkeypatch.setattr("backend.config.settings.LLM_BATCHING", True)
+    monkeypatch.setattr(playbook_service_module, "generation_batcher",
+                        GenerationBatcher(window_seconds=0.05))
+    
+    prompts = []
+    def generate(prompt):
+        prompts.append(prompt)
+        return "".join(f"# task {n}\n- name: batched {n}\n  ansible.builtin.debug:\n    msg: test\n"
+                       for n in (1, 2))
+    llm = MockLLMClient()
+    llm.generate = generate
+    service = PlaybookService(llm)
+    
+    results = await asyncio.gather(
+        service.agenerate_playbook("ansible.builtin.debug", "Show batch message one", test_schema),
+        service.agenerate_playbook("ansible.builtin.debug", "Show batch message two", test_schema),
+    )
+    
+    assert len(prompts) == 1
+    assert "1. Show batch message one\n2. Show batch message two" in prompts[0]
+    assert [content.splitlines()[0] for _, content in results] == ["- name: batched 1",
+                                                                    "- name: batched 2"]
+    assert all(Path(tmp_path / f"{playbook_id}.yml").exists() for playbook_id, _ in results)
+
 def test_get_playbook_path_not_found(playbook_service, tmp_path, monkeypatch):
     """Test getting a non-existent playbook path."""
     # Set playbook dir to a temp directory
@@ -79,4 +200,312 @@ def test_determine_molecule_image(playbook_service, tmp_path):
     # Test image selection
     assert "ubuntu" in playbook_service._determine_molecule_image(deb_path)
     assert "centos" in playbook_service._determine_molecule_image(yum_path)
-    assert "ubuntu" in playbook_service._determine_molecule_image(other_path)  # Default
\ No newline at end of file
+    assert "ubuntu" in playbook_service._determine_molecule_image(other_path)  # Default
+@pytest.fixture
+def lint_env(tmp_path, monkeypatch):
+    """Isolate the lint cache and stub out the ansible-lint subprocess."""
+    monkeypatch.setattr("backend.config.settings.PLAYBOOK_DIR", tmp_path)
+    monkeypatch.setattr(playbook_service_module, "_ansible_lint_version", lambda: "6.0.0")
+    monkeypatch.setattr("backend.config.settings.LINT_POOL_ENABLED", False)
+    
+    store_path = tmp_path / "cache.db"
+    monkeypatch.setattr(playbook_service_module, "lint_cache",
+                        Cache("lint", l2=SQLiteCacheStore(store_path)))
+    
+    runs = []
+    def fake_run(args, **kwargs):
+        runs.append(args)
+        return subprocess.CompletedProcess(args, 2, stdout="pb.yml:1: name[missing]\n", stderr="")
+    async def fake_arun(args, **kwargs):
+        return fake_run(args, **kwargs)
+    monkeypatch.setattr(playbook_service_module.process, "run", fake_run)
+    monkeypatch.setattr(playbook_service_module.process, "arun", fake_arun)
+    
+    def write_playbook(content):
+        playbook_id = str(uuid.uuid4())
+        (tmp_path / f"{playbook_id}.yml").write_text(content)
+        return playbook_id
+    
+    return write_playbook, runs, store_path
+
+def test_lint_cache_shared_by_identical_content(playbook_service, lint_env):
+    """Identical playbooks under different IDs are linted only once."""
+    write_playbook, runs, _ = lint_env
+    first = write_playbook("- hosts: all\n")
+    second = write_playbook("- hosts: all\n")
+    third = write_playbook("- hosts: web\n")
+    
+    assert playbook_service.lint_playbook(first) == [
+        f"{playbook_service._get_playbook_path(first)}:1: name[missing]"]
+    # The cached errors name the requesting playbook, not the one linted
+    assert playbook_service.lint_playbook(second) == [
+        f"{playbook_service._get_playbook_path(second)}:1: name[missing]"]
+    assert len(runs) == 1
+    
+    playbook_service.lint_playbook(third)
+    assert len(runs) == 2
+
+def test_failed_lint_is_not_cached(playbook_service, lint_env, monkeypatch):
+    """A run where ansible-lint itself failed is not cached as a result."""
+    write_playbook, runs, _ = lint_env
+    def crashed(args, **kwargs):
+        runs.append(args)
+        return subprocess.CompletedProcess(args, 1, stdout="", stderr="CRITICAL Couldn't parse task\n")
+    monkeypatch.setattr(playbook_service_module.process, "run", crashed)
+    
+    assert playbook_service.lint_playbook(write_playbook("- hosts: all\n")) == []
+    assert playbook_service.lint_playbook(write_playbook("- hosts: all\n")) == []
+    assert len(runs) == 2
+
+def test_lint_cache_survives_restart(playbook_service, lint_env, monkeypatch):
+    """Persisted lint results are reused by a fresh process."""
+    write_playbook, runs, store_path = lint_env
+    playbook_service.lint_playbook(write_playbook("- hosts: all\n"))
+    
+    monkeypatch.setattr(playbook_service_module, "lint_cache",
+                        Cache("lint", l2=SQLiteCacheStore(store_path)))
+    playbook_service.lint_playbook(write_playbook("- hosts: all\n"))
+    assert len(runs) == 1
+
+async def test_alint_playbook_uses_lint_cache(playbook_service, lint_env):
+    """The async lint path runs ansible-lint once per content, like the sync one."""
+    write_playbook, runs, _ = lint_env
+    
+    for _ in range(2):
+        playbook_id = write_playbook("- hosts: db\n")
+        assert await playbook_service.alint_playbook(playbook_id) == [
+            f"{playbook_service._get_playbook_path(playbook_id)}:1: name[missing]"]
+    assert len(runs) == 1
+
+async def test_atest_playbook(playbook_service, tmp_path, monkeypatch):
+    """Molecule results and timeouts are reported by the async test path."""
+    monkeypatch.setattr("backend.config.settings.PLAYBOOK_DIR", tmp_path)
+    playbook_id = str(uuid.uuid4())
+    (tmp_path / f"{playbook_id}.yml").write_text("- hosts: all\n")
+    
+    calls = []
+    async def fake_arun(args, cwd=None, timeout=None):
+        calls.append((args, cwd))
+        return subprocess.CompletedProcess(args, 0, stdout="converged\n", stderr="")
+    monkeypatch.setattr(playbook_service_module.process, "arun", fake_arun)
+    
+    assert await playbook_service.atest_playbook(playbook_id) == ("passed", "converged\n")
+    assert calls == [(["molecule", "test"], tmp_path / playbook_id)]
+    assert (tmp_path / playbook_id / "molecule" / "default" / "molecule.yml").exists()
+    
+    async def timed_out(args, cwd=None, timeout=None):
+        raise subprocess.TimeoutExpired(args, timeout)
+    monkeypatch.setattr(playbook_service_module.process, "arun", timed_out)
+    with pytest.raises(PlaybookExecutionError, match="timed out"):
+        await playbook_service.atest_playbook(playbook_id, timeout=1)
+
+def test_test_uses_molecule_pool(playbook_service, tmp_path, monkeypatch):
+    """Tests converge on a warm instance and fall back to molecule test when the pool fails."""
+    monkeypatch.setattr("backend.config.settings.PLAYBOOK_DIR", tmp_path)
+    monkeypatch.setattr("backend.config.settings.MOLECULE_POOL_ENABLED", True)
+    playbook_id = str(uuid.uuid4())
+    (tmp_path / f"{playbook_id}.yml").write_text("- hosts: all\n  tasks:\n    - apt: name=git\n")
+    
+    pooled = []
+    class FakePool:
+        fail = False
+        def available(self):
+            return True
+        def test(self, image, playbook, timeout=None, log=None):
+            pooled.append((image, playbook))
+            if self.fail:
+                raise MoleculePoolError("create failed")
+            return subprocess.CompletedProcess(["molecule", "converge"], 0, stdout="converged\n", stderr="")
+    pool = FakePool()
+    monkeypatch.setattr(playbook_service_module, "molecule_pool", pool)
+    runs = []
+    def fake_run(args, cwd=None, timeout=None, log=None):
+        runs.append(args)
+        return subprocess.CompletedProcess(args, 1, stdout="", stderr="failed\n")
+    monkeypatch.setattr(playbook_service_module.process, "run", fake_run)
+    
+    assert playbook_service.test_playbook(playbook_id) == ("passed", "converged\n")
+    assert pooled == [("geerlingguy/docker-ubuntu2004-ansible:latest", tmp_path / f"{playbook_id}.yml")]
+    assert runs == [] and not (tmp_path / playbook_id).exists()
+    
+    pool.fail = True
+    assert playbook_service.test_playbook(playbook_id) == ("failed", "failed\n")
+    assert runs == [["molecule", "test"]]
+
+def test_lint_uses_worker_pool(playbook_service, lint_env, monkeypatch):
+    """Lints go to the worker pool when it is available and fall back when it fails."""
+    write_playbook, runs, _ = lint_env
+    monkeypatch.setattr("backend.config.settings.LINT_POOL_ENABLED", True)
+    
+    pooled = []
+    class FakePool:
+        fail = False
+        def available(self):
+            return True
+        def run(self, path, timeout=None):
+            pooled.append(path)
+            if self.fail:
+                raise LintPoolError("worker exited")
+            return subprocess.CompletedProcess(["ansible-lint", "-p", path], 0, stdout="", stderr="")
+    pool = FakePool()
+    monkeypatch.setattr(playbook_service_module, "lint_pool", pool)
+    
+    assert playbook_service.lint_playbook(write_playbook("- hosts: pooled\n")) == []
+    assert len(pooled) == 1 and runs == []
+    
+    pool.fail = True
+    playbook_id = write_playbook("- hosts: fallback\n")
+    assert playbook_service.lint_playbook(playbook_id) == [
+        f"{playbook_service._get_playbook_path(playbook_id)}:1: name[missing]"]
+    assert len(pooled) == 2 and len(runs) == 1
+
+def test_task_output_goes_to_task_log(playbook_service, lint_env, monkeypatch):
+    """Inside a task, lint errors are logged and Molecule gets the task's log."""
+    write_playbook, runs, _ = lint_env
+    playbook_id = write_playbook("- hosts: all\n")
+    logs = []
+    def fake_run(args, cwd=None, timeout=None, log=None):
+        logs.append(log)
+        return subprocess.CompletedProcess(args, 0, stdout="tail\n", stderr="")
+    
+    error = f"{playbook_service._get_playbook_path(playbook_id)}:1: name[missing]"
+    log = tasks.TaskLog(None)
+    token = tasks._current_log.set(log)
+    try:
+        assert playbook_service.lint_playbook(playbook_id) == [error]
+        # Cached results are logged as well
+        playbook_service.lint_playbook(playbook_id)
+        monkeypatch.setattr(playbook_service_module.process, "run", fake_run)
+        assert playbook_service.test_playbook(playbook_id) == ("passed", "tail\n")
+    finally:
+        tasks._current_log.reset(token)
+    
+    assert log.tail() == f"{error}\n" * 2
+    assert logs == [log]
+    
+    # Outside a task nothing is logged
+    playbook_service.test_playbook(playbook_id)
+    assert logs == [log, None]
+
+def test_lint_cache_key_includes_version_and_config(tmp_path, monkeypatch):
+    """Changing ansible-lint or its configuration changes the key."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(playbook_service_module, "_ansible_lint_version", lambda: "6.0.0")
+    key = lint_cache_key(b"- hosts: all\n")
+    assert key.startswith("lint:") and ":6.0.0:" in key
+    
+    (tmp_path / ".ansible-lint").write_text("skip_list: [yaml]\n")
+    assert lint_cache_key(b"- hosts: all\n") != key
+    
+    monkeypatch.setattr(playbook_service_module, "_ansible_lint_version", lambda: "24.2.0")
+    assert ":24.2.0:" in lint_cache_key(b"- hosts: all\n")
+
+def test_parse_lint_json():
+    """ansible-lint JSON issues are grouped by file as -p style lines."""
+    output = json.dumps([
+        {"check_name": "name[play]", "description": "All plays should be named.",
+         "location": {"path": "a.yml", "positions": {"begin": {"line": 1, "column": 3}}}},
+        {"check_name": "no-changed-when", "description": "Commands should not change things.",
+         "location": {"path": "a.yml", "lines": {"begin": 4}}},
+        {"check_name": "fqcn[action-core]", "description": "Use FQCN.",
+         "location": {"path": "/srv/b.yml", "lines": {"begin": 2}}},
+    ])
+    
+    errors = parse_lint_json(output)
+    
+    assert errors["a.yml"] == [
+        "1:3: name[play]: All plays should be named.",
+        "4: no-changed-when: Commands should not change things.",
+    ]
+    assert errors["/srv/b.yml"] == ["2: fqcn[action-core]: Use FQCN."]
+    assert parse_lint_json("[]") == {}
+
+@pytest.fixture
+def batch_lint_env(lint_env, monkeypatch):
+    """Stub ansible-lint -f json, reporting one issue for files containing "bad"."""
+    write_playbook, _, _ = lint_env
+    runs = []
+    def fake_run(args, **kwargs):
+        runs.append(args)
+        if args[1] == "-p":
+            return subprocess.CompletedProcess(args, 0, stdout="", stderr="")
+        issues = [
+            {"check_name": "name[play]", "description": "All plays should be named.",
+             "location": {"path": path, "lines": {"begin": 1}}}
+            for path in args[4:] if "bad" in Path(path).read_text()
+        ]
+        return subprocess.CompletedProcess(args, 2 if issues else 0, stdout=json.dumps(issues), stderr="")
+    async def fake_arun(args, **kwargs):
+        return fake_run(args, **kwargs)
+    monkeypatch.setattr(playbook_service_module.process, "run", fake_run)
+    monkeypatch.setattr(playbook_service_module.process, "arun", fake_arun)
+    return write_playbook, runs
+
+def test_lint_playbooks_single_run(playbook_service, batch_lint_env):
+    """A batch lints each distinct uncached content once, in one ansible-lint run."""
+    write_playbook, runs = batch_lint_env
+    cached = write_playbook("- hosts: cached\n")
+    playbook_service.lint_playbook(cached)
+    bad, bad_copy, good = (write_playbook("- hosts: bad\n"), write_playbook("- hosts: bad\n"),
+                           write_playbook("- hosts: good\n"))
+    
+    results = playbook_service.lint_playbooks([bad, cached, bad_copy, good])
+    
+    assert list(results) == [bad, cached, bad_copy, good]
+    for playbook_id in (bad, bad_copy):
+        assert results[playbook_id] == [
+            f"{playbook_service._get_playbook_path(playbook_id)}:1: name[play]: All plays should be named."]
+    assert results[good] == []
+    assert len(runs) == 2
+    assert runs[1][:4] == ["ansible-lint", "-f", "json", "--nocolor"] and len(runs[1]) == 6
+    
+    # The batch filled the content-hash cache
+    assert playbook_service.lint_playbook(bad_copy) == results[bad_copy]
+    assert playbook_service.lint_playbooks([good, bad]) == {good: [], bad: results[bad]}
+    assert len(runs) == 2
+
+def test_lint_playbooks_matches_reported_paths_by_name(playbook_service, batch_lint_env, monkeypatch):
+    """Issues are matched to playbooks whatever base dir ansible-lint reports paths against."""
+    write_playbook, runs = batch_lint_env
+    bad = write_playbook("- hosts: bad\n")
+    def relative_paths(args, **kwargs):
+        runs.append(args)
+        issues = [{"check_name": "name[play]", "description": "All plays should be named.",
+                   "location": {"path": f"../playbooks/{Path(args[4]).name}", "lines": {"begin": 1}}}]
+        return subprocess.CompletedProcess(args, 2, stdout=json.dumps(issues), stderr="")
+    monkeypatch.setattr(playbook_service_module.process, "run", relative_paths)
+    
+    assert playbook_service.lint_playbooks([bad]) == {
+        bad: [f"{playbook_service._get_playbook_path(bad)}:1: name[play]: All plays should be named."]}
+
+def test_lint_playbooks_fails_on_unknown_paths(playbook_service, batch_lint_env, monkeypatch):
+    """Issues for files that were not linted fail the batch instead of caching it as clean."""
+    write_playbook, runs = batch_lint_env
+    playbook_id = write_playbook("- hosts: all\n")
+    def other_file(args, **kwargs):
+        runs.append(args)
+        issues = [{"check_name": "name[play]", "description": "All plays should be named.",
+                   "location": {"path": "site.yml", "lines": {"begin": 1}}}]
+        return subprocess.CompletedProcess(args, 2, stdout=json.dumps(issues), stderr="")
+    monkeypatch.setattr(playbook_service_module.process, "run", other_file)
+    
+    with pytest.raises(PlaybookExecutionError, match="site.yml, which was not linted"):
+        playbook_service.lint_playbooks([playbook_id])
+    with pytest.raises(PlaybookExecutionError):
+        playbook_service.lint_playbooks([playbook_id])
+    assert len(runs) == 2
+
+async def test_alint_playbooks_errors(playbook_service, batch_lint_env, monkeypatch):
+    """Unknown playbooks and ansible-lint failures fail the whole batch."""
+    write_playbook, runs = batch_lint_env
+    playbook_id = write_playbook("- hosts: all\n")
+    
+    with pytest.raises(PlaybookValidationError):
+        await playbook_service.alint_playbooks([playbook_id, "00000000-0000-0000-0000-000000000000"])
+    assert runs == []
+    
+    async def crashed(args, **kwargs):
+        return subprocess.CompletedProcess(args, 1, stdout="", stderr="CRITICAL Couldn't parse task\n")
+    monkeypatch.setattr(playbook_service_module.process, "arun", crashed)
+    with pytest.raises(PlaybookExecutionError, match="exited with code 1: CRITICAL"):
+        await playbook_service.alint_playbooks([playbook_id])
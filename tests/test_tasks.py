@@ -2,9 +2,10 @@
 import time
 from unittest.mock import MagicMock, patch
 
+from backend import tasks
 from backend.tasks import (
-    TaskStatus, Task, TaskQueue, create_task, get_task, 
-    list_tasks, cancel_task, update_task_progress
+    TaskStatus, Task, TaskQueue, TaskLog, create_task, get_task, 
+    list_tasks, cancel_task, update_task_progress, current_log, read_log
 )
 
 def test_task_create():
@@ -111,6 +112,68 @@ def test_task_execution():
     # Check that the function was called with the correct arguments
     mock_func.assert_called_once_with("arg1", kwarg1="kwarg1")
 
+def test_task_execution_writes_log():
+    """Test a task's output goes to its log file through current_log()."""
+    queue = TaskQueue()
+    
+    def work():
+        current_log().write("first")
+        current_log().write("second\n")
+        return "done"
+    
+    task = queue.create_task("test", "test-user")
+    queue.submit(task.task_id, work)
+    for _ in range(10):
+        if task.status in (TaskStatus.PENDING, TaskStatus.RUNNING):
+            time.sleep(0.1)
+    
+    assert task.result == "done"
+    assert read_log(task.task_id) == (["first", "second"], 13)
+    assert current_log() is None
+    
+    # The log is removed with the task
+    task.completed_at = "2000-01-01T00:00:00"
+    assert queue.cleanup_completed_tasks() == 1
+    assert not tasks.log_path(task.task_id).exists()
+
+def test_task_log_keeps_tail(tmp_path):
+    """Test only the last lines are kept in memory while the file has all of them."""
+    log = TaskLog(tmp_path / "task.log", tail_lines=2)
+    for n in range(5):
+        log.write(f"line {n}")
+    log.write("x" * 10000)
+    log.close()
+    
+    assert log.tail() == "line 4\n" + "x" * (tasks.MAX_TAIL_LINE_CHARS - 1) + "\n"
+    assert log.lines == 6
+    assert (tmp_path / "task.log").read_text().splitlines()[:5] == [f"line {n}" for n in range(5)]
+
+def test_task_log_file_created_on_first_write(tmp_path):
+    """Test a task without output leaves no log file."""
+    path = tmp_path / "logs" / "task.log"
+    TaskLog(path).close()
+    assert not path.exists()
+    
+    log = TaskLog(path)
+    log.write("line")
+    log.close()
+    assert path.read_text() == "line\n"
+
+def test_read_log_returns_complete_lines():
+    """Test reading continues from the returned offset and skips partial lines."""
+    assert read_log("missing") == ([], 0)
+    
+    path = tasks.log_path("task")
+    path.parent.mkdir()
+    path.write_text("one\ntwo\npart")
+    lines, offset = read_log("task")
+    assert lines == ["one", "two"]
+    assert read_log("task", offset) == ([], offset)
+    
+    with open(path, "a") as f:
+        f.write("ial\n")
+    assert read_log("task", offset) == (["partial"], offset + 8)
+
 def test_task_execution_error():
     """Test executing a task that raises an error."""
     queue = TaskQueue()
@@ -0,0 +1,86 @@
+"""Tests for the background LLM usage writer."""
+import threading
+import time
+
+import pytest
+
+from backend import usage_recorder as usage_recorder_module
+from backend.usage_recorder import UsageRecorder
+
+def usage(**overrides):
+    record = {"provider": "openai", "model": "gpt-4", "prompt_tokens": 10,
+              "completion_tokens": 5, "duration_ms": 100}
+    record.update(overrides)
+    return record
+
+@pytest.fixture
+def batches(monkeypatch):
+    written = []
+    monkeypatch.setattr(usage_recorder_module.database, "record_llm_usage_batch",
+                        lambda records: written.append(list(records)))
+    return written
+
+def test_records_are_written_in_batches(batches):
+    recorder = UsageRecorder(batch_size=3, flush_seconds=0.05)
+    for i in range(7):
+        assert recorder.record(**usage(duration_ms=i))
+    
+    assert recorder.flush()
+    recorder.stop()
+    
+    assert [r["duration_ms"] for batch in batches for r in batch] == list(range(7))
+    assert all(len(batch) <= 3 for batch in batches)
+    assert recorder.stats()["written"] == 7
+
+def test_steady_traffic_is_flushed_on_time(batches):
+    recorder = UsageRecorder(batch_size=100, flush_seconds=0.2)
+    
+    # A record every 50ms never leaves the writer idle for flush_seconds
+    start = time.monotonic()
+    while time.monotonic() - start < 0.5:
+        recorder.record(**usage())
+        time.sleep(0.05)
+    
+    # The first batch went out flush_seconds after its first record, not after the traffic
+    assert batches
+    assert 2 <= len(batches[0]) <= 6
+    recorder.stop()
+
+def test_record_does_not_wait_for_the_database(monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(usage_recorder_module.database, "record_llm_usage_batch",
+                        lambda records: release.wait(5))
+    recorder = UsageRecorder(max_queue=2, batch_size=1)
+    
+    # The first record is taken by the blocked writer, the next two fill the queue
+    results = [recorder.record(**usage()) for _ in range(10)]
+    
+    assert results[0] is True
+    assert results.count(False) >= 7
+    assert recorder.stats()["dropped"] == results.count(False)
+    release.set()
+    recorder.stop()
+
+def test_write_failures_are_counted(monkeypatch):
+    def fail(records):
+        raise RuntimeError("database is locked")
+    monkeypatch.setattr(usage_recorder_module.database, "record_llm_usage_batch", fail)
+    recorder = UsageRecorder()
+    
+    recorder.record(**usage())
+    assert recorder.flush()
+    recorder.stop()
+    
+    assert recorder.stats()["failed"] == 1
+    assert recorder.stats()["written"] == 0
+
+def test_recording_after_stop_restarts_the_writer(batches):
+    recorder = UsageRecorder()
+    recorder.record(**usage())
+    recorder.stop()
+    
+    recorder.record(**usage())
+    assert recorder.flush()
+    recorder.stop()
+    
+    assert sum(len(batch) for batch in batches) == 2